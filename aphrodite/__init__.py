@@ -1,7 +1,8 @@
 from aphrodite.common.outputs import (CompletionOutput, EmbeddingOutput,
                                       EmbeddingRequestOutput, RequestOutput)
 from aphrodite.common.pooling_params import PoolingParams
-from aphrodite.common.sampling_params import SamplingParams
+from aphrodite.common.sampling_params import (RequestOutputKind,
+                                              SamplingParams)
 from aphrodite.endpoints.llm import LLM
 from aphrodite.engine.aphrodite_engine import AphroditeEngine
 from aphrodite.engine.args_tools import AsyncEngineArgs, EngineArgs
@@ -18,6 +19,7 @@ __all__ = [
     "LLM",
     "ModelRegistry",
     "SamplingParams",
+    "RequestOutputKind",
     "RequestOutput",
     "CompletionOutput",
     "EmbeddingOutput",
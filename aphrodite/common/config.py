@@ -675,6 +675,12 @@ class CacheConfig:
         cache_dtype: Data type for kv cache storage.
         num_gpu_blocks_override: Number of GPU blocks to use. This overrides the
             profiled num_gpu_blocks if specified. Does nothing if None.
+        enable_host_prefix_caching: Whether to use the CPU swap space as a
+            second tier of the prefix cache for the blocks evicted from the
+            GPU.
+        kv_disk_cache_path: Directory of a persistent on-disk cache of
+            prefix KV blocks. Does nothing if None.
+        kv_disk_cache_size: Size of the on-disk KV cache per GPU (in GiB).
     """
 
     def __init__(
@@ -688,6 +694,9 @@ class CacheConfig:
         sliding_window: Optional[int] = None,
         enable_prefix_caching: bool = False,
         cpu_offload_gb: float = 0.0,
+        enable_host_prefix_caching: bool = False,
+        kv_disk_cache_path: Optional[str] = None,
+        kv_disk_cache_size: float = 16,
     ) -> None:
         self.block_size = block_size
         self.gpu_memory_utilization = gpu_memory_utilization
@@ -698,6 +707,9 @@ class CacheConfig:
         self.sliding_window = sliding_window
         self.enable_prefix_caching = enable_prefix_caching
         self.cpu_offload_gb = cpu_offload_gb
+        self.enable_host_prefix_caching = enable_host_prefix_caching
+        self.kv_disk_cache_path = kv_disk_cache_path
+        self.kv_disk_cache_size_bytes = int(kv_disk_cache_size * GiB_bytes)
         self._verify_args()
         self._verify_cache_dtype()
         self._verify_prefix_caching()
@@ -705,6 +717,8 @@ class CacheConfig:
         # Will be set after profiling.
         self.num_gpu_blocks = None
         self.num_cpu_blocks = None
+        # Will be set by the engine.
+        self.kv_disk_cache_dir: Optional[str] = None
 
     def metrics_info(self):
         # convert cache_config to dict(key: str, value: str) for prometheus
@@ -731,8 +745,19 @@ class CacheConfig:
 
     def _verify_prefix_caching(self) -> None:
         if not self.enable_prefix_caching:
+            if self.enable_host_prefix_caching:
+                raise ValueError("Host prefix caching requires "
+                                 "--enable-prefix-caching.")
+            if self.kv_disk_cache_path is not None:
+                raise ValueError("The KV disk cache requires "
+                                 "--enable-prefix-caching.")
             return
 
+        if (self.kv_disk_cache_path is not None
+                and self.kv_disk_cache_size_bytes <= 0):
+            raise ValueError("KV disk cache size must be positive. Got "
+                             f"{self.kv_disk_cache_size_bytes} bytes.")
+
         if self.sliding_window is not None:
             raise NotImplementedError(
                 "Prefix caching is not supported with sliding window. "
@@ -763,6 +788,12 @@ class CacheConfig:
         num_gpus_per_node = parallel_config.tensor_parallel_size
         cpu_memory_usage = self.swap_space_bytes * num_gpus_per_node
 
+        if (self.kv_disk_cache_path is not None
+                and parallel_config.pipeline_parallel_size > 1):
+            raise NotImplementedError(
+                "The KV disk cache is not supported with pipeline "
+                "parallelism.")
+
         msg = (f"{cpu_memory_usage / GiB_bytes:.2f} GiB out of the "
                f"{total_cpu_memory / GiB_bytes:.2f} GiB total CPU memory "
                "is allocated for the swap space.")
@@ -1045,6 +1076,15 @@ class SchedulerConfig:
             workers instead of an entire data. It should be enabled only
             when SPMD worker architecture is enabled. I.e.,
             APHRODITE_USE_RAY_SPMD_WORKER=1
+        scheduling_policy: The order in which queued requests are scheduled.
+            "fcfs" schedules in arrival order, "priority" by the request's
+            priority and then arrival order, and "fair" additionally shares
+            the batch fairly between LoRA adapters within a priority level.
+        async_output_proc: Whether to process the outputs of a step in a
+            background thread while the next step is executed.
+        cache_aware_admission_window: The number of requests at the head of
+            the waiting queue that are reordered to favour the requests with
+            more blocks in the prefix cache. 0 admits in queue order.
     """
 
     def __init__(self,
@@ -1059,7 +1099,10 @@ class SchedulerConfig:
                  embedding_mode: Optional[bool] = False,
                  preemption_mode: Optional[str] = None,
                  num_scheduler_steps: int = 1,
-                 send_delta_data: bool = False) -> None:
+                 send_delta_data: bool = False,
+                 scheduling_policy: str = "fcfs",
+                 async_output_proc: bool = False,
+                 cache_aware_admission_window: int = 0) -> None:
         if max_num_batched_tokens is not None:
             self.max_num_batched_tokens = max_num_batched_tokens
         else:
@@ -1093,6 +1136,9 @@ class SchedulerConfig:
         self.preemption_mode = preemption_mode
         self.num_scheduler_steps = num_scheduler_steps
         self.send_delta_data = send_delta_data
+        self.scheduling_policy = scheduling_policy
+        self.async_output_proc = async_output_proc
+        self.cache_aware_admission_window = cache_aware_admission_window
 
         self._verify_args()
 
@@ -1125,6 +1171,17 @@ class SchedulerConfig:
                 f"({self.num_scheduler_steps}) must be greater than or "
                 "equal to 1.")
 
+        if self.scheduling_policy not in ("fcfs", "priority", "fair"):
+            raise ValueError(
+                f"Unknown scheduling policy: {self.scheduling_policy}. Must "
+                "be one of 'fcfs', 'priority' or 'fair'.")
+
+        if self.cache_aware_admission_window < 0:
+            raise ValueError(
+                "cache_aware_admission_window "
+                f"({self.cache_aware_admission_window}) must be greater than "
+                "or equal to 0.")
+
     @property
     def is_multi_step(self) -> bool:
         return self.num_scheduler_steps > 1
@@ -1186,10 +1243,12 @@ class SpeculativeConfig:
         speculative_disable_by_batch_size: Optional[int],
         ngram_prompt_lookup_max: Optional[int],
         ngram_prompt_lookup_min: Optional[int],
+        ngram_prompt_lookup_corpus: bool,
         draft_token_acceptance_method: str,
         typical_acceptance_sampler_posterior_threshold: Optional[float],
         typical_acceptance_sampler_posterior_alpha: Optional[float],
         disable_logprobs: Optional[bool],
+        adaptive_num_speculative_tokens: bool,
     ) -> Optional["SpeculativeConfig"]:
         """Create a SpeculativeConfig if possible, else return None.
 
@@ -1229,6 +1288,8 @@ class SpeculativeConfig:
                 window, if provided.
             ngram_prompt_lookup_min (Optional[int]): Min size of ngram token
                 window, if provided.
+            ngram_prompt_lookup_corpus (bool): Whether ngram prompt lookup
+                also looks up the prompts of the other running requests.
             draft_token_acceptance_method (str): The method to use for
                 accepting draft tokens. This can take two possible
                 values 'rejection_sampler' and 'typical_acceptance_sampler'
@@ -1247,6 +1308,9 @@ class SpeculativeConfig:
                 If set to False, token log probabilities are returned
                 according to the log probability settings in SamplingParams.
                 If not specified, it defaults to True.
+            adaptive_num_speculative_tokens (bool): If set to True, the
+                number of speculative tokens of each step is chosen from the
+                acceptance rate and stage times, up to num_speculative_tokens.
         Returns:
             Optional["SpeculativeConfig"]: An instance of SpeculativeConfig if
                 the necessary conditions are met, else None.
@@ -1369,6 +1433,7 @@ class SpeculativeConfig:
             speculative_disable_by_batch_size,
             ngram_prompt_lookup_max,
             ngram_prompt_lookup_min,
+            ngram_prompt_lookup_corpus=ngram_prompt_lookup_corpus,
             draft_token_acceptance_method=draft_token_acceptance_method,
             typical_acceptance_sampler_posterior_threshold=\
                 typical_acceptance_sampler_posterior_threshold,
@@ -1376,6 +1441,7 @@ class SpeculativeConfig:
                 typical_acceptance_sampler_posterior_alpha,
             disable_logprobs=disable_logprobs,
             disable_log_stats=disable_log_stats,
+            adaptive_num_speculative_tokens=adaptive_num_speculative_tokens,
         )
 
     @staticmethod
@@ -1460,6 +1526,8 @@ class SpeculativeConfig:
         typical_acceptance_sampler_posterior_alpha: float,
         disable_logprobs: bool,
         disable_log_stats: bool,
+        ngram_prompt_lookup_corpus: bool = False,
+        adaptive_num_speculative_tokens: bool = False,
     ):
         """Create a SpeculativeConfig object.
 
@@ -1494,6 +1562,11 @@ class SpeculativeConfig:
                 returned.
             disable_log_stats: Whether to disable periodic printing of stage
                 times in speculative decoding.
+            ngram_prompt_lookup_corpus: Whether ngram prompt lookup also
+                looks up the prompts of the other running requests.
+            adaptive_num_speculative_tokens: Whether the number of
+                speculative tokens of each step is chosen from the acceptance
+                rate and stage times, up to num_speculative_tokens.
         """
         self.draft_model_config = draft_model_config
         self.draft_parallel_config = draft_parallel_config
@@ -1502,6 +1575,8 @@ class SpeculativeConfig:
             speculative_disable_by_batch_size
         self.ngram_prompt_lookup_max = ngram_prompt_lookup_max or 0
         self.ngram_prompt_lookup_min = ngram_prompt_lookup_min or 0
+        self.ngram_prompt_lookup_corpus = ngram_prompt_lookup_corpus
+        self.adaptive_num_speculative_tokens = adaptive_num_speculative_tokens
         self.draft_token_acceptance_method = draft_token_acceptance_method
         self.typical_acceptance_sampler_posterior_threshold = \
             typical_acceptance_sampler_posterior_threshold
@@ -1576,6 +1651,8 @@ class LoRAConfig:
     # This is a constant.
     lora_vocab_padding_size: ClassVar[int] = 256
     long_lora_scaling_factors: Optional[Tuple[float]] = None
+    max_prefetch_loras: int = 0
+    lora_affinity_timeout: float = 0.0
 
     def __post_init__(self):
         # Setting the maximum rank to 256 should be able to satisfy the vast
@@ -1598,6 +1675,12 @@ class LoRAConfig:
             raise ValueError(
                 f"max_cpu_loras ({self.max_cpu_loras}) must be >= "
                 f"max_loras ({self.max_loras})")
+        if self.max_prefetch_loras < 0:
+            raise ValueError(f"max_prefetch_loras ({self.max_prefetch_loras}) "
+                             "must be >= 0.")
+        if self.lora_affinity_timeout < 0:
+            raise ValueError("lora_affinity_timeout "
+                             f"({self.lora_affinity_timeout}) must be >= 0.")
 
     def verify_with_model_config(self, model_config: ModelConfig):
         if self.lora_dtype in (None, "auto"):
@@ -1,9 +1,11 @@
 import collections
 import functools
 import weakref
-from copy import copy, deepcopy
+from collections import OrderedDict
+from copy import copy
 from dataclasses import dataclass, fields
-from typing import List, Optional, Set, Union
+from typing import (Any, Hashable, List, NamedTuple, Optional, Set, Tuple,
+                    Union)
 
 import regex
 import torch
@@ -13,28 +15,27 @@ from lark.parsers.lalr_interactive_parser import InteractiveParser
 from lark.parsers.lalr_parser_state import ParserState
 from transformers import PreTrainedTokenizer, PreTrainedTokenizerFast
 
+# Bound on the per-terminal and per-parser-state memoization caches.
+_MEMO_CACHE_SIZE = 2**16
+# Bound on the number of sequences whose parser state is remembered by the
+# root parser of a request, see `IncrementalParserState.__getitem__`.
+_MAX_FULL_SEQS = 2**12
+
 
 class FastParserState(ParserState):
-    copy_memo = {}
 
     def __copy__(self):
-        new_value_stack = []
-        for value in self.value_stack:
-            key = f"{id(self)}_{id(value)}"
-            if key not in self.copy_memo:
-                self.copy_memo[key] = deepcopy(value, self.copy_memo)
-            new_value_stack.append(self.copy_memo[key])
-
-        new_instance = type(self)(
+        # The parse tree is never inspected, only the state stack decides
+        # which terminals are accepted. Reductions build new tree nodes
+        # instead of mutating the values on the stack, so copies can share
+        # them instead of deep-copying the stack.
+        return type(self)(
             self.parse_conf,
             self.lexer,
             copy(self.state_stack),
-            new_value_stack,
+            copy(self.value_stack),
         )
 
-        self.copy_memo[id(self)] = new_instance
-        return new_instance
-
 
 class FastInteractiveParser(InteractiveParser):
 
@@ -74,7 +75,7 @@ def get_pattern_validator(pattern: Pattern):
     if isinstance(pattern, PatternRE):
         compiled_pattern = regex.compile(pattern.value)
 
-        @functools.lru_cache(int(1e6))
+        @functools.lru_cache(_MEMO_CACHE_SIZE)
         def get_re_matched_parts(seq):
             # match complete terminal, potentially with leftover seq
             complete_terminal_match = compiled_pattern.match(seq)
@@ -101,7 +102,7 @@ def get_pattern_validator(pattern: Pattern):
     elif isinstance(pattern, PatternStr):
         base_str = pattern.value
 
-        @functools.lru_cache(int(1e6))
+        @functools.lru_cache(_MEMO_CACHE_SIZE)
         def get_str_matched_parts(seq):
             if seq.startswith(base_str):
                 processed_seq = seq[:len(base_str)]
@@ -139,7 +140,51 @@ def method_lru_cache(*lru_args, **lru_kwargs):
     return decorator
 
 
-memoize_by_instance = method_lru_cache(int(1e7))
+memoize_by_instance = method_lru_cache(_MEMO_CACHE_SIZE)
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class BoundedCache:
+    """LRU cache with a fixed number of entries that counts its hits, misses
+    and evictions, see `cache_info()`."""
+
+    def __init__(self, maxsize: int):
+        assert maxsize > 0
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize,
+                         len(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
 
 
 class TrieNode:
@@ -154,6 +199,10 @@ class Trie:
 
     def __init__(self):
         self.root = TrieNode()
+        self.num_words = 0
+
+    def __len__(self):
+        return self.num_words
 
     def insert(self, key, value):
         node = self.root
@@ -161,9 +210,15 @@ class Trie:
             if char not in node.children:
                 node.children[char] = TrieNode()
             node = node.children[char]
+        if not node.is_end_of_word:
+            self.num_words += 1
         node.is_end_of_word = True
         node.value = value
 
+    def clear(self):
+        self.root = TrieNode()
+        self.num_words = 0
+
     def get_best(self, word):
         node = self.root
         prefix = ""
@@ -183,6 +238,22 @@ class Trie:
         return best_prefix, best_value, remainder
 
 
+@functools.lru_cache(1000)
+def _compile_grammar(grammar: str, start: str):
+    lark_parser = Lark(
+        grammar,
+        regex=True,  # use `regex` not `re`
+        start=start,
+        parser="lalr",
+        cache=True,  # results in 2-3x faster loading
+    )
+    seq_validator = {(term.name): get_pattern_validator(term.pattern)
+                     for term in lark_parser.terminals}
+    seq_validator["$END"] = lambda seq: tuple(
+        ["" if seq is None else None] * 2)
+    return lark_parser, seq_validator
+
+
 @dataclass
 class IncrementalParserState:
     """
@@ -196,6 +267,9 @@ class IncrementalParserState:
     - 1) Ensure uniqueness of (interactive_parser, partial_token)
     - 2) Cache class methods via `memoize_by_instance` which considers id(self)
         and fn arguments
+    The memo of parser states and the trie of full sequences are shared by
+    the states derived from one `from_grammar` root, so they live as long as
+    the request owning that root, and both are bounded.
     """
 
     # unique state key
@@ -207,7 +281,7 @@ class IncrementalParserState:
     # shared across instances
     _ignored_terms: set
     _seq_validator: dict
-    _memo: dict
+    _memo: BoundedCache
     _full_seq_trie: Trie
 
     def __repr__(self):
@@ -216,15 +290,11 @@ class IncrementalParserState:
         return f"{class_name}({state_stack})"
 
     @classmethod
-    @functools.lru_cache(1000)
     def from_grammar(cls, grammar: str, start: str):
-        lark_parser = Lark(
-            grammar,
-            regex=True,  # use `regex` not `re`
-            start=start,
-            parser="lalr",
-            cache=True,  # results in 2-3x faster loading
-        )
+        """Create the root parser state of a new request. The compiled
+        grammar is shared, the parser states derived from the root are not.
+        """
+        lark_parser, _seq_validator = _compile_grammar(grammar, start)
         base_interactive_parser = lark_parser.parse_interactive()
         interactive_parser = FastInteractiveParser(
             base_interactive_parser.parser,
@@ -232,16 +302,11 @@ class IncrementalParserState:
             base_interactive_parser.lexer_thread)
         interactive_parser.lexer_thread.state.text = ""
 
-        _seq_validator = {(term.name): get_pattern_validator(term.pattern)
-                          for term in lark_parser.terminals}
-        _seq_validator["$END"] = lambda seq: tuple(
-            ["" if seq is None else None] * 2)
-
         parser = cls(interactive_parser=interactive_parser,
                      terminal_candidates=None,
                      _ignored_terms=set(lark_parser.lexer_conf.ignore),
                      _seq_validator=_seq_validator,
-                     _memo={},
+                     _memo=BoundedCache(_MEMO_CACHE_SIZE),
                      _full_seq_trie=Trie())
         parser._full_seq_trie.insert("", parser)
         return parser
@@ -249,35 +314,54 @@ class IncrementalParserState:
     def new(self, **kwargs):
         """Cached create now state"""
         parser_state_key = hash(kwargs["interactive_parser"])
-        if parser_state_key in self._memo:
-            return self._memo[parser_state_key]
+        inst = self._memo.get(parser_state_key)
+        if inst is not None:
+            return inst
 
         instance_dict = {f.name: getattr(self, f.name) for f in fields(self)}
         instance_dict.update(kwargs)
         inst = self.__class__(**instance_dict)
 
-        self._memo[parser_state_key] = inst
+        self._memo.put(parser_state_key, inst)
 
         return inst
 
     def __getitem__(self, full_seq):
-        """Get the parser state, given a full sequence"""
-        # pylint: disable=unused-variable
-        match_seq, parser, remainder_seq = self._full_seq_trie.get_best(
+        """
+        Get the parser state, given a full sequence. Returns the last
+        terminal, which is incomplete or may still be extended, and the parser
+        state before it, or None if full_seq is invalid
+        """
+        processed_seq, parser, remainder_seq = self._full_seq_trie.get_best(
             full_seq)
         if parser is None:
             return
-        if remainder_seq:
-            result = parser.step(remainder_seq)
-            if result is None:
+        while remainder_seq:
+            terminal, terminal_seq, next_seq = (
+                parser.get_best_matched_terminal(remainder_seq))
+            if terminal is None:
                 return None
-            remainder_seq, parser = result
-            processed_seq = full_seq
-            if remainder_seq:
-                processed_seq = processed_seq[:-len(remainder_seq)]
-            self._full_seq_trie.insert(processed_seq, parser)
+            # A terminal which ends with the sequence may still be extended
+            # by a longer sequence, only remember the states after terminals
+            # that are followed by a character they didn't consume.
+            if not next_seq:
+                break
+            parser = parser._next_with_new_terminal(terminal)
+            processed_seq += terminal_seq
+            remainder_seq = next_seq
+            self._insert_full_seq(processed_seq, parser)
         return remainder_seq, parser
 
+    def _insert_full_seq(self, full_seq, parser):
+        trie = self._full_seq_trie
+        if len(trie) >= _MAX_FULL_SEQS:
+            # Start over from the root, later sequences are parsed from the
+            # longest prefix inserted since.
+            root = trie.root.value
+            trie.clear()
+            trie.insert("", root)
+        trie.insert(full_seq, parser)
+
     @memoize_by_instance
     def step(self, new_seq: str):
         """
@@ -360,6 +444,8 @@ class TokenVocab:
         per token
     - iter: iterate over normalized token strings
     - vocab[token_str]: return token id set
+    - trie: character trie of the normalized token strings, whose nodes hold
+        the token string ending there
     """
 
     def __init__(self,
@@ -379,6 +465,11 @@ class TokenVocab:
                 [char in legal_chars for char in norm_token]):
                 self.norm_vocab[norm_token].add(token_id)
 
+        self.trie = Trie()
+        for token in self.norm_vocab:
+            if token is not None:
+                self.trie.insert(token, token)
+
     def __iter__(self):
         return iter(self.norm_vocab)
 
@@ -400,22 +491,47 @@ class NextTokenValidator:
         self.root_parser = IncrementalParserState.from_grammar(
             grammar, grammar_start)
 
+    def get_parser_state(
+            self, full_seq: str
+    ) -> Optional[Tuple[str, IncrementalParserState]]:
+        """
+        Return the last terminal of full_seq, which is incomplete or may still
+        be extended, and the parser state before it, or None if full_seq is
+        invalid
+        """
+        return self.root_parser[full_seq]
+
     def get_valid_next_token_strs(self, full_seq):
         """
         Generate valid token strings given the full sequence
         """
 
-        result = self.root_parser[full_seq]
+        result = self.get_parser_state(full_seq)
         if result is None:
             return []
-        partial_term, parser = result
-        for token in self.vocab:
-            if token is None:
-                if partial_term == "" and parser.is_valid_next_seq(token):
-                    yield None
-            else:
-                if parser.is_valid_next_seq(partial_term + token):
-                    yield token
+        return self._walk_vocab(*result)
+
+    def _walk_vocab(self, partial_term: str, parser: IncrementalParserState):
+        """
+        Generate the valid token strings by walking the vocabulary trie.
+        An invalid prefix can't be extended into a valid sequence, so its
+        whole subtree is skipped instead of checking every token.
+        """
+        result = parser.step(partial_term)
+        if result is not None:
+            remainder_seq, end_parser = result
+            if remainder_seq == "" and end_parser.is_valid_next_seq(None):
+                yield None
+
+        stack = [(self.vocab.trie.root, "")]
+        while stack:
+            node, prefix = stack.pop()
+            if node.is_end_of_word:
+                yield node.value
+            for char, child in node.children.items():
+                seq = prefix + char
+                if parser.is_valid_next_seq(partial_term + seq):
+                    stack.append((child, seq))
 
     def get_valid_next_token_ids(self, full_seq):
         """
@@ -428,18 +544,45 @@ class NextTokenValidator:
 class GrammarLogitsProcessor(NextTokenValidator):
     """
     Apply NextTokenValidator in __call__ and set excluded tokens logits to -inf
+
+    The mask of excluded tokens only depends on the parser state and the
+    incomplete terminal, so it is computed once per such state and kept in a
+    bounded cache (see `mask_cache_info()`).
     """
 
+    def __init__(self, *args, mask_cache_size: int = 4096, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._mask_cache = BoundedCache(mask_cache_size)
+
+    def mask_cache_info(self) -> CacheInfo:
+        return self._mask_cache.cache_info()
+
+    def _get_excluded_mask(self, sequence: str, vocab_size: int,
+                           device: torch.device) -> torch.Tensor:
+        result = self.get_parser_state(sequence)
+        if result is None:
+            return torch.ones(vocab_size, dtype=torch.bool, device=device)
+        partial_term, parser = result
+        # Parser states may be evicted from the memo and recreated, so they
+        # are keyed by their state stack rather than by identity.
+        state_stack = tuple(parser.interactive_parser.parser_state.state_stack)
+        key = (state_stack, partial_term, vocab_size, device)
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            valid = [
+                token_id for tok_str in self._walk_vocab(partial_term, parser)
+                for token_id in self.vocab[tok_str] if token_id < vocab_size
+            ]
+            mask = torch.ones(vocab_size, dtype=torch.bool, device=device)
+            mask[torch.tensor(valid, dtype=torch.long, device=device)] = False
+            self._mask_cache.put(key, mask)
+        return mask
+
     def __call__(self, logits: torch.Tensor,
                  token_ids: List[List[int]]) -> None:
         for i in range(len(token_ids)):
-            # get valid token IDs given prior tokens
+            # get the excluded token IDs given prior tokens
             sequence = self.tokenizer.decode(token_ids[i])
-            valid_token_ids = self.get_valid_next_token_ids(sequence)
-            valid = torch.tensor(list(valid_token_ids), dtype=torch.long)
-
-            # modify logits given valid token IDs
-            N = len(logits[i])
-            mask = torch.zeros(N, dtype=torch.bool)
-            mask[valid] = True
-            logits[i][~mask] = float("-inf")
+            mask = self._get_excluded_mask(sequence, logits.shape[-1],
+                                           logits.device)
+            logits[i].masked_fill_(mask, float("-inf"))
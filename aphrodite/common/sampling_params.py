@@ -3,13 +3,21 @@ import copy
 import os
 from enum import IntEnum
 from functools import cached_property
-from typing import Any, Callable, Dict, List, Optional, Set, Union
+from typing import (TYPE_CHECKING, Any, Callable, Dict, List, Optional,
+                    Protocol, Set, Union)
 
 import msgspec
 import torch
 from loguru import logger
 from typing_extensions import Annotated
 
+from aphrodite.engine.output_processor.stop_matcher import (
+    MultiPatternMatcher, get_stop_string_matcher,
+    get_stop_token_sequence_matcher)
+
+if TYPE_CHECKING:
+    from aphrodite.common.sequence import SequenceData
+
 _SAMPLING_EPS = 1e-5
 _MAX_TEMP = 1e-2
 
@@ -23,6 +31,16 @@ class SamplingType(IntEnum):
     RANDOM_SEED = 2
     BEAM = 3
 
+
+class RequestOutputKind(IntEnum):
+    # Return the entire output so far in every RequestOutput.
+    CUMULATIVE = 0
+    # Return only the new tokens and text in each RequestOutput.
+    DELTA = 1
+    # Only return the final RequestOutput of a request.
+    FINAL_ONLY = 2
+
+
 class SamplerID(IntEnum):
     # Mirror these in aphrodite/modeling/layers/sampler.py
     # Values out of order to keep backwards compatibility
@@ -77,6 +95,23 @@ first argument, and returns a modified tensor of logits
 to sample from."""
 
 
+class BatchedLogitsProcessor(Protocol):
+    """A logits processor that handles all rows of a sequence group in one
+    call instead of being invoked once per row.
+
+    A processor with a `process_batch` method is called through it; the
+    per-row `__call__` is only kept for callers outside the model runner.
+    """
+
+    def process_batch(self, logits: torch.Tensor, row_indices: List[int],
+                      seq_ids: List[int],
+                      seq_data: List["SequenceData"]) -> None:
+        """Edit `logits[row_indices]` in-place. `seq_ids[i]` and
+        `seq_data[i]` identify and hold the prompt and output tokens of the
+        sequence sampled from `logits[row_indices[i]]`."""
+        ...
+
+
 class SamplingParams(
     msgspec.Struct,
     omit_defaults=True,
@@ -159,12 +194,18 @@ class SamplingParams(
             procedure only stops when there cannot be better candidates
             (canonical beam search algorithm).
         stop: List of strings that stop the generation when they are generated.
-            The returned output will not contain the stop strings.
+            The returned output will not contain the stop strings. If several
+            stop strings are generated, the output stops at the one that ends
+            first; the order of the list only decides between stop strings
+            that end at the same character.
         stop_token_ids: List of tokens that stop the generation when they are
             generated. The returned output will contain the stop tokens unless
             the stop tokens are special tokens.
         include_stop_str_in_output: Whether to include the stop strings in
             output text. Defaults to False.
+        stop_token_sequences: List of token id sequences that stop the
+            generation when they are generated. The returned output will
+            contain the stop token sequence.
         ignore_eos: Whether to ignore the EOS token and continue generating
             tokens after the EOS token is generated.
         max_tokens: Maximum number of tokens to generate per output sequence.
@@ -186,7 +227,8 @@ class SamplingParams(
             tokens in the output. Defaults to True.
         logits_processors: List of functions that modify logits based on
             previously generated tokens, and optionally prompt tokens as
-            a first argument.
+            a first argument. Processors implementing
+            `BatchedLogitsProcessor` are called once per sequence group.
         truncate_prompt_tokens: If set to an integer k, will use only the last
             k tokens from the prompt (i.e. left-truncation). Defaults to None
             (i.e. no truncation).
@@ -222,6 +264,13 @@ class SamplingParams(
             tokens. Defaults to 0 (disabled).
         sampler_priority: A list of integers to control the order in which
             samplers are applied.
+        priority: The scheduling priority of the request. Lower values are
+            scheduled first. Only used by the "priority" and "fair"
+            scheduling policies. Defaults to 0.
+        output_kind: Whether each RequestOutput of the request holds the
+            whole output so far (CUMULATIVE), only what was generated since
+            the previous one (DELTA), or whether only the final RequestOutput
+            is returned (FINAL_ONLY). Defaults to CUMULATIVE.
     """
 
     n: int = 1
@@ -276,6 +325,9 @@ class SamplingParams(
     dry_range: int = 0
     skew: float = 0.0
     sampler_priority: Optional[List[int]] = []
+    priority: int = 0
+    output_kind: RequestOutputKind = RequestOutputKind.CUMULATIVE
+    stop_token_sequences: Optional[List[List[int]]] = None
     # The below fields are not supposed to be used as an input.
     # They are set in post_init.
     output_text_buffer_length: int = 0
@@ -309,6 +361,7 @@ class SamplingParams(
         "early_stopping": False,
         "stop": [],
         "stop_token_ids": [],
+        "stop_token_sequences": [],
         "ignore_eos": False,
         "max_tokens": 16,
         "min_tokens": 0,
@@ -330,6 +383,8 @@ class SamplingParams(
         "dry_range": 0,
         "skew": 0.0,
         "sampler_priority": [],
+        "priority": 0,
+        "output_kind": RequestOutputKind.CUMULATIVE,
     }
 
     def __post_init__(self) -> None:
@@ -354,6 +409,13 @@ class SamplingParams(
             self.stop_token_ids = []
         else:
             self.stop_token_ids = list(self.stop_token_ids)
+        if self.stop_token_sequences is None:
+            self.stop_token_sequences = []
+        else:
+            self.stop_token_sequences = [
+                list(stop_token_sequence)
+                for stop_token_sequence in self.stop_token_sequences
+            ]
         self.logprobs = 1 if self.logprobs is True else self.logprobs
         self.prompt_logprobs = (1 if self.prompt_logprobs is True else
                                 self.prompt_logprobs)
@@ -447,6 +509,11 @@ class SamplingParams(
         assert isinstance(self.stop, list)
         if any(not stop_str for stop_str in self.stop):
             raise ValueError("stop cannot contain an empty string.")
+        assert isinstance(self.stop_token_sequences, list)
+        if any(not stop_token_sequence
+               for stop_token_sequence in self.stop_token_sequences):
+            raise ValueError(
+                "stop_token_sequences cannot contain an empty sequence.")
         if self.stop and not self.detokenize:
             raise ValueError(
                 "stop strings are only supported when detokenize is True. "
@@ -526,6 +593,10 @@ class SamplingParams(
             raise ValueError(
                 f"early_stopping must be True, False, or 'never', "
                 f"got {self.early_stopping}.")
+        if self.output_kind == RequestOutputKind.DELTA:
+            raise ValueError("Delta outputs are not supported with beam "
+                             "search, as the beams are reordered while "
+                             "they are generated.")
 
     def _verify_non_beam_search(self) -> None:
         if self.early_stopping is not False:
@@ -588,6 +659,24 @@ class SamplingParams(
     def all_stop_token_ids(self) -> Set[int]:
         return self._all_stop_token_ids
 
+    @cached_property
+    def stop_string_matcher(self) -> Optional[MultiPatternMatcher[str]]:
+        """The matcher of the stop strings, looked up once instead of on
+        every step. None if there are no stop strings."""
+        if not self.stop:
+            return None
+        return get_stop_string_matcher(tuple(self.stop))
+
+    @cached_property
+    def stop_token_sequence_matcher(
+            self) -> Optional[MultiPatternMatcher[int]]:
+        """The matcher of the stop token sequences, looked up once instead of
+        on every step. None if there are no stop token sequences."""
+        if not self.stop_token_sequences:
+            return None
+        return get_stop_token_sequence_matcher(
+            tuple(map(tuple, self.stop_token_sequences)))
+
     def clone(self) -> "SamplingParams":
         """Deep copy excluding LogitsProcessor objects.
         LogitsProcessor objects are excluded because they may contain an
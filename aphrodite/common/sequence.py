@@ -7,6 +7,7 @@ from collections import defaultdict
 from dataclasses import dataclass
 from typing import (TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple,
                     Union, cast)
+from typing import Sequence as GenericSequence
 
 import msgspec
 import torch
@@ -118,7 +119,8 @@ class SequenceDataDelta(
     new_stage: SequenceStage
 
 class SequenceData(msgspec.Struct,
-                   omit_defaults=True):
+                   omit_defaults=True,
+                   dict=True):
     """Data associated with a sequence.
 
     Args:
@@ -132,6 +134,10 @@ class SequenceData(msgspec.Struct,
         cumulative_logprob: The cumulative log probability of the output.
     """
 
+    # NOTE: `dict=True` allows caches that are not struct fields (e.g. the
+    # n-gram index). They are neither serialized nor pickled, so every process
+    # rebuilds its own copy from the token ids on first use.
+
     # NOTE: we can't use Union[List, array] because msgspec can't support
     # union of 2 list types
     _prompt_token_ids: array
@@ -159,6 +165,14 @@ class SequenceData(msgspec.Struct,
         assert isinstance(self._prompt_token_ids, array)
         self._cached_all_token_ids: List[int] = list(self._prompt_token_ids +
                                                      self._output_token_ids)
+        self._reset_ngram_index()
+
+    def _reset_ngram_index(self) -> None:
+        # (n-1)-gram -> tokens that followed it, for n = _ngram_size
+        self._ngram_index: Dict[Tuple[int, ...], Set[int]] = {}
+        self._ngram_size = 0
+        # Number of leading tokens whose n-grams are in the index.
+        self._ngram_index_len = 0
 
     @property
     def cumulative_logprob(self) -> float:
@@ -221,6 +235,36 @@ class SequenceData(msgspec.Struct,
     def get_token_ids(self) -> List[int]:
         return self._cached_all_token_ids
 
+    def get_banned_ngram_tokens(self, ngram_size: int) -> List[int]:
+        """Return the tokens that would repeat an n-gram of `ngram_size`
+        already present in the prompt or output if generated next.
+
+        The n-gram index is extended with the tokens appended since the last
+        call, so the cost per decode step does not grow with the sequence
+        length.
+        """
+        if ngram_size != self._ngram_size:
+            self._reset_ngram_index()
+            self._ngram_size = ngram_size
+        token_ids = self._cached_all_token_ids
+        num_tokens = len(token_ids)
+        if num_tokens < ngram_size:
+            return []
+
+        index = self._ngram_index
+        start = max(self._ngram_index_len + 1, ngram_size)
+        for end in range(start, num_tokens + 1):
+            prefix = tuple(token_ids[end - ngram_size:end - 1])
+            next_tokens = index.get(prefix)
+            if next_tokens is None:
+                index[prefix] = {token_ids[end - 1]}
+            else:
+                next_tokens.add(token_ids[end - 1])
+        self._ngram_index_len = num_tokens
+
+        banned = index.get(tuple(token_ids[num_tokens - ngram_size + 1:]))
+        return list(banned) if banned else []
+
     def get_prefix_token_ids(
             self, num_tokens: int
     ) -> Tuple[Tuple[int, ...], Optional[Tuple[int, ...]]]:
@@ -380,9 +424,23 @@ class Sequence:
         # Used for incremental detokenization
         self.prefix_offset = 0
         self.read_offset = 0
-        # Input + output tokens
+        # States of the stop string and stop token sequence matchers, see
+        # StopChecker.
+        self.stop_str_match_state = 0
+        self.stop_token_sequence_match_state = 0
+
+        # The input + output tokens needed for incremental detokenization.
+        # Tokens before the prefix offset are dropped as the sequence grows.
         self.tokens: Optional[List[str]] = None
 
+        # Lengths of the output returned so far, used for delta outputs.
+        self._last_output_token_ids_offset = 0
+        self._last_output_text_offset = 0
+
+        # Chained content hashes of the full blocks hashed so far. Used by
+        # BlockSpaceManagerV1 prefix caching, see hash_of_block().
+        self._block_hashes: List[int] = []
+
     @property
     def n_blocks(self) -> int:
         return (self.get_len() + self.block_size - 1) // self.block_size
@@ -432,21 +490,68 @@ class Sequence:
         return self.prompt_adapter_request.prompt_adapter_id \
                         if self.prompt_adapter_request else 0
 
-    def get_output_text_to_return(self, buffer_length: int):
+    def get_output_text_to_return(self, buffer_length: int,
+                                  delta: bool = False) -> str:
+        """If delta is True, only the text that has not been returned before
+        is returned."""
         # We return the full output text if the sequence is finished.
         truncate = buffer_length and not self.is_finished()
-        return self.output_text[:-buffer_length] if truncate else (
-            self.output_text)
+        if not delta:
+            return self.output_text[:-buffer_length] if truncate else (
+                self.output_text)
+        length = len(self.output_text)
+        if truncate:
+            length -= buffer_length
+        last_offset = self._last_output_text_offset
+        if last_offset >= length:
+            return ""
+        self._last_output_text_offset = length
+        return self.output_text[last_offset:length]
+
+    def get_output_token_ids_to_return(
+            self, delta: bool = False) -> GenericSequence[int]:
+        """If delta is True, only the token ids that have not been returned
+        before are returned."""
+        if not delta:
+            return self.data._output_token_ids
+        length = self.get_output_len()
+        last_offset = self._last_output_token_ids_offset
+        self._last_output_token_ids_offset = length
+        return self.data._output_token_ids[last_offset:length].tolist()
 
     def hash_of_block(self, logical_idx: int) -> int:
-        # TODO This can produce incorrect hash when block size > prompt size
-
-        # Compute the number of tokens in the sequence
-        # TODO: The current hashing function is O(L^2). We should optimize
-        # this in the future.
-        num_tokens = self.num_hashed_tokens_of_block(logical_idx)
-        hashed_tokens = self.data.get_prefix_token_ids(num_tokens)
-        return hash((hashed_tokens, self.lora_int_id))
+        """Return the content hash of the given logical block.
+
+        Like PrefixCachingBlock.hash_block_tokens, the hash of a block covers
+        its own tokens plus the hash of the previous block, so it identifies
+        the whole prefix. Hashes of full blocks are cached on the sequence,
+        which makes hashing a newly filled block O(block_size) instead of
+        O(prefix length). The last block may be partially filled; its hash
+        is computed on demand and not cached.
+        """
+        token_ids = self.data.get_token_ids()
+        num_full_blocks = len(token_ids) // self.block_size
+        block_hashes = self._block_hashes
+        if len(block_hashes) > num_full_blocks:
+            # The output tokens were truncated, drop the stale hashes.
+            del block_hashes[num_full_blocks:]
+
+        while len(block_hashes) < min(logical_idx + 1, num_full_blocks):
+            block_hashes.append(
+                self._hash_block_tokens(len(block_hashes), token_ids))
+
+        if logical_idx < len(block_hashes):
+            return block_hashes[logical_idx]
+        assert logical_idx == num_full_blocks, (logical_idx, num_full_blocks)
+        return self._hash_block_tokens(logical_idx, token_ids)
+
+    def _hash_block_tokens(self, logical_idx: int,
+                           token_ids: List[int]) -> int:
+        prev_block_hash = (self._block_hashes[logical_idx - 1]
+                           if logical_idx > 0 else None)
+        start = logical_idx * self.block_size
+        return hash((prev_block_hash, self.lora_int_id,
+                     *token_ids[start:start + self.block_size]))
 
     def num_hashed_tokens_of_block(self, logical_idx: int):
         return logical_idx * self.block_size + self.block_size
@@ -644,6 +749,12 @@ class SequenceGroup:
         return self.prompt_adapter_request.prompt_adapter_num_virtual_tokens\
                          if self.prompt_adapter_request else 0
 
+    @property
+    def priority(self) -> int:
+        """Scheduling priority of the request, lower is scheduled first."""
+        return (self.sampling_params.priority
+                if self.sampling_params is not None else 0)
+
     def init_multi_step(self, num_scheduler_steps: int) -> None:
         self.state.num_steps = num_scheduler_steps
         self.state.current_step = 0
@@ -1263,6 +1374,17 @@ class ExecuteModelRequest(
     finished_requests_ids: List[str] = msgspec.field(default_factory=list)
     # The last sampled token ids for multi step decoding.
     last_sampled_token_ids: Optional[torch.Tensor] = None
+    # LoRAs of waiting requests to load in the background.
+    lora_prefetch_requests: Set[LoRARequest] = msgspec.field(
+        default_factory=set)
+    # Blocks to save to the disk cache. List of (key, GPU block number).
+    disk_blocks_to_save: List[Tuple[str, int]] = msgspec.field(
+        default_factory=list)
+    # Blocks to load from the disk cache. List of (key, GPU block number).
+    disk_blocks_to_load: List[Tuple[str, int]] = msgspec.field(
+        default_factory=list)
+    # Keys of the blocks to remove from the disk cache.
+    disk_blocks_to_remove: List[str] = msgspec.field(default_factory=list)
 
     @property
     def is_first_multi_step(self) -> bool:
@@ -1308,4 +1430,8 @@ class ExecuteModelRequest(
             num_steps=self.num_steps,
             finished_requests_ids=self.finished_requests_ids,
             last_sampled_token_ids=self.last_sampled_token_ids.clone()
-            if self.last_sampled_token_ids is not None else None)
+            if self.last_sampled_token_ids is not None else None,
+            lora_prefetch_requests=self.lora_prefetch_requests,
+            disk_blocks_to_save=self.disk_blocks_to_save.copy(),
+            disk_blocks_to_load=self.disk_blocks_to_load.copy(),
+            disk_blocks_to_remove=self.disk_blocks_to_remove.copy())
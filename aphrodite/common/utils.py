@@ -1138,6 +1138,15 @@ def progress_bar(iterable, desc="Processing"):
     else:
         yield from iterable
 
+def get_loaded_bytes(weight: torch.Tensor) -> int:
+    """The number of bytes of a loaded weight. Lazily read weights only
+    count the bytes their weight loader read from the file."""
+    num_bytes_read = getattr(weight, "num_bytes_read", None)
+    if num_bytes_read is not None:
+        return num_bytes_read()
+    return weight.element_size() * weight.nelement()
+
+
 def tensor_progress_bar(iterable:Iterable[Tuple[str, torch.Tensor]],
                         final_bytes:int, desc="Processing"):
     show_progress = get_tensor_model_parallel_rank() == 0
@@ -1154,9 +1163,14 @@ def tensor_progress_bar(iterable:Iterable[Tuple[str, torch.Tensor]],
             TimeElapsedColumn(),
         ) as progress:
             task = progress.add_task(f"[cyan]{desc}", total=final_bytes/units)
+            completed = 0.0
             for item in iterable:
-                steps = item[1].element_size() * item[1].nelement() / units
                 yield item
+                steps = get_loaded_bytes(item[1]) / units
+                completed += steps
                 progress.update(task, advance=steps)
+            # The total is an estimate, e.g. of the bytes each tensor parallel
+            # rank reads of sliced weights.
+            progress.update(task, total=completed)
     else:
         yield from iterable
\ No newline at end of file
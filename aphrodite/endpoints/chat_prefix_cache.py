@@ -0,0 +1,183 @@
+import json
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from aphrodite.common.utils import LRUCache
+from aphrodite.endpoints.chat_utils import ConversationMessage
+from aphrodite.transformers_utils.tokenizer import AnyTokenizer
+from aphrodite.transformers_utils.tokenizer_group.tokenization_executor import (  # noqa: E501
+    TokenizationExecutor)
+
+# Minimum number of tokens at the end of a cached prompt that are tokenized
+# again with the appended text. Text appended to the prompt can change how the
+# last tokens of the prompt are merged, but not the tokens further back.
+_NUM_TAIL_TOKENS = 8
+# Maximum number of tokens at the end of a cached prompt that are searched for
+# a token boundary to split the prompt at.
+_MAX_SPLIT_SEARCH_TOKENS = 64
+
+
+class _ChatPrefixCacheMetrics:
+    """Prometheus metrics of the chat prefix cache."""
+
+    def __init__(self):
+        # Imported lazily, as PROMETHEUS_MULTIPROC_DIR must be set before
+        # prometheus_client is imported in the API server process.
+        import prometheus_client
+
+        self.queries = prometheus_client.Counter(
+            name="aphrodite:chat_prefix_cache_queries",
+            documentation="Number of chat prompts looked up in the chat "
+            "prefix cache.")
+        self.hits = prometheus_client.Counter(
+            name="aphrodite:chat_prefix_cache_hits",
+            documentation="Number of chat prompts that reused the tokens of "
+            "a cached conversation prefix.")
+        self.prompt_tokens = prometheus_client.Counter(
+            name="aphrodite:chat_prefix_cache_prompt_tokens",
+            documentation="Number of tokens of the chat prompts looked up in "
+            "the chat prefix cache.")
+        self.cached_tokens = prometheus_client.Counter(
+            name="aphrodite:chat_prefix_cache_cached_tokens",
+            documentation="Number of prompt tokens taken from the chat prefix "
+            "cache instead of being tokenized.")
+
+
+_metrics: Optional[_ChatPrefixCacheMetrics] = None
+
+
+def _get_metrics() -> _ChatPrefixCacheMetrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = _ChatPrefixCacheMetrics()
+    return _metrics
+
+
+@dataclass
+class _CachedPrefix:
+    # The rendered prompt, up to the first tail token.
+    text: str
+    # The tokens of text.
+    token_ids: List[int]
+    # The first tail token, which the tokenization of the text after the
+    # prefix must start with.
+    next_token_id: int
+
+
+def _encode_with_offsets(tokenizer: AnyTokenizer,
+                         text: str) -> Tuple[List[int], List[Tuple[int, int]]]:
+    encoded = tokenizer(text,
+                        add_special_tokens=False,
+                        return_offsets_mapping=True)
+    return encoded.input_ids, encoded.offset_mapping
+
+
+def _hash_message(message: ConversationMessage) -> int:
+    return hash(json.dumps(message, sort_keys=True, default=str))
+
+
+class ChatPrefixCache:
+    """An LRU cache of the tokenized prompts of chat conversations.
+
+    Chat clients send the whole conversation with every request, so the
+    prompt of a request usually starts with the prompt of the previous
+    turn. The cache keeps the tokens of recent prompts, keyed by the chat
+    template, the tokenizer, the LoRA adapter and the hashes of the
+    messages. A new turn only tokenizes the text that follows the longest
+    cached prefix of its conversation.
+
+    The last few tokens of a cached prompt are always tokenized again, as
+    the appended text can be merged with them. If the prompt no longer
+    starts with the cached text, or the tokenization of the appended text
+    does not start at the same token boundary, the prompt is tokenized
+    from scratch.
+    """
+
+    def __init__(self, capacity: int):
+        self.cache = LRUCache[_CachedPrefix](capacity)
+        self.metrics = _get_metrics()
+
+    @staticmethod
+    def _get_keys(conversation: List[ConversationMessage],
+                  tokenizer: AnyTokenizer, chat_template: Optional[str],
+                  lora_int_id: int) -> List[int]:
+        """Get the cache key of each prefix of the conversation."""
+        key = hash((tokenizer.name_or_path, lora_int_id, chat_template))
+        keys: List[int] = []
+        for message in conversation:
+            key = hash((key, _hash_message(message)))
+            keys.append(key)
+        return keys
+
+    def _lookup(self, keys: List[int]) -> Optional[_CachedPrefix]:
+        for key in reversed(keys):
+            cached_prefix = self.cache.get(key)
+            if cached_prefix is not None:
+                return cached_prefix
+        return None
+
+    async def tokenize(
+        self,
+        executor: TokenizationExecutor,
+        tokenizer: AnyTokenizer,
+        conversation: List[ConversationMessage],
+        prompt: str,
+        chat_template: Optional[str],
+        lora_int_id: int = 0,
+    ) -> List[int]:
+        """Tokenize the rendered prompt of conversation without adding
+        special tokens, reusing the tokens of a cached prefix if
+        possible. The tokenizer must be a fast tokenizer, which returns the
+        offsets of the tokens."""
+        if not conversation:
+            token_ids, _ = await executor.run(_encode_with_offsets,
+                                              tokenizer, prompt)
+            return token_ids
+
+        keys = self._get_keys(conversation, tokenizer, chat_template,
+                              lora_int_id)
+        self.metrics.queries.inc()
+
+        token_ids: Optional[List[int]] = None
+        offsets: List[Tuple[int, int]] = []
+        cached_prefix = self._lookup(keys)
+        if cached_prefix is not None and prompt.startswith(
+                cached_prefix.text):
+            start = len(cached_prefix.text)
+            new_token_ids, new_offsets = await executor.run(
+                _encode_with_offsets, tokenizer, prompt[start:])
+            if new_token_ids and new_token_ids[0] == (
+                    cached_prefix.next_token_id):
+                token_ids = cached_prefix.token_ids + new_token_ids
+                # Only the offsets of the tail are needed to split the
+                # prompt again.
+                offsets = [(0, 0)] * len(cached_prefix.token_ids) + [
+                    (token_start + start, token_end + start)
+                    for token_start, token_end in new_offsets
+                ]
+                self.metrics.hits.inc()
+                self.metrics.cached_tokens.inc(len(cached_prefix.token_ids))
+
+        if token_ids is None:
+            token_ids, offsets = await executor.run(_encode_with_offsets,
+                                                    tokenizer, prompt)
+        self.metrics.prompt_tokens.inc(len(token_ids))
+
+        self._put(keys[-1], prompt, token_ids, offsets)
+        return token_ids
+
+    def _put(self, key: int, prompt: str, token_ids: List[int],
+             offsets: List[Tuple[int, int]]):
+        # Split the prompt at a token that starts where the previous one
+        # ends, so that the text after the split point is tokenized the same
+        # way when it is tokenized on its own.
+        end = max(len(token_ids) - _MAX_SPLIT_SEARCH_TOKENS, 0)
+        for i in range(len(token_ids) - _NUM_TAIL_TOKENS, end, -1):
+            start = offsets[i][0]
+            if start > 0 and start == offsets[i - 1][1]:
+                self.cache.put(
+                    key,
+                    _CachedPrefix(text=prompt[:start],
+                                  token_ids=token_ids[:i],
+                                  next_token_id=token_ids[i]))
+                return
@@ -22,7 +22,8 @@ from starlette.routing import Mount
 
 from aphrodite.common.config import ModelConfig
 from aphrodite.common.outputs import RequestOutput
-from aphrodite.common.sampling_params import _SAMPLING_EPS, SamplingParams
+from aphrodite.common.sampling_params import (_SAMPLING_EPS, RequestOutputKind,
+                                              SamplingParams)
 from aphrodite.common.utils import (FlexibleArgumentParser,
                                     get_open_zmq_ipc_path, in_windows,
                                     random_uuid)
@@ -457,6 +458,7 @@ async def generate_stream(
         kai_payload: KAIGenerationInputSchema) -> StreamingResponse:
 
     sampling_params, input_tokens = prepare_engine_payload(kai_payload)
+    sampling_params.output_kind = RequestOutputKind.DELTA
     results_generator = async_engine_client.generate(
         {
             "prompt": kai_payload.prompt,
@@ -467,10 +469,8 @@ async def generate_stream(
     )
 
     async def stream_kobold() -> AsyncGenerator[bytes, None]:
-        previous_output = ""
         async for res in results_generator:
-            new_chunk = res.outputs[0].text[len(previous_output):]
-            previous_output += new_chunk
+            new_chunk = res.outputs[0].text
             yield b"event: message\n"
             yield f"data: {json.dumps({'token': new_chunk})}\n\n".encode()
 
@@ -713,6 +713,7 @@ async def init_app(
         request_logger=request_logger,
         chat_template=args.chat_template,
         return_tokens_as_token_ids=args.return_tokens_as_token_ids,
+        chat_prefix_cache_size=args.chat_prefix_cache_size,
     )
     openai_serving_completion = OpenAIServingCompletion(
         async_engine_client,
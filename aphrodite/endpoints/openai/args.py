@@ -90,6 +90,13 @@ def make_arg_parser(parser: FlexibleArgumentParser) -> FlexibleArgumentParser:
                         help="The file path to the chat template, "
                         "or the template in single-line form "
                         "for the specified model")
+    parser.add_argument(
+        "--chat-prefix-cache-size",
+        type=int,
+        default=0,
+        help="Number of tokenized chat prompts to cache. A chat request whose "
+        "conversation starts with a cached conversation only tokenizes the "
+        "messages that were appended to it. 0 disables the cache.")
     parser.add_argument("--response-role",
                         type=str,
                         default="assistant",
@@ -1,10 +1,11 @@
-from functools import lru_cache, partial
+from functools import lru_cache
 from typing import Dict, FrozenSet, Iterable, List, Optional, Union
 
 import torch
 from transformers import PreTrainedTokenizer
 
 from aphrodite.common.sampling_params import LogitsProcessorFunc
+from aphrodite.common.sequence import SequenceData
 
 
 class AllowedTokenIdsLogitsProcessor:
@@ -15,17 +16,26 @@ class AllowedTokenIdsLogitsProcessor:
         self.allowed_ids: Optional[List[int]] = list(allowed_ids)
         self.mask: Optional[torch.Tensor] = None
 
-    def __call__(self, token_ids: List[int],
-                 logits: torch.Tensor) -> torch.Tensor:
+    def _get_mask(self, logits: torch.Tensor) -> torch.Tensor:
         if self.mask is None:
             self.mask = torch.ones((logits.shape[-1], ),
                                    dtype=torch.bool,
                                    device=logits.device)
             self.mask[self.allowed_ids] = False
             self.allowed_ids = None
-        logits.masked_fill_(self.mask, float("-inf"))
+        return self.mask
+
+    def __call__(self, token_ids: List[int],
+                 logits: torch.Tensor) -> torch.Tensor:
+        logits.masked_fill_(self._get_mask(logits), float("-inf"))
         return logits
 
+    def process_batch(self, logits: torch.Tensor, row_indices: List[int],
+                      seq_ids: List[int],
+                      seq_data: List[SequenceData]) -> None:
+        logits[row_indices] = logits[row_indices].masked_fill_(
+            self._get_mask(logits), float("-inf"))
+
 
 @lru_cache(maxsize=32)
 def _get_allowed_token_ids_logits_processor(
@@ -40,14 +50,38 @@ def _get_allowed_token_ids_logits_processor(
     return AllowedTokenIdsLogitsProcessor(allowed_token_ids)
 
 
-def logit_bias_logits_processor(
-    logit_bias: Dict[int, float],
-    token_ids: List[int],
-    logits: torch.Tensor,
-) -> torch.Tensor:
-    for token_id, bias in logit_bias.items():
-        logits[token_id] += bias
-    return logits
+class LogitBiasLogitsProcessor:
+    """Logits processor for adding a bias to the logits of specific
+    token ids."""
+
+    def __init__(self, logit_bias: Dict[int, float]):
+        self.logit_bias = logit_bias
+        self.token_ids: Optional[torch.Tensor] = None
+        self.biases: Optional[torch.Tensor] = None
+
+    def _get_bias_tensors(self, logits: torch.Tensor):
+        if (self.biases is None or self.biases.device != logits.device
+                or self.biases.dtype != logits.dtype):
+            self.token_ids = torch.tensor(list(self.logit_bias.keys()),
+                                          dtype=torch.long,
+                                          device=logits.device)
+            self.biases = torch.tensor(list(self.logit_bias.values()),
+                                       dtype=logits.dtype,
+                                       device=logits.device)
+        return self.token_ids, self.biases
+
+    def __call__(self, token_ids: List[int],
+                 logits: torch.Tensor) -> torch.Tensor:
+        bias_token_ids, biases = self._get_bias_tensors(logits)
+        logits[bias_token_ids] += biases
+        return logits
+
+    def process_batch(self, logits: torch.Tensor, row_indices: List[int],
+                      seq_ids: List[int],
+                      seq_data: List[SequenceData]) -> None:
+        bias_token_ids, biases = self._get_bias_tensors(logits)
+        rows = torch.tensor(row_indices, device=logits.device).unsqueeze(1)
+        logits[rows, bias_token_ids] += biases
 
 
 def get_logits_processors(
@@ -75,7 +109,7 @@ def get_logits_processors(
                                  "out-of-vocab token id")
 
         logits_processors.append(
-            partial(logit_bias_logits_processor, clamped_logit_bias))
+            LogitBiasLogitsProcessor(clamped_logit_bias))
 
     if allowed_token_ids is not None:
         logits_processors.append(
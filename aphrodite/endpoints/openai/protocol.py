@@ -12,6 +12,7 @@ from typing_extensions import Annotated
 
 from aphrodite.common.pooling_params import PoolingParams
 from aphrodite.common.sampling_params import (LogitsProcessorFunc,
+                                              RequestOutputKind,
                                               SamplingParams)
 from aphrodite.common.sequence import Logprob
 from aphrodite.common.utils import random_uuid
@@ -143,6 +144,8 @@ class ChatCompletionRequest(OpenAIBaseModel):
     ignore_eos: Optional[bool] = False
     min_tokens: Optional[int] = 0
     stop_token_ids: Optional[List[int]] = Field(default_factory=list)
+    stop_token_sequences: Optional[List[List[int]]] = Field(
+        default_factory=list)
     skip_special_tokens: Optional[bool] = True
     spaces_between_special_tokens: Optional[bool] = True
     truncate_prompt_tokens: Optional[Annotated[int, Field(ge=1)]] = None
@@ -253,6 +256,13 @@ class ChatCompletionRequest(OpenAIBaseModel):
             "If specified, will override the default whitespace pattern "
             "for guided json decoding."))
 
+    priority: int = Field(
+        default=0,
+        description=(
+            "The scheduling priority of the request. Lower values are "
+            "scheduled first. Ignored unless the server runs with the "
+            "'priority' or 'fair' scheduling policy."))
+
     # doc: end-chat-completion-extra-params
 
     def to_sampling_params(
@@ -279,6 +289,11 @@ class ChatCompletionRequest(OpenAIBaseModel):
                 token_id = tokenizer.encode(f'a{s}')[-1]
                 dry_sequence_breaker_ids.append(token_id)
 
+        # Streamed responses only need the new tokens of each step; the
+        # others, and beam search, are sent once the request is finished.
+        stream = (self.stream and not self.use_beam_search
+                  and (self.best_of is None or self.best_of == self.n))
+
         return SamplingParams(
             n=self.n,
             presence_penalty=self.presence_penalty,
@@ -291,6 +306,7 @@ class ChatCompletionRequest(OpenAIBaseModel):
             seed=self.seed,
             stop=self.stop,
             stop_token_ids=self.stop_token_ids,
+            stop_token_sequences=self.stop_token_sequences,
             max_tokens=max_tokens,
             min_tokens=self.min_tokens,
             logprobs=self.top_logprobs if self.logprobs else None,
@@ -328,6 +344,9 @@ class ChatCompletionRequest(OpenAIBaseModel):
             skew=self.skew,
             custom_token_bans=self.custom_token_bans,
             sampler_priority=self.sampler_priority,
+            priority=self.priority,
+            output_kind=RequestOutputKind.DELTA
+            if stream else RequestOutputKind.FINAL_ONLY,
         )
 
     @model_validator(mode='before')
@@ -424,6 +443,8 @@ class CompletionRequest(OpenAIBaseModel):
     length_penalty: Optional[float] = 1.0
     early_stopping: Optional[bool] = False
     stop_token_ids: Optional[List[int]] = Field(default_factory=list)
+    stop_token_sequences: Optional[List[List[int]]] = Field(
+        default_factory=list)
     ignore_eos: Optional[bool] = False
     min_tokens: Optional[int] = 0
     skip_special_tokens: Optional[bool] = True
@@ -496,6 +517,13 @@ class CompletionRequest(OpenAIBaseModel):
             "If specified, will override the default whitespace pattern "
             "for guided json decoding."))
 
+    priority: int = Field(
+        default=0,
+        description=(
+            "The scheduling priority of the request. Lower values are "
+            "scheduled first. Ignored unless the server runs with the "
+            "'priority' or 'fair' scheduling policy."))
+
     # doc: end-completion-extra-params
 
     def to_sampling_params(
@@ -523,6 +551,12 @@ class CompletionRequest(OpenAIBaseModel):
                 token_id = tokenizer.encode(f'a{s}')[-1]
                 dry_sequence_breaker_ids.append(token_id)
 
+        # Similar to the OpenAI API, results are not streamed when n !=
+        # best_of or with beam search; such requests only need the final
+        # output.
+        stream = (self.stream and not self.use_beam_search
+                  and (self.best_of is None or self.n == self.best_of))
+
         return SamplingParams(
             n=self.n,
             best_of=self.best_of,
@@ -544,6 +578,7 @@ class CompletionRequest(OpenAIBaseModel):
             seed=self.seed,
             stop=self.stop,
             stop_token_ids=self.stop_token_ids,
+            stop_token_sequences=self.stop_token_sequences,
             ignore_eos=self.ignore_eos,
             max_tokens=max_tokens if not echo_without_generation else 1,
             min_tokens=self.min_tokens,
@@ -573,6 +608,9 @@ class CompletionRequest(OpenAIBaseModel):
             skew=self.skew,
             custom_token_bans=self.custom_token_bans,
             sampler_priority=self.sampler_priority,
+            priority=self.priority,
+            output_kind=RequestOutputKind.DELTA
+            if stream else RequestOutputKind.FINAL_ONLY,
         )
 
     @model_validator(mode="before")
@@ -1,8 +1,12 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
+import msgspec
+
+from aphrodite.common.outputs import CompletionOutput, RequestOutput
 from aphrodite.common.sampling_params import SamplingParams
+from aphrodite.common.sequence import Logprob, RequestMetrics
 from aphrodite.inputs import PromptInputs
 from aphrodite.lora.request import LoRARequest
 from aphrodite.prompt_adapter.request import PromptAdapterRequest
@@ -10,6 +14,10 @@ from aphrodite.prompt_adapter.request import PromptAdapterRequest
 APHRODITE_RPC_SUCCESS_STR = "SUCCESS"
 APHRODITE_RPC_HEALTHY_STR = "HEALTHY"
 
+# Frame types sent by the server on the generate channel.
+RPC_OUTPUTS_FRAME = b"O"
+RPC_ERROR_FRAME = b"E"
+
 
 @dataclass
 class RPCGenerateRequest:
@@ -38,3 +46,118 @@ class RPCUtilityRequest(Enum):
 
 RPC_REQUEST_TYPE = Union[RPCGenerateRequest, RPCAbortRequest,
                          RPCUtilityRequest]
+
+
+# A Logprob on the wire: (logprob, rank, decoded_token).
+RPCLogprobs = Dict[int, Tuple[float, Optional[int], Optional[str]]]
+
+
+def _encode_logprobs(logprobs: Dict[int, Logprob]) -> RPCLogprobs:
+    return {
+        token_id: (logprob.logprob, logprob.rank, logprob.decoded_token)
+        for token_id, logprob in logprobs.items()
+    }
+
+
+def _decode_logprobs(logprobs: RPCLogprobs) -> Dict[int, Logprob]:
+    return {
+        token_id: Logprob(*logprob)
+        for token_id, logprob in logprobs.items()
+    }
+
+
+class RPCCompletionOutput(msgspec.Struct, array_like=True):
+    """Wire format of a CompletionOutput."""
+    index: int
+    text: str
+    token_ids: List[int]
+    cumulative_logprob: Optional[float]
+    logprobs: Optional[List[RPCLogprobs]]
+    finish_reason: Optional[str]
+    stop_reason: Union[int, str, None]
+
+
+class RPCRequestOutput(msgspec.Struct, array_like=True):
+    """Wire format of a RequestOutput. The LoRA request is not sent, the
+    client already knows it."""
+    request_id: str
+    prompt: Optional[str]
+    prompt_token_ids: Optional[List[int]]
+    prompt_logprobs: Optional[List[Optional[RPCLogprobs]]]
+    outputs: List[RPCCompletionOutput]
+    finished: bool
+    metrics: Optional[RequestMetrics]
+    encoder_prompt: Optional[str]
+    encoder_prompt_token_ids: Optional[List[int]]
+
+    @classmethod
+    def from_request_output(
+            cls, request_output: RequestOutput) -> "RPCRequestOutput":
+        outputs = [
+            RPCCompletionOutput(
+                output.index, output.text, list(output.token_ids),
+                output.cumulative_logprob,
+                None if output.logprobs is None else
+                [_encode_logprobs(logprobs) for logprobs in output.logprobs],
+                output.finish_reason, output.stop_reason)
+            for output in request_output.outputs
+        ]
+        prompt_logprobs = request_output.prompt_logprobs
+        if prompt_logprobs is not None:
+            prompt_logprobs = [
+                None if logprobs is None else _encode_logprobs(logprobs)
+                for logprobs in prompt_logprobs
+            ]
+        return cls(request_output.request_id, request_output.prompt,
+                   request_output.prompt_token_ids, prompt_logprobs, outputs,
+                   request_output.finished, request_output.metrics,
+                   request_output.encoder_prompt,
+                   request_output.encoder_prompt_token_ids)
+
+    def to_request_output(
+            self,
+            lora_request: Optional[LoRARequest] = None) -> RequestOutput:
+        outputs = [
+            CompletionOutput(
+                output.index, output.text, output.token_ids,
+                output.cumulative_logprob,
+                None if output.logprobs is None else
+                [_decode_logprobs(logprobs) for logprobs in output.logprobs],
+                output.finish_reason, output.stop_reason, lora_request)
+            for output in self.outputs
+        ]
+        prompt_logprobs = None
+        if self.prompt_logprobs is not None:
+            prompt_logprobs = [
+                None if logprobs is None else _decode_logprobs(logprobs)
+                for logprobs in self.prompt_logprobs
+            ]
+        return RequestOutput(
+            self.request_id,
+            self.prompt,
+            self.prompt_token_ids,
+            prompt_logprobs,
+            outputs,
+            self.finished,
+            self.metrics,
+            lora_request=lora_request,
+            encoder_prompt=self.encoder_prompt,
+            encoder_prompt_token_ids=self.encoder_prompt_token_ids,
+        )
+
+
+_outputs_encoder = msgspec.msgpack.Encoder()
+_outputs_decoder = msgspec.msgpack.Decoder(List[RPCRequestOutput])
+
+
+def encode_request_outputs(request_outputs: List[RequestOutput]) -> bytes:
+    """Encode the outputs of an engine step into one generate channel
+    frame."""
+    return _outputs_encoder.encode([
+        RPCRequestOutput.from_request_output(request_output)
+        for request_output in request_outputs
+    ])
+
+
+def decode_request_outputs(frame: bytes) -> List[RPCRequestOutput]:
+    return _outputs_decoder.decode(frame)
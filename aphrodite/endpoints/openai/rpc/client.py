@@ -1,5 +1,6 @@
+import asyncio
 from contextlib import contextmanager
-from typing import Any, AsyncGenerator, Optional
+from typing import Any, AsyncGenerator, Dict, Optional
 
 import cloudpickle
 import zmq
@@ -11,9 +12,12 @@ from aphrodite.common.outputs import EmbeddingRequestOutput, RequestOutput
 from aphrodite.common.sampling_params import SamplingParams
 from aphrodite.endpoints.openai.rpc import (APHRODITE_RPC_HEALTHY_STR,
                                             APHRODITE_RPC_SUCCESS_STR,
+                                            RPC_ERROR_FRAME,
+                                            RPC_OUTPUTS_FRAME,
                                             RPC_REQUEST_TYPE, RPCAbortRequest,
                                             RPCGenerateRequest,
-                                            RPCUtilityRequest)
+                                            RPCUtilityRequest,
+                                            decode_request_outputs)
 from aphrodite.inputs import PromptInputs
 from aphrodite.lora.request import LoRARequest
 from aphrodite.prompt_adapter.request import PromptAdapterRequest
@@ -23,12 +27,22 @@ from aphrodite.transformers_utils.tokenizer_group import (
 # Time to wait before checking if the server process is alive
 SERVER_START_TIMEOUT_MS = 1000
 
+
 class AsyncEngineRPCClient:
 
     def __init__(self, rpc_path: str):
         self.context = zmq.asyncio.Context()
         self.rpc_path = rpc_path
 
+        # All generate requests share one socket. Their outputs are routed
+        # to the queue of their request by the output handler loop.
+        self.generate_socket: Optional[zmq.asyncio.Socket] = None
+        self.output_queues: Dict[str, asyncio.Queue] = {}
+        self.output_handler: Optional[asyncio.Task] = None
+        # The exception that stopped the output handler loop. Nothing
+        # receives the outputs of new requests after that.
+        self._errored_with: Optional[BaseException] = None
+
     async def setup(self):
         """Setup the client before it starts sending server requests."""
 
@@ -49,10 +63,55 @@ class AsyncEngineRPCClient:
             enable_lora=bool(await self._get_lora_config_rpc()),
         )
 
+        self.setup_generate_socket()
+
+    def setup_generate_socket(self):
+        """Connect the socket shared by all generate requests and start
+        routing their outputs."""
+        self.generate_socket = self.context.socket(zmq.constants.DEALER)
+        self.generate_socket.connect(self.rpc_path)
+        self.output_handler = asyncio.create_task(
+            self.run_output_handler_loop())
+
     def close(self):
         """Destroy the ZeroMQ Context."""
+        if self.output_handler is not None:
+            self.output_handler.cancel()
+        if self.generate_socket is not None:
+            # See socket() for why linger is 0.
+            self.generate_socket.close(linger=0)
         self.context.destroy()
 
+    async def run_output_handler_loop(self):
+        """Route the frames received on the generate socket to the queues of
+        their requests. An outputs frame holds the outputs of all of this
+        client's requests from one engine step."""
+        socket = self.generate_socket
+        assert socket is not None
+        try:
+            while True:
+                frame_type, *frames = await socket.recv_multipart()
+                if frame_type == RPC_OUTPUTS_FRAME:
+                    for output in decode_request_outputs(frames[0]):
+                        queue = self.output_queues.get(output.request_id)
+                        # The queue is gone if the request was aborted.
+                        if queue is not None:
+                            queue.put_nowait(output)
+                elif frame_type == RPC_ERROR_FRAME:
+                    queue = self.output_queues.get(frames[0].decode())
+                    if queue is not None:
+                        queue.put_nowait(cloudpickle.loads(frames[1]))
+                else:
+                    raise ValueError(
+                        f"Unknown generate frame type: {frame_type!r}")
+        except Exception as e:
+            # Fail all running requests instead of leaving them hanging, and
+            # the new ones from now on.
+            self._errored_with = e
+            for queue in self.output_queues.values():
+                queue.put_nowait(e)
+            raise
+
     @contextmanager
     def socket(self):
         # Ensure client sockets are always closed after use
@@ -186,15 +245,15 @@ class AsyncEngineRPCClient:
 
     @property
     def is_running(self) -> bool:
-        return not self._errored
+        return not self.errored
 
     @property
     def is_stopped(self) -> bool:
-        return self._errored
+        return self.errored
 
     @property
     def errored(self) -> bool:
-        return self._errored
+        return self._errored or self._errored_with is not None
 
     async def generate(
         self,
@@ -206,41 +265,48 @@ class AsyncEngineRPCClient:
     ) -> AsyncGenerator[RequestOutput, None]:
         """Send an RPCGenerateRequest to the RPCServer and stream responses."""
 
+        assert self.generate_socket is not None
+        if self._errored_with is not None:
+            raise RuntimeError(
+                "The RPC client stopped receiving outputs from the server."
+            ) from self._errored_with
+        if request_id in self.output_queues:
+            raise ValueError(f"Request {request_id} already exists")
+        queue: asyncio.Queue = asyncio.Queue()
+        self.output_queues[request_id] = queue
+
         finished = False
         try:
-            with self.socket() as socket:
-
-                # Send RPCGenerateRequest to the RPCServer.
-                await socket.send_multipart([
-                    cloudpickle.dumps(
-                        RPCGenerateRequest(
-                            inputs=inputs,
-                            sampling_params=sampling_params,
-                            request_id=request_id,
-                            lora_request=lora_request,
-                            prompt_adapter_request=prompt_adapter_request))
-                ])
-
-                # Stream back the results from the RPC Server.
-                while not finished:
-                    message = await socket.recv()
-                    request_output = cloudpickle.loads(message)
-
-                    if isinstance(request_output, Exception):
-                        # On exception, check if the server is still healthy.
-                        # Use this to set the sync `is_running` and `errored`
-                        # properties.
-                        try:
-                            await self.check_health()
-                        except Exception:
-                            self._errored = True
-                        # NB: do before raising here so that the flag is set
-                        # by the time the caller receives this exception
-                        raise request_output
-
-                    finished = request_output.finished
-                    yield request_output
+            # Send RPCGenerateRequest to the RPCServer.
+            await self.generate_socket.send(
+                cloudpickle.dumps(
+                    RPCGenerateRequest(
+                        inputs=inputs,
+                        sampling_params=sampling_params,
+                        request_id=request_id,
+                        lora_request=lora_request,
+                        prompt_adapter_request=prompt_adapter_request)))
+
+            # Stream back the results from the RPC Server.
+            while not finished:
+                request_output = await queue.get()
+
+                if isinstance(request_output, Exception):
+                    # On exception, check if the server is still healthy.
+                    # Use this to set the sync `is_running` and `errored`
+                    # properties.
+                    try:
+                        await self.check_health()
+                    except Exception:
+                        self._errored = True
+                    # NB: do before raising here so that the flag is set
+                    # by the time the caller receives this exception
+                    raise request_output
+
+                finished = request_output.finished
+                yield request_output.to_request_output(lora_request)
         finally:
+            del self.output_queues[request_id]
             if not finished:
                 await self.abort(request_id)
 
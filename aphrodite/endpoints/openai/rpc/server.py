@@ -1,6 +1,6 @@
 import asyncio
 import signal
-from typing import Any, Coroutine
+from typing import Any, Coroutine, Dict, List, Optional, Tuple
 
 import cloudpickle
 import zmq
@@ -9,12 +9,16 @@ from loguru import logger
 from typing_extensions import Never
 
 from aphrodite import AsyncAphrodite, AsyncEngineArgs
+from aphrodite.common.outputs import RequestOutput
 from aphrodite.common.utils import in_windows
 from aphrodite.endpoints.openai.rpc import (APHRODITE_RPC_HEALTHY_STR,
                                             APHRODITE_RPC_SUCCESS_STR,
+                                            RPC_ERROR_FRAME,
+                                            RPC_OUTPUTS_FRAME,
                                             RPCAbortRequest,
                                             RPCGenerateRequest,
-                                            RPCUtilityRequest)
+                                            RPCUtilityRequest,
+                                            encode_request_outputs)
 
 if in_windows():
     import winloop as uvloop
@@ -27,7 +31,9 @@ class AsyncEngineRPCServer:
     def __init__(self, async_engine_args: AsyncEngineArgs, rpc_path: str):
         # Initialize engine first.
         self.engine = AsyncAphrodite.from_engine_args(async_engine_args)
+        self._init_socket(rpc_path)
 
+    def _init_socket(self, rpc_path: str):
         # Initialize context.
         self.context = zmq.asyncio.Context()
 
@@ -35,6 +41,19 @@ class AsyncEngineRPCServer:
         self.socket = self.context.socket(zmq.constants.ROUTER)
         self.socket.bind(rpc_path)
 
+        # Outputs of the generate requests that are waiting to be sent,
+        # grouped by the identity of the client socket.
+        self.pending_outputs: Dict[bytes, List[RequestOutput]] = {}
+        self.pending_errors: List[Tuple[bytes, str, Exception]] = []
+        # Created in run_server_loop, inside the event loop of the server.
+        self.outputs_ready: Optional[asyncio.Event] = None
+        # The identity of the client socket of every running generate request.
+        self.running_requests: Dict[str, bytes] = {}
+        # The exception that stopped the output loop. Nothing sends the
+        # outputs of the generate requests after that.
+        self._errored_with: Optional[BaseException] = None
+        self._fail_requests_task: Optional[asyncio.Task] = None
+
     def cleanup(self):
         """Cleanup all resources."""
         self.socket.close()
@@ -108,24 +127,97 @@ class AsyncEngineRPCServer:
             ])
 
     async def generate(self, identity, generate_request: RPCGenerateRequest):
+        request_id = generate_request.request_id
+        if self._errored_with is not None:
+            await self._send_error(identity, request_id,
+                                   self._output_loop_error())
+            return
+
+        self.running_requests[request_id] = identity
         try:
             results_generator = self.engine.generate(
                 generate_request.inputs,
                 sampling_params=generate_request.sampling_params,
-                request_id=generate_request.request_id,
+                request_id=request_id,
                 lora_request=generate_request.lora_request,
                 prompt_adapter_request=generate_request.prompt_adapter_request)
 
             async for request_output in results_generator:
-                await self.socket.send_multipart(
-                    [identity, cloudpickle.dumps(request_output)])
+                outputs = self.pending_outputs.get(identity)
+                if outputs is None:
+                    self.pending_outputs[identity] = [request_output]
+                    self.outputs_ready.set()
+                else:
+                    outputs.append(request_output)
 
         except Exception as e:
             ### Notify client of all failures
-            await self.socket.send_multipart([identity, cloudpickle.dumps(e)])
+            # If the output loop stopped, the request was already failed.
+            if self._errored_with is None:
+                self.pending_errors.append((identity, request_id, e))
+                self.outputs_ready.set()
+        finally:
+            self.running_requests.pop(request_id, None)
+
+    async def run_output_loop(self):
+        """Send the outputs queued by the generate handlers.
+
+        The engine puts the outputs of a step into the streams of all its
+        requests at once, so every handler queues its output before this
+        task runs again. This sends all of them in a single msgpack frame
+        per client instead of pickling and sending every output on its
+        own.
+        """
+        while True:
+            await self.outputs_ready.wait()
+            self.outputs_ready.clear()
+            pending_outputs, self.pending_outputs = self.pending_outputs, {}
+            pending_errors, self.pending_errors = self.pending_errors, []
+
+            for identity, outputs in pending_outputs.items():
+                frame = encode_request_outputs(outputs)
+                await self.socket.send_multipart(
+                    [identity, RPC_OUTPUTS_FRAME, frame], copy=False)
+            # Errors are sent after the outputs that preceded them.
+            for identity, request_id, e in pending_errors:
+                await self._send_error(identity, request_id, e)
+
+    async def _send_error(self, identity, request_id: str, e: Exception):
+        await self.socket.send_multipart(
+            [identity, RPC_ERROR_FRAME,
+             request_id.encode(),
+             cloudpickle.dumps(e)])
+
+    def _output_loop_error(self) -> Exception:
+        return RuntimeError("The RPC server stopped sending outputs: "
+                            f"{self._errored_with!r}")
+
+    def _on_output_loop_done(self, task: asyncio.Task):
+        """Mark the server as errored if the output loop failed, and fail
+        the running requests instead of leaving them hanging."""
+        if task.cancelled():
+            return
+        self._errored_with = task.exception()
+        logger.opt(exception=self._errored_with).error(
+            "The RPC server output loop failed")
+        # The generate handlers of these requests don't send anything from
+        # now on, and new ones fail right away.
+        self._fail_requests_task = asyncio.create_task(
+            self._fail_requests(dict(self.running_requests)))
+
+    async def _fail_requests(self, requests: Dict[str, bytes]):
+        error = self._output_loop_error()
+        for request_id, identity in requests.items():
+            try:
+                await self.engine.abort(request_id)
+                await self._send_error(identity, request_id, error)
+            except Exception:
+                logger.exception(f"Failed to abort request {request_id}")
 
     async def check_health(self, identity):
         try:
+            if self._errored_with is not None:
+                raise self._output_loop_error()
             await self.engine.check_health()
             await self.socket.send_multipart(
                 [identity,
@@ -172,6 +264,10 @@ class AsyncEngineRPCServer:
         """Inner RPC Server Loop"""
 
         running_tasks = set()
+        self.outputs_ready = asyncio.Event()
+        output_loop = asyncio.create_task(self.run_output_loop())
+        output_loop.add_done_callback(self._on_output_loop_done)
+        running_tasks.add(output_loop)
         while True:
             # Wait for a request.
             identity, message = await self.socket.recv_multipart()
@@ -12,6 +12,7 @@ from aphrodite.common.config import ModelConfig
 from aphrodite.common.outputs import RequestOutput
 from aphrodite.common.sequence import Logprob
 from aphrodite.common.utils import iterate_with_cancellation, random_uuid
+from aphrodite.endpoints.chat_prefix_cache import ChatPrefixCache
 from aphrodite.endpoints.chat_utils import (ConversationMessage,
                                             apply_chat_template,
                                             load_chat_template,
@@ -47,6 +48,7 @@ class OpenAIServingChat(OpenAIServing):
         request_logger: Optional[RequestLogger],
         chat_template: Optional[str],
         return_tokens_as_token_ids: bool = False,
+        chat_prefix_cache_size: int = 0,
     ):
         super().__init__(async_engine_client=async_engine_client,
                          model_config=model_config,
@@ -59,6 +61,8 @@ class OpenAIServingChat(OpenAIServing):
         self.response_role = response_role
         # If this is None we use the tokenizer's default chat template
         self.chat_template = load_chat_template(chat_template)
+        self.chat_prefix_cache = ChatPrefixCache(
+            chat_prefix_cache_size) if chat_prefix_cache_size > 0 else None
 
     async def create_chat_completion(
         self,
@@ -105,7 +109,8 @@ class OpenAIServingChat(OpenAIServing):
                 tool.model_dump() for tool in request.tools
             ]
 
-            prompt = apply_chat_template(
+            prompt = await self.tokenization_executor.run(
+                apply_chat_template,
                 tokenizer,
                 conversation=conversation,
                 chat_template=request.chat_template or self.chat_template,
@@ -135,8 +140,23 @@ class OpenAIServingChat(OpenAIServing):
             guided_decode_logits_processor = (
                 await self._guided_decode_logits_processor(request, tokenizer))
 
-            if isinstance(prompt, str):
-                prompt_inputs = self._tokenize_prompt_input(
+            if (isinstance(prompt, str) and self.chat_prefix_cache is not None
+                    and tokenizer.is_fast
+                    and request.truncate_prompt_tokens is None
+                    and not request.add_special_tokens):
+                prompt_token_ids = await self.chat_prefix_cache.tokenize(
+                    self.tokenization_executor,
+                    tokenizer,
+                    conversation,
+                    prompt,
+                    chat_template=request.chat_template or self.chat_template,
+                    lora_int_id=lora_request.lora_int_id
+                    if lora_request else 0,
+                )
+                prompt_inputs = self._validate_input(request,
+                                                     prompt_token_ids, prompt)
+            elif isinstance(prompt, str):
+                prompt_inputs = await self._tokenize_prompt_input(
                     request,
                     tokenizer,
                     prompt,
@@ -148,11 +168,15 @@ class OpenAIServingChat(OpenAIServing):
                     prompt[0], int
                 ), "Prompt has to be either a string or a list of token ids"
                 prompt_inputs = TextTokensPrompt(
-                    prompt=tokenizer.decode(prompt), prompt_token_ids=prompt)
+                    prompt=await self.tokenization_executor.run(
+                        tokenizer.decode, prompt),
+                    prompt_token_ids=prompt)
 
             assert prompt_inputs is not None
 
-            sampling_params = request.to_sampling_params(
+            # The tokenizer may encode the DRY sequence breakers.
+            sampling_params = await self.tokenization_executor.run(
+                request.to_sampling_params,
                 tokenizer,
                 guided_decode_logits_processor,
                 default_max_tokens=self.max_model_len -
@@ -217,15 +241,18 @@ class OpenAIServingChat(OpenAIServing):
 
         # Send response for each token for each request.n (index)
         num_choices = 1 if request.n is None else request.n
-        previous_texts = [""] * num_choices
         previous_num_tokens = [0] * num_choices
         finish_reason_sent = [False] * num_choices
+        num_prompt_tokens = 0
         try:
             async for res in result_generator:
                 # We need to do it here, because if there are exceptions in
                 # the result_generator, it needs to be sent as the FIRST
                 # response (by the try...catch).
                 if first_iteration:
+                    # The outputs are deltas (RequestOutputKind.DELTA), so
+                    # only the first one is guaranteed to hold the prompt.
+                    num_prompt_tokens = len(res.prompt_token_ids)
                     # Send first response for each request.n (index) with
                     # the role
                     role = self.get_chat_request_role(request)
@@ -244,7 +271,7 @@ class OpenAIServingChat(OpenAIServing):
                         if (request.stream_options
                                 and request.stream_options.include_usage):
                             if (request.stream_options.continuous_usage_stats):
-                                prompt_tokens = len(res.prompt_token_ids)
+                                prompt_tokens = num_prompt_tokens
                                 usage = UsageInfo(prompt_tokens=prompt_tokens,
                                                   completion_tokens=0,
                                                   total_tokens=prompt_tokens)
@@ -282,8 +309,7 @@ class OpenAIServingChat(OpenAIServing):
                                         request.stream_options.include_usage):
                                     if (request.stream_options.
                                             continuous_usage_stats):
-                                        prompt_tokens = len(
-                                            res.prompt_token_ids)
+                                        prompt_tokens = num_prompt_tokens
                                         usage = UsageInfo(
                                             prompt_tokens=prompt_tokens,
                                             completion_tokens=0,
@@ -302,14 +328,14 @@ class OpenAIServingChat(OpenAIServing):
                     if finish_reason_sent[i]:
                         continue
 
-                    delta_token_ids = output.token_ids[previous_num_tokens[i]:]
-                    out_logprobs = output.logprobs[
-                        previous_num_tokens[i]:] if output.logprobs else None
+                    delta_token_ids = output.token_ids
+                    out_logprobs = output.logprobs
 
                     if request.logprobs and request.top_logprobs is not None:
                         assert out_logprobs is not None, (
                             "Did not output logprobs")
-                        logprobs = self._create_chat_logprobs(
+                        logprobs = await self.tokenization_executor.run(
+                            self._create_chat_logprobs,
                             token_ids=delta_token_ids,
                             top_logprobs=out_logprobs,
                             tokenizer=tokenizer,
@@ -318,9 +344,8 @@ class OpenAIServingChat(OpenAIServing):
                     else:
                         logprobs = None
 
-                    delta_text = output.text[len(previous_texts[i]):]
-                    previous_texts[i] = output.text
-                    previous_num_tokens[i] = len(output.token_ids)
+                    delta_text = output.text
+                    previous_num_tokens[i] += len(output.token_ids)
 
                     if request.tool_choice and type(
                             request.tool_choice
@@ -350,8 +375,8 @@ class OpenAIServingChat(OpenAIServing):
                         if (request.stream_options
                                 and request.stream_options.include_usage):
                             if (request.stream_options.continuous_usage_stats):
-                                prompt_tokens = len(res.prompt_token_ids)
-                                completion_tokens = len(output.token_ids)
+                                prompt_tokens = num_prompt_tokens
+                                completion_tokens = previous_num_tokens[i]
                                 usage = UsageInfo(
                                     prompt_tokens=prompt_tokens,
                                     completion_tokens=completion_tokens,
@@ -365,7 +390,7 @@ class OpenAIServingChat(OpenAIServing):
                         yield f"data: {data}\n\n"
                     else:
                         # Send the finish response for each request.n only once
-                        prompt_tokens = len(res.prompt_token_ids)
+                        prompt_tokens = num_prompt_tokens
                         choice_data = ChatCompletionResponseStreamChoice(
                             index=i,
                             delta=delta_message,
@@ -381,8 +406,8 @@ class OpenAIServingChat(OpenAIServing):
                         if (request.stream_options
                                 and request.stream_options.include_usage):
                             if (request.stream_options.continuous_usage_stats):
-                                prompt_tokens = len(res.prompt_token_ids)
-                                completion_tokens = len(output.token_ids)
+                                prompt_tokens = num_prompt_tokens
+                                completion_tokens = previous_num_tokens[i]
                                 usage = UsageInfo(
                                     prompt_tokens=prompt_tokens,
                                     completion_tokens=completion_tokens,
@@ -452,7 +477,8 @@ class OpenAIServingChat(OpenAIServing):
 
             if request.logprobs and request.top_logprobs is not None:
                 assert out_logprobs is not None, "Did not output logprobs"
-                logprobs = self._create_chat_logprobs(
+                logprobs = await self.tokenization_executor.run(
+                    self._create_chat_logprobs,
                     token_ids=token_ids,
                     top_logprobs=out_logprobs,
                     tokenizer=tokenizer,
@@ -98,17 +98,18 @@ class OpenAIServingCompletion(OpenAIServing):
 
             guided_decode_logits_processor = (
                 await self._guided_decode_logits_processor(request, tokenizer))
-            prompts = list(
-                self._tokenize_prompt_input_or_inputs(
-                    request,
-                    tokenizer,
-                    request.prompt,
-                    truncate_prompt_tokens=request.truncate_prompt_tokens,
-                    add_special_tokens=request.add_special_tokens,
-                ))
+            prompts = await self._tokenize_prompt_input_or_inputs(
+                request,
+                tokenizer,
+                request.prompt,
+                truncate_prompt_tokens=request.truncate_prompt_tokens,
+                add_special_tokens=request.add_special_tokens,
+            )
 
             for i, prompt_inputs in enumerate(prompts):
-                sampling_params = request.to_sampling_params(
+                # The tokenizer may encode the DRY sequence breakers.
+                sampling_params = await self.tokenization_executor.run(
+                    request.to_sampling_params,
                     tokenizer,
                     guided_decode_logits_processor,
                     default_max_tokens=self.max_model_len -
@@ -173,7 +174,9 @@ class OpenAIServingCompletion(OpenAIServing):
 
             final_res_batch_checked = cast(List[RequestOutput],
                                            final_res_batch)
-            response = self.request_output_to_completion_response(
+            # The logprobs are decoded on the tokenizer thread.
+            response = await self.tokenization_executor.run(
+                self.request_output_to_completion_response,
                 final_res_batch_checked,
                 request,
                 request_id,
@@ -211,17 +214,20 @@ class OpenAIServingCompletion(OpenAIServing):
         tokenizer: PreTrainedTokenizer,
     ) -> AsyncGenerator[str, None]:
         num_choices = 1 if request.n is None else request.n
-        previous_texts = [""] * num_choices * num_prompts
+        previous_text_lens = [0] * num_choices * num_prompts
         previous_num_tokens = [0] * num_choices * num_prompts
+        num_prompt_tokens = [0] * num_prompts
         has_echoed = [False] * num_choices * num_prompts
 
         try:
             async for prompt_idx, res in result_generator:
+                # The outputs are deltas (RequestOutputKind.DELTA), which
+                # only hold the prompt until the first token is returned.
+                if res.prompt_token_ids is not None:
+                    num_prompt_tokens[prompt_idx] = len(res.prompt_token_ids)
 
                 for output in res.outputs:
                     i = output.index + prompt_idx * num_choices
-                    # TODO: optimize the performance by avoiding full
-                    # text O(n^2) sending.
 
                     assert request.max_tokens is not None
                     if request.echo and request.max_tokens == 0:
@@ -235,33 +241,32 @@ class OpenAIServingCompletion(OpenAIServing):
                         # echo the prompt and first token
                         delta_text = res.prompt + output.text
                         delta_token_ids = (res.prompt_token_ids +
-                                           output.token_ids)
+                                           list(output.token_ids))
                         out_logprobs = res.prompt_logprobs + (output.logprobs
                                                               or [])
                         has_echoed[i] = True
                     else:
                         # return just the delta
-                        delta_text = output.text[len(previous_texts[i]):]
-                        delta_token_ids = output.token_ids[
-                            previous_num_tokens[i]:]
-                        out_logprobs = output.logprobs[previous_num_tokens[
-                            i]:] if output.logprobs else None
+                        delta_text = output.text
+                        delta_token_ids = output.token_ids
+                        out_logprobs = output.logprobs
 
                     if request.logprobs is not None:
                         assert out_logprobs is not None, (
                             "Did not output logprobs")
-                        logprobs = self._create_completion_logprobs(
+                        logprobs = await self.tokenization_executor.run(
+                            self._create_completion_logprobs,
                             token_ids=delta_token_ids,
                             top_logprobs=out_logprobs,
                             num_output_top_logprobs=request.logprobs,
                             tokenizer=tokenizer,
-                            initial_text_offset=len(previous_texts[i]),
+                            initial_text_offset=previous_text_lens[i],
                         )
                     else:
                         logprobs = None
 
-                    previous_texts[i] = output.text
-                    previous_num_tokens[i] = len(output.token_ids)
+                    previous_text_lens[i] += len(output.text)
+                    previous_num_tokens[i] += len(output.token_ids)
                     finish_reason = output.finish_reason
                     stop_reason = output.stop_reason
 
@@ -282,8 +287,8 @@ class OpenAIServingCompletion(OpenAIServing):
                             and request.stream_options.include_usage):
                         if (request.stream_options.continuous_usage_stats
                                 or output.finish_reason is not None):
-                            prompt_tokens = len(res.prompt_token_ids)
-                            completion_tokens = len(output.token_ids)
+                            prompt_tokens = num_prompt_tokens[prompt_idx]
+                            completion_tokens = previous_num_tokens[i]
                             usage = UsageInfo(
                                 prompt_tokens=prompt_tokens,
                                 completion_tokens=completion_tokens,
@@ -109,12 +109,11 @@ class OpenAIServingEmbedding(OpenAIServing):
                 lora_request)
             pooling_params = request.to_pooling_params()
 
-            prompts = list(
-                self._tokenize_prompt_input_or_inputs(
-                    request,
-                    tokenizer,
-                    request.input,
-                ))
+            prompts = await self._tokenize_prompt_input_or_inputs(
+                request,
+                tokenizer,
+                request.input,
+            )
 
             for i, prompt_inputs in enumerate(prompts):
                 request_id_item = f"{request_id}-{i}"
@@ -1,8 +1,9 @@
+import asyncio
 import json
 import pathlib
 from dataclasses import dataclass
 from http import HTTPStatus
-from typing import Iterable, Iterator, List, Optional, Tuple, TypedDict, Union
+from typing import Iterable, List, Optional, Tuple, TypedDict, Union
 
 from loguru import logger
 from pydantic import Field
@@ -33,6 +34,8 @@ from aphrodite.lora.request import LoRARequest
 from aphrodite.modeling.guided_decoding import (
     get_guided_decoding_logits_processor)
 from aphrodite.prompt_adapter.request import PromptAdapterRequest
+from aphrodite.transformers_utils.tokenizer_group.tokenization_executor import (  # noqa: E501
+    get_tokenization_executor)
 
 
 @dataclass
@@ -105,6 +108,7 @@ class OpenAIServing:
 
         self.request_logger = request_logger
         self.return_tokens_as_token_ids = return_tokens_as_token_ids
+        self.tokenization_executor = get_tokenization_executor()
 
     async def show_available_models(self) -> ModelList:
         """Show available models. Right now we only have one model."""
@@ -242,7 +246,7 @@ class OpenAIServing:
             if prompt_adapter.prompt_adapter_name != prompt_adapter_name
         ]
 
-    def _normalize_prompt_text_to_input(
+    async def _normalize_prompt_text_to_input(
         self,
         request: AnyRequest,
         tokenizer: AnyTokenizer,
@@ -250,21 +254,17 @@ class OpenAIServing:
         truncate_prompt_tokens: Optional[Annotated[int, Field(ge=1)]],
         add_special_tokens: bool,
     ) -> TextTokensPrompt:
-        if truncate_prompt_tokens is None:
-            encoded = tokenizer(prompt, add_special_tokens=add_special_tokens)
-        else:
-            encoded = tokenizer(prompt,
-                                add_special_tokens=add_special_tokens,
-                                truncation=True,
-                                max_length=truncate_prompt_tokens)
-
-        input_ids = encoded.input_ids
+        input_ids = await self.tokenization_executor.encode(
+            tokenizer,
+            prompt,
+            add_special_tokens=add_special_tokens,
+            max_length=truncate_prompt_tokens)
 
         input_text = prompt
 
         return self._validate_input(request, input_ids, input_text)
 
-    def _normalize_prompt_tokens_to_input(
+    async def _normalize_prompt_tokens_to_input(
         self,
         request: AnyRequest,
         tokenizer: AnyTokenizer,
@@ -276,7 +276,8 @@ class OpenAIServing:
         else:
             input_ids = prompt_ids[-truncate_prompt_tokens:]
 
-        input_text = tokenizer.decode(input_ids)
+        input_text = await self.tokenization_executor.run(
+            tokenizer.decode, input_ids)
 
         return self._validate_input(request, input_ids, input_text)
 
@@ -324,7 +325,7 @@ class OpenAIServing:
 
         return TextTokensPrompt(prompt=input_text, prompt_token_ids=input_ids)
 
-    def _tokenize_prompt_input(
+    async def _tokenize_prompt_input(
         self,
         request: AnyRequest,
         tokenizer: AnyTokenizer,
@@ -336,78 +337,70 @@ class OpenAIServing:
         A simpler implementation of :meth:`_tokenize_prompt_input_or_inputs`
         that assumes single input.
         """
-        return next(
-            self._tokenize_prompt_inputs(
-                request,
-                tokenizer,
-                [prompt_input],
-                truncate_prompt_tokens=truncate_prompt_tokens,
-                add_special_tokens=add_special_tokens,
-            ))
-
-    def _tokenize_prompt_inputs(
+        return (await self._tokenize_prompt_inputs(
+            request,
+            tokenizer,
+            [prompt_input],
+            truncate_prompt_tokens=truncate_prompt_tokens,
+            add_special_tokens=add_special_tokens,
+        ))[0]
+
+    async def _tokenize_prompt_inputs(
         self,
         request: AnyRequest,
         tokenizer: AnyTokenizer,
         prompt_inputs: Iterable[Union[str, List[int]]],
         truncate_prompt_tokens: Optional[Annotated[int, Field(ge=1)]] = None,
         add_special_tokens: bool = True,
-    ) -> Iterator[TextTokensPrompt]:
+    ) -> List[TextTokensPrompt]:
         """
         A simpler implementation of :meth:`_tokenize_prompt_input_or_inputs`
         that assumes multiple inputs.
         """
-        for text in prompt_inputs:
+        def normalize(text: Union[str, List[int]]):
             if isinstance(text, str):
-                yield self._normalize_prompt_text_to_input(
+                return self._normalize_prompt_text_to_input(
                     request,
                     tokenizer,
                     prompt=text,
                     truncate_prompt_tokens=truncate_prompt_tokens,
                     add_special_tokens=add_special_tokens,
                 )
-            else:
-                yield self._normalize_prompt_tokens_to_input(
-                    request,
-                    tokenizer,
-                    prompt_ids=text,
-                    truncate_prompt_tokens=truncate_prompt_tokens,
-                )
+            return self._normalize_prompt_tokens_to_input(
+                request,
+                tokenizer,
+                prompt_ids=text,
+                truncate_prompt_tokens=truncate_prompt_tokens,
+            )
 
-    def _tokenize_prompt_input_or_inputs(
+        # The inputs are tokenized concurrently, so that the tokenization
+        # executor can encode them in one batch.
+        return list(await asyncio.gather(*map(normalize, prompt_inputs)))
+
+    async def _tokenize_prompt_input_or_inputs(
         self,
         request: AnyRequest,
         tokenizer: AnyTokenizer,
         input_or_inputs: Union[str, List[str], List[int], List[List[int]]],
         truncate_prompt_tokens: Optional[Annotated[int, Field(ge=1)]] = None,
         add_special_tokens: bool = True,
-    ) -> Iterator[TextTokensPrompt]:
+    ) -> List[TextTokensPrompt]:
         """
         Tokenize/detokenize depending on the input format.
         According to `OpenAI API <https://platform.openai.com/docs/api-reference/embeddings/create>`_
         , each input can be a string or array of tokens. Note that each request
         can pass one or more inputs.
         """
-        for prompt_input in parse_and_batch_prompt(input_or_inputs):
-            # Although our type checking is based on mypy,
-            # VSCode Pyright extension should still work properly
-            # "is True" is required for Pyright to perform type narrowing
-            # See: https://github.com/microsoft/pyright/issues/7672
-            if prompt_input["is_tokens"] is False:
-                yield self._normalize_prompt_text_to_input(
-                    request,
-                    tokenizer,
-                    prompt=prompt_input["content"],
-                    truncate_prompt_tokens=truncate_prompt_tokens,
-                    add_special_tokens=add_special_tokens,
-                )
-            else:
-                yield self._normalize_prompt_tokens_to_input(
-                    request,
-                    tokenizer,
-                    prompt_ids=prompt_input["content"],
-                    truncate_prompt_tokens=truncate_prompt_tokens,
-                )
+        return await self._tokenize_prompt_inputs(
+            request,
+            tokenizer,
+            [
+                prompt_input["content"]
+                for prompt_input in parse_and_batch_prompt(input_or_inputs)
+            ],
+            truncate_prompt_tokens=truncate_prompt_tokens,
+            add_special_tokens=add_special_tokens,
+        )
 
     def _log_inputs(
         self,
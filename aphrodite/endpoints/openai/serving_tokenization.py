@@ -71,7 +71,8 @@ class OpenAIServingTokenization(OpenAIServing):
                 logger.warning(
                     "Multi-modal inputs are ignored during tokenization")
 
-            prompt = apply_chat_template(
+            prompt = await self.tokenization_executor.run(
+                apply_chat_template,
                 tokenizer,
                 conversation=conversation,
                 chat_template=self.chat_template,
@@ -88,7 +89,7 @@ class OpenAIServingTokenization(OpenAIServing):
 
         # Silently ignore prompt adapter since it does not affect tokenization
 
-        prompt_input = self._tokenize_prompt_input(
+        prompt_input = await self._tokenize_prompt_input(
             request,
             tokenizer,
             prompt,
@@ -127,7 +128,7 @@ class OpenAIServingTokenization(OpenAIServing):
             raise NotImplementedError("Prompt adapter is not supported "
                                       "for tokenization")
 
-        prompt_input = self._tokenize_prompt_input(
+        prompt_input = await self._tokenize_prompt_input(
             request,
             tokenizer,
             request.tokens,
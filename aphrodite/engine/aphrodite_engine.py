@@ -1,6 +1,9 @@
 import os
 import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
+from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, ClassVar, Dict, Iterable, List, Optional
 from typing import Sequence as GenericSequence
 from typing import Tuple, Type, TypeVar, Union
@@ -22,12 +25,15 @@ from aphrodite.common.sampling_params import SamplingParams
 from aphrodite.common.sequence import (EmbeddingSequenceGroupOutput,
                                        ExecuteModelRequest, PoolerOutput,
                                        SamplerOutput, Sequence, SequenceGroup,
-                                       SequenceGroupMetadata, SequenceStatus)
+                                       SequenceGroupMetadata,
+                                       SequenceGroupOutput, SequenceStatus)
 from aphrodite.common.utils import Counter, Device
 from aphrodite.engine.args_tools import EngineArgs
 from aphrodite.engine.metrics_types import StatLoggerBase, Stats
 from aphrodite.engine.output_processor.interfaces import (
     SequenceGroupOutputProcessor)
+from aphrodite.engine.output_processor.single_step import (
+    SingleStepOutputProcessor)
 from aphrodite.engine.output_processor.stop_checker import StopChecker
 from aphrodite.engine.output_processor.util import (
     create_output_by_sequence_group)
@@ -39,6 +45,8 @@ from aphrodite.inputs import (INPUT_REGISTRY, EncoderDecoderLLMInputs,
 from aphrodite.inputs.parse import is_explicit_encoder_decoder_prompt
 from aphrodite.lora.request import LoRARequest
 from aphrodite.multimodal import MultiModalDataDict
+from aphrodite.processing.kv_disk_cache import (KVDiskCacheIndex,
+                                                get_kv_disk_cache_dir)
 from aphrodite.processing.scheduler import (ScheduledSequenceGroup, Scheduler,
                                             SchedulerOutputs)
 from aphrodite.prompt_adapter.request import PromptAdapterRequest
@@ -69,6 +77,20 @@ def _load_generation_config_dict(model_config: ModelConfig) -> Dict[str, Any]:
 
 _O = TypeVar("_O", RequestOutput, EmbeddingRequestOutput)
 
+
+@dataclass
+class DeferredOutputs:
+    """Model outputs of a step whose tokens have been appended, but that
+    still need detokenization, stop checks and the creation of the request
+    outputs. Used for asynchronous output processing."""
+    scheduled_seq_groups: List[ScheduledSequenceGroup]
+    ignored_seq_groups: List[SequenceGroup]
+    output_by_sequence_group: List[List[SequenceGroupOutput]]
+    # Per scheduled group: None if its output was discarded because it had
+    # already finished, else whether only its tokens were appended.
+    split: List[Optional[bool]]
+
+
 PromptComponents = Tuple[Optional[str], List[int],
                          Optional[MultiModalDataDict]]
 DecoderPromptComponents = Tuple[Optional[str], Optional[List[int]],
@@ -259,6 +281,12 @@ class AphroditeEngine:
         self.input_processor = input_registry.create_input_processor(
             model_config)
 
+        if cache_config.kv_disk_cache_path is not None:
+            # Resolved before the workers are created, so that they all use
+            # the directory of the engine.
+            cache_config.kv_disk_cache_dir = get_kv_disk_cache_dir(
+                cache_config, model_config, parallel_config)
+
         self.model_executor = executor_class(
             model_config=model_config,
             cache_config=cache_config,
@@ -282,9 +310,19 @@ class AphroditeEngine:
         # Create the scheduler.
         # NOTE: the cache_config here have been updated with the numbers of
         # GPU and CPU blocks, which are profiled in the distributed executor.
+        get_prefetching_loras = None
+        if lora_config and lora_config.max_prefetch_loras:
+            get_prefetching_loras = self.model_executor.list_prefetching_loras
+        kv_disk_cache = None
+        if (cache_config.kv_disk_cache_path is not None
+                and not self.model_config.embedding_mode):
+            kv_disk_cache = self._create_kv_disk_cache()
+        # The virtual engines share the LoRA slots of the workers.
+        active_loras: "OrderedDict[int, None]" = OrderedDict()
         self.scheduler = [
             Scheduler(scheduler_config, cache_config, lora_config,
-                      parallel_config.pipeline_parallel_size)
+                      parallel_config.pipeline_parallel_size,
+                      get_prefetching_loras, kv_disk_cache, active_loras)
             for _ in range(parallel_config.pipeline_parallel_size)
         ]
 
@@ -312,6 +350,24 @@ class AphroditeEngine:
                 self.stat_loggers["prometheus"].info("cache_config",
                                                      self.cache_config)
 
+        # Asynchronous output processing: the outputs of a step are
+        # processed in a background thread while the next step is executed.
+        self.async_output_proc = scheduler_config.async_output_proc
+        if self.async_output_proc and (scheduler_config.is_multi_step
+                                       or scheduler_config.num_lookahead_slots
+                                       > 0 or model_config.embedding_mode):
+            logger.warning("Asynchronous output processing is not supported "
+                           "with multi-step scheduling, speculative decoding "
+                           "or embedding models. Disabling it.")
+            self.async_output_proc = False
+        self.deferred_outputs: List[Optional[DeferredOutputs]] = [
+            None
+        ] * parallel_config.pipeline_parallel_size
+        self.output_proc_executor: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=1,
+                               thread_name_prefix="output_proc")
+            if self.async_output_proc else None)
+
         # Create sequence output processor, e.g. for beam search or
         # speculative decoding.
         self.output_processor = (
@@ -347,6 +403,20 @@ class AphroditeEngine:
 
         self.model_executor.initialize_cache(num_gpu_blocks, num_cpu_blocks)
 
+    def _create_kv_disk_cache(self) -> KVDiskCacheIndex:
+        """Create the index of the on-disk KV cache from the blocks that the
+        workers kept after checking their cache layout."""
+        from aphrodite.task_handler.cache_engine import CacheEngine
+        block_size_bytes = CacheEngine.get_cache_block_size(
+            self.cache_config, self.model_config, self.parallel_config)
+        return KVDiskCacheIndex(
+            cache_dir=get_kv_disk_cache_dir(self.cache_config,
+                                            self.model_config,
+                                            self.parallel_config),
+            num_blocks=self.cache_config.kv_disk_cache_size_bytes //
+            block_size_bytes,
+            num_ranks=self.parallel_config.tensor_parallel_size)
+
     @classmethod
     def _get_executor_cls(cls,
                           engine_config: EngineConfig) -> Type[ExecutorBase]:
@@ -1061,14 +1131,17 @@ class AphroditeEngine:
     def has_unfinished_requests(self) -> bool:
         """Returns True if there are unfinished requests."""
         return any(scheduler.has_unfinished_seqs()
-                   for scheduler in self.scheduler)
+                   for scheduler in self.scheduler) or any(
+                       deferred is not None
+                       for deferred in self.deferred_outputs)
 
     def has_unfinished_requests_for_virtual_engine(
             self, virtual_engine: int) -> bool:
         """
         Returns True if there are unfinished requests for the virtual engine.
         """
-        return self.scheduler[virtual_engine].has_unfinished_seqs()
+        return (self.scheduler[virtual_engine].has_unfinished_seqs()
+                or self.deferred_outputs[virtual_engine] is not None)
 
     def _process_sequence_group_outputs(
         self,
@@ -1094,6 +1167,21 @@ class AphroditeEngine:
         Returns RequestOutputs that can be returned to the client.
         """
 
+        if (not self.model_config.embedding_mode
+                and isinstance(self.output_processor,
+                               SingleStepOutputProcessor)):
+            # Append the sampled tokens of all groups first, so that the new
+            # tokens are detokenized in one batch.
+            deferred = self._append_model_outputs(output,
+                                                  scheduled_seq_groups,
+                                                  ignored_seq_groups,
+                                                  seq_group_metadata_list)
+            if deferred is None:
+                return []
+            request_outputs = self._finish_deferred_outputs(deferred)
+            self._free_deferred_seqs(deferred)
+            return request_outputs
+
         now = time.time()
 
         # Organize outputs by [sequence group][step] instead of
@@ -1127,12 +1215,133 @@ class AphroditeEngine:
             seq_group = scheduled_seq_group.seq_group
             seq_group.maybe_set_first_token_time(now)
             request_output = RequestOutputFactory.create(seq_group)
-            request_outputs.append(request_output)
+            if request_output:
+                request_outputs.append(request_output)
         for seq_group in ignored_seq_groups:
             request_output = RequestOutputFactory.create(seq_group)
-            request_outputs.append(request_output)
+            if request_output:
+                request_outputs.append(request_output)
+        return request_outputs
+
+    def _append_model_outputs(
+        self,
+        output: GenericSequence[SamplerOutput],
+        scheduled_seq_groups: List[ScheduledSequenceGroup],
+        ignored_seq_groups: List[SequenceGroup],
+        seq_group_metadata_list: List[SequenceGroupMetadata],
+    ) -> Optional[DeferredOutputs]:
+        """First part of the asynchronous output processing, run before the
+        next step is scheduled. Appends the sampled tokens so that the next
+        step can be scheduled. Groups with more than one sequence are
+        processed completely, since they fork and free sequences.
+
+        Returns the outputs that are left to process with
+        `_finish_deferred_outputs`, or None if there are none.
+        """
+        output_by_sequence_group = create_output_by_sequence_group(
+            output, num_seq_groups=len(scheduled_seq_groups))
+
+        split: List[Optional[bool]] = []
+        for scheduled_seq_group, outputs, seq_group_meta in zip(
+                scheduled_seq_groups, output_by_sequence_group,
+                seq_group_metadata_list):
+            seq_group = scheduled_seq_group.seq_group
+            if seq_group.is_finished():
+                # The group finished or was aborted while this step was
+                # being executed, so its output is stale.
+                split.append(None)
+                continue
+            seq_group.update_num_computed_tokens(
+                scheduled_seq_group.token_chunk_size)
+            if not seq_group_meta.do_sample:
+                split.append(False)
+            elif SingleStepOutputProcessor.can_split_outputs(seq_group):
+                self.output_processor.append_outputs(seq_group, outputs)
+                split.append(True)
+            else:
+                self.output_processor.process_outputs(seq_group, outputs)
+                split.append(False)
+
+        # Free the groups that were processed completely.
+        for scheduler in self.scheduler:
+            scheduler.free_finished_seq_groups()
+
+        if not ignored_seq_groups and all(s is None for s in split):
+            return None
+        return DeferredOutputs(
+            scheduled_seq_groups=scheduled_seq_groups,
+            ignored_seq_groups=ignored_seq_groups,
+            output_by_sequence_group=output_by_sequence_group,
+            split=split)
+
+    def _finish_deferred_outputs(
+            self, deferred: DeferredOutputs) -> List[RequestOutput]:
+        """Second part of the asynchronous output processing, run in the
+        output processing thread while the next step is executed. Must not
+        modify the scheduler state; finished sequences are freed afterwards
+        by `_free_deferred_seqs`.
+
+        Returns RequestOutputs that can be returned to the client.
+        """
+        now = time.time()
+        seq_groups_to_finish: List[SequenceGroup] = []
+        for scheduled_seq_group, outputs, split in zip(
+                deferred.scheduled_seq_groups,
+                deferred.output_by_sequence_group, deferred.split):
+            if split is None:
+                continue
+            seq_group = scheduled_seq_group.seq_group
+            self.output_processor.process_prompt_logprob(seq_group, outputs)
+            if split and not seq_group.is_finished():
+                seq_groups_to_finish.append(seq_group)
+        self.output_processor.finish_appended_outputs(seq_groups_to_finish)
+
+        request_outputs: List[RequestOutput] = []
+        for scheduled_seq_group, split in zip(deferred.scheduled_seq_groups,
+                                              deferred.split):
+            if split is None:
+                continue
+            seq_group = scheduled_seq_group.seq_group
+            seq_group.maybe_set_first_token_time(now)
+            request_output = RequestOutputFactory.create(seq_group)
+            if request_output:
+                request_outputs.append(request_output)
+        for seq_group in deferred.ignored_seq_groups:
+            request_output = RequestOutputFactory.create(seq_group)
+            if request_output:
+                request_outputs.append(request_output)
         return request_outputs
 
+    def _free_deferred_seqs(self, deferred: DeferredOutputs) -> None:
+        """Free the sequences that `_finish_deferred_outputs` found to be
+        finished."""
+        for scheduled_seq_group, split in zip(deferred.scheduled_seq_groups,
+                                              deferred.split):
+            if not split:
+                continue
+            seq = scheduled_seq_group.seq_group.seqs[0]
+            if seq.is_finished():
+                for scheduler in self.scheduler:
+                    scheduler.free_seq(seq)
+        for scheduler in self.scheduler:
+            scheduler.free_finished_seq_groups()
+
+    def _process_model_outputs_async(
+        self,
+        virtual_engine: int,
+        deferred: Optional[DeferredOutputs],
+        output: GenericSequence[SamplerOutput],
+        scheduler_outputs: SchedulerOutputs,
+        seq_group_metadata_list: List[SequenceGroupMetadata],
+    ) -> None:
+        """Apply the outputs of the previous step, which were processed while
+        this step was executed, and append the outputs of this step."""
+        if deferred is not None:
+            self._free_deferred_seqs(deferred)
+        self.deferred_outputs[virtual_engine] = self._append_model_outputs(
+            output, scheduler_outputs.scheduled_seq_groups,
+            scheduler_outputs.ignored_seq_groups, seq_group_metadata_list)
+
     def step(self) -> List[Union[RequestOutput, EmbeddingRequestOutput]]:
         """Performs one decoding iteration and returns newly generated results.
 
@@ -1161,6 +1370,11 @@ class AphroditeEngine:
 
             - Finally, it creates and returns the newly generated results.
 
+            With asynchronous output processing, step 3 only appends the new
+            tokens. Detokenization, stop checks and the creation of the
+            results run in a background thread during the next step, so the
+            results of a step are returned by the following one.
+
         Example:
             >>> # Please see the example/ folder for more detailed examples.
             >>>
@@ -1191,6 +1405,14 @@ class AphroditeEngine:
         seq_group_metadata_list, scheduler_outputs = self.scheduler[
             0].schedule()
 
+        # Process the outputs of the previous step while this one executes.
+        deferred = self.deferred_outputs[0]
+        deferred_future: Optional[Future] = None
+        if deferred is not None:
+            self.deferred_outputs[0] = None
+            deferred_future = self.output_proc_executor.submit(
+                self._finish_deferred_outputs, deferred)
+
         if not scheduler_outputs.is_empty():
             finished_requests_ids = self.scheduler[
                 0].get_and_reset_finished_requests_ids()
@@ -1202,15 +1424,27 @@ class AphroditeEngine:
                 num_lookahead_slots=scheduler_outputs.num_lookahead_slots,
                 running_queue_size=scheduler_outputs.running_queue_size,
                 finished_requests_ids=finished_requests_ids,
+                lora_prefetch_requests=scheduler_outputs.
+                lora_prefetch_requests,
+                disk_blocks_to_save=scheduler_outputs.disk_blocks_to_save,
+                disk_blocks_to_load=scheduler_outputs.disk_blocks_to_load,
+                disk_blocks_to_remove=scheduler_outputs.disk_blocks_to_remove,
             )
             output = self.model_executor.execute_model(
                 execute_model_req=execute_model_req)
         else:
             output = []
 
-        request_outputs = self._process_model_outputs(
-            output, scheduler_outputs.scheduled_seq_groups,
-            scheduler_outputs.ignored_seq_groups, seq_group_metadata_list)
+        if self.async_output_proc:
+            request_outputs = (deferred_future.result()
+                               if deferred_future is not None else [])
+            self._process_model_outputs_async(0, deferred, output,
+                                              scheduler_outputs,
+                                              seq_group_metadata_list)
+        else:
+            request_outputs = self._process_model_outputs(
+                output, scheduler_outputs.scheduled_seq_groups,
+                scheduler_outputs.ignored_seq_groups, seq_group_metadata_list)
 
         # Log stats.
         self.do_log_stats(scheduler_outputs, output)
@@ -1267,6 +1501,14 @@ class AphroditeEngine:
             len(scheduler.swapped) for scheduler in self.scheduler)
         num_waiting_sys = sum(
             len(scheduler.waiting) for scheduler in self.scheduler)
+        num_waiting_per_lora_sys: Dict[str, int] = {}
+        if self.lora_config:
+            for scheduler in self.scheduler:
+                for lora_name, num_waiting in (
+                        scheduler.get_num_waiting_per_lora().items()):
+                    num_waiting_per_lora_sys[lora_name] = (
+                        num_waiting_per_lora_sys.get(lora_name, 0) +
+                        num_waiting)
 
         # KV Cache Usage in %
         num_total_gpu = self.cache_config.num_gpu_blocks
@@ -1305,6 +1547,8 @@ class AphroditeEngine:
         time_per_output_tokens_iter: List[float] = []
         num_preemption_iter = (0 if scheduler_outputs is None else
                                scheduler_outputs.preempted)
+        num_lora_swaps_iter = (0 if scheduler_outputs is None else
+                               scheduler_outputs.num_lora_swaps)
 
         # Request stats
         #   Latency
@@ -1404,6 +1648,7 @@ class AphroditeEngine:
             num_running_sys=num_running_sys,
             num_swapped_sys=num_swapped_sys,
             num_waiting_sys=num_waiting_sys,
+            num_waiting_per_lora_sys=num_waiting_per_lora_sys,
             #   KV Cache Usage in %
             gpu_cache_usage_sys=gpu_cache_usage_sys,
             cpu_cache_usage_sys=cpu_cache_usage_sys,
@@ -1419,6 +1664,7 @@ class AphroditeEngine:
             time_per_output_tokens_iter=time_per_output_tokens_iter,
             spec_decode_metrics=spec_decode_metrics,
             num_preemption_iter=num_preemption_iter,
+            num_lora_swaps_iter=num_lora_swaps_iter,
 
             # Request stats
             #   Latency
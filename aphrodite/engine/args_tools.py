@@ -107,6 +107,9 @@ class EngineArgs:
     kv_cache_dtype: str = "auto"
     block_size: int = 16
     enable_prefix_caching: Optional[bool] = False
+    enable_host_prefix_caching: bool = False
+    kv_disk_cache_path: Optional[str] = None
+    kv_disk_cache_size: float = 16  # GiB
     num_gpu_blocks_override: Optional[int] = None
     disable_sliding_window: bool = False
     gpu_memory_utilization: float = 0.90
@@ -120,6 +123,9 @@ class EngineArgs:
     max_num_batched_tokens: Optional[int] = None
     max_num_seqs: int = 256
     num_scheduler_steps: int = 1
+    scheduling_policy: str = "fcfs"
+    async_output_proc: bool = False
+    cache_aware_admission_window: int = 0
     # Speculative Decoding Options
     num_lookahead_slots: int = 0
     speculative_model: Optional[str] = None
@@ -128,12 +134,14 @@ class EngineArgs:
     speculative_max_model_len: Optional[int] = None
     ngram_prompt_lookup_max: Optional[int] = None
     ngram_prompt_lookup_min: Optional[int] = None
+    ngram_prompt_lookup_corpus: bool = False
     speculative_draft_tensor_parallel_size: Optional[int] = None
     speculative_disable_by_batch_size: Optional[int] = None
     spec_decoding_acceptance_method: str = 'rejection_sampler'
     typical_acceptance_sampler_posterior_threshold: Optional[float] = None
     typical_acceptance_sampler_posterior_alpha: Optional[float] = None
     disable_logprobs_during_spec_decoding: Optional[bool] = None
+    spec_decoding_adaptive_num_tokens: bool = False
     # Adapter Options
     enable_lora: bool = False
     max_loras: int = 1
@@ -141,6 +149,8 @@ class EngineArgs:
     lora_extra_vocab_size: int = 256
     lora_dtype: str = "auto"
     max_cpu_loras: Optional[int] = None
+    max_prefetch_loras: int = 0
+    lora_affinity_timeout: float = 0.0
     long_lora_scaling_factors: Optional[Tuple[float]] = None
     fully_sharded_loras: bool = False
     qlora_adapter_name_or_path: Optional[str] = None
@@ -291,7 +301,12 @@ class EngineArgs:
                             "This will be passed to the model loader "
                             "corresponding to the chosen load_format. "
                             "This should be a JSON string that will be "
-                            "parsed into a dictionary.")
+                            "parsed into a dictionary. The default loader "
+                            "reads safetensors files in parallel with "
+                            '\'{"enable_multithread_load": true, '
+                            '"num_threads": 4}\', or only reads the weight '
+                            "shards of each tensor parallel rank with "
+                            '\'{"enable_sliced_load": true}\'.')
         parser.add_argument(
             "--enforce-eager",
             action=StoreBoolean,
@@ -546,6 +561,32 @@ class EngineArgs:
             help="Category: Cache Options\n"
             "Enable automatic prefix caching.",
         )
+        parser.add_argument(
+            "--enable-host-prefix-caching",
+            action="store_true",
+            help="Category: Cache Options\n"
+            "Keep the prefix cache blocks evicted from the GPU in the CPU "
+            "swap space, and swap them back in instead of recomputing them "
+            "on a hit. Requires --enable-prefix-caching.",
+        )
+        parser.add_argument(
+            "--kv-disk-cache-path",
+            type=str,
+            default=EngineArgs.kv_disk_cache_path,
+            help="Category: Cache Options\n"
+            "Directory of a persistent on-disk cache of prefix KV blocks. "
+            "Blocks of reused prompt prefixes are saved there and loaded "
+            "back on prefix cache misses, also across restarts. Requires "
+            "--enable-prefix-caching.",
+        )
+        parser.add_argument(
+            "--kv-disk-cache-size",
+            type=float,
+            default=EngineArgs.kv_disk_cache_size,
+            help="Category: Cache Options\n"
+            "On-disk KV cache size (GiB) per GPU. The least recently used "
+            "blocks are removed beyond it.",
+        )
         parser.add_argument(
             "--num-gpu-blocks-override",
             type=int,
@@ -644,6 +685,36 @@ class EngineArgs:
                             default=1,
                             help=('Maximum number of forward steps per '
                                   'scheduler call.'))
+        parser.add_argument(
+            "--scheduling-policy",
+            type=str,
+            default=EngineArgs.scheduling_policy,
+            choices=["fcfs", "priority", "fair"],
+            help="Category: Scheduler Options\n"
+            "The order in which queued requests are scheduled. 'fcfs' "
+            "schedules in arrival order. 'priority' schedules by the "
+            "request's priority (lower first) and preempts lower-priority "
+            "requests to admit higher-priority ones. 'fair' shares the "
+            "batch fairly between LoRA adapters within a priority level.")
+        parser.add_argument(
+            "--cache-aware-admission-window",
+            type=int,
+            default=EngineArgs.cache_aware_admission_window,
+            help="Category: Scheduler Options\n"
+            "Reorder up to this many requests at the head of the waiting "
+            "queue to admit the requests with the most blocks in the prefix "
+            "cache first, and to hold back requests whose uncached prefix is "
+            "being prefilled by another request so that it is computed once. "
+            "A request is passed over at most this many times. 0 admits "
+            "requests in queue order. Requires --enable-prefix-caching.")
+        parser.add_argument(
+            "--async-output-proc",
+            action="store_true",
+            help="Category: Scheduler Options\n"
+            "Process the outputs of a step (detokenization, stop checks) in a "
+            "background thread while the next step is executed. Outputs are "
+            "returned one step later. Not supported with multi-step "
+            "scheduling or speculative decoding.")
         # Speculative Decoding Options
         parser.add_argument("--num-lookahead-slots",
                             type=int,
@@ -700,6 +771,13 @@ class EngineArgs:
             help="Category: Speculative Decoding Options\n"
             "Min size of window for ngram prompt lookup in speculative "
             "decoding.")
+        parser.add_argument(
+            "--ngram-prompt-lookup-corpus",
+            action="store_true",
+            help="Category: Speculative Decoding Options\n"
+            "If set, ngram prompt lookup also looks up the prompts of the "
+            "other running requests when a sequence has no match in its "
+            "own tokens.")
 
         parser.add_argument(
             "--speculative-draft-tensor-parallel-size",
@@ -760,6 +838,15 @@ class EngineArgs:
             'during speculative decoding reduces latency by skipping logprob '
             'calculation in proposal sampling, target sampling, and after '
             'accepted tokens are determined.')
+        parser.add_argument(
+            '--spec-decoding-adaptive-num-tokens',
+            action='store_true',
+            help='Category: Speculative Decoding Options\n'
+            'If set, the number of speculative tokens of each step is chosen '
+            'from the rolling acceptance rate of the sequences in the batch '
+            'and the measured proposal and scoring times, up to '
+            '--num-speculative-tokens. Speculation is reduced as the batch '
+            'grows, and may be skipped for a step.')
         # Adapter Options
         parser.add_argument(
             "--enable-lora",
@@ -808,6 +895,26 @@ class EngineArgs:
                   "Must be >= than max_num_seqs. "
                   "Defaults to max_num_seqs."),
         )
+        parser.add_argument(
+            "--max-prefetch-loras",
+            type=int,
+            default=EngineArgs.max_prefetch_loras,
+            help=("Category: Adapter Options\n"
+                  "Maximum number of LoRAs of waiting requests to load into "
+                  "CPU memory in the background. Requests whose LoRA is "
+                  "still being loaded are skipped by the scheduler instead "
+                  "of blocking the batch. 0 disables prefetching."),
+        )
+        parser.add_argument(
+            "--lora-affinity-timeout",
+            type=float,
+            default=EngineArgs.lora_affinity_timeout,
+            help=("Category: Adapter Options\n"
+                  "Maximum time in seconds that the scheduler holds back a "
+                  "waiting request whose LoRA would evict an active LoRA "
+                  "from the GPU, in favor of requests whose LoRA is "
+                  "already active. 0 disables LoRA-affinity scheduling."),
+        )
         parser.add_argument(
             "--long-lora-scaling-factors",
             type=str,
@@ -931,6 +1038,9 @@ class EngineArgs:
             sliding_window=model_config.get_sliding_window(),
             enable_prefix_caching=self.enable_prefix_caching,
             cpu_offload_gb=self.cpu_offload_gb,
+            enable_host_prefix_caching=self.enable_host_prefix_caching,
+            kv_disk_cache_path=self.kv_disk_cache_path,
+            kv_disk_cache_size=self.kv_disk_cache_size,
         )
 
         parallel_config = ParallelConfig(
@@ -990,6 +1100,31 @@ class EngineArgs:
                 "Enabled BlockSpaceManagerV2 because it is "
                 "required for multi-step scheduling.")
 
+        if self.enable_host_prefix_caching and not self.use_v2_block_manager:
+            self.use_v2_block_manager = True
+            logger.warning(
+                "Enabled BlockSpaceManagerV2 because it is "
+                "required for host prefix caching.")
+
+        if (self.cache_aware_admission_window > 0
+                and not self.enable_prefix_caching):
+            raise ValueError("Cache-aware admission requires "
+                             "--enable-prefix-caching.")
+
+        if (self.cache_aware_admission_window > 0
+                and not self.use_v2_block_manager):
+            self.use_v2_block_manager = True
+            logger.warning(
+                "Enabled BlockSpaceManagerV2 because it is "
+                "required for cache-aware admission.")
+
+        if (self.kv_disk_cache_path is not None
+                and not self.use_v2_block_manager):
+            self.use_v2_block_manager = True
+            logger.warning(
+                "Enabled BlockSpaceManagerV2 because it is "
+                "required for the KV disk cache.")
+
         speculative_config = SpeculativeConfig.maybe_create_spec_config(
             target_model_config=model_config,
             target_parallel_config=parallel_config,
@@ -1008,6 +1143,7 @@ class EngineArgs:
             disable_log_stats=self.disable_log_stats,
             ngram_prompt_lookup_max=self.ngram_prompt_lookup_max,
             ngram_prompt_lookup_min=self.ngram_prompt_lookup_min,
+            ngram_prompt_lookup_corpus=self.ngram_prompt_lookup_corpus,
             draft_token_acceptance_method=\
                 self.spec_decoding_acceptance_method,
             typical_acceptance_sampler_posterior_threshold=self.
@@ -1015,6 +1151,8 @@ class EngineArgs:
             typical_acceptance_sampler_posterior_alpha=self.
             typical_acceptance_sampler_posterior_alpha,
             disable_logprobs=self.disable_logprobs_during_spec_decoding,
+            adaptive_num_speculative_tokens=self.
+            spec_decoding_adaptive_num_tokens,
         )
 
         if self.num_scheduler_steps > 1:
@@ -1047,6 +1185,9 @@ class EngineArgs:
             num_scheduler_steps=self.num_scheduler_steps,
             send_delta_data=(APHRODITE_USE_RAY_SPMD_WORKER and
                              parallel_config.use_ray),
+            scheduling_policy=self.scheduling_policy,
+            async_output_proc=self.async_output_proc,
+            cache_aware_admission_window=self.cache_aware_admission_window,
         )
 
         if not HAS_TRITON and self.enable_lora:
@@ -1060,7 +1201,10 @@ class EngineArgs:
             long_lora_scaling_factors=self.long_lora_scaling_factors,
             lora_dtype=self.lora_dtype,
             max_cpu_loras=self.max_cpu_loras if self.max_cpu_loras
-            and self.max_cpu_loras > 0 else None) if self.enable_lora else None
+            and self.max_cpu_loras > 0 else None,
+            max_prefetch_loras=self.max_prefetch_loras,
+            lora_affinity_timeout=self.lora_affinity_timeout,
+        ) if self.enable_lora else None
 
         if self.qlora_adapter_name_or_path is not None and \
             self.qlora_adapter_name_or_path != "":
@@ -307,6 +307,15 @@ class _AsyncAphrodite(AphroditeEngine):
         assert seq_group_metadata_list is not None
         assert scheduler_outputs is not None
 
+        # Process the outputs of the previous step while this one executes.
+        deferred = self.deferred_outputs[virtual_engine]
+        deferred_future: Optional[asyncio.Future] = None
+        if deferred is not None:
+            self.deferred_outputs[virtual_engine] = None
+            deferred_future = asyncio.get_running_loop().run_in_executor(
+                self.output_proc_executor, self._finish_deferred_outputs,
+                deferred)
+
         if not scheduler_outputs.is_empty():
             finished_requests_ids = self.scheduler[
                 virtual_engine].get_and_reset_finished_requests_ids()
@@ -325,6 +334,11 @@ class _AsyncAphrodite(AphroditeEngine):
                 num_lookahead_slots=scheduler_outputs.num_lookahead_slots,
                 running_queue_size=scheduler_outputs.running_queue_size,
                 finished_requests_ids=finished_requests_ids,
+                lora_prefetch_requests=scheduler_outputs.
+                lora_prefetch_requests,
+                disk_blocks_to_save=scheduler_outputs.disk_blocks_to_save,
+                disk_blocks_to_load=scheduler_outputs.disk_blocks_to_load,
+                disk_blocks_to_remove=scheduler_outputs.disk_blocks_to_remove,
                 # We use ExecuteModelRequest to pass the last sampled_token_ids
                 # to each of the non-last PP stages for in-place prepare_input.
                 last_sampled_token_ids=last_sampled_token_ids)
@@ -338,6 +352,15 @@ class _AsyncAphrodite(AphroditeEngine):
         else:
             output = []
 
+        if self.async_output_proc:
+            request_outputs = (await deferred_future
+                               if deferred_future is not None else [])
+            self._process_model_outputs_async(virtual_engine, deferred,
+                                              output, scheduler_outputs,
+                                              seq_group_metadata_list)
+            self.do_log_stats(scheduler_outputs, output)
+            return request_outputs
+
         # Finish the current step for all the sequence groups.
         if self.scheduler_config.is_multi_step:
             for seq_group in seq_group_metadata_list:
@@ -983,7 +1006,9 @@ class AsyncAphrodite:
 
         Yields:
             The output `RequestOutput` objects from the AphroditeEngine
-            for the request.
+            for the request. Depending on `sampling_params.output_kind`,
+            each holds the whole output so far, only what was generated
+            since the previous one, or only the final output is yielded.
 
         Details:
             - If the engine is not running, start the background loop,
@@ -1,6 +1,7 @@
+import os
 from typing import TYPE_CHECKING
 from typing import Counter as CollectionsCounter
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Set, Union
 
 import numpy as np
 import prometheus_client
@@ -34,6 +35,7 @@ class Metrics:
     details on limitations.
     """
     labelname_finish_reason = "finished_reason"
+    labelname_lora_name = "lora_name"
     _gauge_cls = prometheus_client.Gauge
     _counter_cls = prometheus_client.Counter
     _histogram_cls = prometheus_client.Histogram
@@ -59,6 +61,12 @@ class Metrics:
             documentation="Number of requests swapped to CPU.",
             labelnames=labelnames,
             multiprocess_mode="sum")
+        self.gauge_scheduler_waiting_per_lora = self._gauge_cls(
+            name="aphrodite:num_requests_waiting_per_lora",
+            documentation="Number of requests waiting to be processed, "
+            "per LoRA adapter.",
+            labelnames=labelnames + [Metrics.labelname_lora_name],
+            multiprocess_mode="sum")
         #   KV Cache Usage in %
         self.gauge_gpu_cache_usage = self._gauge_cls(
             name="aphrodite:gpu_cache_usage_perc",
@@ -88,6 +96,11 @@ class Metrics:
             name="aphrodite:num_preemptions_total",
             documentation="Cumulative number of preemption from the engine.",
             labelnames=labelnames)
+        self.counter_num_lora_swaps = self._counter_cls(
+            name="aphrodite:lora_activation_swaps_total",
+            documentation="Cumulative number of active LoRA adapters evicted "
+            "from the GPU to activate another adapter.",
+            labelnames=labelnames)
         self.counter_prompt_tokens = self._counter_cls(
             name="aphrodite:prompt_tokens_total",
             documentation="Number of prefill tokens processed.",
@@ -221,6 +234,10 @@ class _RayGaugeWrapper:
     def set(self, value: Union[int, float]):
         return self._gauge.set(value)
 
+    def remove(self, *labelvalues):
+        # Ray metrics cannot remove the series of a set of tags.
+        pass
+
 
 class _RayCounterWrapper:
     """Wraps around ray.util.metrics.Counter to provide same API as
@@ -404,6 +421,8 @@ class PrometheusStatLogger(StatLoggerBase):
         self.labels = labels
         self.metrics = self._metrics_cls(labelnames=list(labels.keys()),
                                          max_model_len=max_model_len)
+        # LoRAs whose number of waiting requests was last logged as non-zero.
+        self._waiting_lora_names: Set[str] = set()
 
     def _log_gauge(self, gauge, data: Union[int, float]) -> None:
         # Convenience function for logging to gauge.
@@ -425,6 +444,23 @@ class PrometheusStatLogger(StatLoggerBase):
         for datum in data:
             histogram.labels(**self.labels).observe(datum)
 
+    def _log_gauge_labels(self, gauge, data: Dict[str, int], label_key: str,
+                          logged_labels: Set[str]) -> Set[str]:
+        # Convenience function for logging a gauge per label, label_key being
+        # the last label name of the gauge. The series of the logged_labels
+        # that are no longer in data are removed. Returns the logged labels.
+        for label in logged_labels - data.keys():
+            labels = {**self.labels, label_key: label}
+            # The multiprocess mode cannot remove a series and keeps
+            # reporting its last value.
+            gauge.labels(**labels).set(0)
+            if ("PROMETHEUS_MULTIPROC_DIR" not in os.environ
+                    and "prometheus_multiproc_dir" not in os.environ):
+                gauge.remove(*labels.values())
+        for label, value in data.items():
+            gauge.labels(**{**self.labels, label_key: label}).set(value)
+        return set(data)
+
     def _log_prometheus(self, stats: Stats) -> None:
         # System state data
         self._log_gauge(self.metrics.gauge_scheduler_running,
@@ -433,6 +469,10 @@ class PrometheusStatLogger(StatLoggerBase):
                         stats.num_swapped_sys)
         self._log_gauge(self.metrics.gauge_scheduler_waiting,
                         stats.num_waiting_sys)
+        self._waiting_lora_names = self._log_gauge_labels(
+            self.metrics.gauge_scheduler_waiting_per_lora,
+            stats.num_waiting_per_lora_sys, Metrics.labelname_lora_name,
+            self._waiting_lora_names)
         self._log_gauge(self.metrics.gauge_gpu_cache_usage,
                         stats.gpu_cache_usage_sys)
         self._log_gauge(self.metrics.gauge_cpu_cache_usage,
@@ -445,6 +485,8 @@ class PrometheusStatLogger(StatLoggerBase):
         # Iteration level data
         self._log_counter(self.metrics.counter_num_preemption,
                           stats.num_preemption_iter)
+        self._log_counter(self.metrics.counter_num_lora_swaps,
+                          stats.num_lora_swaps_iter)
         self._log_counter(self.metrics.counter_prompt_tokens,
                           stats.num_prompt_tokens_iter)
         self._log_counter(self.metrics.counter_generation_tokens,
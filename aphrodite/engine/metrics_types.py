@@ -10,7 +10,7 @@ do this in Python code and lazily import prometheus_client.
 """
 import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Protocol
 
 from aphrodite.spec_decode.metrics import SpecDecodeWorkerMetrics
@@ -47,6 +47,9 @@ class Stats:
     n_requests: List[int]
     finished_reason_requests: List[str]
     spec_decode_metrics: Optional["SpecDecodeWorkerMetrics"] = None
+    #   LoRA scheduling
+    num_waiting_per_lora_sys: Dict[str, int] = field(default_factory=dict)
+    num_lora_swaps_iter: int = 0
 class SupportsMetricsInfo(Protocol):
     def metrics_info(self) -> Dict[str, str]:
         ...
@@ -75,26 +75,59 @@ class SingleStepOutputProcessor(SequenceGroupOutputProcessor):
                     position_offset=len(seq_group.prompt_logprobs))
             seq_group.prompt_logprobs.extend(prompt_logprobs)
 
-    def _process_sequence_group_outputs(self, seq_group: SequenceGroup,
-                                        outputs: SequenceGroupOutput) -> None:
+    @staticmethod
+    def can_split_outputs(seq_group: SequenceGroup) -> bool:
+        """Whether the outputs of seq_group can be processed in two parts
+        with `append_outputs` and `finish_appended_outputs`. This is only
+        possible for single-sequence groups, which never fork or free
+        sequences based on the sampled tokens."""
         sampling_params = seq_group.sampling_params
-        if sampling_params.n == 1 and not sampling_params.use_beam_search:
-            # only have one output sample
-            sample = outputs.samples[0]
-            # only have one sequence
-            seq = seq_group.seqs[0]
-            seq.append_token_id(sample.output_token, sample.logprobs)
-            if sampling_params.detokenize and self.detokenizer:
-                new_char_count = self.detokenizer.decode_sequence_inplace(
-                    seq, sampling_params)
-            else:
-                new_char_count = 0
+        return sampling_params.n == 1 and not sampling_params.use_beam_search
+
+    def append_outputs(self, seq_group: SequenceGroup,
+                       outputs: List[SequenceGroupOutput]) -> None:
+        """Append the new token of a single-sequence group, without
+        detokenizing it or checking the stop conditions."""
+        assert len(outputs) == 1, ("Single step should only has 1 output.")
+        # only have one output sample
+        sample = outputs[0].samples[0]
+        # only have one sequence
+        seq = seq_group.seqs[0]
+        seq.append_token_id(sample.output_token, sample.logprobs)
+
+    def finish_appended_outputs(self,
+                                seq_groups: List[SequenceGroup]) -> None:
+        """Detokenize the tokens appended by `append_outputs` and mark the
+        sequences that meet a stop condition as finished. The new tokens of
+        all groups are detokenized in one batch. Finished sequences are not
+        freed in the scheduler; this is left to the caller."""
+        new_char_counts = [0] * len(seq_groups)
+        if self.detokenizer:
+            indices = [
+                i for i, seq_group in enumerate(seq_groups)
+                if seq_group.sampling_params.detokenize
+            ]
+            char_counts = self.detokenizer.decode_sequences_inplace([
+                (seq_groups[i].seqs[0], seq_groups[i].sampling_params)
+                for i in indices
+            ])
+            for i, new_char_count in zip(indices, char_counts):
+                new_char_counts[i] = new_char_count
+        for seq_group, new_char_count in zip(seq_groups, new_char_counts):
             self.stop_checker.maybe_stop_sequence(
-                seq,
+                seq_group.seqs[0],
                 new_char_count,
-                sampling_params,
+                seq_group.sampling_params,
                 lora_req=seq_group.lora_request,
             )
+
+    def _process_sequence_group_outputs(self, seq_group: SequenceGroup,
+                                        outputs: SequenceGroupOutput) -> None:
+        sampling_params = seq_group.sampling_params
+        if self.can_split_outputs(seq_group):
+            self.append_outputs(seq_group, [outputs])
+            self.finish_appended_outputs([seq_group])
+            seq = seq_group.seqs[0]
             if seq.is_finished():
                 for scheduler in self.scheduler:
                     scheduler.free_seq(seq)
@@ -1,4 +1,4 @@
-from typing import Callable, Optional
+from typing import Callable, Optional, Tuple
 
 from transformers import PreTrainedTokenizer
 
@@ -40,6 +40,14 @@ class StopChecker:
            sequence's output text for the newly generated token
         """
 
+        # The stop strings and stop token sequences are matched
+        # incrementally, so the matchers must see all the output, including
+        # the output generated before min_tokens.
+        stop_str_match = self._match_stop_strings(seq, new_char_count,
+                                                  sampling_params)
+        stop_token_sequence = self._match_stop_token_sequences(
+            seq, sampling_params)
+
         # Check if the minimum number of tokens has been generated yet;
         # skip the stop string/token checks if not
         if seq.get_output_len() < sampling_params.min_tokens:
@@ -68,10 +76,18 @@ class StopChecker:
             seq.stop_reason = last_token_id
             return
 
+        # Check if a stop token sequence was encountered. The output text
+        # contains the stop token sequence.
+        if stop_token_sequence:
+            seq.status = SequenceStatus.FINISHED_STOPPED
+            seq.stop_reason = last_token_id
+            return
+
         # Check if any stop strings are matched.
-        stop_str = self._check_stop_strings(seq, new_char_count,
-                                            sampling_params)
-        if stop_str is not None:
+        if stop_str_match is not None:
+            stop_str, stop_index = stop_str_match
+            self._truncate_stop_string(seq, stop_str, stop_index,
+                                       sampling_params)
             seq.status = SequenceStatus.FINISHED_STOPPED
             seq.stop_reason = stop_str
             return
@@ -87,33 +103,47 @@ class StopChecker:
             return
 
     @staticmethod
-    def _check_stop_strings(seq: Sequence, new_char_count: int,
-                            sampling_params: SamplingParams) -> Optional[str]:
-        """Check if any stop strings are matched and truncate sequence
-        output text accordingly.
-
-        Returns the stop string if matched or else None.
+    def _match_stop_strings(
+            seq: Sequence, new_char_count: int,
+            sampling_params: SamplingParams) -> Optional[Tuple[str, int]]:
+        """Feed the new output text to the stop string matcher of the
+        sequence.
+
+        Returns the stop string that ends first in the new text and its index
+        in the output text, or None if there is none. Stop strings that end
+        at the same character are chosen in the order of the stop list.
         """
-        if not new_char_count:
+        matcher = sampling_params.stop_string_matcher
+        if not new_char_count or matcher is None:
             return None
 
-        for stop_str in sampling_params.stop:
-            stop_string_len = len(stop_str)
-            # Avoid searching already-searched text.
-            stop_index = seq.output_text.find(
-                stop_str, -new_char_count - stop_string_len)
-            if stop_index == -1:
-                continue
-
-            if sampling_params.include_stop_str_in_output:
-                # Truncate to end of stop string.
-                stop_index += stop_string_len
-                if stop_index >= len(seq.output_text):
-                    # No truncation required.
-                    return stop_str
-
-            # Truncate the output text to either the beginning
-            # or end of the stop string.
-            seq.output_text = seq.output_text[:stop_index]
-            return stop_str
-        return None
+        new_text_index = len(seq.output_text) - new_char_count
+        seq.stop_str_match_state, match = matcher.feed(
+            seq.stop_str_match_state, seq.output_text[new_text_index:])
+        if match is None:
+            return None
+        end_index, stop_str_index = match
+        stop_str = sampling_params.stop[stop_str_index]
+        return stop_str, new_text_index + end_index + 1 - len(stop_str)
+
+    @staticmethod
+    def _match_stop_token_sequences(seq: Sequence,
+                                    sampling_params: SamplingParams) -> bool:
+        """Feed the new token to the stop token sequence matcher of the
+        sequence. Returns whether a stop token sequence ends with it."""
+        matcher = sampling_params.stop_token_sequence_matcher
+        if matcher is None:
+            return False
+
+        seq.stop_token_sequence_match_state, match = matcher.feed(
+            seq.stop_token_sequence_match_state, (seq.get_last_token_id(), ))
+        return match is not None
+
+    @staticmethod
+    def _truncate_stop_string(seq: Sequence, stop_str: str, stop_index: int,
+                              sampling_params: SamplingParams) -> None:
+        """Truncate the output text to either the beginning or the end of
+        the matched stop string."""
+        if sampling_params.include_stop_str_in_output:
+            stop_index += len(stop_str)
+        seq.output_text = seq.output_text[:stop_index]
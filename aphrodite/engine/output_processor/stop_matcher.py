@@ -0,0 +1,96 @@
+from collections import deque
+from functools import lru_cache
+from typing import (Dict, Generic, Hashable, Iterable, List, Optional,
+                    Sequence, Tuple, TypeVar)
+
+T = TypeVar("T", bound=Hashable)
+
+# Maximum number of distinct stop lists whose matchers are kept.
+_MAX_CACHED_MATCHERS = 1024
+
+
+class MultiPatternMatcher(Generic[T]):
+    """Aho-Corasick automaton that finds any of a set of patterns in a
+    stream of symbols, e.g. the characters of the output text or the output
+    token ids.
+
+    The state of a stream is a single int, so that the text can be fed
+    incrementally as it is generated; each step only processes the new
+    symbols, independent of the number of patterns.
+    """
+
+    def __init__(self, patterns: Sequence[Sequence[T]]):
+        self.patterns = patterns
+        # Trie transitions, fail links, and for each node the lowest index
+        # of the patterns that end there, including through fail links.
+        self._goto: List[Dict[T, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._match: List[int] = [-1]
+
+        for i, pattern in enumerate(patterns):
+            node = 0
+            for symbol in pattern:
+                next_node = self._goto[node].get(symbol)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._match.append(-1)
+                    self._goto[node][symbol] = next_node
+                node = next_node
+            if self._match[node] == -1:
+                self._match[node] = i
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for symbol, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and symbol not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(symbol, 0)
+                self._fail[child] = fail
+                fail_match = self._match[fail]
+                if fail_match != -1 and (self._match[child] == -1
+                                         or fail_match < self._match[child]):
+                    self._match[child] = fail_match
+
+    def feed(self, state: int,
+             symbols: Iterable[T]) -> Tuple[int, Optional[Tuple[int, int]]]:
+        """Feed the symbols to a stream in the given state. The initial state
+        of a stream is 0.
+
+        Returns the new state, and for the first pattern that ends within
+        the symbols, the index of its last symbol in symbols and the index
+        of the pattern. If several patterns end at the same symbol, the
+        first one in the list of patterns is returned.
+        """
+        goto = self._goto
+        fail = self._fail
+        match = self._match
+        first_match: Optional[Tuple[int, int]] = None
+        for i, symbol in enumerate(symbols):
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            if first_match is None and match[state] != -1:
+                first_match = (i, match[state])
+        return state, first_match
+
+
+@lru_cache(maxsize=_MAX_CACHED_MATCHERS)
+def get_stop_string_matcher(
+        stop: Tuple[str, ...]) -> MultiPatternMatcher[str]:
+    """Get the matcher for a list of stop strings. Matchers are shared by
+    the requests with the same stop strings."""
+    return MultiPatternMatcher(stop)
+
+
+@lru_cache(maxsize=_MAX_CACHED_MATCHERS)
+def get_stop_token_sequence_matcher(
+    stop_token_sequences: Tuple[Tuple[int, ...], ...]
+) -> MultiPatternMatcher[int]:
+    """Get the matcher for a list of stop token sequences. Matchers are
+    shared by the requests with the same stop token sequences."""
+    return MultiPatternMatcher(stop_token_sequences)
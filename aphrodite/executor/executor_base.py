@@ -98,6 +98,11 @@ class ExecutorBase(ABC):
     def pin_lora(self, lora_id: int) -> bool:
         raise NotImplementedError
 
+    def list_prefetching_loras(self) -> Optional[Set[int]]:
+        """List the LoRAs that the workers are still loading in the
+        background, or None if the executor does not track them."""
+        return None
+
     @abstractmethod
     def add_prompt_adapter(
             self, prompt_adapter_request: PromptAdapterRequest) -> bool:
@@ -142,6 +142,9 @@ class GPUExecutor(ExecutorBase):
     def list_loras(self) -> Set[int]:
         return self.driver_worker.list_loras()
 
+    def list_prefetching_loras(self) -> Optional[Set[int]]:
+        return self.driver_worker.list_prefetching_loras()
+
     def pin_lora(self, lora_id: int) -> bool:
         assert lora_id > 0, "lora_id must be greater than 0."
         return self.driver_worker.pin_lora(lora_id)
@@ -2,7 +2,7 @@ import asyncio
 import os
 from collections import defaultdict
 from itertools import islice, repeat
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
 
 import msgspec
 from loguru import logger
@@ -315,6 +315,11 @@ class RayGPUExecutor(DistributedGPUExecutor):
         return self.driver_worker.execute_method("execute_model",
                                                  execute_model_req)
 
+    def list_prefetching_loras(self) -> Optional[Set[int]]:
+        if self.use_ray_spmd_worker:
+            return None
+        return self.driver_worker.execute_method("list_prefetching_loras")
+
     def execute_model(
             self,
             execute_model_req: ExecuteModelRequest) -> List[SamplerOutput]:
@@ -1,7 +1,11 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
 from typing import Any, Dict, List, Literal, Optional, Set, Type, Union
 
 import torch
+import torch.distributed
+from torch.distributed import ProcessGroup
 
 from aphrodite.adapter_commons.utils import (add_adapter_worker,
                                              apply_adapters_worker,
@@ -20,7 +24,12 @@ class WorkerLoRAManager(AbstractWorkerManager):
     """WorkerLoRAManager that manages LoRA models on the worker side.
 
     Every request, the requested LoRAs will be loaded (unless they are already
-    loaded), and every other LoRA will be unloaded."""
+    loaded), and every other LoRA will be unloaded.
+
+    LoRAs of requests that are not scheduled yet can be prefetched: they are
+    loaded from disk into pinned CPU memory by a background thread, up to
+    max_prefetch_loras of them, so that adding them later does not block the
+    model execution."""
 
     _manager_cls: Type[LoRAModelManager] = LoRAModelManager
 
@@ -45,6 +54,13 @@ class WorkerLoRAManager(AbstractWorkerManager):
         self.vocab_size = vocab_size
         self.lora_config = lora_config
         self.max_position_embeddings = max_position_embeddings
+        # LoRAs that are being or have been loaded by the prefetcher, in the
+        # order they were requested.
+        self._prefetched_loras: Dict[int, Future] = OrderedDict()
+        self._prefetch_executor: Optional[ThreadPoolExecutor] = None
+        # LoRAs that other workers of the tensor parallel group were still
+        # prefetching at the last sync.
+        self._group_prefetching_lora_ids: Set[int] = set()
         super().__init__(device)
         # Lazily initialized by create_lora_manager.
         self._adapter_manager: LoRAModelManager
@@ -114,6 +130,73 @@ class WorkerLoRAManager(AbstractWorkerManager):
                              f"{self.lora_config.lora_extra_vocab_size}.")
         return lora
 
+    def _get_adapter(self, lora_request: LoRARequest) -> LoRAModel:
+        """Get the LoRA from the prefetcher, waiting for it if it is still
+        being loaded, or load it if it was not prefetched."""
+        future = self._prefetched_loras.pop(lora_request.lora_int_id, None)
+        if future is None:
+            return self._load_adapter(lora_request)
+        return future.result()
+
+    def prefetch_adapters(self, lora_requests: Set[LoRARequest]) -> None:
+        """Start loading the LoRAs that are not in the CPU cache yet in the
+        background."""
+        max_prefetch_loras = self.lora_config.max_prefetch_loras
+        if not max_prefetch_loras:
+            return
+        lora_ids = {lora_request.lora_int_id for lora_request in lora_requests}
+        registered_lora_ids = self.list_adapters()
+        for lora_request in lora_requests:
+            lora_id = lora_request.lora_int_id
+            if (lora_id in registered_lora_ids
+                    or lora_id in self._prefetched_loras):
+                continue
+            if (len(self._prefetched_loras) >= max_prefetch_loras
+                    and not self._evict_prefetched_adapter(lora_ids)):
+                break
+            if self._prefetch_executor is None:
+                self._prefetch_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="lora_prefetch")
+            self._prefetched_loras[lora_id] = self._prefetch_executor.submit(
+                self._load_adapter, lora_request)
+
+    def _evict_prefetched_adapter(self, keep_lora_ids: Set[int]) -> bool:
+        """Remove the oldest loaded LoRA that is no longer requested from the
+        prefetched LoRAs. Returns False if there is none."""
+        for lora_id, future in self._prefetched_loras.items():
+            if lora_id not in keep_lora_ids and future.done():
+                del self._prefetched_loras[lora_id]
+                return True
+        return False
+
+    def list_prefetching_adapters(self) -> Set[int]:
+        """Get the ids of the LoRAs that are still being prefetched by this
+        worker or, as of the last sync_prefetching_adapters, by any worker
+        of the tensor parallel group."""
+        prefetching_lora_ids = {
+            lora_id
+            for lora_id, future in list(self._prefetched_loras.items())
+            if not future.done()
+        }
+        return prefetching_lora_ids | self._group_prefetching_lora_ids
+
+    def sync_prefetching_adapters(self, lora_ids: List[int],
+                                  group: ProcessGroup) -> None:
+        """Agree with the other workers of the group on which of the LoRAs
+        are still being prefetched by any of them. All the workers of the
+        group must call this with the same LoRAs."""
+        prefetching_lora_ids = self.list_prefetching_adapters()
+        prefetching = torch.tensor(
+            [lora_id in prefetching_lora_ids for lora_id in lora_ids],
+            dtype=torch.int32)
+        torch.distributed.all_reduce(prefetching,
+                                     op=torch.distributed.ReduceOp.MAX,
+                                     group=group)
+        self._group_prefetching_lora_ids = {
+            lora_id
+            for lora_id, flag in zip(lora_ids, prefetching.tolist()) if flag
+        }
+
     def add_dummy_lora(self, lora_request: LoRARequest, rank: int) -> bool:
         if lora_request.lora_int_id in self.list_adapters():
             return False
@@ -142,7 +225,7 @@ class WorkerLoRAManager(AbstractWorkerManager):
 
     def add_adapter(self, adapter_request: Any) -> bool:
         return add_adapter_worker(adapter_request, self.list_adapters,
-                                  self._load_adapter,
+                                  self._get_adapter,
                                   self._adapter_manager.add_adapter,
                                   self._adapter_manager.activate_adapter)
 
@@ -200,7 +283,7 @@ class LRUCacheWorkerLoRAManager(WorkerLoRAManager):
                 assert isinstance(self._adapter_manager,
                                   LRUCacheLoRAModelManager)
                 self._adapter_manager.remove_oldest_adapter()
-            lora = self._load_adapter(lora_request)
+            lora = self._get_adapter(lora_request)
             loaded = self._adapter_manager.add_adapter(lora)
         else:
             # If the lora is already loaded, just touch it to
@@ -10,6 +10,7 @@ from lmformatenforcer.integrations.transformers import (
 from transformers import PreTrainedTokenizerBase
 
 import aphrodite
+from aphrodite.common.sequence import SequenceData
 
 
 class aphroditeLogitsProcessor:
@@ -36,6 +37,23 @@ class aphroditeLogitsProcessor:
         scores = scores + self.mask
         return scores
 
+    def process_batch(self, logits: torch.Tensor, row_indices: List[int],
+                      seq_ids: List[int],
+                      seq_data: List[SequenceData]) -> None:
+        mask = torch.full((len(row_indices), logits.shape[-1]),
+                          -math.inf,
+                          dtype=logits.dtype,
+                          device=logits.device)
+        for i, data in enumerate(seq_data):
+            token_sequence = list(data.output_token_ids)
+            if self.analyzer:
+                self.analyzer.report_raw_logits(
+                    token_sequence, logits[row_indices[i]].tolist())
+            allowed_tokens = self.token_enforcer.get_allowed_tokens(
+                token_sequence)
+            mask[i, allowed_tokens] = 0
+        logits[row_indices] += mask
+
 
 def build_aphrodite_token_enforcer_tokenizer_data(
     tokenizer: Union[aphrodite.LLM, PreTrainedTokenizerBase]
@@ -16,9 +16,10 @@
 import copy
 import json
 import math
-from collections import defaultdict
+from collections import OrderedDict
 from functools import lru_cache
-from typing import Callable, DefaultDict, Dict, List, Union
+from typing import (TYPE_CHECKING, Callable, Dict, Hashable, List, Optional,
+                    Sequence, Tuple, Union)
 
 import torch
 from pydantic import BaseModel
@@ -26,50 +27,167 @@ from transformers import PreTrainedTokenizerBase
 
 from aphrodite.triton_utils import HAS_TRITON
 
+if TYPE_CHECKING:
+    from aphrodite.common.sequence import SequenceData
+
 if HAS_TRITON:
     from outlines.caching import cache
     from outlines.fsm.guide import CFGGuide, Generate, Guide, RegexGuide, Write
     from outlines.fsm.json_schema import build_regex_from_schema
 
 
-class BaseLogitsProcessor:
+# The number of last tokens that are compared to check that a sequence
+# continues the tokens that its FSM state was advanced with.
+_NUM_FINGERPRINT_TOKENS = 4
 
-    def __init__(self, guide: Guide):
-        self._guide: Guide = guide
-        self._fsm_state: DefaultDict[int, int] = defaultdict(int)
+# (FSM state, number of tokens consumed, last tokens consumed)
+_FSMStateEntry = Tuple[int, int, Tuple[int, ...]]
+
+
+class _MaskCache:
+    """LRU cache of the masks of the tokens that are not allowed in an FSM
+    state, shared by all the requests that use the same guide and bounded by
+    the bytes of the masks. Logits processors run in the model runner
+    thread only, so it is not locked."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._num_bytes = 0
+        self._masks: OrderedDict[Hashable, torch.Tensor] = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[torch.Tensor]:
+        mask = self._masks.get(key)
+        if mask is not None:
+            self._masks.move_to_end(key)
+        return mask
+
+    def put(self, key: Hashable, mask: torch.Tensor) -> None:
+        num_bytes = mask.numel() * mask.element_size()
+        if key in self._masks or num_bytes > self.max_bytes:
+            return
+        self._masks[key] = mask
+        self._num_bytes += num_bytes
+        while self._num_bytes > self.max_bytes:
+            _, evicted = self._masks.popitem(last=False)
+            self._num_bytes -= evicted.numel() * evicted.element_size()
 
-    def __call__(self, input_ids: List[int],
-                 scores: torch.Tensor) -> torch.Tensor:
-        """Use the FSM to bias the logits before sampling the next token."""
 
-        seq_id = hash(tuple(input_ids))
+_mask_cache = _MaskCache(max_bytes=64 * 2**20)
 
-        if len(input_ids) > 0:
-            last_token = input_ids[-1]
-            last_seq_id = hash(tuple(input_ids[:-1]))
-            self._fsm_state[seq_id] = self._guide.get_next_state(
-                state=self._fsm_state[last_seq_id], token_id=last_token)
 
-        instruction = self._guide.get_next_instruction(
-            state=self._fsm_state[seq_id])
+class BaseLogitsProcessor:
+
+    # Maximum number of sequences whose FSM states are kept for `__call__`,
+    # which is not given a sequence id.
+    _MAX_CALL_STATES = 64
 
+    def __init__(self, guide: Guide, guide_key: Optional[Hashable] = None):
+        """guide_key identifies the guide across requests, so that they
+        share the cached masks. The masks are not cached without it, e.g.
+        for CFG guides, whose parser keeps its own state."""
+        self._guide: Guide = guide
+        self._guide_key = guide_key
+        # seq_id -> FSM state of the sequence
+        self._seq_states: Dict[int, _FSMStateEntry] = {}
+        # FSM states of the sequences seen by `__call__`, least recently
+        # used first.
+        self._call_states: List[_FSMStateEntry] = []
+
+    def _advance(self, entry: Optional[_FSMStateEntry],
+                 token_ids: Sequence[int]) -> _FSMStateEntry:
+        """Advance the FSM state with the tokens that follow the ones it
+        consumed, or replay all the tokens if they do not continue them."""
+        state, num_consumed = 0, 0
+        if entry is not None and _continues(entry, token_ids):
+            state, num_consumed, _ = entry
+        for token_id in token_ids[num_consumed:]:
+            state = self._guide.get_next_state(state=state, token_id=token_id)
+        return (state, len(token_ids),
+                tuple(token_ids[-_NUM_FINGERPRINT_TOKENS:]))
+
+    def _get_fsm_state(self, seq_id: int, token_ids: Sequence[int]) -> int:
+        """Advance the FSM of `seq_id` with the tokens generated since the
+        previous call."""
+        entry = self._advance(self._seq_states.get(seq_id), token_ids)
+        self._seq_states[seq_id] = entry
+        return entry[0]
+
+    def _get_call_fsm_state(self, token_ids: Sequence[int]) -> int:
+        """Advance the FSM state of the sequence that the tokens continue the
+        most."""
+        best = None
+        for i, entry in enumerate(self._call_states):
+            if _continues(entry, token_ids) and (
+                    best is None or entry[1] > self._call_states[best][1]):
+                best = i
+        entry = self._advance(
+            self._call_states.pop(best) if best is not None else None,
+            token_ids)
+        self._call_states.append(entry)
+        if len(self._call_states) > self._MAX_CALL_STATES:
+            self._call_states.pop(0)
+        return entry[0]
+
+    def _get_mask(self, state: int, logits: torch.Tensor) -> torch.Tensor:
+        key = None
+        if self._guide_key is not None:
+            key = (self._guide_key, state, logits.shape[-1], logits.device)
+            mask = _mask_cache.get(key)
+            if mask is not None:
+                return mask
+
+        instruction = self._guide.get_next_instruction(state=state)
         if type(instruction) == Generate:
             allowed_tokens = instruction.tokens
         elif type(instruction) == Write:
-            # TODO: support fast forward tokens
+            # The tokens of a Write are deterministic, but the engine samples
+            # one token per step, so they are forced one at a time.
             allowed_tokens = [instruction.tokens[0]]
         else:
             raise TypeError(
                 f"Unsupported instruction type {type(instruction)}")
 
-        mask = torch.full((scores.shape[-1], ),
-                          -math.inf,
-                          device=scores.device)
-        mask[allowed_tokens] = 0
-        scores.add_(mask)
+        if allowed_tokens is None:
+            mask = torch.zeros((logits.shape[-1], ),
+                               dtype=torch.bool,
+                               device=logits.device)
+        else:
+            mask = torch.ones((logits.shape[-1], ),
+                              dtype=torch.bool,
+                              device=logits.device)
+            mask[allowed_tokens] = False
+
+        if key is not None:
+            _mask_cache.put(key, mask)
+        return mask
 
+    def __call__(self, input_ids: List[int],
+                 scores: torch.Tensor) -> torch.Tensor:
+        """Use the FSM to bias the logits before sampling the next token."""
+        state = self._get_call_fsm_state(input_ids)
+        scores.masked_fill_(self._get_mask(state, scores), -math.inf)
         return scores
 
+    def process_batch(self, logits: torch.Tensor, row_indices: List[int],
+                      seq_ids: List[int],
+                      seq_data: List["SequenceData"]) -> None:
+        """Use the FSM to bias the logits of all rows of a sequence group."""
+        masks = [
+            self._get_mask(
+                self._get_fsm_state(seq_id, data.output_token_ids_array),
+                logits) for seq_id, data in zip(seq_ids, seq_data)
+        ]
+        logits[row_indices] = logits[row_indices].masked_fill_(
+            torch.stack(masks), -math.inf)
+
+
+def _continues(entry: _FSMStateEntry, token_ids: Sequence[int]) -> bool:
+    """Whether the tokens start with the ones the FSM state consumed, judged
+    by their number and the last of them."""
+    _, num_consumed, tail = entry
+    return (len(token_ids) >= num_consumed and tuple(
+        token_ids[num_consumed - len(tail):num_consumed]) == tail)
+
 
 class RegexLogitsProcessor(BaseLogitsProcessor):
 
@@ -92,7 +210,8 @@ class RegexLogitsProcessor(BaseLogitsProcessor):
 
         """
         super().__init__(
-            RegexLogitsProcessor._get_guide(regex_string, tokenizer))
+            RegexLogitsProcessor._get_guide(regex_string, tokenizer),
+            guide_key=(regex_string, tokenizer.name_or_path, len(tokenizer)))
 
 
 class JSONLogitsProcessor(RegexLogitsProcessor):
@@ -136,6 +136,11 @@ class UnquantizedLinearMethod(LinearMethodBase):
 class LinearBase(torch.nn.Module):
     """Base linear layer.
 
+    The weight loaders of the tensor parallel layers narrow the loaded
+    weights to the shard of their rank before any other use. The narrowed
+    range is all that is read of a lazily loaded weight (see
+    LazySafetensorsWeight).
+
     Args:
         input_size: input dimension of the linear layer.
         output_size: output dimension of the linear layer.
@@ -1,6 +1,7 @@
 """A layer that compute logits from hidden_stats."""
 import inspect
-from typing import Optional
+import weakref
+from typing import Any, List, Optional, Tuple
 
 import torch
 import torch.nn as nn
@@ -113,6 +114,25 @@ def _prune_hidden_states(
                                       sampling_metadata.selected_token_indices)
 
 
+# Number of parameters of each per-row logits processor, so that
+# `inspect.signature` is not called for every row on every step.
+_num_parameters_cache: "weakref.WeakKeyDictionary[Any, int]" = (
+    weakref.WeakKeyDictionary())
+
+
+def _get_num_parameters(logits_processor: Any) -> int:
+    try:
+        return _num_parameters_cache[logits_processor]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable or not weak-referenceable, can't be cached.
+        return len(inspect.signature(logits_processor).parameters)
+    num_parameters = len(inspect.signature(logits_processor).parameters)
+    _num_parameters_cache[logits_processor] = num_parameters
+    return num_parameters
+
+
 def _apply_logits_processors(
     logits: torch.Tensor,
     sampling_metadata: SamplingMetadata,
@@ -127,23 +147,33 @@ def _apply_logits_processors(
         if logits_processors:
             found_logits_processors = True
 
-            for seq_id, logits_row_idx in zip(seq_ids,
-                                              seq_group.sample_indices):
-                logits_row = logits[logits_row_idx]
-                past_tokens_ids = seq_group.seq_data[seq_id].output_token_ids
-                prompt_tokens_ids = seq_group.seq_data[seq_id].prompt_token_ids
-
-                for logits_processor in logits_processors:
-                    parameters = inspect.signature(logits_processor).parameters
-                    if len(parameters) == 3:
-                        logits_row = logits_processor(prompt_tokens_ids,
-                                                      past_tokens_ids,
-                                                      logits_row)
+        if logits_processors and seq_group.sample_indices:
+            row_indices = seq_group.sample_indices
+            seq_data = [seq_group.seq_data[seq_id] for seq_id in seq_ids]
+            # Only built if a processor without `process_batch` needs them.
+            past_tokens_ids: Optional[List[Tuple[int, ...]]] = None
+
+            for logits_processor in logits_processors:
+                process_batch = getattr(logits_processor, "process_batch",
+                                        None)
+                if process_batch is not None:
+                    process_batch(logits, row_indices, seq_ids, seq_data)
+                    continue
+
+                if past_tokens_ids is None:
+                    past_tokens_ids = [
+                        data.output_token_ids for data in seq_data
+                    ]
+                num_parameters = _get_num_parameters(logits_processor)
+                for data, past_tokens, logits_row_idx in zip(
+                        seq_data, past_tokens_ids, row_indices):
+                    logits_row = logits[logits_row_idx]
+                    if num_parameters == 3:
+                        logits_row = logits_processor(data.prompt_token_ids,
+                                                      past_tokens, logits_row)
                     else:
-                        logits_row = logits_processor(past_tokens_ids,
-                                                      logits_row)
-
-                logits[logits_row_idx] = logits_row
+                        logits_row = logits_processor(past_tokens, logits_row)
+                    logits[logits_row_idx] = logits_row
 
         logits_processed += len(seq_group.sample_indices) + len(
             seq_group.prompt_logprob_indices)
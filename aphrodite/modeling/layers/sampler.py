@@ -15,12 +15,15 @@ from aphrodite.common.sampling_params import SamplingType
 from aphrodite.common.sequence import (CompletionSequenceGroupOutput, Logprob,
                                        PromptLogprobs, SampleLogprobs,
                                        SamplerOutput, SequenceOutput)
+from aphrodite.distributed import (get_pp_group,
+                                   model_parallel_is_initialized)
 from aphrodite.triton_utils import HAS_TRITON
 
 if HAS_TRITON:
     from aphrodite.modeling.layers.ops.sample import sample as sample_triton
 
-from aphrodite.modeling.sampling_metadata import (SamplingMetadata,
+from aphrodite.modeling.sampling_metadata import (PersistentSamplingState,
+                                                  SamplingMetadata,
                                                   SamplingTensors,
                                                   SequenceGroupToSample)
 
@@ -37,6 +40,12 @@ _TEMPERATURE_MINIMUM = 2e-5
 APHRODITE_USE_SAMPLING_KERNELS = bool(int(
     os.getenv("APHRODITE_USE_SAMPLING_KERNELS", "0")))
 
+# If enabled, the sampler keeps per-sequence state across decode steps:
+# sampling tensors are reused while the decode batch is unchanged, and
+# penalties use a persistent token histogram that is updated incrementally.
+APHRODITE_PERSISTENT_SAMPLING_STATE = bool(int(
+    os.getenv("APHRODITE_PERSISTENT_SAMPLING_STATE", "0")))
+
 
 class SamplerID(IntEnum):
     # Mirror these in aphrodite/common/sampling_params.py
@@ -88,6 +97,10 @@ class Sampler(nn.Module):
         self.include_gpu_probs_tensor = False
         self.should_modify_greedy_probs_inplace = False
 
+        # Only used with APHRODITE_PERSISTENT_SAMPLING_STATE.
+        self._sampling_state: Optional[PersistentSamplingState] = None
+        self._sampling_batch_key: Optional[Tuple] = None
+
     def _init_sampling_tensors(
         self,
         logits: torch.Tensor,
@@ -110,7 +123,8 @@ class Sampler(nn.Module):
          do_epsilon_cutoffs, do_typical_ps, do_quadratic, do_xtc, do_nsigmas,
          do_dry, do_skew, do_temp_last
          ) = SamplingTensors.from_sampling_metadata(
-             sampling_metadata, vocab_size, logits.device, logits.dtype)
+             sampling_metadata, vocab_size, logits.device, logits.dtype,
+             histogram_penalties=APHRODITE_PERSISTENT_SAMPLING_STATE)
 
         self._sampling_tensors = sampling_tensors
         self._do_penalties = do_penalties
@@ -130,6 +144,21 @@ class Sampler(nn.Module):
         self._do_skew = do_skew
         self._do_temp_last = do_temp_last
 
+    def _get_sampling_state(
+            self, logits: torch.Tensor) -> PersistentSamplingState:
+        _, vocab_size = logits.shape
+        state = self._sampling_state
+        if (state is None or state.vocab_size != vocab_size
+                or state.device != logits.device):
+            # With pipeline parallelism, the batches of the other virtual
+            # engines run in between the batches of a sequence.
+            max_idle_updates = (get_pp_group().world_size - 1
+                                if model_parallel_is_initialized() else 0)
+            state = PersistentSamplingState(vocab_size, logits.device,
+                                            max_idle_updates)
+            self._sampling_state = state
+        return state
+
     def forward(
         self,
         logits: torch.Tensor,
@@ -144,9 +173,21 @@ class Sampler(nn.Module):
         _, vocab_size = logits.shape
 
         # Prepare sampling tensors with pinned memory to avoid blocking.
-        if not sampling_metadata.reuse_sampling_tensors:
+        reuse_sampling_tensors = sampling_metadata.reuse_sampling_tensors
+        if APHRODITE_PERSISTENT_SAMPLING_STATE:
+            # The sampling parameters of a request never change, so an
+            # unchanged decode batch can reuse the previous tensors.
+            batch_key = PersistentSamplingState.get_batch_key(
+                sampling_metadata)
+            reuse_sampling_tensors |= (
+                batch_key is not None
+                and batch_key == self._sampling_batch_key
+                and self._sampling_tensors.temperatures.dtype == logits.dtype)
+            self._sampling_batch_key = batch_key
+        if not reuse_sampling_tensors:
             self._init_sampling_tensors(logits, sampling_metadata)
-        elif self._do_penalties or self._do_dry:
+        elif self._do_dry or (self._do_penalties and
+                              not APHRODITE_PERSISTENT_SAMPLING_STATE):
             # In this case, the sampling tensors logic depends on
             # "output_tokens" of a sequence. As a result, we cannot
             # reuse sampling tensors, since "output_tokens" changes
@@ -268,12 +309,24 @@ class Sampler(nn.Module):
                         f"pres_pen: {sampling_tensors.presence_penalties}, "
                         f"freq_pen: {sampling_tensors.frequency_penalties}, "
                         f"rep_pen: {sampling_tensors.repetition_penalties}.")
-                logits = _apply_penalties(
-                    logits, sampling_tensors.prompt_tokens,
-                    sampling_tensors.output_tokens,
-                    sampling_tensors.presence_penalties,
-                    sampling_tensors.frequency_penalties,
-                    sampling_tensors.repetition_penalties)
+                if APHRODITE_PERSISTENT_SAMPLING_STATE:
+                    sampling_state = self._get_sampling_state(logits)
+                    row_slots = sampling_state.update(sampling_metadata)
+                    output_bin_counts = sampling_state.output_counts[
+                        row_slots]
+                    logits = _apply_penalties_from_counts(
+                        logits, sampling_state.prompt_mask[row_slots],
+                        output_bin_counts, output_bin_counts > 0,
+                        sampling_tensors.presence_penalties,
+                        sampling_tensors.frequency_penalties,
+                        sampling_tensors.repetition_penalties)
+                else:
+                    logits = _apply_penalties(
+                        logits, sampling_tensors.prompt_tokens,
+                        sampling_tensors.output_tokens,
+                        sampling_tensors.presence_penalties,
+                        sampling_tensors.frequency_penalties,
+                        sampling_tensors.repetition_penalties)
 
             elif sampler_id == SamplerID.NO_REPEAT_NGRAM and \
                 do_no_repeat_ngrams:
@@ -282,10 +335,7 @@ class Sampler(nn.Module):
                     logger.debug(
                         "Applying no_repeat_ngram with no_repeat_ngram_size: "
                         f"{sampling_tensors.no_repeat_ngram_sizes}.")
-                logits = _apply_no_repeat_ngram(
-                    logits,
-                    sampling_tensors.prompt_tokens,
-                    sampling_tensors.no_repeat_ngram_sizes)
+                logits = _apply_no_repeat_ngram(logits, sampling_metadata)
 
             elif sampler_id == SamplerID.TEMPERATURE and do_temperatures:
                 if (sampling_metadata.seq_groups and
@@ -514,7 +564,21 @@ def _apply_penalties(logits: torch.Tensor, prompt_tokens_tensor: torch.Tensor,
                                               num_seqs)
     output_bin_counts, output_mask = _get_bin_counts_and_mask(
         output_tokens_tensor, vocab_size, num_seqs)
-
+    return _apply_penalties_from_counts(logits, prompt_mask, output_bin_counts,
+                                        output_mask, presence_penalties,
+                                        frequency_penalties,
+                                        repetition_penalties)
+
+
+def _apply_penalties_from_counts(logits: torch.Tensor,
+                                 prompt_mask: torch.Tensor,
+                                 output_bin_counts: torch.Tensor,
+                                 output_mask: torch.Tensor,
+                                 presence_penalties: torch.Tensor,
+                                 frequency_penalties: torch.Tensor,
+                                 repetition_penalties: torch.Tensor
+                                 ) -> torch.Tensor:
+    _, vocab_size = logits.shape
     repetition_penalties = repetition_penalties[:, None].repeat(1, vocab_size)
     repetition_penalties[~(prompt_mask | output_mask)] = 1.0
     logits = torch.where(logits > 0, logits / repetition_penalties,
@@ -522,8 +586,8 @@ def _apply_penalties(logits: torch.Tensor, prompt_tokens_tensor: torch.Tensor,
 
     # We follow the definition in OpenAI API.
     # Refer to https://platform.openai.com/docs/api-reference/parameter-details
-    logits -= frequency_penalties.unsqueeze_(dim=1) * output_bin_counts
-    logits -= presence_penalties.unsqueeze_(dim=1) * output_mask
+    logits -= frequency_penalties.unsqueeze(dim=1) * output_bin_counts
+    logits -= presence_penalties.unsqueeze(dim=1) * output_mask
     return logits
 
 
@@ -623,7 +687,7 @@ def _apply_dry(
     logits: torch.Tensor,
     input_token_ids: torch.Tensor,
     output_token_ids: torch.Tensor,
-    multipliers: torch.Tensor, 
+    multipliers: torch.Tensor,
     bases: torch.Tensor,
     allowed_lengths: torch.Tensor,
     sequence_breakers_ids: torch.Tensor,
@@ -632,8 +696,134 @@ def _apply_dry(
     """
     Apply Don't Repeat Yourself (DRY) sampling to the logits.
 
+    Batched implementation of `_apply_dry_per_row`, producing identical
+    penalties. The contexts of all rows are right-aligned in one tensor so
+    that every row's suffix ends in the last column, and the match length of
+    every occurrence of the last token is extended one token per iteration
+    for all rows at once. The loop stops as soon as no match can be
+    extended, so it runs for the length of the longest repeat (at most
+    MAX_NGRAM iterations) instead of per row and per occurrence.
+
     Reference: https://github.com/oobabooga/text-generation-webui/pull/5677
     """
+    VOCAB_SIZE = logits.size(-1)
+    MAX_NGRAM = 100
+
+    applies_to = multipliers.nonzero(as_tuple=True)[0]
+    if applies_to.numel() == 0:
+        return logits
+    device = logits.device
+
+    # DRY applies to input AND output tokens. Concatenate them and move the
+    # non-padding tokens of every row to the right, keeping their order.
+    tokens = torch.cat(
+        (input_token_ids[applies_to], output_token_ids[applies_to]), dim=1)
+    num_rows, width = tokens.shape
+    valid = tokens != VOCAB_SIZE
+    seq_lens = valid.sum(dim=1)
+    dest = torch.cumsum(valid, dim=1) - 1 + (width - seq_lens).unsqueeze(1)
+    # Padding tokens are scattered into an extra column that is dropped.
+    dest = torch.where(valid, dest, width)
+    aligned = torch.full((num_rows, width + 1),
+                         -1,
+                         dtype=tokens.dtype,
+                         device=device)
+    aligned.scatter_(1, dest, tokens)
+
+    range_limits = ranges[applies_to].to(seq_lens.dtype)
+    seq_lens = torch.where(range_limits > 0,
+                           torch.minimum(seq_lens, range_limits), seq_lens)
+    max_len = int(seq_lens.max().item())
+    tokens = aligned[:, width - max_len:width]
+    cols = torch.arange(max_len, device=device)
+    offsets = max_len - seq_lens
+    tokens = tokens.masked_fill(cols.unsqueeze(0) < offsets.unsqueeze(1), -1)
+
+    # Build a mask of all the breaking tokens in the context
+    break_mask = torch.zeros_like(tokens, dtype=torch.bool)
+    breakers = sequence_breakers_ids[applies_to]
+    for i in range(breakers.size(1)):
+        break_mask.logical_or_(tokens == breakers[:, i:i + 1])
+
+    last_tokens = tokens[:, -1]
+
+    # Find the most recent breaking token (sets ngram limit)
+    window = min(max_len, MAX_NGRAM + 1)
+    window_lens = torch.clamp(seq_lens, max=MAX_NGRAM + 1)
+    recent_breaks = (break_mask[:, max_len - window:].flip(1) &
+                     (torch.arange(window, device=device).unsqueeze(0) <
+                      window_lens.unsqueeze(1)))
+    max_ngrams = torch.where(recent_breaks.any(dim=1),
+                             recent_breaks.int().argmax(dim=1),
+                             window_lens - 1)
+
+    min_ngrams = allowed_lengths[applies_to].to(max_ngrams.dtype)
+    # Rows ending in a breaking token, or too close to one, match nothing.
+    active = ~break_mask[:, -1] & (max_ngrams > min_ngrams)
+    if not active.any():
+        return logits
+    rows = active.nonzero(as_tuple=True)[0]
+    applies_to = applies_to[rows]
+    tokens = tokens[rows]
+    break_mask = break_mask[rows]
+    offsets = offsets[rows]
+    max_ngrams = max_ngrams[rows]
+    min_ngrams = min_ngrams[rows]
+    last_tokens = last_tokens[rows]
+
+    # Every earlier occurrence of the last token is a potential ngram. Its
+    # match is extended backwards by at most min(idx, max_ngram) tokens.
+    matches = tokens[:, :-1] == last_tokens.unsqueeze(1)
+    idx = cols[:-1].unsqueeze(0) - offsets.unsqueeze(1)
+    limits = torch.minimum(idx, max_ngrams.unsqueeze(1))
+    unwind = torch.zeros_like(limits)
+    alive = matches
+    for step in range(1, MAX_NGRAM + 1):
+        alive = alive & (limits >= step)
+        if not alive.any():
+            break
+        unwind.masked_fill_(alive, step)
+        prev_tokens = torch.full_like(matches, -1, dtype=tokens.dtype)
+        prev_tokens[:, step:] = tokens[:, :-1 - step]
+        prev_breaks = torch.zeros_like(matches)
+        prev_breaks[:, step:] = break_mask[:, :-1 - step]
+        suffix_tokens = tokens[:, -1 - step].unsqueeze(1)
+        alive = alive & ~prev_breaks & (prev_tokens == suffix_tokens)
+
+    # If [token] is picked, what's the longest ngram that would match?
+    # The repeated tokens BEFORE next_tok (+1 to include [idx]).
+    ngram_lens = torch.zeros((len(rows), VOCAB_SIZE),
+                             dtype=torch.int32,
+                             device=device)
+    next_tokens = torch.where(matches, tokens[:, 1:], 0)
+    candidate_lens = torch.where(matches, unwind + 1, 0).to(torch.int32)
+    ngram_lens.scatter_reduce_(1, next_tokens, candidate_lens, reduce="amax")
+
+    # Convert ngram lengths to penalty exponents
+    penalty_mask = ngram_lens > 0
+    scales = bases[applies_to].unsqueeze(1)**(ngram_lens -
+                                              min_ngrams.unsqueeze(1))
+    penalties = multipliers[applies_to].unsqueeze(1) * scales
+
+    # Calculate and apply penalties
+    logits[applies_to] -= torch.where(penalty_mask, penalties, 0)
+    return logits
+
+
+def _apply_dry_per_row(
+    logits: torch.Tensor,
+    input_token_ids: torch.Tensor,
+    output_token_ids: torch.Tensor,
+    multipliers: torch.Tensor,
+    bases: torch.Tensor,
+    allowed_lengths: torch.Tensor,
+    sequence_breakers_ids: torch.Tensor,
+    ranges: torch.Tensor,
+) -> torch.Tensor:
+    """
+    Reference implementation of DRY that processes one row at a time. Kept
+    for equivalence tests and benchmarks of `_apply_dry`.
+    """
 
     VOCAB_SIZE = logits.size(-1)
     MAX_NGRAM = 100
@@ -704,34 +894,27 @@ def _apply_dry(
 
 def _apply_no_repeat_ngram(
     logits: torch.Tensor,
-    input_ids: torch.Tensor,
-    ngram_size: torch.Tensor,
+    sampling_metadata: SamplingMetadata,
 ) -> torch.Tensor:
     """Apply no-repeat-ngram penalty which sets logits to -inf for tokens that 
     would create a repeated n-gram.
     """
-    if torch.all(ngram_size == 0):
-        return logits
-
-    batch_size = logits.shape[0]
-
-    for i in range(batch_size):
-        size = int(ngram_size[i].item())
-        if size == 0:
-            continue
-
-        cur_len = len(input_ids[i])
-        if cur_len < size:
+    # list of indices in logits that will be set to -inf
+    logits_to_penalize = []
+    for seq_group in sampling_metadata.seq_groups:
+        ngram_size = seq_group.sampling_params.no_repeat_ngram_size
+        if not seq_group.do_sample or ngram_size <= 0:
             continue
 
-        banned_tokens = _calc_banned_ngram_tokens(
-            ngram_size=size,
-            prev_input_ids=input_ids[i],
-            cur_len=cur_len-1
-        )
+        start_idx = seq_group.sample_indices[0]
+        for j, seq_id in enumerate(seq_group.seq_ids):
+            seq_data = seq_group.seq_data[seq_id]
+            banned_tokens = seq_data.get_banned_ngram_tokens(ngram_size)
+            logits_to_penalize.extend(
+                (start_idx + j, token_id) for token_id in banned_tokens)
 
-        if banned_tokens:
-            logits[i, banned_tokens] = -float("inf")
+    if logits_to_penalize:
+        logits[tuple(zip(*logits_to_penalize))] = -float("inf")
 
     return logits
 
@@ -777,7 +960,7 @@ def _apply_min_p(
     """
     probs = torch.softmax(logits, dim=-1)
     top_probs, _ = probs.max(dim=-1, keepdim=True)
-    scaled_min_p = min_p.unsqueeze_(dim=1) * top_probs
+    scaled_min_p = min_p.unsqueeze(dim=1) * top_probs
     tokens_to_remove = probs < scaled_min_p
     logits = logits.masked_fill_(tokens_to_remove, -float("inf"))
 
@@ -790,7 +973,7 @@ def _apply_top_a(
 ) -> torch.Tensor:
     probs = torch.softmax(logits, dim=-1)
     top_probs, _ = probs.max(dim=-1, keepdim=True)
-    threshold = torch.pow(top_probs, 2) * top_a.unsqueeze_(dim=1)
+    threshold = torch.pow(top_probs, 2) * top_a.unsqueeze(dim=1)
     tokens_to_remove = probs < threshold
     logits = logits.masked_fill_(tokens_to_remove, -float("inf"))
 
@@ -914,8 +1097,8 @@ def _apply_quadratic_sampling(
     """
     mask = smoothing_factor != 0
 
-    smoothing_factor.unsqueeze_(dim=1)
-    smoothing_curve.unsqueeze_(dim=1)
+    smoothing_factor = smoothing_factor.unsqueeze(dim=1)
+    smoothing_curve = smoothing_curve.unsqueeze(dim=1)
     k = smoothing_factor * (3 - smoothing_curve) / 2
     s = smoothing_factor * (smoothing_curve - 1) / 2
 
@@ -1835,85 +2018,6 @@ def _get_next_prompt_tokens(seq_group: SequenceGroupToSample) -> List[str]:
         next_token_index_start:next_token_index_end]
     return next_prompt_tokens
 
-def _get_ngrams(
-    ngram_size: int, 
-    prev_input_ids: torch.Tensor
-) -> Dict[Tuple[int, ...], List[int]]:
-    """Get dictionary of ngrams and the tokens that followed them.
-
-    Args:
-        ngram_size: Size of ngrams to track
-        prev_input_ids: 1D tensor of previous token ids
-
-    Returns:
-        Dictionary mapping ngram tuples to list of tokens that followed them
-    """
-    generated_ngrams = {}
-    gen_tokens = prev_input_ids.tolist()
-
-    for i in range(len(gen_tokens) - ngram_size + 1):
-        ngram = tuple(gen_tokens[i:i + ngram_size - 1])
-        next_token = gen_tokens[i + ngram_size - 1]
-        if ngram in generated_ngrams:
-            generated_ngrams[ngram].append(next_token)
-        else:
-            generated_ngrams[ngram] = [next_token]
-
-    return generated_ngrams
-
-def _get_generated_ngrams(
-    banned_ngrams: Dict[Tuple[int, ...], List[int]], 
-    prev_input_ids: torch.Tensor,
-    ngram_size: int, 
-    cur_len: int
-) -> List[int]:
-    """Get list of tokens that would create a repeated ngram if generated next.
-
-    Args:
-        banned_ngrams: Dictionary of previously seen ngrams and their next
-            tokens
-        prev_input_ids: Previous token ids
-        ngram_size: Size of ngrams to check
-        cur_len: Current position in sequence
-
-    Returns:
-        List of token ids that would create a repeat ngram
-    """
-    start_idx = cur_len + 1 - ngram_size
-    current_ngram = tuple(prev_input_ids[start_idx:cur_len].tolist())
-
-    return banned_ngrams.get(current_ngram, [])
-
-def _calc_banned_ngram_tokens(
-    ngram_size: int,
-    prev_input_ids: torch.Tensor,
-    cur_len: int
-) -> List[int]:
-    """Calculate tokens that would create repeated ngrams if generated next.
-
-    Args:
-        ngram_size: Size of ngrams to prevent repeating
-        prev_input_ids: Previous token ids in sequence
-        cur_len: Current position in sequence
-
-    Returns:
-        List of token ids that should be banned to prevent ngram repetition
-    """
-    if cur_len + 1 < ngram_size:
-        return []
-
-    generated_ngrams = _get_ngrams(ngram_size, prev_input_ids)
-
-    banned_tokens = _get_generated_ngrams(
-        generated_ngrams,
-        prev_input_ids, 
-        ngram_size,
-        cur_len
-    )
-
-    return banned_tokens
-
-
 # def _apply_mirostat_v2(logits: torch.Tensor,
 #                        sampling_tensors: SamplingTensors) -> torch.Tensor:
 #     # Reduce our view to just the affected logits
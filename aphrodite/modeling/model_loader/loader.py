@@ -6,6 +6,7 @@ import glob
 import json
 import math
 import os
+import time
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
 from typing import Any, Dict, Generator, List, Optional, Tuple, Type
@@ -24,18 +25,22 @@ from aphrodite.common.config import (APHRODITE_USE_MODELSCOPE, CacheConfig,
                                      DeviceConfig, LoadConfig, LoadFormat,
                                      LoRAConfig, ModelConfig, MultiModalConfig,
                                      ParallelConfig, SchedulerConfig)
-from aphrodite.common.utils import is_pin_memory_available, tensor_progress_bar
+from aphrodite.common.utils import (GiB_bytes, get_loaded_bytes,
+                                    is_pin_memory_available,
+                                    tensor_progress_bar)
 from aphrodite.modeling.model_loader.tensorizer import (
     TensorizerConfig, is_aphrodite_tensorized, load_with_tensorizer,
     serialize_aphrodite_model, tensorizer_weights_iterator)
 from aphrodite.modeling.model_loader.utils import (get_model_architecture,
                                                    set_default_torch_dtype)
 from aphrodite.modeling.model_loader.weight_utils import (
-    download_safetensors_index_file_from_hf, download_weights_from_hf,
+    LazySafetensorsWeight, download_safetensors_index_file_from_hf,
+    download_weights_from_hf,
     filter_duplicate_safetensors_files, filter_files_not_needed_for_inference,
     get_gguf_extra_tensor_names, get_quant_config, gguf_quant_weights_iterator,
-    initialize_dummy_weights, np_cache_weights_iterator, pt_weights_iterator,
-    safetensors_weights_iterator)
+    initialize_dummy_weights, multi_thread_safetensors_weights_iterator,
+    np_cache_weights_iterator, pt_weights_iterator,
+    safetensors_weights_iterator, sliced_safetensors_weights_iterator)
 from aphrodite.modeling.models.interfaces import (has_inner_state,
                                                   supports_lora,
                                                   supports_multimodal)
@@ -193,13 +198,38 @@ class BaseModelLoader(ABC):
 
 
 class DefaultModelLoader(BaseModelLoader):
-    """Model loader that can load different file types from disk."""
+    """Model loader that can load different file types from disk.
+
+    Safetensors checkpoints are read in a thread pool if the model loader
+    extra config sets "enable_multithread_load", with "num_threads" threads.
+    If it sets "enable_sliced_load", each tensor parallel rank only reads the
+    shards of the weights that its weight loaders narrow them to.
+    """
+
+    DEFAULT_NUM_THREADS = 4
 
     def __init__(self, load_config: LoadConfig):
         super().__init__(load_config)
-        if load_config.model_loader_extra_config:
-            raise ValueError(f"Model loader extra config is not supported for "
-                             f"load format {load_config.load_format}")
+        extra_config = load_config.model_loader_extra_config or {}
+        unexpected_keys = set(extra_config) - {
+            "enable_multithread_load", "num_threads", "enable_sliced_load"
+        }
+        if unexpected_keys:
+            raise ValueError(f"Unexpected model loader extra config keys "
+                             f"{sorted(unexpected_keys)} for load format "
+                             f"{load_config.load_format}")
+        self.enable_multithread_load = bool(
+            extra_config.get("enable_multithread_load", False))
+        self.num_threads = int(
+            extra_config.get("num_threads", self.DEFAULT_NUM_THREADS))
+        if self.num_threads < 1:
+            raise ValueError("num_threads in the model loader extra config "
+                             f"must be at least 1, got {self.num_threads}")
+        self.enable_sliced_load = bool(
+            extra_config.get("enable_sliced_load", False))
+        if self.enable_multithread_load and self.enable_sliced_load:
+            raise ValueError("enable_multithread_load and enable_sliced_load "
+                             "cannot be used together.")
 
     def _maybe_download_from_modelscope(
             self, model: str, revision: Optional[str]) -> Optional[str]:
@@ -315,6 +345,19 @@ class DefaultModelLoader(BaseModelLoader):
             weights_iterator = np_cache_weights_iterator(
                 model_name_or_path, self.load_config.download_dir, hf_folder,
                 hf_weights_files)
+        elif use_safetensors and self.enable_sliced_load:
+            from aphrodite.distributed import (
+                get_tensor_model_parallel_world_size)
+            weights_iterator = sliced_safetensors_weights_iterator(
+                hf_weights_files)
+            # Each rank reads about its shards of the weights.
+            est_weight_bytes //= get_tensor_model_parallel_world_size()
+        elif use_safetensors and self.enable_multithread_load:
+            # Pinned host buffers speed up the copies to the device.
+            pin_memory = is_pin_memory_available() and (
+                current_platform.is_cuda() or current_platform.is_rocm())
+            weights_iterator = multi_thread_safetensors_weights_iterator(
+                hf_weights_files, self.num_threads, pin_memory)
         elif use_safetensors:
             weights_iterator = safetensors_weights_iterator(hf_weights_files)
         else:
@@ -352,8 +395,28 @@ class DefaultModelLoader(BaseModelLoader):
                                                model,
                                                "fall_back_to_pt_during_load",
                                                True))
-            model.load_weights(tensor_progress_bar(weights, wgt_bytes,
-                                                   "Loading model weights..."))
+            num_bytes_loaded = 0
+            lazy_bytes_read: List[List[int]] = []
+
+            def count_loaded_bytes(weights):
+                nonlocal num_bytes_loaded
+                for name, weight in weights:
+                    if isinstance(weight, LazySafetensorsWeight):
+                        # Sliced weights are only read when they are loaded,
+                        # which may be after all weights were received, e.g.
+                        # by models that filter the weights of inner models.
+                        lazy_bytes_read.append(weight.bytes_read_counter)
+                    else:
+                        num_bytes_loaded += get_loaded_bytes(weight)
+                    yield name, weight
+
+            start_time = time.perf_counter()
+            model.load_weights(
+                tensor_progress_bar(count_loaded_bytes(weights), wgt_bytes,
+                                    "Loading model weights..."))
+            num_bytes_loaded += sum(counter[0] for counter in lazy_bytes_read)
+            self._log_load_throughput(num_bytes_loaded,
+                                      time.perf_counter() - start_time)
 
             for _, module in model.named_modules():
                 quant_method = getattr(module, "quant_method", None)
@@ -367,6 +430,15 @@ class DefaultModelLoader(BaseModelLoader):
                         quant_method.process_weights_after_loading(module)
         return model.eval()
 
+    @staticmethod
+    def _log_load_throughput(num_bytes: int, elapsed: float) -> None:
+        from aphrodite.distributed import get_tensor_model_parallel_rank
+        if get_tensor_model_parallel_rank() != 0 or elapsed <= 0:
+            return
+        logger.info(f"Read {num_bytes / GiB_bytes:.2f} GiB of weights in "
+                    f"{elapsed:.2f} seconds "
+                    f"({num_bytes / GiB_bytes / elapsed:.2f} GiB/s).")
+
 
 class DummyModelLoader(BaseModelLoader):
     """Model loader that will set model weights to random values."""
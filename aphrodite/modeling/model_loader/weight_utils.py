@@ -4,15 +4,19 @@ import glob
 import hashlib
 import json
 import os
+import struct
 import tempfile
-from collections import defaultdict
-from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple, Union
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (Any, Deque, Dict, Generator, Iterable, List, Optional,
+                    Tuple, Union)
 
 import filelock
 import gguf
 import huggingface_hub.constants
 import numpy as np
 import torch
+import torch.utils._pytree as pytree
 from huggingface_hub import HfFileSystem, hf_hub_download, snapshot_download
 from loguru import logger
 from safetensors.torch import load_file, safe_open, save_file
@@ -388,6 +392,366 @@ def safetensors_weights_iterator(
                 yield name, param
 
 
+# The torch dtypes of the dtypes in the safetensors format.
+_SAFETENSORS_DTYPES: Dict[str, torch.dtype] = {
+    "BOOL": torch.bool,
+    "U8": torch.uint8,
+    "I8": torch.int8,
+    "I16": torch.int16,
+    "I32": torch.int32,
+    "I64": torch.int64,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "F32": torch.float32,
+    "F64": torch.float64,
+    "F8_E4M3": torch.float8_e4m3fn,
+    "F8_E5M2": torch.float8_e5m2,
+}
+_READ_CHUNK_BYTES = 64 * 1024 * 1024
+# The size of the reused host buffers the tensors are read into. Larger
+# tensors are read into buffers of their own, which are not pinned.
+_STAGING_BUFFER_BYTES = 256 * 1024 * 1024
+
+# The name, dtype, shape and data offsets of a tensor in a safetensors file.
+_SafetensorsEntry = Tuple[str, torch.dtype, List[int], int, int]
+
+
+def _read_safetensors_header(
+        st_file: str) -> Tuple[int, List[_SafetensorsEntry]]:
+    """Return the file offset of the data of a safetensors file and its
+    tensors, in file order."""
+    with open(st_file, "rb") as f:
+        header_size, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    entries = [(name, _SAFETENSORS_DTYPES[info["dtype"]], info["shape"],
+                *info["data_offsets"]) for name, info in header.items()]
+    entries.sort(key=lambda entry: entry[3])
+    return 8 + header_size, entries
+
+
+def _group_safetensors_entries(
+        entries: List[_SafetensorsEntry],
+        max_bytes: int) -> List[List[_SafetensorsEntry]]:
+    """Group consecutive tensors whose data spans at most max_bytes. A
+    tensor larger than max_bytes is a group of its own."""
+    groups: List[List[_SafetensorsEntry]] = []
+    for entry in entries:
+        if groups and entry[4] - groups[-1][0][3] <= max_bytes:
+            groups[-1].append(entry)
+        else:
+            groups.append([entry])
+    return groups
+
+
+def _read_safetensors_file(
+    st_file: str,
+    data_offset: int,
+    entries: List[_SafetensorsEntry],
+    buffer: Optional[torch.Tensor] = None,
+    pin_memory: bool = False,
+) -> List[Tuple[str, torch.Tensor]]:
+    """Read the data of consecutive tensors of a safetensors file into a host
+    buffer and return the tensors as views into the buffer.
+
+    The given buffer is used if the data fits into it. Otherwise a new buffer
+    is allocated, which is pinned if pin_memory is set.
+    """
+    start, end = entries[0][3], entries[-1][4]
+    data_size = end - start
+    if buffer is None or buffer.numel() < data_size:
+        buffer = torch.empty(data_size,
+                             dtype=torch.uint8,
+                             pin_memory=pin_memory)
+    with open(st_file, "rb", buffering=0) as f:
+        f.seek(data_offset + start)
+        # The reads release the GIL, so files are read in parallel.
+        view = memoryview(buffer.numpy())
+        offset = 0
+        while offset < data_size:
+            num_bytes = f.readinto(
+                view[offset:min(offset + _READ_CHUNK_BYTES, data_size)])
+            if not num_bytes:
+                raise EOFError(f"Unexpected end of file {st_file}")
+            offset += num_bytes
+        del view
+
+    tensors: List[Tuple[str, torch.Tensor]] = []
+    for name, dtype, shape, tensor_start, tensor_end in entries:
+        param = buffer[tensor_start - start:tensor_end - start]
+        if (tensor_start - start) % dtype.itemsize != 0:
+            # The format does not align the tensors, and an unaligned view
+            # cannot be reinterpreted as the dtype.
+            param = param.clone()
+        tensors.append((name, param.view(dtype).reshape(shape)))
+    return tensors
+
+
+def _storage_use_count(tensor: torch.Tensor) -> int:
+    return torch._C._storage_Use_Count(tensor.untyped_storage()._cdata)
+
+
+class _StagingBuffers:
+    """A fixed number of reused host buffers of the same size.
+
+    A buffer is only reused once no tensor refers to it anymore. A buffer
+    whose tensors are still referenced when it is released, e.g. because a
+    weight loader keeps them, is left to them and replaced by a new one.
+    The replacements are not pinned, so that a caller that keeps all the
+    weights, like filter_weights, does not pin the whole checkpoint.
+    """
+
+    def __init__(self, num_buffers: int, buffer_bytes: int,
+                 pin_memory: bool):
+        self.buffer_bytes = buffer_bytes
+        self.pin_memory = pin_memory
+        # The buffers with their storage use count when unreferenced. They
+        # are allocated when first needed.
+        self._free: List[Optional[Tuple[torch.Tensor, int]]] = ([None] *
+                                                                num_buffers)
+
+    def num_free(self) -> int:
+        return len(self._free)
+
+    def get(self) -> Tuple[torch.Tensor, int]:
+        buffer = self._free.pop()
+        if buffer is None:
+            tensor = torch.empty(self.buffer_bytes,
+                                 dtype=torch.uint8,
+                                 pin_memory=self.pin_memory)
+            buffer = (tensor, _storage_use_count(tensor))
+        return buffer
+
+    def put(self, buffer: Tuple[torch.Tensor, int]) -> None:
+        tensor, use_count = buffer
+        if _storage_use_count(tensor) == use_count:
+            self._free.append(buffer)
+        else:
+            self._free.append(None)
+            self.pin_memory = False
+
+
+def _staged_safetensors_weights_iterator(
+    hf_weights_files: List[str],
+    num_threads: int,
+    pin_memory: bool,
+    buffer_bytes: int = _STAGING_BUFFER_BYTES,
+) -> Generator[Tuple[str, torch.Tensor], None, None]:
+    """Iterate over the weights in the model safetensor files, reading them
+    in a thread pool into num_threads + 1 reused host buffers of at most
+    buffer_bytes. The buffers are pinned if pin_memory is set."""
+    groups = []
+    max_group_bytes = 0
+    for st_file in hf_weights_files:
+        data_offset, entries = _read_safetensors_header(st_file)
+        for group in _group_safetensors_entries(entries, buffer_bytes):
+            groups.append((st_file, data_offset, group))
+            group_bytes = group[-1][4] - group[0][3]
+            if group_bytes <= buffer_bytes:
+                max_group_bytes = max(max_group_bytes, group_bytes)
+    buffers = _StagingBuffers(num_threads + 1, max_group_bytes, pin_memory)
+
+    with ThreadPoolExecutor(max_workers=num_threads,
+                            thread_name_prefix="weight_loader") as executor:
+        pending: Deque[Tuple[Tuple[torch.Tensor, int], Future]] = deque()
+        released_buffer = None
+        next_group = 0
+        while True:
+            # The next groups are read while the weights of the current one
+            # are loaded, as far as there are free buffers.
+            while buffers.num_free() > 0 and next_group < len(groups):
+                st_file, data_offset, entries = groups[next_group]
+                next_group += 1
+                buffer = buffers.get()
+                pending.append((buffer,
+                                executor.submit(_read_safetensors_file,
+                                                st_file, data_offset, entries,
+                                                buffer[0])))
+            if not pending:
+                break
+            buffer, future = pending.popleft()
+            tensors = future.result()
+            for i in range(len(tensors)):
+                item = tensors[i]
+                tensors[i] = None
+                yield item
+                del item
+                # The caller holds on to the last weight it received until
+                # it asks for the next one, so the buffer of the previous
+                # group is only released once a weight of this one is
+                # received.
+                if released_buffer is not None:
+                    buffers.put(released_buffer)
+                    released_buffer = None
+            del tensors
+            released_buffer = buffer
+
+
+def _prefetch_safetensors_file(st_file: str) -> None:
+    """Ask the kernel to read the file into the page cache."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(st_file, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def multi_thread_safetensors_weights_iterator(
+    hf_weights_files: List[str],
+    num_threads: int,
+    pin_memory: bool = False,
+) -> Generator[Tuple[str, torch.Tensor], None, None]:
+    """Iterate over the weights in the model safetensor files, reading ahead
+    in a thread pool.
+
+    The weights are loaded while the next ones are read, so the disk reads
+    overlap the sharding and the device copies of the weight loaders. If
+    pin_memory is set, the weights are read into num_threads + 1 reused
+    pinned host buffers of at most _STAGING_BUFFER_BYTES, and the weights
+    are views into them. Otherwise up to num_threads files are read ahead
+    into the page cache and the weights are read from the memory-mapped
+    files, which avoids allocating and faulting in host buffers.
+    """
+    if pin_memory:
+        yield from _staged_safetensors_weights_iterator(
+            hf_weights_files, num_threads, pin_memory)
+        return
+    with ThreadPoolExecutor(max_workers=num_threads,
+                            thread_name_prefix="weight_loader") as executor:
+        st_files = iter(hf_weights_files)
+        pending: Deque[Tuple[str, Future]] = deque()
+        for st_file in st_files:
+            pending.append(
+                (st_file,
+                 executor.submit(_prefetch_safetensors_file, st_file)))
+            if len(pending) == num_threads:
+                break
+        while pending:
+            st_file, future = pending.popleft()
+            future.result()
+            next_st_file = next(st_files, None)
+            if next_st_file is not None:
+                pending.append(
+                    (next_st_file,
+                     executor.submit(_prefetch_safetensors_file,
+                                     next_st_file)))
+            with safe_open(st_file, framework="pt") as f:
+                for name in f.keys():  # noqa: SIM118
+                    yield name, f.get_tensor(name)
+
+
+class LazySafetensorsWeight:
+    """A weight in a safetensors file that is only read when it is used.
+
+    Narrowing the weight returns another lazy weight, so weight loaders that
+    narrow it to the shard of their tensor parallel rank first only read the
+    bytes of the shard from the file. Any other use, including passing it to
+    a torch function, reads the narrowed weight into a tensor.
+    """
+
+    def __init__(self,
+                 f: Any,
+                 name: str,
+                 slices: Optional[Tuple[slice, ...]] = None,
+                 num_bytes_read: Optional[List[int]] = None):
+        self._file = f
+        self._name = name
+        # Shared with the weights narrowed from this one, and can be read
+        # after the weights are released.
+        self.bytes_read_counter = (num_bytes_read
+                                   if num_bytes_read is not None else [0])
+        self._slice = f.get_slice(name)
+        full_shape = self._slice.get_shape()
+        self._slices = slices if slices is not None else tuple(
+            slice(0, size) for size in full_shape)
+        self._full_shape = tuple(full_shape)
+        self._tensor: Optional[torch.Tensor] = None
+        self.dtype = _SAFETENSORS_DTYPES[self._slice.get_dtype()]
+        self.shape = torch.Size(s.stop - s.start for s in self._slices)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    def dim(self) -> int:
+        return len(self.shape)
+
+    def size(self, dim: Optional[int] = None) -> Union[torch.Size, int]:
+        return self.shape if dim is None else self.shape[dim]
+
+    def numel(self) -> int:
+        return self.shape.numel()
+
+    def nelement(self) -> int:
+        return self.shape.numel()
+
+    def element_size(self) -> int:
+        return self.dtype.itemsize
+
+    def narrow(self, dim: int, start: int,
+               length: int) -> "LazySafetensorsWeight":
+        dim = dim % self.ndim
+        if start < 0 or length < 0 or start + length > self.shape[dim]:
+            raise RuntimeError(f"start ({start}) + length ({length}) exceeds "
+                               f"dimension size ({self.shape[dim]}).")
+        slices = list(self._slices)
+        offset = slices[dim].start + start
+        slices[dim] = slice(offset, offset + length)
+        return LazySafetensorsWeight(self._file, self._name, tuple(slices),
+                                     self.bytes_read_counter)
+
+    def materialize(self) -> torch.Tensor:
+        """Read the narrowed weight into a tensor."""
+        if self._tensor is None:
+            if self.shape == self._full_shape:
+                self._tensor = self._file.get_tensor(self._name)
+            else:
+                self._tensor = self._slice[self._slices]
+            self.bytes_read_counter[0] += (self._tensor.numel() *
+                                           self._tensor.element_size())
+        return self._tensor
+
+    def num_bytes_read(self) -> int:
+        """The number of bytes read from the file for this weight and the
+        weights narrowed from it so far."""
+        return self.bytes_read_counter[0]
+
+    def __getitem__(self, index: Any) -> torch.Tensor:
+        return self.materialize()[index]
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    def __repr__(self) -> str:
+        return (f"LazySafetensorsWeight(name={self._name}, "
+                f"shape={tuple(self.shape)}, dtype={self.dtype})")
+
+    @classmethod
+    def __torch_function__(cls, func, types, args=(), kwargs=None):
+        args, kwargs = pytree.tree_map_only(cls, cls.materialize,
+                                            (args, kwargs or {}))
+        return func(*args, **kwargs)
+
+
+def sliced_safetensors_weights_iterator(
+    hf_weights_files: List[str]
+) -> Generator[Tuple[str, LazySafetensorsWeight], None, None]:
+    """Iterate over the weights in the model safetensor files as lazy
+    weights, so that each tensor parallel rank only reads its shards."""
+    for st_file in hf_weights_files:
+        # The lazy weights keep the file open until they are released.
+        f = safe_open(st_file, framework="pt")
+        for name in f.keys():  # noqa: SIM118
+            yield name, LazySafetensorsWeight(f, name)
+
+
 def pt_weights_iterator(
     hf_weights_files: List[str]
 ) -> Generator[Tuple[str, torch.Tensor], None, None]:
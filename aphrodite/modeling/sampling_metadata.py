@@ -15,6 +15,9 @@ from aphrodite.triton_utils.sample import get_num_triton_sampler_splits
 
 _SAMPLING_EPS = 1e-5
 _SEED_0_REPLACEMENT = 3403598558
+# The number of last output tokens that PersistentSamplingState compares to
+# check that a sequence continues the tokens counted in its slot.
+_NUM_FINGERPRINT_TOKENS = 4
 # Some triton sampler related code is guarded before it is ready.
 _USE_TRITON_SAMPLER = False
 
@@ -50,6 +53,9 @@ class SequenceGroupToSample:
     prompt_logprob_indices: List[int]
     # Sample token indices from logits. Empty if sampling is not required.
     sample_indices: List[int]
+    # The id of the request. Sequence ids are only unique among the running
+    # sequences; speculative decoding reuses them for other requests.
+    request_id: Optional[str] = None
 
     @property
     def do_sample(self):
@@ -73,7 +79,8 @@ def gen_seq_group_to_sample_builder(num_seqs: int):
         generator=None,
         is_prompt=True,
         prompt_logprob_indices=[],
-        sample_indices=[])
+        sample_indices=[],
+        request_id=None)
 
 
 class SamplingMetadataCache:
@@ -343,6 +350,7 @@ def _prepare_seq_groups(
             sample_obj.query_len = query_len
             sample_obj.generator = generator
             sample_obj.is_prompt = is_prompt
+            sample_obj.request_id = seq_group_metadata.request_id
         else:
             sample_obj = SequenceGroupToSample(
                 seq_ids=list(seq_ids),
@@ -353,7 +361,8 @@ def _prepare_seq_groups(
                 generator=generator,
                 is_prompt=is_prompt,
                 prompt_logprob_indices=list(prompt_logprob_indices),
-                sample_indices=list(sample_indices))
+                sample_indices=list(sample_indices),
+                request_id=seq_group_metadata.request_id)
 
         seq_groups.append(sample_obj)
 
@@ -410,13 +419,17 @@ class SamplingTensors:
         dtype: torch.dtype,
         *,
         extra_seeds_to_generate: int = 0,
-        extra_entropy: Optional[Tuple[int, ...]] = None
+        extra_entropy: Optional[Tuple[int, ...]] = None,
+        histogram_penalties: bool = False,
     ) -> Tuple["SamplingTensors", bool, bool, bool, bool, bool, bool, bool,
                bool, bool, bool, bool, bool, bool, bool, bool, bool]:
         """
         extra_seeds_to_generate: extra seeds to generate using the
             user-defined seed for each sequence.
         extra_entropy: extra entropy to use when generating seeds.
+        histogram_penalties: if True, penalties are applied from a
+            `PersistentSamplingState`, so the prompt and output token tensors
+            are only built when DRY needs them.
         """
         prompt_tokens: List[array] = []
         output_tokens: List[array] = []
@@ -579,7 +592,7 @@ class SamplingTensors:
                     sampling_seeds.append(seq_seeds)
                 sample_indices.extend(seq_group.sample_indices)
 
-        if do_penalties or do_dry or do_no_repeat_ngrams:
+        if do_dry or (do_penalties and not histogram_penalties):
             for seq_group in sampling_metadata.seq_groups:
                 seq_ids = seq_group.seq_ids
                 if (seq_group.is_prompt
@@ -917,3 +930,201 @@ class SamplingTensors:
             # For the kernel, seed == 0 means greedy decoding.
             seq_seeds = [0] * seeds_to_generate
         return seq_seeds
+
+
+def _get_fingerprint(
+        request_id: Optional[str],
+        seq_data: SequenceData) -> Tuple[Optional[str], int, int, array]:
+    prompt = seq_data.prompt_token_ids_array
+    output = seq_data.output_token_ids_array
+    return (request_id, len(prompt), prompt[-1] if prompt else -1,
+            output[-_NUM_FINGERPRINT_TOKENS:])
+
+
+class PersistentSamplingState:
+    """Sampling state that is kept across decode steps instead of being
+    rebuilt from the full token history every step.
+
+    Each sampled sequence owns a slot (a row) in a device-resident token
+    histogram: `output_counts` holds the number of times each token was
+    generated, and `prompt_mask` marks the tokens present in the prompt. On
+    every step only the deltas are applied: new sequences are counted once,
+    finished or preempted sequences release their slot, and running sequences
+    only add the tokens sampled since the previous step. Penalties can then be
+    applied by gathering the rows of the current batch, without padding and
+    uploading the token arrays of every sequence.
+
+    A sequence id does not always name the same tokens: speculative decoding
+    reuses the ids of its expanded sequences with other proposal tokens, and
+    for other requests. So a slot is only updated incrementally if the
+    sequence still belongs to the same request and has the prompt and the last
+    output tokens that were counted; otherwise it is recounted.
+
+    Slot 0 is never assigned; it stays zero and is used for the logits rows
+    that only compute prompt logprobs.
+
+    Args:
+        vocab_size: The size of the vocabulary.
+        device: The device of the histograms.
+        max_idle_updates: The number of updates a sequence can be missing
+            from the batch before its slot is released, e.g. the number of
+            other virtual engines with pipeline parallelism.
+    """
+
+    def __init__(self,
+                 vocab_size: int,
+                 device: torch.device,
+                 max_idle_updates: int = 0) -> None:
+        self.vocab_size = vocab_size
+        self.device = device
+        self.max_idle_updates = max_idle_updates
+        self.pin_memory = is_pin_memory_available()
+        self._num_updates = 0
+        # seq_id -> slot in the histograms.
+        self._slots: Dict[int, int] = {}
+        # seq_id -> number of output tokens already counted.
+        self._num_counted: Dict[int, int] = {}
+        # seq_id -> the request id, the prompt length, the last prompt token
+        # and the last output tokens that were counted.
+        self._fingerprints: Dict[int, Tuple[Optional[str], int, int,
+                                            array]] = {}
+        # seq_id -> the update in which the sequence was last in the batch.
+        self._last_updates: Dict[int, int] = {}
+        self._free_slots: List[int] = []
+        self._num_slots = 1
+        self.output_counts = torch.zeros((1, vocab_size),
+                                         dtype=torch.int32,
+                                         device=device)
+        self.prompt_mask = torch.zeros((1, vocab_size),
+                                       dtype=torch.bool,
+                                       device=device)
+
+    @staticmethod
+    def get_batch_key(
+        sampling_metadata: "SamplingMetadata"
+    ) -> Optional[Tuple[Tuple[Optional[str], Tuple[int, ...]], ...]]:
+        """Return a key identifying the layout of a pure decode batch, or None
+        if the batch contains prefills or a request without an id.
+
+        Sampling parameters are fixed for the lifetime of a request, so two
+        decode batches with the same key produce the same per-row sampling
+        parameters and the same sample indices. The key holds the request ids
+        because sequence ids alone may name other requests in a later step,
+        e.g. the expanded sequences of speculative decoding.
+        """
+        key: List[Tuple[Optional[str], Tuple[int, ...]]] = []
+        for seq_group in sampling_metadata.seq_groups:
+            if (seq_group.is_prompt or not seq_group.do_sample
+                    or seq_group.request_id is None):
+                return None
+            key.append((seq_group.request_id, tuple(seq_group.seq_ids)))
+        return tuple(key)
+
+    def update(self, sampling_metadata: "SamplingMetadata") -> torch.Tensor:
+        """Apply the changes since the previous step and return the slot of
+        every logits row of this batch.
+        """
+        assert sampling_metadata.seq_groups is not None
+        self._num_updates += 1
+        for seq_group in sampling_metadata.seq_groups:
+            if seq_group.do_sample:
+                for seq_id in seq_group.seq_ids:
+                    self._last_updates[seq_id] = self._num_updates
+        min_update = self._num_updates - self.max_idle_updates
+        for seq_id in [
+                s for s, update in self._last_updates.items()
+                if update < min_update
+        ]:
+            del self._last_updates[seq_id]
+            slot = self._slots.pop(seq_id, None)
+            if slot is not None:
+                self._free_slots.append(slot)
+                del self._num_counted[seq_id]
+                del self._fingerprints[seq_id]
+
+        row_slots: List[int] = []
+        reset_slots: List[int] = []
+        prompt_slots: List[int] = []
+        prompt_token_ids: List[int] = []
+        output_slots: List[int] = []
+        output_token_ids: List[int] = []
+        for seq_group in sampling_metadata.seq_groups:
+            if (seq_group.is_prompt
+                    and seq_group.sampling_params.prompt_logprobs is not None):
+                row_slots.extend([0] * len(seq_group.prompt_logprob_indices))
+            if not seq_group.do_sample:
+                continue
+            for seq_id in seq_group.seq_ids:
+                seq_data = seq_group.seq_data[seq_id]
+                num_output = seq_data.get_output_len()
+                slot = self._slots.get(seq_id)
+                if slot is None or not self._is_continuation(
+                        seq_id, seq_group.request_id, seq_data):
+                    # New sequence, or its tokens were replaced: recount.
+                    if slot is None:
+                        slot = self._allocate_slot()
+                        self._slots[seq_id] = slot
+                    reset_slots.append(slot)
+                    prompt = seq_data.prompt_token_ids_array
+                    prompt_slots.extend([slot] * len(prompt))
+                    prompt_token_ids.extend(prompt)
+                    start = 0
+                else:
+                    start = self._num_counted[seq_id]
+                new_tokens = seq_data.output_token_ids_array[start:]
+                output_slots.extend([slot] * len(new_tokens))
+                output_token_ids.extend(new_tokens)
+                self._num_counted[seq_id] = num_output
+                self._fingerprints[seq_id] = _get_fingerprint(
+                    seq_group.request_id, seq_data)
+                row_slots.append(slot)
+
+        if reset_slots:
+            reset_t = self._to_device(reset_slots)
+            self.output_counts[reset_t] = 0
+            self.prompt_mask[reset_t] = False
+        if prompt_slots:
+            self.prompt_mask[self._to_device(prompt_slots),
+                             self._to_device(prompt_token_ids)] = True
+        if output_slots:
+            output_slots_t = self._to_device(output_slots)
+            self.output_counts.index_put_(
+                (output_slots_t, self._to_device(output_token_ids)),
+                torch.ones_like(output_slots_t, dtype=torch.int32),
+                accumulate=True)
+        return self._to_device(row_slots)
+
+    def _is_continuation(self, seq_id: int, request_id: Optional[str],
+                         seq_data: SequenceData) -> bool:
+        """Whether the sequence still belongs to the same request and starts
+        with the tokens that were counted in its slot."""
+        num_counted = self._num_counted[seq_id]
+        (counted_request_id, prompt_len, last_prompt_token,
+         tail) = self._fingerprints[seq_id]
+        output = seq_data.output_token_ids_array
+        prompt = seq_data.prompt_token_ids_array
+        return (request_id == counted_request_id
+                and len(output) >= num_counted and len(prompt) == prompt_len
+                and (prompt[-1] if prompt else -1) == last_prompt_token
+                and output[num_counted - len(tail):num_counted] == tail)
+
+    def _allocate_slot(self) -> int:
+        if not self._free_slots:
+            # Double the capacity, keeping the existing rows.
+            num_new = self._num_slots
+            self.output_counts = torch.cat([
+                self.output_counts,
+                self.output_counts.new_zeros((num_new, self.vocab_size))
+            ])
+            self.prompt_mask = torch.cat([
+                self.prompt_mask,
+                self.prompt_mask.new_zeros((num_new, self.vocab_size))
+            ])
+            self._free_slots.extend(
+                range(self._num_slots + num_new - 1, self._num_slots - 1, -1))
+            self._num_slots += num_new
+        return self._free_slots.pop()
+
+    def _to_device(self, data: List[int]) -> torch.Tensor:
+        return async_tensor_h2d(data, torch.long, self.device,
+                                self.pin_memory)
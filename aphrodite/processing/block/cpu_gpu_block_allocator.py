@@ -8,6 +8,7 @@ from aphrodite.processing.block.naive_block import (NaiveBlock,
                                                     NaiveBlockAllocator)
 from aphrodite.processing.block.prefix_caching_block import (
     PrefixCachingBlockAllocator)
+from aphrodite.processing.evictor_v2 import EvictionPolicy
 
 
 class CpuGpuBlockAllocator(DeviceAwareBlockAllocator):
@@ -28,6 +29,7 @@ class CpuGpuBlockAllocator(DeviceAwareBlockAllocator):
         num_gpu_blocks: int,
         num_cpu_blocks: int,
         block_size: int,
+        enable_host_caching: bool = False,
     ) -> DeviceAwareBlockAllocator:
         """Creates a CpuGpuBlockAllocator instance with the specified
         configuration.
@@ -46,6 +48,9 @@ class CpuGpuBlockAllocator(DeviceAwareBlockAllocator):
             num_cpu_blocks (int): The number of blocks to allocate for CPU
                 memory.
             block_size (int): The size of each block in number of tokens.
+            enable_host_caching (bool): Whether the CPU blocks are used as a
+                second tier of the prefix cache. Only supported with the
+                "prefix_caching" allocator type.
 
         Returns:
             DeviceAwareBlockAllocator: A CpuGpuBlockAllocator instance with the
@@ -59,6 +64,10 @@ class CpuGpuBlockAllocator(DeviceAwareBlockAllocator):
         gpu_block_ids = block_ids[:num_gpu_blocks]
         cpu_block_ids = block_ids[num_gpu_blocks:]
 
+        if enable_host_caching and allocator_type != "prefix_caching":
+            raise ValueError("Host caching requires the prefix_caching "
+                             "allocator type")
+
         if allocator_type == "naive":
             gpu_allocator: BlockAllocator = NaiveBlockAllocator(
                 create_block=NaiveBlock,  # type: ignore
@@ -80,10 +89,14 @@ class CpuGpuBlockAllocator(DeviceAwareBlockAllocator):
                 block_ids=gpu_block_ids,
             )
 
+            # The host tier holds many more blocks than the GPU, and its
+            # blocks are not added to the evictor in access time order.
             cpu_allocator = PrefixCachingBlockAllocator(
                 num_blocks=num_cpu_blocks,
                 block_size=block_size,
                 block_ids=cpu_block_ids,
+                eviction_policy=EvictionPolicy.HEAP_LRU
+                if enable_host_caching else EvictionPolicy.LRU,
             )
         else:
             raise ValueError(f"Unknown allocator type {allocator_type=}")
@@ -91,10 +104,13 @@ class CpuGpuBlockAllocator(DeviceAwareBlockAllocator):
         return CpuGpuBlockAllocator(
             cpu_block_allocator=cpu_allocator,
             gpu_block_allocator=gpu_allocator,
+            enable_host_caching=enable_host_caching,
         )
 
-    def __init__(self, cpu_block_allocator: BlockAllocator,
-                 gpu_block_allocator: BlockAllocator):
+    def __init__(self,
+                 cpu_block_allocator: BlockAllocator,
+                 gpu_block_allocator: BlockAllocator,
+                 enable_host_caching: bool = False):
         assert not (
             cpu_block_allocator.all_block_ids
             & gpu_block_allocator.all_block_ids
@@ -105,6 +121,14 @@ class CpuGpuBlockAllocator(DeviceAwareBlockAllocator):
             Device.GPU: gpu_block_allocator,
         }
 
+        self._host_caching_enabled = enable_host_caching
+        if enable_host_caching:
+            assert isinstance(gpu_block_allocator,
+                              PrefixCachingBlockAllocator)
+            assert isinstance(cpu_block_allocator,
+                              PrefixCachingBlockAllocator)
+            gpu_block_allocator.set_host_allocator(cpu_block_allocator)
+
         self._swap_mapping: Dict[int, int] = {}
         self._null_block: Optional[Block] = None
 
@@ -250,6 +274,12 @@ class CpuGpuBlockAllocator(DeviceAwareBlockAllocator):
             Dict[int, int]: Swap mapping from source_device
                 on to dest_device.
         """
+        if self._host_caching_enabled and src_device == Device.CPU:
+            # The freed CPU blocks are read by the swap in of this step.
+            gpu_allocator = self._allocators[Device.GPU]
+            assert isinstance(gpu_allocator, PrefixCachingBlockAllocator)
+            gpu_allocator.pause_host_demotions()
+
         src_block_ids = [block.block_id for block in blocks]
         self._allocators[src_device].swap_out(blocks)
         self._allocators[dst_device].swap_in(blocks)
@@ -327,10 +357,52 @@ class CpuGpuBlockAllocator(DeviceAwareBlockAllocator):
         return frozenset(self._block_ids_to_allocator.keys())
 
     def get_prefix_cache_hit_rate(self, device: Device) -> float:
-        """Prefix cache hit rate. -1 means not supported or disabled."""
+        """Prefix cache hit rate. -1 means not supported or disabled.
+
+        With host caching, the CPU hit rate is the hit rate of the host tier
+        for the blocks that miss on the GPU.
+        """
         assert device in self._allocators
+        if self._host_caching_enabled and device == Device.CPU:
+            gpu_allocator = self._allocators[Device.GPU]
+            assert isinstance(gpu_allocator, PrefixCachingBlockAllocator)
+            return gpu_allocator.get_host_cache_hit_rate()
         return self._allocators[device].get_prefix_cache_hit_rate()
 
+    def get_num_computed_prefix_blocks(
+            self, content_hashes: List[int]) -> Tuple[int, bool]:
+        """Looks up the full blocks of a prefix by content hash in the GPU
+        prefix cache, without allocating them. Only supported by the prefix
+        caching allocator."""
+        gpu_allocator = self._allocators[Device.GPU]
+        assert isinstance(gpu_allocator, PrefixCachingBlockAllocator)
+        return gpu_allocator.get_num_computed_prefix_blocks(content_hashes)
+
+    def mark_block_as_restored(self, block: Block) -> None:
+        """Marks a GPU block whose content is loaded from another tier of
+        the prefix cache before the model runs as computed. Only supported
+        by the prefix caching allocator."""
+        gpu_allocator = self._allocators[Device.GPU]
+        assert isinstance(gpu_allocator, PrefixCachingBlockAllocator)
+        gpu_allocator.mark_block_as_restored(block)
+
+    def get_and_reset_host_swaps(
+            self) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """Returns and clears the swaps of the host tier of the prefix cache
+        since the last call. Should be called after every schedule.
+
+        Returns:
+            Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]: The CPU to
+                GPU block ids of the promoted blocks, and the GPU to CPU
+                block ids of the demoted blocks. The demotions must be
+                issued before the promotions.
+        """
+        if not self._host_caching_enabled:
+            return [], []
+        gpu_allocator = self._allocators[Device.GPU]
+        assert isinstance(gpu_allocator, PrefixCachingBlockAllocator)
+        return gpu_allocator.get_and_reset_host_swaps()
+
     def get_and_reset_swaps(self) -> List[Tuple[int, int]]:
         """Returns and clears the mapping of source to destination block IDs.
         Will be called after every swapping operations for now, and after every
@@ -288,3 +288,25 @@ class DeviceAwareBlockAllocator(ABC):
     def get_prefix_cache_hit_rate(self, device: Device) -> float:
         """Prefix cache hit rate. -1 means not supported or disabled."""
         pass
+
+    @abstractmethod
+    def get_and_reset_host_swaps(
+            self) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """Returns and clears the (CPU, GPU) block ids of the blocks promoted
+        from and the (GPU, CPU) block ids of the blocks demoted to the host
+        tier of the prefix cache."""
+        pass
+
+    @abstractmethod
+    def get_num_computed_prefix_blocks(
+            self, content_hashes: List[int]) -> Tuple[int, bool]:
+        """Returns the number of leading blocks of a prefix that are
+        computed in the prefix cache, and whether the next block is cached
+        but not computed yet."""
+        pass
+
+    @abstractmethod
+    def mark_block_as_restored(self, block: Block) -> None:
+        """Marks a GPU block whose content is loaded from another tier of
+        the prefix cache as computed."""
+        pass
@@ -1,5 +1,6 @@
 """Token blocks."""
 
+import time
 from os.path import commonprefix
 from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
 
@@ -112,6 +113,22 @@ class PrefixCachingBlockAllocator(BlockAllocator):
 
         self.metric_data = CacheMetricData()
 
+        # Lazily built mapping of absolute to zero-offset block ids.
+        self._physical_block_ids: Optional[Dict[BlockId, int]] = None
+
+        # The allocator of the host (CPU) pool that is used as a second tier
+        # of the prefix cache, see set_host_allocator().
+        self._host_allocator: Optional[PrefixCachingBlockAllocator] = None
+        # Host cache swaps of the current scheduling step, as
+        # (host, device) block ids for promotions and (device, host) block
+        # ids for demotions, and the host blocks they reference, which are
+        # held until the swaps are issued.
+        self._host_promotions: List[Tuple[BlockId, BlockId]] = []
+        self._host_demotions: List[Tuple[BlockId, BlockId]] = []
+        self._held_host_blocks: List[Tuple[BlockId, PrefixHash]] = []
+        self._host_demotions_paused = False
+        self.host_metric_data = CacheMetricData()
+
     # Implements Block.Factory.
     def _create_block(
         self,
@@ -149,6 +166,13 @@ class PrefixCachingBlockAllocator(BlockAllocator):
             Block: The allocated immutable block.
         """
         assert device is None
+        return self._allocate_immutable_block(prev_block,
+                                              token_ids,
+                                              use_host_cache=True)
+
+    def _allocate_immutable_block(self, prev_block: Optional[Block],
+                                  token_ids: List[int],
+                                  use_host_cache: bool) -> Block:
         assert_prefix_caching_block_or_none(prev_block)
 
         # First, try to create a block that points to cached data
@@ -170,6 +194,11 @@ class PrefixCachingBlockAllocator(BlockAllocator):
         # No cached block => Allocate a new block
         block = self.allocate_mutable_block(prev_block)
         block.append_token_ids(token_ids)
+
+        # A block of the host cache is only useful if it extends the computed
+        # prefix.
+        if use_host_cache and (prev_block is None or prev_block.computed):
+            self._maybe_promote_from_host(block)
         return block
 
     def allocate_immutable_blocks(
@@ -312,6 +341,7 @@ class PrefixCachingBlockAllocator(BlockAllocator):
         assert _block_id == block_id
 
         self._cached_blocks.pop(content_hash_to_evict)
+        self._maybe_demote_to_host(block_id, content_hash_to_evict)
 
         self._refcounter.incr(block_id)
         self._track_block_id(block_id, computed=False)
@@ -405,7 +435,12 @@ class PrefixCachingBlockAllocator(BlockAllocator):
         Returns:
             int: The rzero-offset block id on certain device.
         """
-        return sorted(self.all_block_ids).index(absolute_id)
+        if self._physical_block_ids is None:
+            self._physical_block_ids = {
+                block_id: i
+                for i, block_id in enumerate(sorted(self.all_block_ids))
+            }
+        return self._physical_block_ids[absolute_id]
 
     @property
     def all_block_ids(self) -> FrozenSet[int]:
@@ -511,7 +546,37 @@ class PrefixCachingBlockAllocator(BlockAllocator):
                     "Mark block as accessed which is not belonged to GPU")
 
     def mark_blocks_as_computed(self, block_ids: List[int]) -> None:
-        raise NotImplementedError("Marking as computed is incremental")
+        """Marks the blocks of running sequences as computed, so that other
+        sequences reuse them before they are freed."""
+        for block_id in block_ids:
+            if self._block_tracker[block_id].active:
+                self._block_tracker[block_id].computed = True
+
+    def get_num_computed_prefix_blocks(
+            self, content_hashes: List[PrefixHash]) -> Tuple[int, bool]:
+        """Looks up the blocks of a prefix in the cache without allocating
+        them. Blocks in the host tier count as computed, as they are swapped
+        in instead of recomputed.
+
+        Args:
+            content_hashes (List[PrefixHash]): The content hashes of the full
+                blocks of the prefix.
+
+        Returns:
+            Tuple[int, bool]: The number of leading blocks that are computed,
+                and whether the next block is cached but not computed yet,
+                i.e. its prefill is running.
+        """
+        for i, content_hash in enumerate(content_hashes):
+            block_id = self._cached_blocks.get(content_hash)
+            if block_id is None:
+                if (self._host_allocator is not None and content_hash
+                        in self._host_allocator._cached_blocks):
+                    continue
+                return i, False
+            if not self.block_is_computed(block_id):
+                return i, True
+        return len(content_hashes), False
 
     def _track_block_id(self, block_id: Optional[BlockId],
                         computed: bool) -> None:
@@ -627,8 +692,12 @@ class PrefixCachingBlockAllocator(BlockAllocator):
             # and the block_id is assigned to "block" to allow reusing the
             # existing "block" object
             if block.is_full:
-                tmp_block = self.allocate_immutable_block(
-                    prev_block=block.prev_block, token_ids=block.token_ids)
+                # The content is swapped in from the swap mapping, so the
+                # host cache is not looked up.
+                tmp_block = self._allocate_immutable_block(
+                    prev_block=block.prev_block,
+                    token_ids=block.token_ids,
+                    use_host_cache=False)
             else:
                 tmp_block = self.allocate_mutable_block(
                     prev_block=block.prev_block)
@@ -639,6 +708,146 @@ class PrefixCachingBlockAllocator(BlockAllocator):
 
             block.block_id = block_id  # Assign block_id
 
+    def set_host_allocator(self,
+                           host_allocator: "PrefixCachingBlockAllocator"
+                           ) -> None:
+        """Use the prefix cache of host_allocator as a second tier of this
+        one.
+
+        Immutable blocks that are evicted from this allocator are demoted by
+        content hash into the host allocator, and a block that misses in this
+        allocator but hits in the host allocator is promoted by swapping it
+        in instead of recomputing it. The copies of both are returned by
+        get_and_reset_host_swaps(), and must be issued with the other swaps
+        of the step, swap outs first.
+        """
+        self._host_allocator = host_allocator
+
+    def pause_host_demotions(self) -> None:
+        """Stop demoting evicted blocks until the end of the step.
+
+        Host blocks that are freed during the step may still be read by a
+        swap in of the step, so they must not be overwritten by a demotion.
+        """
+        self._host_demotions_paused = True
+
+    def get_and_reset_host_swaps(
+        self
+    ) -> Tuple[List[Tuple[BlockId, BlockId]], List[Tuple[BlockId, BlockId]]]:
+        """Returns and clears the host cache swaps of the step, and releases
+        the host blocks they reference.
+
+        Returns:
+            Tuple[List[Tuple[BlockId, BlockId]], List[Tuple[BlockId,
+                BlockId]]]: The (host, device) block ids of the promoted
+                blocks and the (device, host) block ids of the demoted
+                blocks.
+        """
+        promotions = self._host_promotions
+        demotions = self._host_demotions
+        self._host_promotions = []
+        self._host_demotions = []
+        if self._host_allocator is not None:
+            for block_id, content_hash in self._held_host_blocks:
+                self._host_allocator.release_cached_block(
+                    block_id, content_hash)
+        self._held_host_blocks.clear()
+        self._host_demotions_paused = False
+        return promotions, demotions
+
+    def get_host_cache_hit_rate(self) -> float:
+        """Hit rate of the host cache for the blocks that miss in this
+        allocator. -1 means the host cache is disabled."""
+        if self._host_allocator is None:
+            return -1
+        return self.host_metric_data.get_hit_rate()
+
+    def _maybe_demote_to_host(self, block_id: BlockId,
+                              content_hash: PrefixHash) -> None:
+        if self._host_allocator is None or self._host_demotions_paused:
+            return
+        host_block_id = self._host_allocator.insert_cached_block(content_hash)
+        if host_block_id is None:
+            return
+        self._host_demotions.append((block_id, host_block_id))
+        self._held_host_blocks.append((host_block_id, content_hash))
+
+    def _maybe_promote_from_host(self, block: Block) -> None:
+        if self._host_allocator is None or block.content_hash is None:
+            return
+        host_block_id = self._host_allocator.acquire_cached_block(
+            block.content_hash)
+        self.host_metric_data.query(hit=host_block_id is not None)
+        if host_block_id is None:
+            return
+        assert block.block_id is not None
+        self._host_promotions.append((host_block_id, block.block_id))
+        self._held_host_blocks.append((host_block_id, block.content_hash))
+        self.mark_block_as_restored(block)
+
+    def mark_block_as_restored(self, block: Block) -> None:
+        """Marks a block whose content is copied in from another tier of the
+        prefix cache before the model runs, so that it is used as computed
+        right away."""
+        assert block.block_id is not None
+        assert block.content_hash is not None
+        block.computed = True
+        self._block_tracker[block.block_id].computed = True
+
+    def insert_cached_block(self,
+                            content_hash: PrefixHash) -> Optional[BlockId]:
+        """Allocates a block for content demoted from a higher tier and
+        caches it under content_hash. The block is held until
+        release_cached_block() is called, so that it is not reused before
+        the content is copied.
+
+        The content is not admitted if it is already cached, or if all
+        blocks are in use, e.g. by swapped out sequences.
+
+        Returns:
+            Optional[BlockId]: The block to copy the content to, or None if
+                the content is not admitted.
+        """
+        block_id = self._cached_blocks.get(content_hash)
+        if block_id is not None:
+            # Refresh the recency of the cached copy.
+            if block_id in self.evictor:
+                self.evictor.update(block_id, time.time())
+            return None
+
+        try:
+            block_id = self._allocate_block_id()
+        except BlockAllocator.NoFreeBlocksError:
+            return None
+        self._cached_blocks[content_hash] = block_id
+        self._block_tracker[block_id].computed = True
+        return block_id
+
+    def acquire_cached_block(self,
+                             content_hash: PrefixHash) -> Optional[BlockId]:
+        """Holds the cached block with content_hash, if any, until
+        release_cached_block() is called, so that it is not evicted before
+        its content is copied."""
+        block_id = self._cached_blocks.get(content_hash)
+        if block_id is None:
+            return None
+        if self._refcounter.incr(block_id) == 1:
+            self.evictor.remove(block_id)
+            self._track_block_id(block_id, computed=True)
+        return block_id
+
+    def release_cached_block(self, block_id: BlockId,
+                             content_hash: PrefixHash) -> None:
+        """Releases a block held by insert_cached_block() or
+        acquire_cached_block()."""
+        if self._refcounter.decr(block_id) > 0:
+            return
+        assert self._cached_blocks[content_hash] == block_id
+        # The blocks of this allocator are ordered by their last use as a
+        # cache tier.
+        self.evictor.add(block_id, content_hash, 0, time.time())
+        self._untrack_block_id(block_id)
+
 
 class PrefixCachingBlock(Block):
     """A block implementation that supports prefix caching.
@@ -17,7 +17,8 @@ from aphrodite.processing.block.utils import (
     check_no_caching_or_swa_for_blockmgr_encdec)
 from aphrodite.processing.evictor_v1 import (EvictionPolicy, Evictor,
                                              make_evictor)
-from aphrodite.processing.interfaces import AllocStatus, BlockSpaceManager
+from aphrodite.processing.interfaces import (AllocStatus, BlockSpaceManager,
+                                             PrefixCacheLookup)
 
 
 class BlockAllocatorBase(ABC):
@@ -735,3 +736,16 @@ class BlockSpaceManagerV1(BlockSpaceManager):
         if device == Device.CPU:
             return self.cpu_allocator.get_prefix_cache_hit_rate()
         raise ValueError(f"Invalid device: {device}")
+
+    def get_and_reset_host_cache_swaps(
+            self) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        return [], []
+
+    def get_and_reset_disk_cache_ops(
+            self) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]],
+                           List[str]]:
+        return [], [], []
+
+    def lookup_prefix_cache(
+            self, seqs: List[Sequence]) -> List[PrefixCacheLookup]:
+        return [PrefixCacheLookup() for _ in seqs]
@@ -11,10 +11,14 @@ from aphrodite.processing.block.cpu_gpu_block_allocator import (
     CpuGpuBlockAllocator)
 from aphrodite.processing.block.interfaces import Block
 from aphrodite.processing.block.prefix_caching_block import (
-    ComputedBlocksTracker, LastAccessBlocksTracker)
+    ComputedBlocksTracker, LastAccessBlocksTracker, PrefixCachingBlock)
 from aphrodite.processing.block.utils import (
     check_no_caching_or_swa_for_blockmgr_encdec)
-from aphrodite.processing.interfaces import AllocStatus, BlockSpaceManager
+from aphrodite.processing.interfaces import (AllocStatus, BlockSpaceManager,
+                                             PrefixCacheLookup)
+from aphrodite.processing.kv_disk_cache import (DiskBlockMapping,
+                                                KVDiskCacheIndex,
+                                                iter_block_keys)
 
 SeqId = int
 EncoderSeqId = str
@@ -55,6 +59,13 @@ class BlockSpaceManagerV2(BlockSpaceManager):
             window. Defaults to None.
         enable_caching (bool, optional): Flag indicating whether caching is
             enabled. Defaults to False.
+        enable_host_caching (bool, optional): Flag indicating whether the CPU
+            blocks are used as a second tier of the prefix cache. Requires
+            enable_caching. Defaults to False.
+        kv_disk_cache (Optional[KVDiskCacheIndex], optional): The index of the
+            on-disk cache of prefix blocks, which the prefix cache misses
+            are loaded from and the reused prefix blocks are saved to.
+            Requires enable_caching. Defaults to None.
     """
 
     def __init__(
@@ -65,6 +76,8 @@ class BlockSpaceManagerV2(BlockSpaceManager):
         watermark: float = 0.01,
         sliding_window: Optional[int] = None,
         enable_caching: bool = False,
+        enable_host_caching: bool = False,
+        kv_disk_cache: Optional[KVDiskCacheIndex] = None,
     ) -> None:
         self.block_size = block_size
         self.num_total_gpu_blocks = num_gpu_blocks
@@ -87,6 +100,8 @@ class BlockSpaceManagerV2(BlockSpaceManager):
         assert watermark >= 0.0
 
         self.enable_caching = enable_caching
+        assert kv_disk_cache is None or enable_caching
+        self.kv_disk_cache = kv_disk_cache
 
         self.watermark_blocks = int(watermark * num_gpu_blocks)
 
@@ -95,6 +110,7 @@ class BlockSpaceManagerV2(BlockSpaceManager):
             num_gpu_blocks=num_gpu_blocks,
             num_cpu_blocks=num_cpu_blocks,
             block_size=block_size,
+            enable_host_caching=enable_host_caching,
         )
 
         self.block_tables: Dict[SeqId, BlockTable] = {}
@@ -102,6 +118,12 @@ class BlockSpaceManagerV2(BlockSpaceManager):
 
         self._computed_blocks_tracker = ComputedBlocksTracker(
             self.block_allocator)
+        # The number of leading blocks of each running sequence that are
+        # marked as computed.
+        self._num_marked_blocks: Dict[SeqId, int] = {}
+        # The content hashes of the full blocks of the sequences that were
+        # looked up by the last lookup_prefix_cache() call.
+        self._lookup_block_hashes: Dict[SeqId, List[int]] = {}
         self._last_access_blocks_tracker = LastAccessBlocksTracker(
             self.block_allocator)
 
@@ -161,6 +183,8 @@ class BlockSpaceManagerV2(BlockSpaceManager):
         seq = waiting_seqs[0]
         block_table: BlockTable = self._allocate_sequence(seq)
         self.block_tables[seq.seq_id] = block_table
+        if self.kv_disk_cache is not None:
+            self._load_from_disk_cache(seq, block_table)
 
         # Track seq
         self._computed_blocks_tracker.add_seq(seq.seq_id)
@@ -250,6 +274,10 @@ class BlockSpaceManagerV2(BlockSpaceManager):
         # Untrack seq
         self._last_access_blocks_tracker.remove_seq(seq_id)
         self._computed_blocks_tracker.remove_seq(seq_id)
+        self._num_marked_blocks.pop(seq_id, None)
+
+        if self.kv_disk_cache is not None:
+            self._save_to_disk_cache(seq, self.block_tables[seq_id])
 
         # Free table/blocks
         self.block_tables[seq_id].free()
@@ -286,11 +314,62 @@ class BlockSpaceManagerV2(BlockSpaceManager):
 
     def mark_blocks_as_computed(self, seq_group: SequenceGroup,
                                 token_chunk_size: int):
-        # The only need for mark block as computed is for prefix caching,
-        # while currently we could determine whether one block is computed
-        # or not by check whether it has content hash.
-        # So this function is useless for block_v2.
-        pass
+        """Marks the full blocks that the scheduled tokens complete as
+        computed, so that other sequences reuse them while the sequence is
+        running. They are computed by the time the next batch is scheduled.
+        """
+        if not self.enable_caching:
+            return
+        for seq in seq_group.get_seqs(status=SequenceStatus.RUNNING):
+            block_ids = self.block_tables[seq.seq_id].physical_block_ids
+            num_computed_blocks = min(
+                len(block_ids), (seq.data.get_num_computed_tokens() +
+                                 token_chunk_size) // self.block_size)
+            num_marked_blocks = self._num_marked_blocks.get(seq.seq_id, 0)
+            if num_computed_blocks > num_marked_blocks:
+                self.block_allocator.mark_blocks_as_computed(
+                    block_ids[num_marked_blocks:num_computed_blocks])
+                self._num_marked_blocks[seq.seq_id] = num_computed_blocks
+
+    def lookup_prefix_cache(
+            self, seqs: List[Sequence]) -> List[PrefixCacheLookup]:
+        """Looks up the full blocks of waiting sequences in the prefix cache
+        without allocating them. The block hashes of a sequence are kept for
+        the next call, as long as the sequence is looked up in every call.
+        """
+        if not self.enable_caching:
+            return [PrefixCacheLookup() for _ in seqs]
+        lookups: List[PrefixCacheLookup] = []
+        block_hashes: Dict[SeqId, List[int]] = {}
+        for seq in seqs:
+            seq_block_hashes = self._lookup_block_hashes.get(seq.seq_id)
+            if seq_block_hashes is None:
+                seq_block_hashes = self._get_block_hashes(seq)
+            block_hashes[seq.seq_id] = seq_block_hashes
+            num_computed_blocks, next_block_pending = (
+                self.block_allocator.get_num_computed_prefix_blocks(
+                    seq_block_hashes))
+            next_block_key = None
+            if num_computed_blocks < len(seq_block_hashes):
+                next_block_key = seq_block_hashes[num_computed_blocks]
+            lookups.append(
+                PrefixCacheLookup(num_computed_blocks, next_block_key,
+                                  next_block_pending))
+        self._lookup_block_hashes = block_hashes
+        return lookups
+
+    def _get_block_hashes(self, seq: Sequence) -> List[int]:
+        token_ids = seq.get_token_ids()
+        block_hashes: List[int] = []
+        prev_block_hash: Optional[int] = None
+        for start in range(0,
+                           len(token_ids) - self.block_size + 1,
+                           self.block_size):
+            prev_block_hash = PrefixCachingBlock.hash_block_tokens(
+                prev_block_hash is None, prev_block_hash,
+                token_ids[start:start + self.block_size])
+            block_hashes.append(prev_block_hash)
+        return block_hashes
 
     def get_common_computed_block_ids(
             self, seqs: List[Sequence]) -> GenericSequence[int]:
@@ -365,6 +444,8 @@ class BlockSpaceManagerV2(BlockSpaceManager):
 
             # Refresh the block ids of the table (post-swap)
             self.block_tables[seq.seq_id].update(blocks)
+            # The blocks are marked again with their new ids.
+            self._num_marked_blocks.pop(seq.seq_id, None)
 
             seq_physical_block_id_mapping = {
                 self.block_allocator.get_physical_block_id(
@@ -420,6 +501,8 @@ class BlockSpaceManagerV2(BlockSpaceManager):
 
             # Refresh the block ids of the table (post-swap)
             self.block_tables[seq.seq_id].update(blocks)
+            # The blocks are marked again with their new ids.
+            self._num_marked_blocks.pop(seq.seq_id, None)
 
             seq_physical_block_id_mapping = {
                 self.block_allocator.get_physical_block_id(
@@ -443,6 +526,84 @@ class BlockSpaceManagerV2(BlockSpaceManager):
     def get_prefix_cache_hit_rate(self, device: Device) -> float:
         return self.block_allocator.get_prefix_cache_hit_rate(device)
 
+    def get_and_reset_host_cache_swaps(
+            self) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """Returns the physical block id mappings of the host tier of the
+        prefix cache since the last call: CPU to GPU for the blocks that are
+        promoted instead of recomputed, and GPU to CPU for the evicted blocks
+        that are demoted. The demotions must be issued before the promotions
+        and the swap ins of the step.
+        """
+        promotions, demotions = self.block_allocator.get_and_reset_host_swaps()
+        get_physical_block_id = self.block_allocator.get_physical_block_id
+        blocks_to_swap_in = [(get_physical_block_id(Device.CPU, cpu_block_id),
+                              get_physical_block_id(Device.GPU, gpu_block_id))
+                             for cpu_block_id, gpu_block_id in promotions]
+        blocks_to_swap_out = [
+            (get_physical_block_id(Device.GPU, gpu_block_id),
+             get_physical_block_id(Device.CPU, cpu_block_id))
+            for gpu_block_id, cpu_block_id in demotions
+        ]
+        return blocks_to_swap_in, blocks_to_swap_out
+
+    def get_and_reset_disk_cache_ops(
+            self) -> Tuple[DiskBlockMapping, DiskBlockMapping, List[str]]:
+        """Returns and clears the (key, physical GPU block id) pairs of the
+        blocks to save to and load from the disk cache, and the keys to
+        remove from it, since the last call. The saves must be issued before
+        the GPU blocks are written to.
+        """
+        if self.kv_disk_cache is None:
+            return [], [], []
+        return self.kv_disk_cache.get_and_reset_ops()
+
+    def _load_from_disk_cache(self, seq: Sequence,
+                              block_table: BlockTable) -> None:
+        """Restores the prefix blocks of a new sequence that miss the prefix
+        cache from the disk cache."""
+        assert self.kv_disk_cache is not None
+        # The last prompt token is always computed.
+        num_blocks = (seq.get_prompt_len() - 1) // self.block_size
+        keys = iter_block_keys(seq.lora_request, seq.get_token_ids(),
+                               self.block_size, num_blocks)
+        for block, key in zip(block_table.blocks, keys):
+            if block.computed:
+                continue
+            if not self.kv_disk_cache.lookup(key):
+                break
+            assert block.block_id is not None
+            self.block_allocator.mark_block_as_restored(block)
+            self.kv_disk_cache.load(
+                key,
+                self.block_allocator.get_physical_block_id(
+                    Device.GPU, block.block_id))
+
+    def _save_to_disk_cache(self, seq: Sequence,
+                            block_table: BlockTable) -> None:
+        """Saves the computed prefix blocks of a sequence to the disk
+        cache. Only the blocks that were reused from the prefix cache are
+        saved, so that prompts that are seen once do not evict the shared
+        prefixes."""
+        assert self.kv_disk_cache is not None
+        blocks = block_table.blocks
+        # The blocks of an aborted swapped out sequence are on the CPU. The
+        # GPU blocks have the lowest ids.
+        if not blocks or blocks[0].block_id is None or (
+                blocks[0].block_id >= self.num_total_gpu_blocks):
+            return
+        num_blocks = min(seq.get_prompt_len(),
+                         seq.data.get_num_computed_tokens()) // self.block_size
+        keys = iter_block_keys(seq.lora_request, seq.get_token_ids(),
+                               self.block_size, num_blocks)
+        for block, key in zip(blocks, keys):
+            if not block.computed:
+                break
+            assert block.block_id is not None
+            self.kv_disk_cache.save(
+                key,
+                self.block_allocator.get_physical_block_id(
+                    Device.GPU, block.block_id))
+
     def _can_swap(self,
                   seq_group: SequenceGroup,
                   device: Device,
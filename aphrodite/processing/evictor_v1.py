@@ -1,6 +1,7 @@
 import enum
+import heapq
 from abc import ABC, abstractmethod
-from typing import OrderedDict
+from typing import Dict, List, OrderedDict, Tuple
 
 from aphrodite.common.block import PhysicalTokenBlock
 
@@ -10,6 +11,7 @@ class EvictionPolicy(enum.Enum):
        Evictor subclass.
     """
     LRU = enum.auto()
+    HEAP_LRU = enum.auto()
 
 
 class Evictor(ABC):
@@ -99,8 +101,86 @@ class LRUEvictor(Evictor):
         return len(self.free_table)
 
 
+class HeapLRUEvictor(Evictor):
+    """Same eviction order as LRUEvictor, but backed by a binary heap so that
+    evict() runs in O(log n) instead of scanning the free table.
+
+    Heap entries snapshot (last_accessed, -num_hashed_tokens) when a block is
+    added. remove() leaves the entry behind and evict() lazily discards
+    entries whose block is no longer in the free table. If a block's metadata
+    changed while it was sitting in the evictor, its entry is re-pushed with
+    the current values rather than trusted. The heap is rebuilt from the free
+    table once stale entries outnumber live ones.
+    """
+
+    # Do not bother compacting tiny heaps.
+    _MIN_COMPACT_SIZE = 64
+
+    def __init__(self):
+        self.free_table: Dict[int, PhysicalTokenBlock] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+
+    def __contains__(self, block_hash: int) -> bool:
+        return block_hash in self.free_table
+
+    def _maybe_compact(self):
+        if (len(self._heap) > self._MIN_COMPACT_SIZE
+                and len(self._heap) > 2 * len(self.free_table)):
+            self._heap = [(block.last_accessed, -block.num_hashed_tokens,
+                           block_hash)
+                          for block_hash, block in self.free_table.items()]
+            heapq.heapify(self._heap)
+
+    def evict(self) -> PhysicalTokenBlock:
+        if len(self.free_table) == 0:
+            raise ValueError("No usable cache memory left")
+
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            last_accessed, neg_num_hashed_tokens, block_hash = entry
+            block = self.free_table.get(block_hash)
+            if block is None:
+                # Removed from the evictor after this entry was pushed.
+                continue
+            if (block.last_accessed != last_accessed
+                    or block.num_hashed_tokens != -neg_num_hashed_tokens):
+                heapq.heappush(self._heap,
+                               (block.last_accessed, -block.num_hashed_tokens,
+                                block_hash))
+                continue
+            self.free_table.pop(block_hash)
+            evicted_block = block
+            break
+        else:
+            raise AssertionError(
+                "Evictor heap is out of sync with free table")
+
+        evicted_block.computed = False
+        return evicted_block
+
+    def add(self, block: PhysicalTokenBlock):
+        self.free_table[block.block_hash] = block
+        heapq.heappush(self._heap, (block.last_accessed,
+                                    -block.num_hashed_tokens, block.block_hash))
+        self._maybe_compact()
+
+    def remove(self, block_hash: int) -> PhysicalTokenBlock:
+        if block_hash not in self.free_table:
+            raise ValueError(
+                "Attempting to remove block that's not in the evictor")
+        block: PhysicalTokenBlock = self.free_table.pop(block_hash)
+        self._maybe_compact()
+        return block
+
+    @property
+    def num_blocks(self) -> int:
+        return len(self.free_table)
+
+
 def make_evictor(eviction_policy: EvictionPolicy) -> Evictor:
     if eviction_policy == EvictionPolicy.LRU:
         return LRUEvictor()
+    elif eviction_policy == EvictionPolicy.HEAP_LRU:
+        return HeapLRUEvictor()
     else:
         raise ValueError(f"Unknown cache eviction policy: {eviction_policy}")
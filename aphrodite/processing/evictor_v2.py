@@ -1,6 +1,7 @@
 import enum
+import heapq
 from abc import ABC, abstractmethod
-from typing import OrderedDict, Tuple
+from typing import Dict, List, OrderedDict, Tuple
 
 
 class EvictionPolicy(enum.Enum):
@@ -8,6 +9,7 @@ class EvictionPolicy(enum.Enum):
        Evictor subclass.
     """
     LRU = enum.auto()
+    HEAP_LRU = enum.auto()
 
 
 class Evictor(ABC):
@@ -125,8 +127,85 @@ class LRUEvictor(Evictor):
         return len(self.free_table)
 
 
+class HeapLRUEvictor(Evictor):
+    """Same eviction order as LRUEvictor, but backed by a binary heap so that
+    evict() and update() run in O(log n) instead of scanning the free table.
+
+    The heap is keyed on (last_accessed, -num_hashed_tokens, block_id).
+    Entries are never removed from the middle of the heap; instead, remove()
+    and update() leave the old entry behind and evict() lazily discards any
+    entry that no longer matches the metadata in free_table. The heap is
+    rebuilt from free_table once stale entries outnumber live ones, which
+    keeps its size bounded by O(num_blocks).
+    """
+
+    # Do not bother compacting tiny heaps.
+    _MIN_COMPACT_SIZE = 64
+
+    def __init__(self):
+        self.free_table: Dict[int, BlockMetaData] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+
+    def __contains__(self, block_id: int) -> bool:
+        return block_id in self.free_table
+
+    def _push(self, block_id: int, block: BlockMetaData):
+        heapq.heappush(
+            self._heap,
+            (block.last_accessed, -block.num_hashed_tokens, block_id))
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        if (len(self._heap) > self._MIN_COMPACT_SIZE
+                and len(self._heap) > 2 * len(self.free_table)):
+            self._heap = [(block.last_accessed, -block.num_hashed_tokens, _id)
+                          for _id, block in self.free_table.items()]
+            heapq.heapify(self._heap)
+
+    def evict(self) -> Tuple[int, int]:
+        if len(self.free_table) == 0:
+            raise ValueError("No usable cache memory left")
+
+        while self._heap:
+            last_accessed, neg_num_hashed_tokens, block_id = heapq.heappop(
+                self._heap)
+            block = self.free_table.get(block_id)
+            # Skip entries invalidated by remove() or update().
+            if (block is None or block.last_accessed != last_accessed
+                    or block.num_hashed_tokens != -neg_num_hashed_tokens):
+                continue
+            self.free_table.pop(block_id)
+            return block_id, block.content_hash
+
+        raise AssertionError("Evictor heap is out of sync with free table")
+
+    def add(self, block_id: int, content_hash: int, num_hashed_tokens: int,
+            last_accessed: float):
+        block = BlockMetaData(content_hash, num_hashed_tokens, last_accessed)
+        self.free_table[block_id] = block
+        self._push(block_id, block)
+
+    def update(self, block_id: int, last_accessed: float):
+        block = self.free_table[block_id]
+        block.last_accessed = last_accessed
+        self._push(block_id, block)
+
+    def remove(self, block_id: int):
+        if block_id not in self.free_table:
+            raise ValueError(
+                "Attempting to remove block that's not in the evictor")
+        self.free_table.pop(block_id)
+        self._maybe_compact()
+
+    @property
+    def num_blocks(self) -> int:
+        return len(self.free_table)
+
+
 def make_evictor(eviction_policy: EvictionPolicy) -> Evictor:
     if eviction_policy == EvictionPolicy.LRU:
         return LRUEvictor()
+    elif eviction_policy == EvictionPolicy.HEAP_LRU:
+        return HeapLRUEvictor()
     else:
         raise ValueError(f"Unknown cache eviction policy: {eviction_policy}")
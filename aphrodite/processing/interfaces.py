@@ -1,6 +1,7 @@
 import enum
 from abc import ABC, abstractmethod
-from typing import List
+from dataclasses import dataclass
+from typing import List, Optional
 from typing import Sequence as GenericSequence
 from typing import Tuple
 
@@ -22,6 +23,19 @@ class AllocStatus(enum.Enum):
     NEVER = enum.auto()
 
 
+@dataclass
+class PrefixCacheLookup:
+    """The prefix cache state of a waiting sequence."""
+    # The number of leading full blocks of the sequence that are computed in
+    # the prefix cache.
+    num_computed_blocks: int = 0
+    # Identifies the prefix up to and including the first full block that is
+    # not computed. None if there is no such block.
+    next_block_key: Optional[int] = None
+    # Whether that block is in the prefix cache, but its prefill is running.
+    next_block_pending: bool = False
+
+
 class BlockSpaceManager(ABC):
 
     @staticmethod
@@ -124,3 +138,27 @@ class BlockSpaceManager(ABC):
     def get_prefix_cache_hit_rate(self, device: Device) -> float:
         """Prefix cache hit rate. -1 means not supported or disabled."""
         pass
+
+    @abstractmethod
+    def get_and_reset_host_cache_swaps(
+            self) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """Returns and clears the CPU -> GPU swaps of the blocks promoted from
+        and the GPU -> CPU swaps of the blocks demoted to the host tier of
+        the prefix cache."""
+        pass
+
+    @abstractmethod
+    def get_and_reset_disk_cache_ops(
+            self) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]],
+                           List[str]]:
+        """Returns and clears the (key, GPU block) pairs of the blocks to save
+        to and load from the on-disk prefix cache, and the keys to remove
+        from it."""
+        pass
+
+    @abstractmethod
+    def lookup_prefix_cache(
+            self, seqs: List[Sequence]) -> List[PrefixCacheLookup]:
+        """Looks up the prompts of waiting sequences in the prefix cache
+        without allocating blocks."""
+        pass
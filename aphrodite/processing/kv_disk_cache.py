@@ -0,0 +1,478 @@
+"""A persistent on-disk cache of prefix KV blocks.
+
+Each full block of a prompt prefix is stored in one file per tensor parallel
+rank. The file is named after a key that chains a digest of the token ids of
+all blocks of the prefix, seeded with the LoRA of the sequence. The files are
+kept in a directory named after a fingerprint of the model and its weight
+files, so that a cache written for other weights, dtype or parallel layout is
+never read, and each rank also checks the layout of its own KV cache against
+the one the files were written with.
+
+The scheduler keeps the index of the stored blocks in LRU order up to a size
+cap, and decides which blocks to save, load and remove. The workers write
+the blocks in the background and map them back into the GPU cache.
+"""
+import enum
+import functools
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (TYPE_CHECKING, Any, Callable, Dict, Iterator, List,
+                    Optional, Sequence, Set, Tuple)
+
+from loguru import logger
+
+from aphrodite.lora.request import LoRARequest
+
+if TYPE_CHECKING:
+    from aphrodite.common.config import (CacheConfig, ModelConfig,
+                                         ParallelConfig)
+
+# Bump when the file format or the key derivation changes.
+_FORMAT_VERSION = 1
+_MAGIC = b"APKV"
+_KEY_SIZE = 16
+# Magic, format version, key, payload size and payload CRC32.
+_HEADER = struct.Struct(f"<4sI{_KEY_SIZE}sQI")
+_BLOCK_FILE_SUFFIX = ".kv"
+_TMP_FILE_SUFFIX = ".tmp"
+# How long a saved block may take to be written before its key is dropped.
+_WRITE_TIMEOUT_S = 60.0
+
+# (key, block id) pairs of the blocks to save to or load from the disk cache.
+DiskBlockMapping = List[Tuple[str, int]]
+
+
+def _get_files_fingerprint(path: str) -> List[Tuple[str, int, int]]:
+    """Get the name, size and modification time of the file, or of the files
+    in the directory. Empty if the path is not local, e.g. a model on the
+    Hugging Face Hub."""
+    if os.path.isdir(path):
+        paths = [entry.path for entry in os.scandir(path) if entry.is_file()]
+    elif os.path.isfile(path):
+        paths = [path]
+    else:
+        return []
+    fingerprint = []
+    for file_path in paths:
+        stat = os.stat(file_path)
+        fingerprint.append(
+            (os.path.basename(file_path), stat.st_size, stat.st_mtime_ns))
+    return sorted(fingerprint)
+
+
+def get_kv_disk_cache_dir(cache_config: "CacheConfig",
+                          model_config: "ModelConfig",
+                          parallel_config: "ParallelConfig") -> str:
+    """Get the directory of the disk cache of the model, under
+    cache_config.kv_disk_cache_path.
+
+    The directory is resolved once by the engine and kept in
+    cache_config.kv_disk_cache_dir, so that the workers use the same
+    directory even if their copies of the model files have other
+    modification times.
+    """
+    assert cache_config.kv_disk_cache_path is not None
+    if cache_config.kv_disk_cache_dir is not None:
+        return cache_config.kv_disk_cache_dir
+    fingerprint = {
+        "format_version": _FORMAT_VERSION,
+        "model": model_config.model,
+        "revision": model_config.revision,
+        # The commit of the snapshot the config was loaded from, if the
+        # model is on the Hugging Face Hub, and the files otherwise, so that
+        # the cache is not reused after the weights are replaced.
+        "commit_hash": getattr(model_config.hf_config, "_commit_hash", None),
+        "weight_files": _get_files_fingerprint(model_config.model),
+        "quantization": model_config.quantization,
+        "hf_config": model_config.hf_config.to_json_string(),
+        "dtype": str(model_config.dtype),
+        "cache_dtype": cache_config.cache_dtype,
+        "block_size": cache_config.block_size,
+        "tensor_parallel_size": parallel_config.tensor_parallel_size,
+    }
+    digest = hashlib.blake2b(json.dumps(fingerprint,
+                                        sort_keys=True).encode(),
+                             digest_size=8).hexdigest()
+    return os.path.join(cache_config.kv_disk_cache_path, digest)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_lora_seed_key(lora_int_id: int, lora_name: str,
+                       lora_path: str) -> bytes:
+    # The workers load the files of a LoRA id once, so they are only checked
+    # once per id as well. The id itself is not stable across restarts.
+    fingerprint = [lora_name, lora_path,
+                   _get_files_fingerprint(os.path.expanduser(lora_path))]
+    return hashlib.blake2b(json.dumps(fingerprint).encode(),
+                           digest_size=_KEY_SIZE).digest()
+
+
+def get_seed_key(lora_request: Optional[LoRARequest]) -> bytes:
+    """Get the key that the key of the first block of a sequence is chained
+    from. It is derived from the LoRA and the size and modification time of
+    its files, if they are local."""
+    if lora_request is None:
+        return b""
+    return _get_lora_seed_key(lora_request.lora_int_id,
+                              lora_request.lora_name, lora_request.lora_path)
+
+
+def hash_block_tokens(prev_key: bytes, token_ids: Sequence[int]) -> bytes:
+    """Chain the key of a block from the key of the previous block.
+
+    This mirrors PrefixCachingBlock.hash_block_tokens, but uses a digest
+    that is stable across processes, unlike hash().
+    """
+    return hashlib.blake2b(prev_key + array("i", token_ids).tobytes(),
+                           digest_size=_KEY_SIZE).digest()
+
+
+def iter_block_keys(lora_request: Optional[LoRARequest],
+                    token_ids: Sequence[int], block_size: int,
+                    num_blocks: int) -> Iterator[str]:
+    """Yield the keys of the first num_blocks full blocks of the token ids,
+    as hex strings."""
+    key = get_seed_key(lora_request)
+    for start in range(0, num_blocks * block_size, block_size):
+        key = hash_block_tokens(key, token_ids[start:start + block_size])
+        yield key.hex()
+
+
+def _get_block_file_name(key: str, rank: int) -> str:
+    return f"{key}.{rank}{_BLOCK_FILE_SUFFIX}"
+
+
+def _parse_block_file_name(name: str) -> Optional[Tuple[str, int]]:
+    if not name.endswith(_BLOCK_FILE_SUFFIX):
+        return None
+    key, _, rank = name[:-len(_BLOCK_FILE_SUFFIX)].partition(".")
+    if len(key) != 2 * _KEY_SIZE or not rank.isdigit():
+        return None
+    return key, int(rank)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _is_valid_block(data: memoryview, key: str) -> bool:
+    """Whether the data of a block file has a valid header and checksum."""
+    if data.nbytes < _HEADER.size:
+        return False
+    magic, version, file_key, payload_size, crc = _HEADER.unpack_from(data)
+    payload = data[_HEADER.size:]
+    return (magic == _MAGIC and version == _FORMAT_VERSION
+            and file_key == bytes.fromhex(key)
+            and payload_size == payload.nbytes
+            and zlib.crc32(payload) == crc)
+
+
+class _BlockStatus(enum.Enum):
+    VALID = enum.auto()
+    MISSING = enum.auto()
+    INVALID = enum.auto()
+
+
+class KVDiskCacheIndex:
+    """The index of the blocks in the disk cache, kept by the scheduler.
+
+    The index is rebuilt from the files on startup. Only the keys that have
+    a file for every rank are kept, in the order their files were last
+    used. The saves, loads and removals of each step are returned by
+    get_and_reset_ops() and executed by the workers.
+
+    The files of a key are verified in the background before it is loaded,
+    and checked again on every load, since a write may fail and another
+    engine sharing the directory may remove them. Keys whose files are
+    invalid or missing are dropped.
+
+    Args:
+        cache_dir: The directory of the disk cache of the model.
+        num_blocks: The max number of blocks to keep.
+        num_ranks: The number of tensor parallel ranks.
+    """
+
+    def __init__(self, cache_dir: str, num_blocks: int, num_ranks: int):
+        self.cache_dir = cache_dir
+        self.num_blocks = num_blocks
+        self.num_ranks = num_ranks
+        # Stored keys in least recently used order.
+        self._keys: "OrderedDict[str, None]" = OrderedDict()
+
+        self._blocks_to_save: DiskBlockMapping = []
+        self._blocks_to_load: DiskBlockMapping = []
+        self._keys_to_remove: List[str] = []
+
+        # Keys whose files were verified, are being verified, and the time
+        # the keys that were not verified yet were saved.
+        self._verified_keys: Set[str] = set()
+        self._verifications: Dict[str, Future] = {}
+        self._save_times: Dict[str, float] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="kv_disk_cache_verify")
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self) -> None:
+        ranks: Dict[str, Set[int]] = {}
+        last_used: Dict[str, float] = {}
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(_TMP_FILE_SUFFIX):
+                # Left over by an interrupted write.
+                _remove_file(entry.path)
+                continue
+            parsed = _parse_block_file_name(entry.name)
+            if parsed is None:
+                continue
+            key, rank = parsed
+            ranks.setdefault(key, set()).add(rank)
+            if rank == 0:
+                last_used[key] = entry.stat().st_mtime
+
+        all_ranks = set(range(self.num_ranks))
+        for key in sorted(last_used, key=last_used.__getitem__):
+            if ranks[key] == all_ranks:
+                self._keys[key] = None
+        for key, key_ranks in ranks.items():
+            if key not in self._keys:
+                self._remove_files(key, key_ranks)
+        while len(self._keys) > self.num_blocks:
+            key, _ = self._keys.popitem(last=False)
+            self._remove_files(key, all_ranks)
+        logger.info(f"Found {len(self._keys)} blocks in the KV disk cache "
+                    f"at {self.cache_dir}")
+
+    def _remove_files(self, key: str, ranks: Set[int]) -> None:
+        for rank in ranks:
+            _remove_file(self._get_path(key, rank))
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _get_path(self, key: str, rank: int) -> str:
+        return os.path.join(self.cache_dir, _get_block_file_name(key, rank))
+
+    def _verify(self, key: str) -> _BlockStatus:
+        for rank in range(self.num_ranks):
+            try:
+                with open(self._get_path(key, rank), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return _BlockStatus.MISSING
+            except OSError:
+                return _BlockStatus.INVALID
+            if not _is_valid_block(memoryview(data), key):
+                return _BlockStatus.INVALID
+        return _BlockStatus.VALID
+
+    def _drop(self, key: str) -> None:
+        logger.warning(f"Block {key} of the KV disk cache is missing or "
+                       "invalid, removing it.")
+        self._forget(key)
+        del self._keys[key]
+        self._keys_to_remove.append(key)
+
+    def _forget(self, key: str) -> None:
+        self._verified_keys.discard(key)
+        self._verifications.pop(key, None)
+        self._save_times.pop(key, None)
+
+    def lookup(self, key: str) -> bool:
+        """Whether the block is stored and can be loaded.
+
+        A block is only loaded once its files have been verified, so the
+        first lookups of a block start its verification and miss.
+        """
+        if key not in self._keys:
+            return False
+        if key not in self._verified_keys:
+            future = self._verifications.get(key)
+            if future is None:
+                self._verifications[key] = self._executor.submit(
+                    self._verify, key)
+                return False
+            if not future.done():
+                return False
+            del self._verifications[key]
+            status = future.result()
+            if status == _BlockStatus.MISSING and (
+                    time.monotonic() - self._save_times.get(key, -math.inf)
+                    < _WRITE_TIMEOUT_S):
+                # The block is still being written.
+                return False
+            if status != _BlockStatus.VALID:
+                self._drop(key)
+                return False
+            self._verified_keys.add(key)
+            self._save_times.pop(key, None)
+        # Another engine sharing the directory may have removed the files.
+        if not all(
+                os.path.exists(self._get_path(key, rank))
+                for rank in range(self.num_ranks)):
+            self._drop(key)
+            return False
+        return True
+
+    def load(self, key: str, block_id: int) -> None:
+        """Load the stored block into the GPU block. The block must have been
+        found by lookup()."""
+        self._keys.move_to_end(key)
+        self._blocks_to_load.append((key, block_id))
+
+    def save(self, key: str, block_id: int) -> None:
+        """Save the GPU block, evicting the least recently used blocks if
+        the cache is full."""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return
+        if self.num_blocks == 0:
+            return
+        while len(self._keys) >= self.num_blocks:
+            evicted_key, _ = self._keys.popitem(last=False)
+            self._forget(evicted_key)
+            self._keys_to_remove.append(evicted_key)
+        if key in self._keys_to_remove:
+            # The files are rewritten before the removal would run.
+            self._keys_to_remove.remove(key)
+        self._keys[key] = None
+        self._save_times[key] = time.monotonic()
+        self._blocks_to_save.append((key, block_id))
+
+    def get_and_reset_ops(
+            self) -> Tuple[DiskBlockMapping, DiskBlockMapping, List[str]]:
+        """Returns and clears the blocks to save and load, and the keys to
+        remove, since the last call."""
+        ops = (self._blocks_to_save, self._blocks_to_load,
+               self._keys_to_remove)
+        self._blocks_to_save = []
+        self._blocks_to_load = []
+        self._keys_to_remove = []
+        return ops
+
+
+class KVDiskCacheStore:
+    """The block files of one tensor parallel rank, used by the worker.
+
+    Writes and removals run in order on a background thread. Reads map the
+    file into memory and verify its header and checksum.
+
+    Args:
+        cache_dir: The directory of the disk cache of the model.
+        rank: The tensor parallel rank.
+        layout: The layout of the KV cache of the rank. The files of the
+            rank are removed if they were written with another layout.
+    """
+
+    def __init__(self, cache_dir: str, rank: int, layout: Dict[str, Any]):
+        self.cache_dir = cache_dir
+        self.rank = rank
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="kv_disk_cache")
+        self._pending_writes: Dict[str, Future] = {}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._check_layout(layout)
+
+    def _check_layout(self, layout: Dict[str, Any]) -> None:
+        layout_path = os.path.join(self.cache_dir, f"layout.{self.rank}.json")
+        try:
+            with open(layout_path) as f:
+                if json.load(f) == layout:
+                    return
+            logger.warning("The KV cache layout of the disk cache at "
+                           f"{self.cache_dir} changed, removing the blocks "
+                           f"of rank {self.rank}.")
+        except FileNotFoundError:
+            pass
+        for entry in os.scandir(self.cache_dir):
+            parsed = _parse_block_file_name(entry.name)
+            if parsed is not None and parsed[1] == self.rank:
+                _remove_file(entry.path)
+        with open(layout_path, "w") as f:
+            json.dump(layout, f)
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir,
+                            _get_block_file_name(key, self.rank))
+
+    def write(self,
+              key: str,
+              payload: memoryview,
+              wait: Optional[Callable[[], None]] = None) -> None:
+        """Write the block in the background. If given, wait is called in the
+        background before reading the payload, e.g. to wait for the copy of
+        the block from the GPU."""
+        self._pending_writes = {
+            pending_key: future
+            for pending_key, future in self._pending_writes.items()
+            if not future.done()
+        }
+        self._pending_writes[key] = self._executor.submit(
+            self._write, key, payload, wait)
+
+    def _write(self, key: str, payload: memoryview,
+               wait: Optional[Callable[[], None]]) -> None:
+        if wait is not None:
+            wait()
+        path = self._get_path(key)
+        header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, bytes.fromhex(key),
+                              payload.nbytes, zlib.crc32(payload))
+        # Write to a temporary file first, so that a block file is always
+        # complete.
+        tmp_path = path + _TMP_FILE_SUFFIX
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(header)
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write {path} to the KV disk cache: {e}")
+            _remove_file(tmp_path)
+
+    def remove(self, key: str) -> None:
+        """Remove the block in the background, after the pending writes."""
+        self._executor.submit(_remove_file, self._get_path(key))
+
+    def read(self, key: str, num_bytes: int) -> Optional[memoryview]:
+        """Map the payload of the block into memory, or return None if the
+        file is missing or invalid."""
+        future = self._pending_writes.pop(key, None)
+        if future is not None:
+            future.result()
+
+        path = self._get_path(key)
+        try:
+            with open(path, "rb") as f:
+                # A private mapping, so that tensors can be created from it.
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read {path} from the KV disk cache: {e}")
+            return None
+
+        data = memoryview(buffer)
+        if (data.nbytes != _HEADER.size + num_bytes
+                or not _is_valid_block(data, key)):
+            logger.error(f"Invalid block {path} in the KV disk cache, "
+                         "removing it.")
+            data.release()
+            buffer.close()
+            self.remove(key)
+            return None
+        return data[_HEADER.size:]
@@ -2,7 +2,8 @@ from typing import List, Tuple
 
 from aphrodite.common.sequence import Sequence, SequenceGroup
 from aphrodite.common.utils import Device
-from aphrodite.processing.interfaces import AllocStatus, BlockSpaceManager
+from aphrodite.processing.interfaces import (AllocStatus, BlockSpaceManager,
+                                             PrefixCacheLookup)
 
 
 class PlaceholderBlockSpaceManager(BlockSpaceManager):
@@ -86,3 +87,16 @@ class PlaceholderBlockSpaceManager(BlockSpaceManager):
 
     def get_prefix_cache_hit_rate(self, device: Device) -> float:
         return -1
+
+    def get_and_reset_host_cache_swaps(
+            self) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        return [], []
+
+    def get_and_reset_disk_cache_ops(
+            self) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]],
+                           List[str]]:
+        return [], [], []
+
+    def lookup_prefix_cache(
+            self, seqs: List[Sequence]) -> List[PrefixCacheLookup]:
+        return [PrefixCacheLookup() for _ in seqs]
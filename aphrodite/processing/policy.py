@@ -0,0 +1,117 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from aphrodite.common.sequence import SequenceGroup
+
+PriorityKey = Tuple[float, ...]
+
+
+class Policy:
+    """Orders the scheduler queues. Sequence groups with a larger priority
+    key are scheduled first and preempted last.
+
+    The order of two sequence groups must not change over time, so that
+    the queues only need to be sorted again when sequence groups are added
+    to them, unless priorities_change_when_scheduled is set.
+    """
+
+    # Whether record_scheduled changes the priorities, so that the queues
+    # must be sorted again after every step that scheduled tokens.
+    priorities_change_when_scheduled = False
+
+    def get_priority(
+        self,
+        now: float,
+        seq_group: SequenceGroup,
+    ) -> PriorityKey:
+        raise NotImplementedError
+
+    def sort_by_priority(
+        self,
+        now: float,
+        seq_groups: Deque[SequenceGroup],
+    ) -> Deque[SequenceGroup]:
+        return deque(
+            sorted(
+                seq_groups,
+                key=lambda seq_group: self.get_priority(now, seq_group),
+                reverse=True,
+            ))
+
+    def record_scheduled(self, seq_group: SequenceGroup,
+                         num_tokens: int) -> None:
+        """Called for every sequence group in a scheduled batch. Stateless
+        policies ignore it."""
+        pass
+
+
+class RequestPriority(Policy):
+    """Schedules by the request's `priority` (lower value first), then in
+    arrival order."""
+
+    def get_priority(
+        self,
+        now: float,
+        seq_group: SequenceGroup,
+    ) -> PriorityKey:
+        return (-seq_group.priority, now - seq_group.metrics.arrival_time)
+
+
+class FairShare(Policy):
+    """Weighted fair queuing across LoRA adapters.
+
+    Within a request priority level, the adapter that received the fewest
+    scheduled tokens relative to its weight goes first; ties fall back to
+    arrival order. Usage is halved every `decay_tokens` scheduled tokens so
+    an adapter that was busy a while ago is not penalized forever, and an
+    adapter that just became active cannot monopolize the batch until it has
+    caught up with the lifetime usage of the others.
+    """
+
+    priorities_change_when_scheduled = True
+
+    def __init__(self,
+                 weights: Optional[Dict[int, float]] = None,
+                 decay_tokens: int = 1 << 16) -> None:
+        # lora_int_id -> weight. Adapters not listed have weight 1.
+        self.weights = weights or {}
+        self.decay_tokens = decay_tokens
+        # lora_int_id -> scheduled tokens (decayed)
+        self.usage: Dict[int, float] = {}
+        self._tokens_since_decay = 0
+
+    def get_priority(
+        self,
+        now: float,
+        seq_group: SequenceGroup,
+    ) -> PriorityKey:
+        lora_int_id = seq_group.lora_int_id
+        normalized_usage = (self.usage.get(lora_int_id, 0.0) /
+                            self.weights.get(lora_int_id, 1.0))
+        return (-seq_group.priority, -normalized_usage,
+                now - seq_group.metrics.arrival_time)
+
+    def record_scheduled(self, seq_group: SequenceGroup,
+                         num_tokens: int) -> None:
+        lora_int_id = seq_group.lora_int_id
+        self.usage[lora_int_id] = self.usage.get(lora_int_id, 0.0) + num_tokens
+        self._tokens_since_decay += num_tokens
+        if self._tokens_since_decay >= self.decay_tokens:
+            self._tokens_since_decay = 0
+            self.usage = {
+                lora_int_id: usage / 2
+                for lora_int_id, usage in self.usage.items() if usage >= 1.0
+            }
+
+
+class PolicyFactory:
+
+    # FCFS has no policy, the queues are kept in arrival order.
+    _POLICY_REGISTRY = {
+        'priority': RequestPriority,
+        'fair': FairShare,
+    }
+
+    @classmethod
+    def get_policy(cls, policy_name: str, **kwargs) -> Policy:
+        return cls._POLICY_REGISTRY[policy_name](**kwargs)
@@ -2,9 +2,10 @@ import enum
 import os
 import random
 import time
-from collections import deque
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
-from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+from typing import (Callable, Deque, Dict, Iterable, List, Optional, Set,
+                    Tuple, Union)
 
 from loguru import logger
 
@@ -15,7 +16,10 @@ from aphrodite.common.sequence import (Sequence, SequenceData, SequenceGroup,
                                        SequenceStatus)
 from aphrodite.common.utils import Device, PyObjectCache
 from aphrodite.lora.request import LoRARequest
-from aphrodite.processing.interfaces import AllocStatus, BlockSpaceManager
+from aphrodite.processing.interfaces import (AllocStatus, BlockSpaceManager,
+                                              PrefixCacheLookup)
+from aphrodite.processing.kv_disk_cache import KVDiskCacheIndex
+from aphrodite.processing.policy import Policy, PolicyFactory
 from aphrodite.prompt_adapter.request import PromptAdapterRequest
 
 # Test-only. If configured, decode is preempted with
@@ -25,6 +29,11 @@ ENABLE_ARTIFICIAL_PREEMPT = bool(
 ARTIFICIAL_PREEMPTION_PROB = 0.5
 ARTIFICIAL_PREEMPTION_MAX_CNT = 500
 
+# Maximum time in seconds that a waiting request is held back while its LoRA
+# is being prefetched into CPU memory, after which the LoRA is loaded when
+# the request is scheduled.
+LORA_PREFETCH_TIMEOUT_S = 30.0
+
 
 class PreemptionMode(enum.Enum):
     """Preemption modes.
@@ -132,9 +141,21 @@ class SchedulerOutputs:
     # The number of requests in the running queue
     running_queue_size: int
     preempted: int
+    # LoRAs of waiting requests to load into CPU memory in the background.
+    lora_prefetch_requests: Set[LoRARequest] = field(default_factory=set)
+    # The number of active LoRAs that are evicted from the GPU to run the
+    # batch.
+    num_lora_swaps: int = 0
+    # Blocks to save to the disk cache. List of (key, GPU block number).
+    disk_blocks_to_save: List[Tuple[str, int]] = field(default_factory=list)
+    # Blocks to load from the disk cache. List of (key, GPU block number).
+    disk_blocks_to_load: List[Tuple[str, int]] = field(default_factory=list)
+    # Keys of the blocks to remove from the disk cache.
+    disk_blocks_to_remove: List[str] = field(default_factory=list)
 
     def __post_init__(self):
-        # Swap in and swap out should never happen at the same time.
+        # Swap in and swap out should never happen at the same time. The
+        # swaps of the host prefix cache are added after this check.
         assert not (self.blocks_to_swap_in and self.blocks_to_swap_out)
 
         self.num_loras: int = len(self.lora_requests)
@@ -146,7 +167,9 @@ class SchedulerOutputs:
     def is_empty(self) -> bool:
         # NOTE: We do not consider the ignored sequence groups.
         return (not self.scheduled_seq_groups and not self.blocks_to_swap_in
-                and not self.blocks_to_swap_out and not self.blocks_to_copy)
+                and not self.blocks_to_swap_out and not self.blocks_to_copy
+                and not self.disk_blocks_to_save
+                and not self.disk_blocks_to_remove)
 
     def _sort_by_lora_ids(self):
         assert 0 <= self.num_prefill_groups <= len(self.scheduled_seq_groups)
@@ -308,13 +331,31 @@ class Scheduler:
         cache_config: CacheConfig,
         lora_config: Optional[LoRAConfig],
         pipeline_parallel_size: int = 1,
+        get_prefetching_loras: Optional[Callable[[],
+                                                 Optional[Set[int]]]] = None,
+        kv_disk_cache: Optional[KVDiskCacheIndex] = None,
+        active_loras: Optional["OrderedDict[int, None]"] = None,
     ) -> None:
         self.scheduler_config = scheduler_config
         self.cache_config = cache_config
-        # Note for LoRA scheduling: the current policy is extremely
+        # Note for LoRA scheduling: the default FCFS policy is extremely
         # simple and NOT fair. It can lead to starvation of some
-        # LoRAs. This should be improved in the future.
+        # LoRAs. Use the "fair" scheduling policy to share the batch
+        # between adapters.
         self.lora_config = lora_config
+        # Returns the ids of the LoRAs that the workers are still loading in
+        # the background. When set, prefills whose LoRA is still being
+        # prefetched are held back while there are other requests to run,
+        # so that loading the LoRA does not block the batch.
+        self.get_prefetching_loras = get_prefetching_loras
+        # LoRA id -> time since which requests of the LoRA are waiting.
+        self._lora_prefetch_times: Dict[int, float] = {}
+        # The LoRAs that are active on the GPU, in least recently used
+        # order, mirroring the LRU LoRA slots of the workers. The virtual
+        # engines of pipeline parallelism share the slots, so their
+        # schedulers share the mirror.
+        self._active_loras: "OrderedDict[int, None]" = (
+            active_loras if active_loras is not None else OrderedDict())
 
         version = "v1"
         if self.scheduler_config.use_v2_block_manager:
@@ -326,6 +367,16 @@ class Scheduler:
         BlockSpaceManagerImpl = BlockSpaceManager.get_block_space_manager_class(
             version)
 
+        self.host_prefix_caching_enabled = (
+            version == "v2" and self.cache_config.enable_host_prefix_caching)
+        block_manager_kwargs = {}
+        if self.host_prefix_caching_enabled:
+            block_manager_kwargs["enable_host_caching"] = True
+        self.kv_disk_cache_enabled = (version == "v2"
+                                      and kv_disk_cache is not None)
+        if self.kv_disk_cache_enabled:
+            block_manager_kwargs["kv_disk_cache"] = kv_disk_cache
+
         num_gpu_blocks = cache_config.num_gpu_blocks
         if num_gpu_blocks:
             num_gpu_blocks //= pipeline_parallel_size
@@ -340,7 +391,8 @@ class Scheduler:
             num_gpu_blocks=num_gpu_blocks,
             num_cpu_blocks=num_cpu_blocks,
             sliding_window=self.cache_config.sliding_window,
-            enable_caching=self.cache_config.enable_prefix_caching)
+            enable_caching=self.cache_config.enable_prefix_caching,
+            **block_manager_kwargs)
 
         # Sequence groups in the WAITING state.
         # Contain new prefill or preempted requests.
@@ -373,6 +425,28 @@ class Scheduler:
                                        else 0)
         self.num_cumulative_preemption: int = 0
 
+        # The policy used to order the queues. None for FCFS, where the
+        # queues are already kept in arrival order and sorting them would
+        # only add overhead.
+        self.policy: Optional[Policy] = None
+        if scheduler_config.scheduling_policy != "fcfs":
+            self.policy = PolicyFactory.get_policy(
+                scheduler_config.scheduling_policy)
+        # Whether sequence groups were added to the queues, or moved within
+        # them, since the queues were last sorted by the policy.
+        self._waiting_unsorted = False
+        self._running_unsorted = False
+        self._swapped_unsorted = False
+
+        # The number of requests at the head of the waiting queue that are
+        # reordered by their prefix cache hits. 0 if disabled.
+        self.cache_aware_admission_window = (
+            scheduler_config.cache_aware_admission_window
+            if cache_config.enable_prefix_caching else 0)
+        # Request id -> the number of times cache-aware admission passed over
+        # the request, for the requests in the reordering window.
+        self._admission_bypasses: Dict[str, int] = {}
+
         # Used to cache python objects
         self._scheduler_running_outputs_cache: PyObjectCache = PyObjectCache(
             scheduler_running_outputs_builder)
@@ -383,6 +457,10 @@ class Scheduler:
     def lora_enabled(self) -> bool:
         return bool(self.lora_config)
 
+    @property
+    def lora_prefetch_enabled(self) -> bool:
+        return bool(self.lora_config and self.lora_config.max_prefetch_loras)
+
     @property
     def num_decoding_tokens_per_seq(self) -> int:
         """The number of new tokens."""
@@ -391,16 +469,19 @@ class Scheduler:
     def add_seq_group(self, seq_group: SequenceGroup) -> None:
         # Add sequence groups to the waiting queue.
         self.waiting.append(seq_group)
+        self._waiting_unsorted = True
 
     def _add_seq_group_to_running(self, seq_group: SequenceGroup) -> None:
         # Add sequence groups to the running queue.
         # Only for testing purposes.
         self.running.append(seq_group)
+        self._running_unsorted = True
 
     def _add_seq_group_to_swapped(self, seq_group: SequenceGroup) -> None:
         # Add sequence groups to the swapped queue.
         # Only for testing purposes.
         self.swapped.append(seq_group)
+        self._swapped_unsorted = True
 
     def abort_seq_group(self, request_id: Union[str, Iterable[str]]) -> None:
         """Aborts a sequence group with the given ID.
@@ -750,6 +831,16 @@ class Scheduler:
 
         waiting_queue = self.waiting
 
+        # Queried from the workers when a request first needs it.
+        prefetching_loras: Optional[Set[int]] = None
+
+        admission_lookups: Dict[str, PrefixCacheLookup] = {}
+        # The first uncached blocks of the prompts admitted in this step.
+        admitted_block_keys: Set[int] = set()
+        if (waiting_queue and self.cache_aware_admission_window > 0
+                and self._passed_delay(time.time())):
+            admission_lookups = self._reorder_waiting_by_prefix_cache()
+
         leftover_waiting_sequences: Deque[SequenceGroup] = deque()
         while self._passed_delay(time.time()) and waiting_queue:
             seq_group = waiting_queue[0]
@@ -803,6 +894,42 @@ class Scheduler:
                     leftover_waiting_sequences.appendleft(seq_group)
                     waiting_queue.popleft()
                     continue
+                if (self.lora_prefetch_enabled
+                        and self.get_prefetching_loras is not None
+                        and lora_int_id > 0 and lora_int_id not in curr_loras
+                        and budget.num_curr_seqs > 0):
+                    if prefetching_loras is None:
+                        prefetching_loras = (self.get_prefetching_loras()
+                                             or set())
+                    if (lora_int_id in prefetching_loras and
+                            not self._lora_prefetch_timed_out(lora_int_id)):
+                        # The LoRA is still being prefetched, so we run the
+                        # other requests instead of waiting for it.
+                        leftover_waiting_sequences.appendleft(seq_group)
+                        waiting_queue.popleft()
+                        continue
+                if (lora_int_id > 0 and lora_int_id not in curr_loras
+                        and budget.num_curr_seqs > 0
+                        and self._would_swap_lora(lora_int_id, seq_group)):
+                    # Prefer the requests whose LoRA is already active
+                    # over evicting an active LoRA from the GPU.
+                    leftover_waiting_sequences.appendleft(seq_group)
+                    waiting_queue.popleft()
+                    continue
+
+            lookup = admission_lookups.get(seq_group.request_id)
+            if (lookup is not None and budget.num_curr_seqs > 0
+                    and self._admission_bypasses[seq_group.request_id] <
+                    self.cache_aware_admission_window
+                    and (lookup.next_block_pending
+                         or lookup.next_block_key in admitted_block_keys)):
+                # The next block of the prompt is being prefilled for another
+                # request, so we wait to reuse it instead of computing it
+                # twice.
+                self._admission_bypasses[seq_group.request_id] += 1
+                leftover_waiting_sequences.appendleft(seq_group)
+                waiting_queue.popleft()
+                continue
 
             num_new_seqs = seq_group.get_max_num_running_seqs()
             if (num_new_tokens == 0
@@ -813,6 +940,8 @@ class Scheduler:
             # Can schedule this request.
             if curr_loras is not None and lora_int_id > 0:
                 curr_loras.add(lora_int_id)
+            if lookup is not None and lookup.next_block_key is not None:
+                admitted_block_keys.add(lookup.next_block_key)
             waiting_queue.popleft()
             self._allocate_and_set_running(seq_group)
             seq_group.init_multi_step(
@@ -898,6 +1027,10 @@ class Scheduler:
 
         # Update swapped requests.
         self.swapped.extend(running_scheduled.swapped_out)
+        self._waiting_unsorted |= bool(running_scheduled.preempted)
+        self._running_unsorted |= bool(prefills.seq_groups
+                                       or swapped_in.decode_seq_groups)
+        self._swapped_unsorted |= bool(running_scheduled.swapped_out)
         preempted = (len(running_scheduled.preempted) +
                      len(running_scheduled.swapped_out))
 
@@ -991,6 +1124,13 @@ class Scheduler:
             [s.seq_group for s in swapped_in.prefill_seq_groups])
         # Update swapped requests.
         self.swapped.extend(running_scheduled.swapped_out)
+        self._waiting_unsorted |= bool(running_scheduled.preempted)
+        # The running prefills are moved after the decodes.
+        self._running_unsorted |= bool(prefills.seq_groups
+                                       or running_scheduled.prefill_seq_groups
+                                       or swapped_in.decode_seq_groups
+                                       or swapped_in.prefill_seq_groups)
+        self._swapped_unsorted |= bool(running_scheduled.swapped_out)
         return SchedulerOutputs(
             scheduled_seq_groups=(prefills.seq_groups +
                                   running_scheduled.prefill_seq_groups +
@@ -1013,12 +1153,248 @@ class Scheduler:
                        len(running_scheduled.swapped_out)),
         )
 
+    def _sort_queues_by_policy(self) -> None:
+        """Sort the queues that changed since they were last sorted."""
+        assert self.policy is not None
+        now = time.time()
+        if self._waiting_unsorted:
+            self.waiting = self.policy.sort_by_priority(now, self.waiting)
+            self._waiting_unsorted = False
+        if self._running_unsorted:
+            self.running = self.policy.sort_by_priority(now, self.running)
+            self._running_unsorted = False
+        if self._swapped_unsorted:
+            self.swapped = self.policy.sort_by_priority(now, self.swapped)
+            self._swapped_unsorted = False
+
+    def _schedule_priority_preemption(self) -> int:
+        """Preempt running sequence groups that have a lower priority than the
+        first waiting sequence group when it could not be admitted otherwise.
+
+        Victims are taken from the tail of the running queue, i.e. in reverse
+        priority order, and are preempted by recomputation, so groups with
+        more than one running sequence (beam search) are skipped. Expects the
+        queues to be sorted by the scheduling policy.
+
+        Returns:
+            The number of preempted sequence groups.
+        """
+        assert self.policy is not None
+        if not self.waiting or not self.running or self.swapped:
+            return 0
+
+        now = time.time()
+        seq_group = self.waiting[0]
+        priority = self.policy.get_priority(now, seq_group)
+        num_new_seqs = seq_group.get_max_num_running_seqs()
+        num_running_seqs = sum(running_group.get_max_num_running_seqs()
+                               for running_group in self.running)
+
+        preempted: List[SequenceGroup] = []
+        for victim in reversed(list(self.running)):
+            can_allocate = self.block_manager.can_allocate(seq_group)
+            if can_allocate == AllocStatus.NEVER:
+                break
+            if (can_allocate == AllocStatus.OK
+                    and num_running_seqs + num_new_seqs <=
+                    self.scheduler_config.max_num_seqs):
+                break
+            if self.policy.get_priority(now, victim) >= priority:
+                break
+            if victim.get_max_num_running_seqs() != 1:
+                continue
+            self.running.remove(victim)
+            self._preempt_by_recompute(victim)
+            self.num_cumulative_preemption += 1
+            num_running_seqs -= 1
+            preempted.append(victim)
+
+        if preempted:
+            self.waiting.extend(preempted)
+            self.waiting = self.policy.sort_by_priority(now, self.waiting)
+        return len(preempted)
+
     def _schedule(self) -> SchedulerOutputs:
         """Schedule queued requests."""
+        num_priority_preempted = 0
+        if self.policy is not None:
+            self._sort_queues_by_policy()
+            if self.scheduler_config.scheduling_policy == "priority":
+                num_priority_preempted = self._schedule_priority_preemption()
+
         if self.scheduler_config.chunked_prefill_enabled:
-            return self._schedule_chunked_prefill()
+            scheduler_outputs = self._schedule_chunked_prefill()
         else:
-            return self._schedule_default()
+            scheduler_outputs = self._schedule_default()
+
+        if self.policy is not None:
+            scheduler_outputs.preempted += num_priority_preempted
+            for scheduled_seq_group in scheduler_outputs.scheduled_seq_groups:
+                self.policy.record_scheduled(
+                    scheduled_seq_group.seq_group,
+                    scheduled_seq_group.token_chunk_size)
+            if (self.policy.priorities_change_when_scheduled
+                    and scheduler_outputs.scheduled_seq_groups):
+                self._waiting_unsorted = True
+                self._running_unsorted = True
+                self._swapped_unsorted = True
+
+        if self.lora_enabled:
+            scheduled_lora_requests = scheduler_outputs.lora_requests
+            scheduler_outputs.num_lora_swaps = self._update_active_loras(
+                scheduled_lora_requests)
+            if self.lora_prefetch_enabled:
+                scheduler_outputs.lora_prefetch_requests = (
+                    self._get_lora_prefetch_requests(scheduled_lora_requests))
+
+        if self.host_prefix_caching_enabled:
+            # The workers issue swap outs before swap ins, so evicted blocks
+            # are demoted before their GPU blocks are reused.
+            blocks_to_swap_in, blocks_to_swap_out = (
+                self.block_manager.get_and_reset_host_cache_swaps())
+            scheduler_outputs.blocks_to_swap_in.extend(blocks_to_swap_in)
+            scheduler_outputs.blocks_to_swap_out.extend(blocks_to_swap_out)
+
+        if self.kv_disk_cache_enabled:
+            # Blocks are saved to the disk cache when their sequences are
+            # freed, which may be before this step reuses them, so the
+            # workers issue the saves first.
+            (scheduler_outputs.disk_blocks_to_save,
+             scheduler_outputs.disk_blocks_to_load,
+             scheduler_outputs.disk_blocks_to_remove) = (
+                 self.block_manager.get_and_reset_disk_cache_ops())
+        return scheduler_outputs
+
+    def _reorder_waiting_by_prefix_cache(self) -> Dict[str, PrefixCacheLookup]:
+        """Move the requests with the most computed blocks in the prefix
+        cache to the front of the reordering window at the head of the
+        waiting queue.
+
+        Requests are only reordered within their priority level if a
+        scheduling policy is set. A request that has been passed over as many
+        times as the size of the window keeps its place in the queue.
+
+        Returns:
+            The prefix cache lookups of the requests in the window, by
+            request id.
+        """
+        window_size = min(self.cache_aware_admission_window,
+                          len(self.waiting))
+        window = [self.waiting.popleft() for _ in range(window_size)]
+        lookups = self.block_manager.lookup_prefix_cache([
+            seq_group.get_seqs(status=SequenceStatus.WAITING)[0]
+            for seq_group in window
+        ])
+        self._admission_bypasses = {
+            seq_group.request_id:
+            self._admission_bypasses.get(seq_group.request_id, 0)
+            for seq_group in window
+        }
+
+        def sort_key(i: int) -> Tuple[int, bool, int, int]:
+            seq_group = window[i]
+            priority = seq_group.priority if self.policy is not None else 0
+            if (self._admission_bypasses[seq_group.request_id] >=
+                    self.cache_aware_admission_window):
+                return (priority, False, 0, i)
+            return (priority, True, -lookups[i].num_computed_blocks, i)
+
+        order = sorted(range(window_size), key=sort_key)
+        max_index = -1
+        for i in order:
+            if i < max_index:
+                self._admission_bypasses[window[i].request_id] += 1
+            max_index = max(max_index, i)
+        self.waiting.extendleft(window[i] for i in reversed(order))
+        return {
+            seq_group.request_id: lookup
+            for seq_group, lookup in zip(window, lookups)
+        }
+
+    def _would_swap_lora(self, lora_int_id: int,
+                         seq_group: SequenceGroup) -> bool:
+        """Whether scheduling the sequence group evicts an active LoRA that
+        it should not, i.e. LoRA-affinity scheduling is enabled, the LoRA
+        slots are full, and the sequence group has waited for less than the
+        affinity timeout."""
+        assert self.lora_config is not None
+        timeout = self.lora_config.lora_affinity_timeout
+        return (timeout > 0 and lora_int_id not in self._active_loras
+                and len(self._active_loras) >= self.lora_config.max_loras
+                and time.time() - seq_group.metrics.arrival_time < timeout)
+
+    def _update_active_loras(self,
+                             scheduled_lora_requests: Set[LoRARequest]) -> int:
+        """Activate the LoRAs of the batch in the mirrored LoRA slots and
+        return the number of active LoRAs they evict."""
+        assert self.lora_config is not None
+        lora_ids = [
+            lora_request.lora_int_id
+            for lora_request in scheduled_lora_requests
+        ]
+        new_lora_ids = []
+        for lora_id in lora_ids:
+            if lora_id in self._active_loras:
+                self._active_loras.move_to_end(lora_id)
+            else:
+                new_lora_ids.append(lora_id)
+        num_swaps = 0
+        for lora_id in new_lora_ids:
+            if len(self._active_loras) >= self.lora_config.max_loras:
+                self._active_loras.popitem(last=False)
+                num_swaps += 1
+            self._active_loras[lora_id] = None
+        return num_swaps
+
+    def get_num_waiting_per_lora(self) -> Dict[str, int]:
+        """Get the number of waiting requests of each LoRA, by LoRA name."""
+        num_waiting: Dict[str, int] = {}
+        for seq_group in self.waiting:
+            lora_request = seq_group.lora_request
+            if lora_request is not None:
+                num_waiting[lora_request.lora_name] = num_waiting.get(
+                    lora_request.lora_name, 0) + 1
+        return num_waiting
+
+    def _get_lora_prefetch_requests(
+            self, scheduled_lora_requests: Set[LoRARequest]
+    ) -> Set[LoRARequest]:
+        """Get the LoRAs of the first waiting requests that are not in the
+        batch, up to max_prefetch_loras of them, for the workers to load
+        into CPU memory in the background."""
+        assert self.lora_config is not None
+        scheduled_lora_ids = {
+            lora_request.lora_int_id
+            for lora_request in scheduled_lora_requests
+        }
+        lora_prefetch_requests: Dict[int, LoRARequest] = {}
+        waiting_lora_ids: Set[int] = set()
+        for seq_group in self.waiting:
+            lora_request = seq_group.lora_request
+            if (lora_request is None or lora_request.lora_int_id <= 0
+                    or lora_request.lora_int_id in scheduled_lora_ids):
+                continue
+            waiting_lora_ids.add(lora_request.lora_int_id)
+            if (len(lora_prefetch_requests) <
+                    self.lora_config.max_prefetch_loras):
+                lora_prefetch_requests.setdefault(lora_request.lora_int_id,
+                                                  lora_request)
+
+        # Keep the timers of all the waiting LoRAs, including the ones that
+        # are not prefetched yet, and forget the LoRAs that are no longer
+        # waiting, so that a LoRA that is requested again gets a new
+        # timeout.
+        now = time.time()
+        self._lora_prefetch_times = {
+            lora_id: self._lora_prefetch_times.get(lora_id, now)
+            for lora_id in waiting_lora_ids
+        }
+        return set(lora_prefetch_requests.values())
+
+    def _lora_prefetch_timed_out(self, lora_int_id: int) -> bool:
+        prefetch_time = self._lora_prefetch_times.setdefault(
+            lora_int_id, time.time())
+        return time.time() - prefetch_time >= LORA_PREFETCH_TIMEOUT_S
 
     def _can_append_slots(self, seq_group: SequenceGroup) -> bool:
         """Determine whether or not we have enough space in the KV cache to
@@ -73,6 +73,12 @@ class AsyncMetricsCollector:
         self._aggregate_num_emitted_tokens = torch.tensor(
             0, dtype=torch.long, device="cpu", pin_memory=pin_memory)
         self._aggregate_num_draft_tokens = 0
+        # The number of tokens that could have been emitted if all draft
+        # tokens were accepted. It is accumulated per step, as the number of
+        # speculative tokens can change between steps.
+        self._num_draft_tokens_seen = 0
+        self._max_num_emitted_tokens = 0
+        self._aggregate_max_num_emitted_tokens = 0
 
         self._rejsample_metrics_collect_interval_s = collect_interval_s
         self._last_metrics_collect_time = self._timer()
@@ -83,6 +89,7 @@ class AsyncMetricsCollector:
 
     def maybe_collect_rejsample_metrics(
             self, k: int) -> Optional[SpecDecodeWorkerMetrics]:
+        self._update_max_num_emitted_tokens(k)
 
         # If a copy was initiated in the previous call, collect and return.
         if self._in_flight_copy is not None:
@@ -97,6 +104,17 @@ class AsyncMetricsCollector:
 
         return None
 
+    def _update_max_num_emitted_tokens(self, k: int) -> None:
+        """Add the draft tokens proposed since the previous step, with k
+        speculative tokens per sequence, to the max number of emitted
+        tokens."""
+        num_draft_tokens = self.spec_decode_sampler.num_draft_tokens
+        new_draft_tokens = num_draft_tokens - self._num_draft_tokens_seen
+        if new_draft_tokens > 0:
+            self._max_num_emitted_tokens += self.get_max_num_emitted_tokens(
+                new_draft_tokens, k)
+        self._num_draft_tokens_seen = num_draft_tokens
+
     def _should_collect_rejsample_metrics(self, now: float) -> bool:
         """Return whether or not this iteration should print sampling
         metrics.
@@ -128,6 +146,8 @@ class AsyncMetricsCollector:
             # required.
             self._aggregate_num_draft_tokens = (
                 self.spec_decode_sampler.num_draft_tokens)
+            self._aggregate_max_num_emitted_tokens = (
+                self._max_num_emitted_tokens)
 
         aggregate_metrics_ready = torch.cuda.Event()
         aggregate_metrics_ready.record(self._copy_stream)
@@ -140,8 +160,7 @@ class AsyncMetricsCollector:
         """Create metrics object from statistics copied asynchronously.
 
         Args:
-            k: int. The number of speculative tokens; used to determine system
-                efficiency.
+            k: int. The number of speculative tokens in the current step.
             ready_event: torch.cuda.Event. The CUDA event recording when the
                 async GPU->CPU copy is complete.
         """
@@ -154,9 +173,7 @@ class AsyncMetricsCollector:
         accepted_tokens = self._aggregate_num_accepted_tokens.item()
         emitted_tokens = self._aggregate_num_emitted_tokens.item()
         draft_tokens = self._aggregate_num_draft_tokens
-
-        max_num_emitted_tokens = self.get_max_num_emitted_tokens(
-            draft_tokens, k)
+        max_num_emitted_tokens = self._aggregate_max_num_emitted_tokens
 
         if draft_tokens > 0:
             draft_acceptance_rate = accepted_tokens / draft_tokens
@@ -0,0 +1,103 @@
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+class NGramIndex:
+    """Hash index from the n-grams of a set of token sequences to the
+    positions that follow them, for prompt lookup decoding.
+
+    Each sequence (document) is indexed incrementally as it grows, so that
+    appending k tokens costs O(k * max_n) and a lookup only hashes the
+    n-gram that is looked up, independent of the length of the documents.
+    For each n-gram, the earliest `max_candidates` occurrences in each
+    document are kept, so that removing a document leaves the occurrences in
+    the other documents intact.
+    """
+
+    def __init__(self, min_n: int, max_n: int, max_candidates: int = 1):
+        assert 1 <= min_n <= max_n
+        assert max_candidates >= 1
+        self.min_n = min_n
+        self.max_n = max_n
+        self.max_candidates = max_candidates
+        self._docs: Dict[Hashable, List[int]] = {}
+        # n-gram -> doc_id -> indices of the tokens that follow the n-gram,
+        # with the documents in the order they first indexed the n-gram.
+        self._positions: Dict[Tuple[int, ...], Dict[Hashable,
+                                                    List[int]]] = {}
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._docs
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def num_tokens(self, doc_id: Hashable) -> int:
+        tokens = self._docs.get(doc_id)
+        return 0 if tokens is None else len(tokens)
+
+    def extend(self, doc_id: Hashable, token_ids: Sequence[int]) -> None:
+        """Append token_ids to the document and index the n-grams that end
+        before its last token. The n-grams that end at the last token are
+        indexed once the token that follows them is appended, so that the
+        suffix of a document never matches itself."""
+        tokens = self._docs.setdefault(doc_id, [])
+        start = max(len(tokens), 1)
+        tokens.extend(token_ids)
+        positions = self._positions
+        for pos in range(start, len(tokens)):
+            for n in range(self.min_n, min(self.max_n, pos) + 1):
+                ngram = tuple(tokens[pos - n:pos])
+                doc_positions = positions.get(ngram)
+                if doc_positions is None:
+                    positions[ngram] = {doc_id: [pos]}
+                    continue
+                candidates = doc_positions.get(doc_id)
+                if candidates is None:
+                    doc_positions[doc_id] = [pos]
+                elif len(candidates) < self.max_candidates:
+                    candidates.append(pos)
+
+    def remove(self, doc_id: Hashable) -> None:
+        """Remove the document and its n-grams from the index."""
+        tokens = self._docs.pop(doc_id, None)
+        if tokens is None:
+            return
+        positions = self._positions
+        for pos in range(1, len(tokens)):
+            for n in range(self.min_n, min(self.max_n, pos) + 1):
+                ngram = tuple(tokens[pos - n:pos])
+                doc_positions = positions.get(ngram)
+                if doc_positions is None:
+                    continue
+                doc_positions.pop(doc_id, None)
+                if not doc_positions:
+                    del positions[ngram]
+
+    def remove_oldest(self) -> None:
+        """Remove the document that was added first."""
+        self.remove(next(iter(self._docs)))
+
+    def lookup(self,
+               ngram: Sequence[int],
+               num_tokens: int,
+               num_candidates: int = 1,
+               exclude_doc_id: Optional[Hashable] = None) -> List[List[int]]:
+        """Get the num_tokens tokens that follow the earliest occurrences
+        of ngram, at most num_candidates of them, from the documents in the
+        order they first indexed it. A continuation that reaches the end of
+        its document is padded with the last token of the document."""
+        doc_positions = self._positions.get(tuple(ngram))
+        if doc_positions is None:
+            return []
+        continuations: List[List[int]] = []
+        for doc_id, candidates in doc_positions.items():
+            if doc_id == exclude_doc_id:
+                continue
+            tokens = self._docs[doc_id]
+            last = len(tokens) - 1
+            for pos in candidates:
+                continuations.append(
+                    [tokens[min(pos + i, last)] for i in range(num_tokens)])
+                if len(continuations) == num_candidates:
+                    return continuations
+        return continuations
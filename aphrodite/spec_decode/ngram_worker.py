@@ -4,7 +4,9 @@ from typing import List, Optional, Set, Tuple
 import torch
 
 from aphrodite.common.sequence import ExecuteModelRequest, SamplerOutput
+from aphrodite.common.utils import LRUCache
 from aphrodite.spec_decode.interfaces import SpeculativeProposals
+from aphrodite.spec_decode.ngram_index import NGramIndex
 from aphrodite.spec_decode.proposer_worker_base import NonLLMProposerWorkerBase
 from aphrodite.spec_decode.top1_proposer import Top1Proposer
 
@@ -15,12 +17,28 @@ class NGramWorker(NonLLMProposerWorkerBase):
     Current NGramWorker only implements prompt lookup decoding,
     and in future we may also do RAG type drafter and other scenarios
     which don't rely on LLM model to give proposals.
+
+    The n-grams of each sequence are kept in an NGramIndex that is extended
+    with the tokens appended since the previous step, so a lookup does not
+    scan the whole context. Optionally, the prompts of the other running
+    requests are indexed too, and are looked up when the sequence itself
+    has no match.
     """
 
     def __init__(self, *args, **kwargs):
         # Get local_rank/vocab_size from kwargs attribute
         self.local_rank = kwargs["local_rank"]
         self.vocab_size = kwargs["model_config"].get_vocab_size()
+        # Indices of sequences that are not freed when their request
+        # finishes, e.g. as speculation was disabled, are evicted once more
+        # sequences are indexed than can run at the same time.
+        self._max_num_indexed_seqs = kwargs[
+            "scheduler_config"].max_num_seqs
+
+        self._seq_indices = LRUCache[NGramIndex](self._max_num_indexed_seqs)
+        self._request_seq_ids = LRUCache[Set[int]](
+            self._max_num_indexed_seqs)
+        self._corpus_index: Optional[NGramIndex] = None
 
         # Lazy initialization list.
         self._proposer: Top1Proposer
@@ -31,6 +49,17 @@ class NGramWorker(NonLLMProposerWorkerBase):
         # ngram_prompt_lookup_min/ngram_prompt_lookup_max
         self.ngram_prompt_lookup_max = ngram_prompt_lookup_max
         self.ngram_prompt_lookup_min = ngram_prompt_lookup_min
+        self._seq_indices.clear()
+        self._request_seq_ids.clear()
+        if self._corpus_index is not None:
+            self.set_ngram_corpus_lookup(True)
+
+    def set_ngram_corpus_lookup(self, enabled: bool):
+        # Look up the prompts of the other running requests when the
+        # sequence itself has no match.
+        self._corpus_index = NGramIndex(
+            self.ngram_prompt_lookup_min,
+            self.ngram_prompt_lookup_max) if enabled else None
 
     def init_device(self):
         self.device = torch.device(f"cuda:{self.local_rank}")
@@ -58,80 +87,115 @@ class NGramWorker(NonLLMProposerWorkerBase):
         indicator pass to sampler_output_to_torch shall be False.
         """
         self._raise_if_unsupported(execute_model_req)
+        self._free_finished_requests(execute_model_req.finished_requests_ids)
+        if self._corpus_index is not None:
+            self._add_prompts_to_corpus(execute_model_req)
 
         has_spec_out = False
-        token_id_list: List[Optional[torch.Tensor]] = []
-        token_prob_list: List[Optional[torch.Tensor]] = []
-        for idx, seq_group_metadata in enumerate(
-                execute_model_req.seq_group_metadata_list):
-            seq_data = next(iter(seq_group_metadata.seq_data.values()))
-
-            input_ids = torch.as_tensor(seq_data.get_token_ids(),
-                                        dtype=torch.long,
-                                        device=self.device)
-            input_length = seq_data.get_len()
-
-            for ngram_size in range(
-                    min(self.ngram_prompt_lookup_max, input_length - 1),
-                    self.ngram_prompt_lookup_min - 1,
-                    -1,
-            ):
-                ngram_tensor = input_ids[-ngram_size:]
-                if ngram_size == 1:
-                    # Do not match itself and do not use unfold and all
-                    matches = (input_ids[:-1] == ngram_tensor)
-                else:
-                    windows = input_ids.unfold(dimension=0,
-                                               size=ngram_size,
-                                               step=1)
-                    # Do not match itself
-                    matches = (windows[:-1] == ngram_tensor).all(dim=-1)
-
-                # first_match includes "values" (bool), indicating whether
-                # the match is found, and "indices", indicating the index
-                # of the first match.
-                # Note that "first_match.values.item()" triggers GPU-CPU
-                # sync so it is a bit inefficient, but we have not found
-                # a better way to do this.
-                first_match = matches.max(dim=-1)
-                if first_match.values.item():
-                    proposal_start_idx = first_match.indices.add_(ngram_size)
-                    spec_indices = (
-                        proposal_start_idx).repeat(sample_len) + torch.arange(
-                            sample_len, device=self.device)
-                    spec_indices.clamp_(max=input_ids.shape[-1] - 1)
-                    res = input_ids.gather(dim=-1, index=spec_indices)
-                    token_id_list.append(res)
-                    token_prob_list.append(
-                        torch.nn.functional.one_hot(
-                            res,
-                            num_classes=self.vocab_size).to(torch.float32))
-                    has_spec_out = True
-                    break
-            else:
-                token_id_list.append(None)
-                token_prob_list.append(None)
+        outputs: List[Optional[SamplerOutput]] = []
+        for seq_group_metadata in execute_model_req.seq_group_metadata_list:
+            seq_id, seq_data = next(iter(seq_group_metadata.seq_data.items()))
+            token_ids = seq_data.get_token_ids()
+            index = self._get_seq_index(seq_group_metadata.request_id, seq_id,
+                                        token_ids)
+            proposal = self._propose(index, token_ids,
+                                     seq_group_metadata.request_id,
+                                     sample_len)
+            if proposal is None:
+                outputs.append(None)
+                continue
+
+            has_spec_out = True
+            res = torch.tensor(proposal, dtype=torch.long, device=self.device)
+            outputs.append(
+                SamplerOutput(
+                    outputs=None,
+                    sampled_token_probs=torch.nn.functional.one_hot(
+                        res, num_classes=self.vocab_size).to(torch.float32),
+                    logprobs=torch.zeros((sample_len, self.vocab_size),
+                                         dtype=torch.float32,
+                                         device=self.device),
+                    sampled_token_ids=res,
+                ))
 
         if not has_spec_out:
             return None, False
 
-        outputs: List[Optional[SamplerOutput]] = []
-        for idx in range(len(execute_model_req.seq_group_metadata_list)):
-            if token_id_list[idx] is None:
-                outputs.append(None)
-            else:
-                outputs.append(
-                    SamplerOutput(
-                        outputs=None,
-                        sampled_token_probs=token_prob_list[idx],
-                        logprobs=torch.zeros((sample_len, self.vocab_size),
-                                             dtype=torch.float32,
-                                             device=self.device),
-                        sampled_token_ids=token_id_list[idx],
-                    ))
-
         return outputs, False
 
+    def _propose(self, index: NGramIndex, token_ids: List[int],
+                 request_id: str, sample_len: int) -> Optional[List[int]]:
+        """Look up the longest suffix of the sequence that occurred before,
+        first in the sequence itself and then in the prompts of the other
+        requests, and propose the tokens that followed it."""
+        input_length = len(token_ids)
+        for ngram_size in range(
+                min(self.ngram_prompt_lookup_max, input_length - 1),
+                self.ngram_prompt_lookup_min - 1,
+                -1,
+        ):
+            ngram = token_ids[-ngram_size:]
+            continuations = index.lookup(ngram, sample_len)
+            if not continuations and self._corpus_index is not None:
+                continuations = self._corpus_index.lookup(
+                    ngram, sample_len, exclude_doc_id=request_id)
+            if continuations:
+                return continuations[0]
+        return None
+
+    def _get_seq_index(self, request_id: str, seq_id: int,
+                       token_ids: List[int]) -> NGramIndex:
+        """Get the index of the sequence, updated with the tokens appended
+        since the previous step."""
+        index = self._seq_indices.get(seq_id)
+        num_indexed = 0 if index is None else index.num_tokens(seq_id)
+        if index is None or num_indexed > len(token_ids):
+            index = NGramIndex(self.ngram_prompt_lookup_min,
+                               self.ngram_prompt_lookup_max)
+            num_indexed = 0
+            self._seq_indices.put(seq_id, index)
+            seq_ids = self._request_seq_ids.get(request_id)
+            if seq_ids is None:
+                seq_ids = set()
+                self._request_seq_ids.put(request_id, seq_ids)
+            seq_ids.add(seq_id)
+        if num_indexed < len(token_ids):
+            index.extend(seq_id, token_ids[num_indexed:])
+        return index
+
+    def _add_prompts_to_corpus(self,
+                               execute_model_req: ExecuteModelRequest) -> None:
+        assert self._corpus_index is not None
+        for seq_group_metadata in execute_model_req.seq_group_metadata_list:
+            request_id = seq_group_metadata.request_id
+            if request_id in self._corpus_index:
+                continue
+            seq_data = next(iter(seq_group_metadata.seq_data.values()))
+            self._corpus_index.extend(request_id,
+                                      seq_data.get_prompt_token_ids())
+            while len(self._corpus_index) > self._max_num_indexed_seqs:
+                self._corpus_index.remove_oldest()
+
+    def _free_finished_requests(self, finished_requests_ids: List[str]):
+        for request_id in finished_requests_ids:
+            for seq_id in self._request_seq_ids.pop(request_id) or ():
+                self._seq_indices.pop(seq_id, None)
+            if self._corpus_index is not None:
+                self._corpus_index.remove(request_id)
+
+    def execute_model(
+        self,
+        execute_model_req: Optional[ExecuteModelRequest] = None
+    ) -> List[SamplerOutput]:
+        """Only index the prompts of the batch, as there is no model to
+        run."""
+        if execute_model_req is not None:
+            self._free_finished_requests(
+                execute_model_req.finished_requests_ids)
+            if self._corpus_index is not None:
+                self._add_prompts_to_corpus(execute_model_req)
+        return []
+
     def get_spec_proposals(
         self,
         execute_model_req: ExecuteModelRequest,
@@ -142,6 +206,7 @@ class NGramWorker(NonLLMProposerWorkerBase):
         """Produce speculations given an input batch of sequences. The number of
         speculative tokens per sequence is determined by max_proposal_len.
         """
+        self._free_finished_requests(execute_model_req.finished_requests_ids)
         return self._proposer.get_spec_proposals(
             execute_model_req, seq_ids_with_bonus_token_in_last_step)
 
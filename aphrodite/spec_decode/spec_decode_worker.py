@@ -30,6 +30,7 @@ from aphrodite.spec_decode.ngram_worker import NGramWorker
 from aphrodite.spec_decode.proposer_worker_base import ProposerWorkerBase
 from aphrodite.spec_decode.smaller_tp_proposer_worker import (
     SmallerTpProposerWorker)
+from aphrodite.spec_decode.spec_length_controller import SpecLengthController
 from aphrodite.spec_decode.target_model_runner import TargetModelRunner
 from aphrodite.spec_decode.util import (Timer, create_sequence_group_output,
                                         get_all_num_logprobs,
@@ -63,6 +64,8 @@ def create_spec_worker(*args, **kwargs) -> "SpecDecodeWorker":
         parallel_config=speculative_config.draft_parallel_config,
         ngram_prompt_lookup_max=speculative_config.ngram_prompt_lookup_max,
         ngram_prompt_lookup_min=speculative_config.ngram_prompt_lookup_min,
+        ngram_prompt_lookup_corpus=speculative_config.
+        ngram_prompt_lookup_corpus,
         # TODO allow draft-model specific load config.
         #load_config=load_config,
     )
@@ -80,6 +83,8 @@ def create_spec_worker(*args, **kwargs) -> "SpecDecodeWorker":
         typical_acceptance_sampler_posterior_alpha,
         disable_logprobs=speculative_config.disable_logprobs,
         disable_log_stats=speculative_config.disable_log_stats,
+        adaptive_num_spec_tokens=speculative_config.
+        adaptive_num_speculative_tokens,
     )
 
     return spec_decode_worker
@@ -118,6 +123,7 @@ class SpecDecodeWorker(LoraNotSupportedWorkerBase):
         typical_acceptance_sampler_posterior_alpha: float,
         disable_logprobs: bool,
         disable_log_stats: bool,
+        adaptive_num_spec_tokens: bool = False,
     ) -> "SpecDecodeWorker":
 
         allow_zero_draft_token_step = True
@@ -125,10 +131,13 @@ class SpecDecodeWorker(LoraNotSupportedWorkerBase):
             draft_worker_kwargs.pop("ngram_prompt_lookup_max"))
         ngram_prompt_lookup_min = (
             draft_worker_kwargs.pop("ngram_prompt_lookup_min"))
+        ngram_prompt_lookup_corpus = (
+            draft_worker_kwargs.pop("ngram_prompt_lookup_corpus"))
         if ngram_prompt_lookup_max > 0:
             proposer_worker = NGramWorker(**draft_worker_kwargs)
             proposer_worker.set_ngram_window_size(ngram_prompt_lookup_min,
                                                   ngram_prompt_lookup_max)
+            proposer_worker.set_ngram_corpus_lookup(ngram_prompt_lookup_corpus)
         else:
             draft_parallel_config: ParallelConfig = draft_worker_kwargs[
                 'parallel_config']
@@ -176,7 +185,8 @@ class SpecDecodeWorker(LoraNotSupportedWorkerBase):
             disable_log_stats=disable_log_stats,
             disable_by_batch_size=disable_by_batch_size,
             spec_decode_sampler=spec_decode_sampler,
-            allow_zero_draft_token_step=allow_zero_draft_token_step)
+            allow_zero_draft_token_step=allow_zero_draft_token_step,
+            adaptive_num_spec_tokens=adaptive_num_spec_tokens)
 
     def __init__(
         self,
@@ -188,6 +198,7 @@ class SpecDecodeWorker(LoraNotSupportedWorkerBase):
         metrics_collector: Optional[AsyncMetricsCollector] = None,
         disable_by_batch_size: Optional[int] = None,
         allow_zero_draft_token_step: Optional[bool] = True,
+        adaptive_num_spec_tokens: bool = False,
     ):
         """
         Create a SpecDecodeWorker.
@@ -216,6 +227,9 @@ class SpecDecodeWorker(LoraNotSupportedWorkerBase):
             allow_zero_draft_token_step: whether to allow a step where the draft
                 model generates no draft token; should disallow when the tp of
                 draft model is larger than 1
+            adaptive_num_spec_tokens: If set to True, the number of
+                speculative tokens of each step is chosen by a
+                SpecLengthController, up to the number of lookahead slots.
         """
         self.proposer_worker = proposer_worker
         self.scorer_worker = scorer_worker
@@ -225,6 +239,8 @@ class SpecDecodeWorker(LoraNotSupportedWorkerBase):
         self.disable_by_batch_size = disable_by_batch_size or float("inf")
         self.spec_decode_sampler = spec_decode_sampler
         self._allow_zero_draft_token_step = allow_zero_draft_token_step
+        self._spec_length_controller = (SpecLengthController()
+                                        if adaptive_num_spec_tokens else None)
         self._metrics = AsyncMetricsCollector(
             self.spec_decode_sampler
         ) if metrics_collector is None else metrics_collector
@@ -353,6 +369,15 @@ class SpecDecodeWorker(LoraNotSupportedWorkerBase):
         disable_all_speculation = self._should_disable_all_speculation(
             execute_model_req)
         num_lookahead_slots = execute_model_req.num_lookahead_slots
+        if (self._spec_length_controller is not None
+                and num_lookahead_slots > 0 and not disable_all_speculation):
+            # Speculate fewer tokens than there are lookahead slots, or none
+            # at all, if that is expected to emit more tokens per second.
+            num_lookahead_slots = (
+                self._spec_length_controller.get_num_spec_tokens(
+                    get_all_seq_ids(execute_model_req.seq_group_metadata_list),
+                    num_lookahead_slots))
+            execute_model_req.num_lookahead_slots = num_lookahead_slots
 
         # Broadcast how many lookahead slots are scheduled for this step, and
         # whether all speculation is disabled, to all non-driver workers.
@@ -560,6 +585,14 @@ class SpecDecodeWorker(LoraNotSupportedWorkerBase):
                        scoring_timer.elapsed_time_ms,
                        verification_timer.elapsed_time_ms)
 
+        if self._spec_length_controller is not None:
+            self._spec_length_controller.observe(
+                get_all_seq_ids(execute_model_req.seq_group_metadata_list),
+                proposals.proposal_lens.tolist(),
+                (accepted_token_ids != -1).sum(dim=1).tolist(),
+                proposal_time_per_token_ms=stage_times[0],
+                scoring_time_ms=stage_times[1] + stage_times[2])
+
         return self._create_output_sampler_list(
             execute_model_req.seq_group_metadata_list,
             accepted_token_ids,
@@ -873,6 +906,9 @@ class SpecDecodeWorker(LoraNotSupportedWorkerBase):
         for finished_request in execute_model_req.finished_requests_ids:
             for seq_id in self._request_id_seq_id_mapping[finished_request]:
                 self._seq_with_bonus_token_in_last_step.discard(seq_id)
+            if self._spec_length_controller is not None:
+                self._spec_length_controller.free_seqs(
+                    self._request_id_seq_id_mapping[finished_request])
             del self._request_id_seq_id_mapping[finished_request]
 
     def _track_sequences_with_bonus_tokens(
@@ -0,0 +1,191 @@
+from typing import Dict, List
+
+# Weight of the previous statistics when a new observation is added.
+_DECAY = 0.95
+# Weight of the acceptance rate of all sequences in the acceptance rate of a
+# sequence, as a number of draft tokens.
+_PRIOR_WEIGHT = 4.0
+# Number of speculative steps to observe before the speculation length is
+# chosen from the statistics.
+_NUM_WARMUP_STEPS = 8
+# Number of consecutive steps without speculation after which one step
+# speculates a single token, to keep the acceptance rate up to date.
+_MAX_STEPS_WITHOUT_SPECULATION = 32
+# Every this many steps, a step speculates one token more or less than the
+# best number, so that the scoring time is measured for different numbers
+# of scored tokens even when the batch size does not change.
+_EXPLORATION_INTERVAL = 8
+
+
+class _DecayedLinearFit:
+    """Least squares fit of y = a + b * x with exponentially decaying
+    weights, so that it follows changes in the measured times."""
+
+    def __init__(self):
+        self.weight = 0.0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xx = 0.0
+        self.sum_xy = 0.0
+
+    def update(self, x: float, y: float) -> None:
+        self.weight = self.weight * _DECAY + 1.0
+        self.sum_x = self.sum_x * _DECAY + x
+        self.sum_y = self.sum_y * _DECAY + y
+        self.sum_xx = self.sum_xx * _DECAY + x * x
+        self.sum_xy = self.sum_xy * _DECAY + x * y
+
+    def predict(self, x: float) -> float:
+        if self.weight == 0.0:
+            return 0.0
+        mean_x = self.sum_x / self.weight
+        mean_y = self.sum_y / self.weight
+        var_x = self.sum_xx / self.weight - mean_x * mean_x
+        slope = 0.0
+        if var_x > 1e-6 * max(mean_x * mean_x, 1.0):
+            cov_xy = self.sum_xy / self.weight - mean_x * mean_y
+            # The time cannot decrease with more tokens.
+            slope = max(cov_xy / var_x, 0.0)
+        return max(mean_y + slope * (x - mean_x), 0.0)
+
+
+class SpecLengthController:
+    """Chooses the number of speculative tokens of each step.
+
+    The controller keeps a rolling acceptance rate of the draft tokens of
+    each sequence, and fits the time of the proposal and scoring stages to
+    the batch size and the number of scored tokens. For each step, it
+    chooses the number of speculative tokens k, up to the number of
+    lookahead slots, that maximizes the expected number of tokens emitted
+    per second by the sequences in the batch. With k = 0, the step runs
+    without speculation.
+
+    Larger batches make scoring more expensive per speculative token, so the
+    speculation length ramps down under load, and ramps up again when the
+    batch is small or the acceptance rate is high.
+    """
+
+    def __init__(self):
+        # Rolling number of accepted draft tokens and of draft tokens that
+        # were verified, i.e. up to and including the first rejected one,
+        # per sequence and in total.
+        self._seq_accepted: Dict[int, float] = {}
+        self._seq_verified: Dict[int, float] = {}
+        self._accepted = 0.0
+        self._verified = 0.0
+        # Rolling fraction of the sequences that get draft tokens, as a
+        # proposer may not have a proposal for all sequences.
+        self._proposal_rate = 1.0
+
+        # Proposal time per token as a function of the batch size, and
+        # scoring and verification time as a function of the number of
+        # scored tokens.
+        self._proposal_time_ms = _DecayedLinearFit()
+        self._scoring_time_ms = _DecayedLinearFit()
+
+        self._num_observed_steps = 0
+        self._num_steps = 0
+        self._num_steps_without_speculation = 0
+
+    def get_acceptance_rate(self, seq_id: int) -> float:
+        """Get the rolling probability that a draft token of the sequence
+        is accepted."""
+        prior = (self._accepted + 1.0) / (self._verified + 2.0)
+        accepted = self._seq_accepted.get(seq_id, 0.0)
+        verified = self._seq_verified.get(seq_id, 0.0)
+        return (accepted + _PRIOR_WEIGHT * prior) / (verified + _PRIOR_WEIGHT)
+
+    def get_num_spec_tokens(self, seq_ids: List[int], max_k: int) -> int:
+        """Choose the number of speculative tokens, up to max_k, for a step
+        of the sequences."""
+        if self._num_observed_steps < _NUM_WARMUP_STEPS or not seq_ids:
+            return max_k
+
+        batch_size = len(seq_ids)
+        acceptance_rate = sum(
+            self.get_acceptance_rate(seq_id)
+            for seq_id in seq_ids) / batch_size
+        proposal_time_ms = self._proposal_time_ms.predict(batch_size)
+        num_proposing_seqs = batch_size * self._proposal_rate
+
+        best_k = 0
+        best_goodput = 0.0
+        for k in range(max_k + 1):
+            # Expected number of tokens emitted per sequence, including the
+            # bonus token, if each draft token is accepted independently.
+            expected_tokens = sum(acceptance_rate**i for i in range(k + 1))
+            step_time_ms = (k * proposal_time_ms +
+                            self._scoring_time_ms.predict(
+                                batch_size + num_proposing_seqs * k))
+            goodput = expected_tokens / max(step_time_ms, 1e-3)
+            if goodput > best_goodput:
+                best_k = k
+                best_goodput = goodput
+
+        self._num_steps += 1
+        if best_k == 0:
+            self._num_steps_without_speculation += 1
+            if (self._num_steps_without_speculation >=
+                    _MAX_STEPS_WITHOUT_SPECULATION):
+                best_k = min(1, max_k)
+        elif self._num_steps % _EXPLORATION_INTERVAL == 0:
+            # Alternate between exploring a shorter and a longer length.
+            if self._num_steps % (2 * _EXPLORATION_INTERVAL) == 0:
+                best_k = max(best_k - 1, 1)
+            else:
+                best_k = min(best_k + 1, max_k)
+        if best_k > 0:
+            self._num_steps_without_speculation = 0
+        return best_k
+
+    def observe(self, seq_ids: List[int], proposal_lens: List[int],
+                num_emitted_tokens: List[int],
+                proposal_time_per_token_ms: float,
+                scoring_time_ms: float) -> None:
+        """Update the statistics with a speculative step.
+
+        Args:
+            seq_ids: The sequences of the step.
+            proposal_lens: The number of draft tokens of each sequence.
+            num_emitted_tokens: The number of tokens emitted by each
+                sequence, i.e. the accepted draft tokens and the bonus or
+                recovered token.
+            proposal_time_per_token_ms: The proposal time per speculative
+                token.
+            scoring_time_ms: The time to score and verify the draft tokens.
+        """
+        self._num_observed_steps += 1
+        self._proposal_time_ms.update(len(seq_ids),
+                                      proposal_time_per_token_ms)
+        self._scoring_time_ms.update(
+            len(seq_ids) + sum(proposal_lens), scoring_time_ms)
+        if seq_ids:
+            num_proposing_seqs = sum(1 for proposal_len in proposal_lens
+                                     if proposal_len > 0)
+            self._proposal_rate = (self._proposal_rate * _DECAY +
+                                   (1 - _DECAY) * num_proposing_seqs /
+                                   len(seq_ids))
+
+        step_accepted = 0
+        step_verified = 0
+        for seq_id, proposal_len, num_emitted in zip(seq_ids, proposal_lens,
+                                                     num_emitted_tokens):
+            if proposal_len == 0:
+                continue
+            accepted = num_emitted - 1
+            # The draft tokens after the first rejected one are not
+            # verified.
+            verified = accepted + (1 if accepted < proposal_len else 0)
+            self._seq_accepted[seq_id] = self._seq_accepted.get(
+                seq_id, 0.0) * _DECAY + accepted
+            self._seq_verified[seq_id] = self._seq_verified.get(
+                seq_id, 0.0) * _DECAY + verified
+            step_accepted += accepted
+            step_verified += verified
+        self._accepted = self._accepted * _DECAY + step_accepted
+        self._verified = self._verified * _DECAY + step_verified
+
+    def free_seqs(self, seq_ids: List[int]) -> None:
+        for seq_id in seq_ids:
+            self._seq_accepted.pop(seq_id, None)
+            self._seq_verified.pop(seq_id, None)
@@ -1,5 +1,5 @@
 """CacheEngine class for managing the KV cache."""
-from typing import List
+from typing import List, Tuple
 
 import torch
 
@@ -8,6 +8,12 @@ from aphrodite.common.config import (CacheConfig, DeviceConfig, ModelConfig,
                                      ParallelConfig)
 from aphrodite.common.utils import (STR_DTYPE_TO_TORCH_DTYPE, get_dtype_size,
                                     is_pin_memory_available)
+from aphrodite.processing.kv_disk_cache import (KVDiskCacheStore,
+                                                get_kv_disk_cache_dir)
+
+# The number of blocks to copy from the GPU at once when saving blocks to
+# the disk cache.
+_DISK_SAVE_BATCH_SIZE = 16
 
 
 class CacheEngine:
@@ -64,6 +70,37 @@ class CacheEngine:
             self.num_gpu_blocks, self.device_config.device_type)
         self.cpu_cache = self._allocate_kv_cache(self.num_cpu_blocks, "cpu")
 
+        self.kv_disk_cache = None
+        self._disk_save_stream = None
+        if cache_config.kv_disk_cache_path is not None:
+            self._init_kv_disk_cache(tp_rank)
+
+    def _init_kv_disk_cache(self, tp_rank: int) -> None:
+        # The dimension of the blocks in the KV cache shape of the backend.
+        shape = self.attn_backend.get_kv_cache_shape(1, self.block_size,
+                                                     self.num_kv_heads,
+                                                     self.head_size)
+        other_shape = self.attn_backend.get_kv_cache_shape(
+            2, self.block_size, self.num_kv_heads, self.head_size)
+        self._block_dim = next(
+            dim for dim, (size, other_size) in enumerate(
+                zip(shape, other_shape)) if size != other_size)
+        self._disk_block_shape = (self.num_attention_layers,
+                                  *shape[:self._block_dim],
+                                  *shape[self._block_dim + 1:])
+        self._disk_block_num_bytes = get_dtype_size(self.dtype)
+        for size in self._disk_block_shape:
+            self._disk_block_num_bytes *= size
+
+        layout = {
+            "attn_backend": self.attn_backend.get_name(),
+            "block_shape": list(self._disk_block_shape),
+            "dtype": str(self.dtype),
+        }
+        self.kv_disk_cache = KVDiskCacheStore(
+            get_kv_disk_cache_dir(self.cache_config, self.model_config,
+                                  self.parallel_config), tp_rank, layout)
+
     def _allocate_kv_cache(
         self,
         num_blocks: int,
@@ -98,6 +135,98 @@ class CacheEngine:
     def copy(self, src_to_dsts: torch.Tensor) -> None:
         self.attn_backend.copy_blocks(self.gpu_cache, src_to_dsts)
 
+    def save_to_disk(self, blocks: List[Tuple[str, int]]) -> None:
+        """Copies the GPU blocks to the CPU and writes them to the disk cache
+        in the background.
+
+        On CUDA, the blocks are gathered and copied into pinned CPU buffers on
+        a side stream, so the step does not wait for the copy. The writer
+        thread of the disk cache waits for it instead.
+        """
+        assert self.kv_disk_cache is not None
+        device = self.gpu_cache[0].device
+        use_side_stream = device.type == "cuda"
+        if use_side_stream and self._disk_save_stream is None:
+            self._disk_save_stream = torch.cuda.Stream(device)
+        for start in range(0, len(blocks), _DISK_SAVE_BATCH_SIZE):
+            batch = blocks[start:start + _DISK_SAVE_BATCH_SIZE]
+            block_ids = torch.tensor([block_id for _, block_id in batch],
+                                     device=device)
+            if not use_side_stream:
+                cpu_blocks = self._gather_blocks(block_ids).cpu()
+                for i, (key, _) in enumerate(batch):
+                    payload = cpu_blocks[i].view(-1).view(torch.uint8).numpy()
+                    self.kv_disk_cache.write(key, memoryview(payload))
+                continue
+
+            stream = self._disk_save_stream
+            step_stream = torch.cuda.current_stream(device)
+            # Gather the blocks after the kernels that wrote them, and before
+            # the kernels of this step can reuse them.
+            stream.wait_stream(step_stream)
+            with torch.cuda.stream(stream):
+                gpu_blocks = self._gather_blocks(block_ids)
+                step_stream.wait_stream(stream)
+                cpu_blocks = torch.empty(gpu_blocks.shape,
+                                         dtype=gpu_blocks.dtype,
+                                         pin_memory=True)
+                cpu_blocks.copy_(gpu_blocks, non_blocking=True)
+                copied = torch.cuda.Event()
+                copied.record(stream)
+            for i, (key, _) in enumerate(batch):
+                payload = cpu_blocks[i].view(-1).view(torch.uint8).numpy()
+                # The payload keeps the pinned buffer alive until the write.
+                self.kv_disk_cache.write(key,
+                                         memoryview(payload),
+                                         wait=copied.synchronize)
+
+    def _gather_blocks(self, block_ids: torch.Tensor) -> torch.Tensor:
+        """Returns the blocks of all layers as a contiguous tensor of shape
+        [num_blocks, *disk_block_shape]."""
+        layer_blocks = [
+            layer_cache.index_select(self._block_dim,
+                                     block_ids).movedim(self._block_dim, 0)
+            for layer_cache in self.gpu_cache
+        ]
+        return torch.stack(layer_blocks, dim=1)
+
+    def load_from_disk(self, blocks: List[Tuple[str, int]]) -> List[int]:
+        """Reads the blocks from the disk cache into the GPU blocks.
+
+        Returns the GPU block ids of the blocks whose files are missing or
+        invalid, e.g. because another engine sharing the directory removed
+        them since the scheduler verified them. These blocks are not written
+        and must be recomputed.
+        """
+        assert self.kv_disk_cache is not None
+        block_ids: List[int] = []
+        failed_block_ids: List[int] = []
+        cpu_blocks = []
+        for key, block_id in blocks:
+            payload = self.kv_disk_cache.read(key, self._disk_block_num_bytes)
+            if payload is None:
+                failed_block_ids.append(block_id)
+                continue
+            block_ids.append(block_id)
+            cpu_blocks.append(
+                torch.frombuffer(payload, dtype=torch.uint8).view(
+                    self.dtype).view(self._disk_block_shape))
+        if not cpu_blocks:
+            return failed_block_ids
+        block_ids_t = torch.tensor(block_ids,
+                                   device=self.gpu_cache[0].device)
+        gpu_blocks = torch.stack(cpu_blocks, dim=self._block_dim + 1).to(
+            block_ids_t.device)
+        for layer_cache, layer_blocks in zip(self.gpu_cache, gpu_blocks):
+            layer_cache.index_copy_(self._block_dim, block_ids_t,
+                                    layer_blocks)
+        return failed_block_ids
+
+    def remove_from_disk(self, keys: List[str]) -> None:
+        assert self.kv_disk_cache is not None
+        for key in keys:
+            self.kv_disk_cache.remove(key)
+
     @staticmethod
     def get_cache_block_size(
         cache_config: CacheConfig,
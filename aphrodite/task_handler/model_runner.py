@@ -1173,6 +1173,25 @@ class GPUModelRunnerBase(ModelRunnerBase[TModelInputForGPU]):
             raise RuntimeError("LoRA is not enabled.")
         return self.lora_manager.list_adapters()
 
+    def prefetch_loras(self, lora_requests: Set[LoRARequest]) -> None:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        self.lora_manager.prefetch_adapters(lora_requests)
+
+    def list_prefetching_loras(self) -> Set[int]:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        return self.lora_manager.list_prefetching_adapters()
+
+    def sync_prefetching_loras(
+            self, lora_requests: Set[LoRARequest],
+            group: torch.distributed.ProcessGroup) -> None:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        self.lora_manager.sync_prefetching_adapters(
+            sorted(lora_request.lora_int_id
+                   for lora_request in lora_requests), group)
+
     def remove_all_prompt_adapters(self):
         if not self.prompt_adapter_manager:
             raise RuntimeError("PromptAdapter is not enabled.")
@@ -1,6 +1,9 @@
+import dataclasses
 from dataclasses import dataclass
 from typing import List, Optional, Tuple
 
+import torch
+
 from aphrodite.common.sequence import ExecuteModelRequest, SamplerOutput
 from aphrodite.distributed import broadcast_tensor_dict, get_pp_group
 from aphrodite.task_handler.model_runner_base import BroadcastableModelInput
@@ -9,6 +12,9 @@ from aphrodite.task_handler.multi_step_model_runner import (
 from aphrodite.task_handler.worker import Worker, WorkerInput
 
 
+_EMPTY_BLOCK_MAPPING = torch.empty((0, 2), dtype=torch.int64)
+
+
 @dataclass
 class MultiStepState:
     worker_input: WorkerInput
@@ -63,7 +69,18 @@ class MultiStepWorker(Worker):
         else:
             # on subsequent steps we reuse the worker input and model input
             multi_step_state = self.multi_step_states[virtual_engine]
-            worker_input = multi_step_state.worker_input
+            # The cache operations only run on the first step. By the later
+            # steps the swapped out, copied and saved blocks may have been
+            # reused and overwritten, e.g. a block demoted to the host prefix
+            # cache.
+            worker_input = dataclasses.replace(
+                multi_step_state.worker_input,
+                blocks_to_swap_in=_EMPTY_BLOCK_MAPPING,
+                blocks_to_swap_out=_EMPTY_BLOCK_MAPPING,
+                blocks_to_copy=_EMPTY_BLOCK_MAPPING,
+                disk_blocks_to_save=None,
+                disk_blocks_to_load=None,
+                disk_blocks_to_remove=None)
             model_input = multi_step_state.model_input
             frozen_model_input = model_input.frozen_model_input
             assert frozen_model_input is not None
@@ -85,6 +102,15 @@ class MultiStepWorker(Worker):
             broadcast_tensor_dict(broadcast_data, src=0)
         return model_input, worker_input
 
+    def _recompute_model_input(
+            self, execute_model_req: ExecuteModelRequest,
+            model_input: StatefulModelInput) -> StatefulModelInput:
+        # Only the first step loads blocks from the disk cache. The model
+        # input is updated in place, as it is kept for the next steps.
+        model_input.frozen_model_input = super()._recompute_model_input(
+            execute_model_req, model_input).frozen_model_input
+        return model_input
+
     def _prepare_last_sampled_token_ids_for_tp_workers(
         self,
         execute_model_req: ExecuteModelRequest,
@@ -16,8 +16,10 @@ from aphrodite.common.sequence import (ExecuteModelRequest,
                                        IntermediateTensors, SamplerOutput,
                                        SequenceGroupMetadata,
                                        SequenceGroupMetadataDelta)
-from aphrodite.distributed import (ensure_model_parallel_initialized,
+from aphrodite.distributed import (broadcast_tensor_dict,
+                                   ensure_model_parallel_initialized,
                                    get_tensor_model_parallel_rank,
+                                   get_tp_group,
                                    init_distributed_environment,
                                    set_custom_all_reduce)
 from aphrodite.lora.request import LoRARequest
@@ -30,6 +32,7 @@ from aphrodite.task_handler.embedding_model_runner import EmbeddingModelRunner
 from aphrodite.task_handler.enc_dec_model_runner import (
     EncoderDecoderModelRunner)
 from aphrodite.task_handler.model_runner import GPUModelRunnerBase, ModelRunner
+from aphrodite.task_handler.model_runner_base import BroadcastableModelInput
 from aphrodite.task_handler.worker_base import (LocalOrDistributedWorkerBase,
                                                 WorkerInput)
 
@@ -117,6 +120,10 @@ class Worker(LocalOrDistributedWorkerBase):
         # Initialize gpu_cache as embedding models don't initialize kv_caches
         self.gpu_cache: Optional[List[List[torch.Tensor]]] = None
         self._seq_group_metadata_cache: Dict[str, SequenceGroupMetadata] = {}
+        # GPU blocks that the scheduler marked as computed but that failed to
+        # load from the disk cache, and whether a load of this step failed.
+        self._blocks_to_recompute: Set[int] = set()
+        self._disk_load_failed = False
 
     def _is_encoder_decoder_model(self):
         return self.model_config.is_encoder_decoder_model
@@ -276,6 +283,9 @@ class Worker(LocalOrDistributedWorkerBase):
     @torch.inference_mode()
     def prepare_worker_input(
             self, execute_model_req: ExecuteModelRequest) -> WorkerInput:
+        # This runs before the model input is prepared.
+        self._exclude_blocks_to_recompute(
+            execute_model_req.seq_group_metadata_list)
         virtual_engine = execute_model_req.virtual_engine
         num_steps = execute_model_req.num_steps
         num_seq_groups = len(execute_model_req.seq_group_metadata_list)
@@ -299,23 +309,142 @@ class Worker(LocalOrDistributedWorkerBase):
                            blocks_to_swap_out=blocks_to_swap_out,
                            blocks_to_copy=blocks_to_copy,
                            virtual_engine=virtual_engine,
-                           num_steps=num_steps)
+                           num_steps=num_steps,
+                           lora_prefetch_requests=execute_model_req.
+                           lora_prefetch_requests or None,
+                           disk_blocks_to_save=execute_model_req.
+                           disk_blocks_to_save or None,
+                           disk_blocks_to_load=execute_model_req.
+                           disk_blocks_to_load or None,
+                           disk_blocks_to_remove=execute_model_req.
+                           disk_blocks_to_remove or None)
 
     @torch.inference_mode()
     def execute_worker(self, worker_input: WorkerInput) -> None:
         virtual_engine = worker_input.virtual_engine
-        # Issue cache operations.
-        if (worker_input.blocks_to_swap_in is not None
-                and worker_input.blocks_to_swap_in.numel() > 0):
-            self.cache_engine[virtual_engine].swap_in(
-                worker_input.blocks_to_swap_in)
+        # Blocks are saved to the disk cache when their sequences are freed,
+        # so the saves go before any operation that writes GPU blocks.
+        if worker_input.disk_blocks_to_save:
+            self.cache_engine[virtual_engine].save_to_disk(
+                worker_input.disk_blocks_to_save)
+        # Issue cache operations. Swap outs go first, as the host prefix
+        # cache demotes evicted blocks that a swap in may overwrite.
         if (worker_input.blocks_to_swap_out is not None
                 and worker_input.blocks_to_swap_out.numel() > 0):
             self.cache_engine[virtual_engine].swap_out(
                 worker_input.blocks_to_swap_out)
+        if (worker_input.blocks_to_swap_in is not None
+                and worker_input.blocks_to_swap_in.numel() > 0):
+            self.cache_engine[virtual_engine].swap_in(
+                worker_input.blocks_to_swap_in)
+        if worker_input.disk_blocks_to_load:
+            self._load_from_disk(virtual_engine,
+                                 worker_input.disk_blocks_to_load)
         if (worker_input.blocks_to_copy is not None
                 and worker_input.blocks_to_copy.numel() > 0):
             self.cache_engine[virtual_engine].copy(worker_input.blocks_to_copy)
+        if worker_input.disk_blocks_to_remove:
+            self.cache_engine[virtual_engine].remove_from_disk(
+                worker_input.disk_blocks_to_remove)
+        if worker_input.lora_prefetch_requests and self.lora_config:
+            self.model_runner.prefetch_loras(
+                worker_input.lora_prefetch_requests)
+            # Every rank loads the LoRAs, so the driver must know when the
+            # other ranks are still loading them too.
+            if self.parallel_config.tensor_parallel_size > 1:
+                self.model_runner.sync_prefetching_loras(
+                    worker_input.lora_prefetch_requests,
+                    get_tp_group().cpu_group)
+
+    def _load_from_disk(self, virtual_engine: int,
+                        blocks: List[Tuple[str, int]]) -> None:
+        failed_block_ids = self.cache_engine[virtual_engine].load_from_disk(
+            blocks)
+        if self.parallel_config.tensor_parallel_size > 1:
+            # Every rank reads its own files, so a block is recomputed if it
+            # failed to load on any rank.
+            failed = torch.tensor(
+                [block_id in failed_block_ids for _, block_id in blocks],
+                dtype=torch.int32)
+            torch.distributed.all_reduce(failed,
+                                         op=torch.distributed.ReduceOp.MAX,
+                                         group=get_tp_group().cpu_group)
+            failed_block_ids = [
+                block_id
+                for (_, block_id), flag in zip(blocks, failed.tolist()) if flag
+            ]
+        self._blocks_to_recompute.difference_update(
+            block_id for _, block_id in blocks)
+        self._blocks_to_recompute.update(failed_block_ids)
+        self._disk_load_failed = bool(failed_block_ids)
+        if failed_block_ids:
+            logger.warning(f"Failed to load {len(failed_block_ids)} blocks "
+                           "from the KV disk cache, recomputing them.")
+
+    def _exclude_blocks_to_recompute(
+            self,
+            seq_group_metadata_list: List[SequenceGroupMetadata]) -> None:
+        """Drop the blocks that failed to load from the disk cache, and the
+        blocks after them, from the computed blocks of the prefills, so that
+        the model runner computes their tokens again.
+
+        A chunked prefill may only reach such a block in a later step, so the
+        blocks are remembered until a prefill computes them.
+        """
+        if not self._blocks_to_recompute:
+            return
+        block_size = self.cache_config.block_size
+        for seq_group_metadata in seq_group_metadata_list:
+            computed_block_nums = seq_group_metadata.computed_block_nums
+            if not seq_group_metadata.is_prompt or not computed_block_nums:
+                continue
+            num_computed_blocks = next(
+                (i for i, block_id in enumerate(computed_block_nums)
+                 if block_id in self._blocks_to_recompute), None)
+            if num_computed_blocks is None:
+                continue
+            seq_group_metadata.computed_block_nums = (
+                computed_block_nums[:num_computed_blocks])
+            # A prefill has a single sequence.
+            seq_data = next(iter(seq_group_metadata.seq_data.values()))
+            block_table = next(iter(seq_group_metadata.block_tables.values()))
+            num_tokens = (seq_data.get_num_computed_tokens() +
+                          seq_group_metadata.token_chunk_size)
+            self._blocks_to_recompute.difference_update(
+                block_table[:num_tokens // block_size])
+
+    def _prepare_model_input_again(
+        self,
+        execute_model_req: Optional[ExecuteModelRequest],
+        model_input: BroadcastableModelInput,
+    ) -> BroadcastableModelInput:
+        """Prepare the model input again if blocks failed to load from the
+        disk cache, so that they are recomputed. The ranks agree on the failed
+        blocks, so either all of them or none of them do it."""
+        if not self._disk_load_failed:
+            return model_input
+        self._disk_load_failed = False
+        if execute_model_req is None:
+            broadcast_data = broadcast_tensor_dict(src=0)
+            return (self.model_runner.
+                    make_model_input_from_broadcasted_tensor_dict(
+                        broadcast_data))
+        self._exclude_blocks_to_recompute(
+            execute_model_req.seq_group_metadata_list)
+        model_input = self._recompute_model_input(execute_model_req,
+                                                  model_input)
+        if self.is_driver_worker and self.do_metadata_broadcast:
+            broadcast_tensor_dict(model_input.as_broadcastable_tensor_dict(),
+                                  src=0)
+        return model_input
+
+    def _recompute_model_input(
+            self, execute_model_req: ExecuteModelRequest,
+            model_input: BroadcastableModelInput) -> BroadcastableModelInput:
+        return self.model_runner.prepare_model_input(
+            execute_model_req.seq_group_metadata_list,
+            execute_model_req.virtual_engine,
+            execute_model_req.finished_requests_ids)
 
     def _get_cached_seq_group_metadata(
             self,
@@ -381,6 +510,11 @@ class Worker(LocalOrDistributedWorkerBase):
     def list_loras(self) -> Set[int]:
         return self.model_runner.list_loras()
 
+    def list_prefetching_loras(self) -> Set[int]:
+        """List the LoRAs that are still being loaded in the background by
+        any worker of the tensor parallel group."""
+        return self.model_runner.list_prefetching_loras()
+
     def add_prompt_adapter(
             self, prompt_adapter_request: PromptAdapterRequest) -> bool:
         return self.model_runner.add_prompt_adapter(prompt_adapter_request)
@@ -129,6 +129,10 @@ class WorkerInput:
     blocks_to_copy: Optional[torch.Tensor] = None
     virtual_engine: int = 0
     num_steps: int = 1
+    lora_prefetch_requests: Optional[Set[LoRARequest]] = None
+    disk_blocks_to_save: Optional[List[Tuple[str, int]]] = None
+    disk_blocks_to_load: Optional[List[Tuple[str, int]]] = None
+    disk_blocks_to_remove: Optional[List[str]] = None
 
     @classmethod
     def from_broadcasted_tensor_dict(
@@ -146,6 +150,12 @@ class WorkerInput:
             blocks_to_copy=tensor_dict.pop("blocks_to_copy"),
             virtual_engine=tensor_dict["virtual_engine"],
             num_steps=tensor_dict.pop("num_steps"),
+            lora_prefetch_requests=tensor_dict.pop("lora_prefetch_requests",
+                                                   None),
+            disk_blocks_to_save=tensor_dict.pop("disk_blocks_to_save", None),
+            disk_blocks_to_load=tensor_dict.pop("disk_blocks_to_load", None),
+            disk_blocks_to_remove=tensor_dict.pop("disk_blocks_to_remove",
+                                                  None),
         )
 
     def as_broadcastable_tensor_dict(
@@ -161,6 +171,15 @@ class WorkerInput:
             "virtual_engine": self.virtual_engine,
             "num_steps": self.num_steps,
         }
+        if self.lora_prefetch_requests:
+            tensor_dict["lora_prefetch_requests"] = (
+                self.lora_prefetch_requests)
+        if self.disk_blocks_to_save:
+            tensor_dict["disk_blocks_to_save"] = self.disk_blocks_to_save
+        if self.disk_blocks_to_load:
+            tensor_dict["disk_blocks_to_load"] = self.disk_blocks_to_load
+        if self.disk_blocks_to_remove:
+            tensor_dict["disk_blocks_to_remove"] = self.disk_blocks_to_remove
 
         return tensor_dict
 
@@ -217,6 +236,19 @@ class LocalOrDistributedWorkerBase(WorkerBase):
         """
         raise NotImplementedError
 
+    def _prepare_model_input_again(
+        self,
+        execute_model_req: Optional[ExecuteModelRequest],
+        model_input: BroadcastableModelInput,
+    ) -> BroadcastableModelInput:
+        """
+        Called on every worker after execute_worker(), to prepare the model
+        input again if the cache operations changed what the model has to
+        compute. The request is None on the workers that receive the model
+        input from the driver.
+        """
+        return model_input
+
     def _get_worker_input_from_broadcast(
             self) -> Optional[Tuple[BroadcastableModelInput, WorkerInput]]:
         """ Get the worker input from the broadcasted tensor dict. """
@@ -289,6 +321,8 @@ class LocalOrDistributedWorkerBase(WorkerBase):
         model_input, worker_input = inputs
         num_steps = worker_input.num_steps
         self.execute_worker(worker_input)
+        model_input = self._prepare_model_input_again(execute_model_req,
+                                                      model_input)
         # If there is no input, we don't need to execute the model.
         if worker_input.num_seq_groups == 0:
             return []
@@ -333,6 +367,8 @@ class LocalOrDistributedWorkerBase(WorkerBase):
                 execute_model_req.seq_group_metadata_list))
 
         self.execute_worker(worker_input)
+        model_input = self._prepare_model_input_again(execute_model_req,
+                                                      model_input)
 
         # If there is no input, we don't need to execute the model.
         if worker_input.num_seq_groups == 0:
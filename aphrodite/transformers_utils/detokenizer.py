@@ -5,7 +5,7 @@ from transformers import PreTrainedTokenizer, PreTrainedTokenizerFast
 from aphrodite.common.sequence import (Logprob, SamplingParams, Sequence,
                                        SequenceGroup)
 from aphrodite.transformers_utils.tokenizer_group.base_tokenizer_group import (
-    BaseTokenizerGroup)
+    AnyTokenizer, BaseTokenizerGroup)
 
 # Used eg. for marking rejected tokens in spec decoding.
 INVALID_TOKEN_ID = -1
@@ -95,13 +95,53 @@ class Detokenizer:
             else:
                 prev_tokens.extend(next_iter_tokens)
 
-    def decode_sequence_inplace(self, seq: Sequence,
-                                prms: SamplingParams) -> int:
+    def decode_sequences_inplace(
+            self, seqs: List[Tuple[Sequence, SamplingParams]]) -> List[int]:
+        """Decodes the new token of each of the sequences. In-place operation.
+
+        The new token ids of all sequences that share a tokenizer are
+        converted to tokens in one tokenizer call.
+
+        Args:
+            seqs: The sequences to decode, with the sampling parameters used
+                to generate them.
+
+        Returns:
+            The number of characters added to the output text of each
+            sequence.
+        """
+        new_tokens: List[Optional[List[str]]] = [None] * len(seqs)
+        batches: Dict[Tuple[int, bool], List[int]] = {}
+        tokenizers: Dict[int, AnyTokenizer] = {}
+        for i, (seq, prms) in enumerate(seqs):
+            tokenizer = self.get_tokenizer_for_seq(seq)
+            tokenizers[id(tokenizer)] = tokenizer
+            batches.setdefault((id(tokenizer), prms.skip_special_tokens),
+                               []).append(i)
+        for (tokenizer_id, skip_special_tokens), indices in batches.items():
+            batch_tokens = convert_ids_to_tokens_batch(
+                tokenizers[tokenizer_id],
+                [seqs[i][0].get_last_token_id() for i in indices],
+                skip_special_tokens=skip_special_tokens)
+            for i, tokens in zip(indices, batch_tokens):
+                new_tokens[i] = tokens
+
+        return [
+            self.decode_sequence_inplace(seq, prms, tokens)
+            for (seq, prms), tokens in zip(seqs, new_tokens)
+        ]
+
+    def decode_sequence_inplace(self,
+                                seq: Sequence,
+                                prms: SamplingParams,
+                                new_tokens: Optional[List[str]] = None) -> int:
         """Decodes the new token for a sequence. In-place operation.
 
         Args:
             seq: The sequence to decode.
             prms: The sampling parameters used to generate the sequence.
+            new_tokens: The new token id converted to tokens, if it was
+                already converted by `decode_sequences_inplace`.
 
         Returns:
             The number of characters added to the output text.
@@ -130,12 +170,12 @@ class Detokenizer:
              read_offset=seq.read_offset,
              skip_special_tokens=prms.skip_special_tokens,
              spaces_between_special_tokens=prms.spaces_between_special_tokens,
+             new_tokens=new_tokens,
          )
 
         # Decode logprobs
         logprobs = seq.output_logprobs[-1]
         if logprobs:
-            previous_tokens = all_input_ids[:-1]
             for token_id, sample_logprob in logprobs.items():
                 # If the token was generated this iteration,
                 # use the provided text.
@@ -145,10 +185,10 @@ class Detokenizer:
 
                 if (sample_logprob.decoded_token is None
                         and token_id != INVALID_TOKEN_ID):
-                    all_input_ids_with_logprob = previous_tokens + [token_id]
+                    # Only the last input id is used once seq.tokens is set.
                     (_, new_text, _, _) = detokenize_incrementally(
                         tokenizer=tokenizer,
-                        all_input_ids=all_input_ids_with_logprob,
+                        all_input_ids=[token_id],
                         prev_tokens=seq.tokens,
                         prefix_offset=seq.prefix_offset,
                         read_offset=seq.read_offset,
@@ -158,9 +198,12 @@ class Detokenizer:
                     )
                     sample_logprob.decoded_token = new_text
 
+        # Only the tokens from the prefix offset on are needed to decode the
+        # next tokens, so drop the ones before it to keep seq.tokens short.
         seq.tokens.extend(new_tokens)
-        seq.prefix_offset = prefix_offset
-        seq.read_offset = read_offset
+        del seq.tokens[:prefix_offset]
+        seq.prefix_offset = 0
+        seq.read_offset = read_offset - prefix_offset
         seq.output_text += new_decoded_token_text
 
         return len(new_decoded_token_text)
@@ -206,6 +249,35 @@ def _convert_tokens_to_string_with_added_encoders(
         return "".join(sub_texts)
 
 
+def convert_ids_to_tokens_batch(
+    tokenizer: Union[PreTrainedTokenizer, PreTrainedTokenizerFast],
+    token_ids: List[int],
+    skip_special_tokens: bool = False,
+) -> List[List[str]]:
+    """Converts each of the token ids to the list of new tokens that
+    `detokenize_incrementally` would convert it to, with one tokenizer call
+    for all of them. The list is empty for a skipped special token."""
+    vocab_size = len(tokenizer)
+    in_vocab_ids = [
+        token_id for token_id in token_ids if token_id < vocab_size
+    ]
+    # Special tokens are skipped below, as convert_ids_to_tokens would drop
+    # them from the list.
+    tokens = iter(
+        tokenizer.convert_ids_to_tokens(in_vocab_ids,
+                                        skip_special_tokens=False))
+    special_ids = set(
+        tokenizer.all_special_ids) if skip_special_tokens else set()
+    batch_tokens: List[List[str]] = []
+    for token_id in token_ids:
+        if token_id >= vocab_size:
+            batch_tokens.append([""])
+            continue
+        token = next(tokens)
+        batch_tokens.append([] if token_id in special_ids else [token])
+    return batch_tokens
+
+
 # 5 is an arbitrary value that should work for all
 # tokenizers (bigger = more conservative).
 INITIAL_INCREMENTAL_DETOKENIZATION_OFFSET = 5
@@ -246,6 +318,7 @@ def detokenize_incrementally(
     read_offset: int,
     skip_special_tokens: bool = False,
     spaces_between_special_tokens: bool = True,
+    new_tokens: Optional[List[str]] = None,
 ) -> Tuple[List[str], str, int, int]:
     """Detokenizes the input ids incrementally and returns the new tokens
     and the new text.
@@ -270,6 +343,8 @@ def detokenize_incrementally(
         skip_special_tokens: Whether to skip special tokens.
         spaces_between_special_tokens: Whether to add spaces between special
             tokens.
+        new_tokens: The new token id already converted to tokens, see
+            `convert_ids_to_tokens_batch`.
     """
     new_token_id = all_input_ids[-1]
     # This is the first iteration for this sequence
@@ -282,39 +357,43 @@ def detokenize_incrementally(
              skip_special_tokens=skip_special_tokens)
     assert prev_tokens is not None
 
-    # If the new token id is out of bounds, return an empty string.
-    if new_token_id >= len(tokenizer):
-        new_tokens = [""]
-    else:
-        # Put new_token_id in a list so skip_special_tokens is respected
-        new_tokens = tokenizer.convert_ids_to_tokens(
-            [new_token_id], skip_special_tokens=skip_special_tokens)
-        if isinstance(new_tokens, str):
-            new_tokens = [new_tokens]
-    output_tokens = prev_tokens + new_tokens
+    if new_tokens is None:
+        # If the new token id is out of bounds, return an empty string.
+        if new_token_id >= len(tokenizer):
+            new_tokens = [""]
+        else:
+            # Put new_token_id in a list so skip_special_tokens is respected
+            new_tokens = tokenizer.convert_ids_to_tokens(
+                [new_token_id], skip_special_tokens=skip_special_tokens)
+            if isinstance(new_tokens, str):
+                new_tokens = [new_tokens]
+    num_output_tokens = len(prev_tokens) + len(new_tokens)
+    # Only the tokens from prefix_offset on are needed, so avoid copying all
+    # of prev_tokens, which would take time linear in the sequence length.
+    output_tokens = prev_tokens[prefix_offset:] + new_tokens
+    window_read_offset = read_offset - prefix_offset
 
     # If this is the first iteration, return all tokens.
     if is_first_iter:
-        new_tokens = output_tokens
+        new_tokens = prev_tokens + new_tokens
 
     # The prefix text is necessary only to defeat cleanup algorithms in
     # the decode which decide to add a space or not depending on the
     # surrounding ids.
     if tokenizer.is_fast or not tokenizer.get_added_vocab():
         prefix_text = tokenizer.convert_tokens_to_string(
-            output_tokens[prefix_offset:read_offset])
-        new_text = tokenizer.convert_tokens_to_string(
-            output_tokens[prefix_offset:])
+            output_tokens[:window_read_offset])
+        new_text = tokenizer.convert_tokens_to_string(output_tokens)
     else:
         prefix_text = _convert_tokens_to_string_with_added_encoders(
             tokenizer,
-            output_tokens[prefix_offset:read_offset],
+            output_tokens[:window_read_offset],
             skip_special_tokens=skip_special_tokens,
             spaces_between_special_tokens=spaces_between_special_tokens,
         )
         new_text = _convert_tokens_to_string_with_added_encoders(
             tokenizer,
-            output_tokens[prefix_offset:],
+            output_tokens,
             skip_special_tokens=skip_special_tokens,
             spaces_between_special_tokens=spaces_between_special_tokens,
         )
@@ -327,4 +406,4 @@ def detokenize_incrementally(
         return new_tokens, "", prefix_offset, read_offset
 
     new_text = new_text[len(prefix_text):]
-    return new_tokens, new_text, read_offset, len(output_tokens)
+    return new_tokens, new_text, read_offset, num_output_tokens
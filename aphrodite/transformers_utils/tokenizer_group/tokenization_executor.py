@@ -0,0 +1,192 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from .base_tokenizer_group import AnyTokenizer
+
+T = TypeVar("T")
+
+# Maximum number of encode calls waiting for the tokenization thread. Further
+# callers wait until there is room in the queue.
+_MAX_QUEUE_SIZE = 1024
+# Maximum number of prompts encoded in one batch.
+_MAX_BATCH_SIZE = 64
+
+_TIME_BUCKETS = [
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0
+]
+
+
+class _TokenizationMetrics:
+    """Prometheus metrics of the tokenization executor."""
+
+    def __init__(self):
+        # Imported lazily, as PROMETHEUS_MULTIPROC_DIR must be set before
+        # prometheus_client is imported in the API server process.
+        import prometheus_client
+
+        self.queue_time = prometheus_client.Histogram(
+            name="aphrodite:tokenizer_queue_time_seconds",
+            documentation="Time prompts waited to be encoded.",
+            buckets=_TIME_BUCKETS)
+        self.encode_time = prometheus_client.Histogram(
+            name="aphrodite:tokenizer_encode_time_seconds",
+            documentation="Time to encode a batch of prompts.",
+            buckets=_TIME_BUCKETS)
+        self.batch_size = prometheus_client.Histogram(
+            name="aphrodite:tokenizer_batch_size",
+            documentation="Number of prompts encoded in one batch.",
+            buckets=[1, 2, 4, 8, 16, 32, 64, 128])
+
+
+_metrics: Optional[_TokenizationMetrics] = None
+
+
+def _get_metrics() -> _TokenizationMetrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = _TokenizationMetrics()
+    return _metrics
+
+
+@dataclass
+class _EncodeRequest:
+    tokenizer: AnyTokenizer
+    prompt: str
+    add_special_tokens: bool
+    max_length: Optional[int]
+    future: asyncio.Future
+    enqueue_time: float = field(default_factory=time.perf_counter)
+
+    @property
+    def batch_key(self) -> Tuple[int, bool, Optional[int]]:
+        return (id(self.tokenizer), self.add_special_tokens, self.max_length)
+
+
+def _encode_batch(tokenizer: AnyTokenizer, prompts: List[str],
+                  add_special_tokens: bool,
+                  max_length: Optional[int]) -> List[List[int]]:
+    # Fast tokenizers encode the whole batch with a single encode_batch call
+    # of the Rust tokenizer, which releases the GIL while it runs.
+    if max_length is None:
+        encoded = tokenizer(prompts, add_special_tokens=add_special_tokens)
+    else:
+        encoded = tokenizer(prompts,
+                            add_special_tokens=add_special_tokens,
+                            truncation=True,
+                            max_length=max_length)
+    return encoded.input_ids
+
+
+class TokenizationExecutor:
+    """Runs tokenization off the event loop.
+
+    Encode calls are queued and encoded by a single worker thread, which
+    also keeps the tokenizers from being used by two threads at once. The
+    calls that queued up while the previous batch was encoded are grouped
+    by tokenizer and arguments, and each group is encoded as one batch.
+    Other tokenizer work, like applying chat templates or decoding, can be
+    run on the same thread with `run`.
+    """
+
+    def __init__(self,
+                 max_queue_size: int = _MAX_QUEUE_SIZE,
+                 max_batch_size: int = _MAX_BATCH_SIZE):
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix="tokenizer")
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batch_loop: Optional[asyncio.Task] = None
+
+    def _get_queue(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if (self._loop is not loop or self._queue is None
+                or self._batch_loop is None or self._batch_loop.done()):
+            # First call, the previous event loop was closed, or the batch
+            # loop was cancelled.
+            metrics = _get_metrics()
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._batch_loop = loop.create_task(
+                self._run_batch_loop(self._queue, metrics))
+        return self._queue
+
+    async def encode(self,
+                     tokenizer: AnyTokenizer,
+                     prompt: str,
+                     add_special_tokens: bool = True,
+                     max_length: Optional[int] = None) -> List[int]:
+        """Encode prompt. If max_length is set, the prompt is truncated to
+        max_length tokens."""
+        queue = self._get_queue()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put(
+            _EncodeRequest(tokenizer, prompt, add_special_tokens, max_length,
+                           future))
+        return await future
+
+    async def run(self, func: Callable[..., T], *args: Any,
+                  **kwargs: Any) -> T:
+        """Run func on the tokenization thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, partial(func, *args, **kwargs))
+
+    async def _run_batch_loop(self, queue: asyncio.Queue,
+                              metrics: _TokenizationMetrics):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests: List[_EncodeRequest] = [await queue.get()]
+            while len(requests) < self.max_batch_size and not queue.empty():
+                requests.append(queue.get_nowait())
+
+            batches: Dict[Tuple[int, bool, Optional[int]],
+                          List[_EncodeRequest]] = {}
+            for request in requests:
+                batches.setdefault(request.batch_key, []).append(request)
+
+            for batch in batches.values():
+                try:
+                    await self._encode(loop, batch, metrics)
+                except Exception as e:
+                    # Fail the batch, but keep serving the later calls.
+                    for request in batch:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+
+    async def _encode(self, loop: asyncio.AbstractEventLoop,
+                      batch: List[_EncodeRequest],
+                      metrics: _TokenizationMetrics) -> None:
+        start_time = time.perf_counter()
+        for request in batch:
+            metrics.queue_time.observe(start_time - request.enqueue_time)
+        first = batch[0]
+        token_ids = await loop.run_in_executor(
+            self.executor, _encode_batch, first.tokenizer,
+            [request.prompt for request in batch], first.add_special_tokens,
+            first.max_length)
+        if len(token_ids) != len(batch):
+            raise RuntimeError(f"Encoded {len(token_ids)} prompts instead of "
+                               f"{len(batch)}.")
+        metrics.encode_time.observe(time.perf_counter() - start_time)
+        metrics.batch_size.observe(len(batch))
+        for request, ids in zip(batch, token_ids):
+            # The caller may have been cancelled in the meantime.
+            if not request.future.done():
+                request.future.set_result(ids)
+
+
+_tokenization_executor: Optional[TokenizationExecutor] = None
+
+
+def get_tokenization_executor() -> TokenizationExecutor:
+    """Get the tokenization executor shared by the process."""
+    global _tokenization_executor
+    if _tokenization_executor is None:
+        _tokenization_executor = TokenizationExecutor()
+    return _tokenization_executor
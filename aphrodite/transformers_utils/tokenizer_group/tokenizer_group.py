@@ -8,6 +8,7 @@ from aphrodite.transformers_utils.tokenizer import (get_lora_tokenizer,
                                                     get_tokenizer)
 
 from .base_tokenizer_group import AnyTokenizer, BaseTokenizerGroup
+from .tokenization_executor import get_tokenization_executor
 
 
 class TokenizerGroup(BaseTokenizerGroup):
@@ -65,7 +66,7 @@ class TokenizerGroup(BaseTokenizerGroup):
             request_id: Optional[str] = None,
             lora_request: Optional[LoRARequest] = None) -> List[int]:
         tokenizer = await self.get_lora_tokenizer_async(lora_request)
-        ret = tokenizer.encode(prompt)
+        ret = await get_tokenization_executor().encode(tokenizer, prompt)
         self._raise_if_input_too_long(ret, lora_request)
         return ret
 
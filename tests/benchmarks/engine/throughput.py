@@ -88,6 +88,7 @@ def run_aphrodite(
     load_format: str = EngineArgs.load_format,
     max_num_seqs: Optional[int] = None,
     num_scheduler_steps: Optional[int] = None,
+    async_output_proc: bool = False,
 ) -> float:
     from aphrodite import LLM, SamplingParams
     llm = LLM(
@@ -114,6 +115,7 @@ def run_aphrodite(
         load_format=load_format,
         max_num_seqs=max_num_seqs,
         num_scheduler_steps=num_scheduler_steps,
+        async_output_proc=async_output_proc,
     )
 
     # Add the requests to the engine.
@@ -242,7 +244,8 @@ def main(args: argparse.Namespace):
             args.enable_prefix_caching, args.enable_chunked_prefill,
             args.max_num_batched_tokens, args.distributed_executor_backend,
             args.gpu_memory_utilization, args.download_dir, args.load_format,
-            args.max_num_seqs, args.num_scheduler_steps)
+            args.max_num_seqs, args.num_scheduler_steps,
+            args.async_output_proc)
     elif args.backend == "hf":
         assert args.tensor_parallel_size == 1
         elapsed_time = run_hf(requests, args.model, tokenizer, args.n,
@@ -316,6 +319,10 @@ if __name__ == "__main__":
                         type=int,
                         default=1,
                         help='number of scheduler steps for multi-step.')
+    parser.add_argument('--async-output-proc',
+                        action='store_true',
+                        help='process the outputs of a step while the next '
+                        'step is executed.')
     parser.add_argument("--num-prompts",
                         type=int,
                         default=1000,
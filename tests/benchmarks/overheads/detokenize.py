@@ -0,0 +1,92 @@
+"""Benchmark for incremental detokenization.
+
+Measures the cost of detokenizing one new token per sequence for a batch of
+sequences that already have `output_len` output tokens, with the per-sequence
+`decode_sequence_inplace` and the batched `decode_sequences_inplace`. The
+cost per step should not grow with the number of output tokens.
+"""
+import random
+import time
+from typing import List
+
+from aphrodite.common.sampling_params import SamplingParams
+from aphrodite.common.sequence import Logprob, Sequence
+from aphrodite.common.utils import FlexibleArgumentParser
+from aphrodite.transformers_utils.detokenizer import Detokenizer
+from aphrodite.transformers_utils.tokenizer_group import TokenizerGroup
+
+
+def make_sequences(detokenizer: Detokenizer, sampling_params: SamplingParams,
+                   batch_size: int, output_len: int,
+                   vocab_size: int) -> List[Sequence]:
+    seqs = []
+    for i in range(batch_size):
+        seq = Sequence(seq_id=i,
+                       inputs={
+                           "prompt": "",
+                           "prompt_token_ids": [1] * 16
+                       },
+                       block_size=16)
+        for _ in range(output_len):
+            seq.append_token_id(random.randrange(vocab_size),
+                                {0: Logprob(0.0)})
+            detokenizer.decode_sequence_inplace(seq, sampling_params)
+        seqs.append(seq)
+    return seqs
+
+
+def bench(detokenizer: Detokenizer, seqs: List[Sequence],
+          sampling_params: SamplingParams, vocab_size: int, num_steps: int,
+          batched: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        for seq in seqs:
+            seq.append_token_id(random.randrange(vocab_size),
+                                {0: Logprob(0.0)})
+        if batched:
+            detokenizer.decode_sequences_inplace([(seq, sampling_params)
+                                                  for seq in seqs])
+        else:
+            for seq in seqs:
+                detokenizer.decode_sequence_inplace(seq, sampling_params)
+    return (time.perf_counter() - start) / num_steps
+
+
+def main(args):
+    random.seed(args.seed)
+    tokenizer_group = TokenizerGroup(tokenizer_id=args.tokenizer,
+                                     enable_lora=False,
+                                     max_num_seqs=args.batch_size,
+                                     max_input_length=None)
+    detokenizer = Detokenizer(tokenizer_group)
+    vocab_size = len(tokenizer_group.tokenizer)
+    sampling_params = SamplingParams(
+        skip_special_tokens=args.skip_special_tokens)
+
+    print(f"{'output len':>10} {'per-seq (ms/step)':>18} "
+          f"{'batched (ms/step)':>18}")
+    for output_len in args.output_lens:
+        seqs = make_sequences(detokenizer, sampling_params, args.batch_size,
+                              output_len, vocab_size)
+        per_seq = bench(detokenizer, seqs, sampling_params, vocab_size,
+                        args.num_steps, batched=False)
+        batched = bench(detokenizer, seqs, sampling_params, vocab_size,
+                        args.num_steps, batched=True)
+        print(f"{output_len:>10} {per_seq * 1000:>18.3f} "
+              f"{batched * 1000:>18.3f}")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description='Benchmark incremental detokenization.')
+    parser.add_argument('--tokenizer', type=str, default='gpt2')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--output-lens',
+                        type=int,
+                        nargs='+',
+                        default=[1024, 32768])
+    parser.add_argument('--num-steps', type=int, default=100)
+    parser.add_argument('--skip-special-tokens', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args)
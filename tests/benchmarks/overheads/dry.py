@@ -0,0 +1,94 @@
+"""Micro-benchmark for the DRY (Don't Repeat Yourself) sampler penalty.
+
+Compares the batched `_apply_dry` against the per-row reference
+implementation on random contexts drawn from a small alphabet, so that every
+row contains many repeats of its last token.
+"""
+import time
+
+import torch
+
+from aphrodite.common.utils import FlexibleArgumentParser
+from aphrodite.modeling.layers.sampler import _apply_dry, _apply_dry_per_row
+
+
+def make_inputs(batch_size: int, context_len: int, vocab_size: int,
+                alphabet: int, device: str):
+    prompt_len = context_len // 2
+    prompt_tokens = torch.randint(alphabet, (batch_size, prompt_len),
+                                  device=device)
+    output_tokens = torch.randint(alphabet,
+                                  (batch_size, context_len - prompt_len),
+                                  device=device)
+    multipliers = torch.full((batch_size, ), 0.8, device=device)
+    bases = torch.full((batch_size, ), 1.75, device=device)
+    allowed_lengths = torch.full((batch_size, ),
+                                 2,
+                                 dtype=torch.int,
+                                 device=device)
+    # Breakers outside the alphabet never occur in the context.
+    breakers = torch.full((batch_size, 4),
+                          vocab_size - 1,
+                          dtype=torch.long,
+                          device=device)
+    ranges = torch.zeros((batch_size, ), dtype=torch.int, device=device)
+    logits = torch.randn(batch_size, vocab_size, device=device)
+    return logits, (prompt_tokens, output_tokens, multipliers, bases,
+                    allowed_lengths, breakers, ranges)
+
+
+def bench(fn, logits: torch.Tensor, args, num_iters: int) -> float:
+    fn(logits.clone(), *args)
+    if logits.is_cuda:
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(num_iters):
+        fn(logits.clone(), *args)
+    if logits.is_cuda:
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / num_iters
+
+
+def main(args):
+    torch.manual_seed(args.seed)
+    print(f"{'batch':>6} {'context':>8} {'batched (ms)':>14} "
+          f"{'per-row (ms)':>14}")
+    for batch_size in args.batch_sizes:
+        for context_len in args.context_lens:
+            logits, dry_args = make_inputs(batch_size, context_len,
+                                           args.vocab_size, args.alphabet,
+                                           args.device)
+            batched = bench(_apply_dry, logits, dry_args, args.num_iters)
+            per_row = float("nan")
+            if not args.batched_only:
+                per_row = bench(_apply_dry_per_row, logits, dry_args, 1)
+            print(f"{batch_size:>6} {context_len:>8} {batched * 1000:>14.2f} "
+                  f"{per_row * 1000:>14.2f}")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description='Benchmark the DRY sampler penalty.')
+    parser.add_argument('--batch-sizes',
+                        type=int,
+                        nargs='+',
+                        default=[1, 32, 256])
+    parser.add_argument('--context-lens',
+                        type=int,
+                        nargs='+',
+                        default=[512, 8192])
+    parser.add_argument('--vocab-size', type=int, default=32000)
+    parser.add_argument('--alphabet',
+                        type=int,
+                        default=64,
+                        help='Number of distinct tokens in the contexts.')
+    parser.add_argument('--num-iters', type=int, default=10)
+    parser.add_argument('--batched-only',
+                        action='store_true',
+                        help='Skip the (slow) per-row reference.')
+    parser.add_argument('--device',
+                        type=str,
+                        default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,83 @@
+"""Micro-benchmark for the prefix caching evictors.
+
+Measures add/update/evict throughput of the BlockSpaceManagerV2 evictors for
+a range of free-table sizes. The linear-scan LRUEvictor degrades once update()
+breaks the timestamp order of its free table, so it is only run up to
+--max-lru-blocks by default.
+"""
+import random
+import time
+
+from aphrodite.common.utils import FlexibleArgumentParser
+from aphrodite.processing.evictor_v2 import EvictionPolicy, make_evictor
+
+
+def bench_policy(policy: EvictionPolicy, num_blocks: int, num_ops: int,
+                 seed: int):
+    random.seed(seed)
+    evictor = make_evictor(policy)
+
+    start = time.perf_counter()
+    for block_id in range(num_blocks):
+        evictor.add(block_id, block_id, random.randint(1, 64) * 16,
+                    float(block_id))
+    add_time = time.perf_counter() - start
+
+    # Touch random blocks so the free table is no longer in access order,
+    # like mark_blocks_as_accessed does for shared prefixes.
+    update_ids = [random.randrange(num_blocks) for _ in range(num_ops)]
+    start = time.perf_counter()
+    for i, block_id in enumerate(update_ids):
+        evictor.update(block_id, float(num_blocks + i))
+    update_time = time.perf_counter() - start
+
+    num_evictions = min(num_ops, num_blocks)
+    start = time.perf_counter()
+    for _ in range(num_evictions):
+        evictor.evict()
+    evict_time = time.perf_counter() - start
+
+    return (num_blocks / add_time, num_ops / update_time,
+            num_evictions / evict_time)
+
+
+def main(args):
+    policies = [EvictionPolicy[name] for name in args.policies]
+    print(f"{'policy':>10} {'blocks':>10} {'add/s':>14} {'update/s':>14} "
+          f"{'evict/s':>14}")
+    for num_blocks in args.num_blocks:
+        for policy in policies:
+            if (policy == EvictionPolicy.LRU
+                    and num_blocks > args.max_lru_blocks):
+                continue
+            add_tput, update_tput, evict_tput = bench_policy(
+                policy, num_blocks, args.num_ops, args.seed)
+            print(f"{policy.name:>10} {num_blocks:>10} {add_tput:>14.0f} "
+                  f"{update_tput:>14.0f} {evict_tput:>14.0f}")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description='Benchmark evict/update throughput of the prefix caching '
+        'evictors.')
+    parser.add_argument('--num-blocks',
+                        type=int,
+                        nargs='+',
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--num-ops',
+                        type=int,
+                        default=10_000,
+                        help='Number of update and evict calls per run.')
+    parser.add_argument('--policies',
+                        type=str,
+                        nargs='+',
+                        default=['LRU', 'HEAP_LRU'],
+                        choices=[p.name for p in EvictionPolicy])
+    parser.add_argument('--max-lru-blocks',
+                        type=int,
+                        default=100_000,
+                        help='Skip the linear-scan LRU evictor above this '
+                        'many blocks.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args)
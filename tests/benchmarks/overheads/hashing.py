@@ -1,7 +1,9 @@
 import cProfile
 import pstats
+import time
 
 from aphrodite import LLM, SamplingParams
+from aphrodite.common.sequence import Logprob, Sequence
 from aphrodite.common.utils import FlexibleArgumentParser
 
 # A very long prompt, total number of tokens is about 15k.
@@ -10,7 +12,39 @@ LONG_PROMPT = ["You are an expert in large language models, aren't you?"
 LONG_PROMPT = ' '.join(LONG_PROMPT)
 
 
+def bench_block_hashing(prompt_len: int, output_len: int, block_size: int):
+    """Time hash_of_block the way BlockSpaceManagerV1 calls it: once per
+    prompt block on allocation, then once per filled block during decode."""
+    seq = Sequence(0,
+                   inputs={"prompt_token_ids": list(range(prompt_len))},
+                   block_size=block_size)
+
+    start = time.perf_counter()
+    for logical_idx in range(seq.n_blocks):
+        seq.hash_of_block(logical_idx)
+    prefill_time = time.perf_counter() - start
+
+    logprobs = {0: Logprob(0.0)}
+    start = time.perf_counter()
+    for _ in range(output_len):
+        seq.append_token_id(0, logprobs)
+        if seq.get_len() % block_size == 0:
+            seq.hash_of_block(seq.n_blocks - 1)
+    decode_time = time.perf_counter() - start
+    return prefill_time, decode_time
+
+
 def main(args):
+    print("------hashing cost vs. prompt length------")
+    print(f"{'prompt_len':>10} {'prompt (ms)':>12} {'decode (ms)':>12}")
+    for prompt_len in args.prompt_lens:
+        prefill_time, decode_time = bench_block_hashing(
+            prompt_len, args.output_len, args.block_size)
+        print(f"{prompt_len:>10} {prefill_time * 1000:>12.3f} "
+              f"{decode_time * 1000:>12.3f}")
+    if args.hashing_only:
+        return
+
     llm = LLM(
         model=args.model,
         enforce_eager=True,
@@ -59,5 +93,14 @@ if __name__ == "__main__":
     parser.add_argument('--use-v2-block-manager',
                         action='store_true',
                         help='Use BlockSpaceMangerV2')
+    parser.add_argument('--prompt-lens',
+                        type=int,
+                        nargs='+',
+                        default=[1024, 4096, 16384, 32768],
+                        help='Prompt lengths for the hash_of_block timing.')
+    parser.add_argument('--block-size', type=int, default=16)
+    parser.add_argument('--hashing-only',
+                        action='store_true',
+                        help='Only time hash_of_block, skip the LLM run.')
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,170 @@
+"""Benchmark for the OpenAI frontend <-> engine RPC.
+
+Runs the RPC server in a separate process with a stub engine that appends one
+token to every running request per step, and streams many concurrent requests
+through the RPC client. This measures the transport overhead (encoding, socket
+traffic, routing of the outputs) without running a model.
+"""
+import asyncio
+import multiprocessing
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from aphrodite.common.outputs import CompletionOutput, RequestOutput
+from aphrodite.common.sampling_params import RequestOutputKind, SamplingParams
+from aphrodite.common.utils import FlexibleArgumentParser
+from aphrodite.endpoints.openai.rpc.client import AsyncEngineRPCClient
+from aphrodite.endpoints.openai.rpc.server import (AsyncEngineRPCServer,
+                                                   run_server)
+
+PROMPT_TOKEN_IDS = list(range(128))
+
+
+class _StubRequest:
+
+    def __init__(self, sampling_params: SamplingParams) -> None:
+        self.sampling_params = sampling_params
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.token_ids: List[int] = []
+        self.text = ""
+
+
+class StubEngine:
+    """Stands in for AsyncAphrodite. Every step appends one token to each
+    running request, and puts the outputs of all requests at once, like the
+    engine loop does."""
+
+    def __init__(self, step_time: float) -> None:
+        self.step_time = step_time
+        self.requests: Dict[str, _StubRequest] = {}
+        self.step_loop: Optional[asyncio.Task] = None
+
+    async def generate(self, inputs, sampling_params: SamplingParams,
+                       request_id: str, lora_request=None,
+                       prompt_adapter_request=None):
+        request = _StubRequest(sampling_params)
+        self.requests[request_id] = request
+        if self.step_loop is None or self.step_loop.done():
+            self.step_loop = asyncio.create_task(self.run_step_loop())
+        while True:
+            request_output = await request.queue.get()
+            yield request_output
+            if request_output.finished:
+                return
+
+    async def run_step_loop(self):
+        while self.requests:
+            await asyncio.sleep(self.step_time)
+            for request_id, request in list(self.requests.items()):
+                request_output = self._step(request_id, request)
+                if request_output.finished:
+                    del self.requests[request_id]
+                if (request_output.finished
+                        or request.sampling_params.output_kind !=
+                        RequestOutputKind.FINAL_ONLY):
+                    request.queue.put_nowait(request_output)
+
+    def _step(self, request_id: str, request: _StubRequest) -> RequestOutput:
+        token_id = len(request.token_ids)
+        request.token_ids.append(token_id)
+        request.text += f" {token_id}"
+        finished = len(request.token_ids) == request.sampling_params.max_tokens
+        if request.sampling_params.output_kind == RequestOutputKind.DELTA:
+            text = f" {token_id}"
+            token_ids = [token_id]
+        else:
+            text = request.text
+            token_ids = list(request.token_ids)
+        first = len(request.token_ids) == 1
+        output = CompletionOutput(0, text, token_ids, None, None,
+                                  "length" if finished else None)
+        return RequestOutput(request_id, None,
+                             PROMPT_TOKEN_IDS if first else None, None,
+                             [output], finished)
+
+    async def abort(self, request_id: str):
+        self.requests.pop(request_id, None)
+
+    async def check_health(self):
+        pass
+
+    def shutdown_background_loop(self):
+        pass
+
+
+class StubRPCServer(AsyncEngineRPCServer):
+
+    def __init__(self, rpc_path: str, step_time: float):
+        self.engine = StubEngine(step_time)
+        self._init_socket(rpc_path)
+
+
+def run_stub_server(rpc_path: str, step_time: float):
+    asyncio.run(run_server(StubRPCServer(rpc_path, step_time)))
+
+
+async def run_client(rpc_path: str, num_requests: int, output_len: int,
+                     output_kind: RequestOutputKind) -> float:
+    client = AsyncEngineRPCClient(rpc_path)
+    await client.wait_for_server()
+    client.setup_generate_socket()
+
+    async def run_request(i: int):
+        sampling_params = SamplingParams(max_tokens=output_len,
+                                         output_kind=output_kind)
+        async for _ in client.generate({"prompt_token_ids": PROMPT_TOKEN_IDS},
+                                       sampling_params, str(i)):
+            pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_request(i) for i in range(num_requests)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rpc_path = f"ipc://{tmp_dir}/rpc"
+        context = multiprocessing.get_context("spawn")
+        server_process = context.Process(target=run_stub_server,
+                                         args=(rpc_path, args.step_time))
+        server_process.start()
+        try:
+            output_kind = RequestOutputKind[args.output_kind]
+            elapsed = asyncio.run(
+                run_client(rpc_path, args.num_requests, args.output_len,
+                           output_kind))
+        finally:
+            server_process.terminate()
+            server_process.join()
+
+    num_outputs = args.num_requests * args.output_len
+    print(f"{args.num_requests} streams x {args.output_len} tokens "
+          f"({args.output_kind}): {elapsed:.2f}s, "
+          f"{num_outputs / elapsed:.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description='Benchmark the OpenAI frontend <-> engine RPC with a '
+        'stub engine.')
+    parser.add_argument('--num-requests',
+                        type=int,
+                        default=1000,
+                        help='Number of concurrent streams.')
+    parser.add_argument('--output-len',
+                        type=int,
+                        default=256,
+                        help='Number of tokens per stream.')
+    parser.add_argument('--output-kind',
+                        type=str,
+                        default='DELTA',
+                        choices=[kind.name for kind in RequestOutputKind])
+    parser.add_argument('--step-time',
+                        type=float,
+                        default=0.0,
+                        help='Seconds the stub engine sleeps per step.')
+    args = parser.parse_args()
+    main(args)
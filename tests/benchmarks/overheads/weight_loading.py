@@ -0,0 +1,118 @@
+"""CPU-only benchmark for reading safetensors checkpoints.
+
+Writes synthetic safetensors shards, then times the serial and the
+multi-threaded weights iterators while a simulated weight loader copies the
+tensor parallel shard of every weight into a parameter. The shards are
+dropped from the page cache before every run, so the reads hit the disk.
+"""
+import os
+import tempfile
+import time
+from typing import Generator, List, Tuple
+
+import torch
+from safetensors.torch import save_file
+
+from aphrodite.common.utils import FlexibleArgumentParser
+from aphrodite.modeling.model_loader.weight_utils import (
+    multi_thread_safetensors_weights_iterator, safetensors_weights_iterator)
+
+
+def create_shards(directory: str, num_shards: int, shard_size_mib: int,
+                  tensor_size_mib: int, dtype: torch.dtype) -> List[str]:
+    num_rows = tensor_size_mib * 2**20 // (1024 * dtype.itemsize)
+    num_tensors = max(1, shard_size_mib // tensor_size_mib)
+    st_files = []
+    for i in range(num_shards):
+        tensors = {
+            f"model.layers.{i}.{j}.weight": torch.rand(num_rows,
+                                                       1024).to(dtype)
+            for j in range(num_tensors)
+        }
+        st_file = os.path.join(directory,
+                               f"model-{i:05d}-of-{num_shards:05d}.safetensors")
+        save_file(tensors, st_file)
+        st_files.append(st_file)
+    return st_files
+
+
+def drop_page_cache(st_files: List[str]) -> None:
+    for st_file in st_files:
+        fd = os.open(st_file, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def load_weights(weights: Generator[Tuple[str, torch.Tensor], None, None],
+                 tp_size: int) -> int:
+    """Copy the shard of rank 0 of every weight, like the weight loaders of
+    the column parallel layers, and return the number of bytes read."""
+    num_bytes = 0
+    for _, loaded_weight in weights:
+        shard_size = loaded_weight.shape[0] // tp_size
+        param = torch.empty((shard_size, ) + loaded_weight.shape[1:],
+                            dtype=loaded_weight.dtype)
+        param.copy_(loaded_weight.narrow(0, 0, shard_size))
+        num_bytes += loaded_weight.numel() * loaded_weight.element_size()
+    return num_bytes
+
+
+def bench_iterator(name: str, st_files: List[str], args) -> None:
+    for _ in range(args.num_iters):
+        if not args.keep_page_cache:
+            drop_page_cache(st_files)
+        if name == "serial":
+            weights = safetensors_weights_iterator(st_files)
+        else:
+            weights = multi_thread_safetensors_weights_iterator(
+                st_files, args.num_threads)
+        start = time.perf_counter()
+        num_bytes = load_weights(weights, args.tp_size)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10} {num_bytes / 2**30:>10.2f} {elapsed:>10.2f} "
+              f"{num_bytes / 2**30 / elapsed:>10.2f}")
+
+
+def main(args):
+    dtype = getattr(torch, args.dtype)
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        st_files = create_shards(directory, args.num_shards,
+                                 args.shard_size_mib, args.tensor_size_mib,
+                                 dtype)
+        print(f"{'iterator':>10} {'GiB':>10} {'seconds':>10} {'GiB/s':>10}")
+        bench_iterator("serial", st_files, args)
+        bench_iterator(f"{args.num_threads} thr", st_files, args)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description='Benchmark reading synthetic safetensors shards with '
+        'the serial and the multi-threaded weights iterators.')
+    parser.add_argument('--num-shards', type=int, default=8)
+    parser.add_argument('--shard-size-mib', type=int, default=512)
+    parser.add_argument('--tensor-size-mib', type=int, default=64)
+    parser.add_argument('--dtype',
+                        type=str,
+                        choices=['float16', 'bfloat16', 'float32'],
+                        default='bfloat16')
+    parser.add_argument('--num-threads', type=int, default=4)
+    parser.add_argument('--tp-size',
+                        type=int,
+                        default=1,
+                        help='Copy 1/tp-size of every weight, like a tensor '
+                        'parallel rank.')
+    parser.add_argument('--num-iters', type=int, default=3)
+    parser.add_argument('--dir',
+                        type=str,
+                        default=None,
+                        help='Directory to write the shards to. Defaults to '
+                        'the system temporary directory.')
+    parser.add_argument('--keep-page-cache',
+                        action='store_true',
+                        help='Do not drop the shards from the page cache '
+                        'before every run.')
+    args = parser.parse_args()
+    main(args)
@@ -92,3 +92,55 @@ def test_allocate_immutable_block(num_cpu_blocks: int, num_gpu_blocks: int,
     _ = [allocator.free(block) for block in gpu_blocks]
     assert allocator.get_num_free_blocks(Device.CPU) == num_cpu_blocks
     assert allocator.get_num_free_blocks(Device.GPU) == num_gpu_blocks
+
+
+@pytest.mark.parametrize("num_blocks", [4])
+@pytest.mark.parametrize("block_size", [16])
+def test_host_caching_demotes_and_promotes(num_blocks: int, block_size: int):
+    """Verify blocks evicted from the GPU are demoted to the CPU, and swapped
+    back in instead of recomputed when they are allocated again.
+    """
+    allocator = CpuGpuBlockAllocator.create(
+        allocator_type="prefix_caching",
+        num_gpu_blocks=num_blocks,
+        num_cpu_blocks=2 * num_blocks,
+        block_size=block_size,
+        enable_host_caching=True,
+    )
+
+    token_ids = list(range(2 * num_blocks * block_size))
+    prompt_a = list(chunk_list(token_ids[:num_blocks * block_size],
+                               block_size))
+    prompt_b = list(chunk_list(token_ids[num_blocks * block_size:],
+                               block_size))
+
+    blocks_a = allocator.allocate_immutable_blocks(None, prompt_a, Device.GPU)
+    gpu_block_ids_a = [block.block_id for block in blocks_a]
+    _ = [allocator.free(block) for block in blocks_a]
+    assert allocator.get_and_reset_host_swaps() == ([], [])
+
+    # Prompt b evicts and demotes all blocks of prompt a.
+    blocks_b = allocator.allocate_immutable_blocks(None, prompt_b, Device.GPU)
+    promotions, demotions = allocator.get_and_reset_host_swaps()
+    assert promotions == []
+    assert sorted(dict(demotions)) == sorted(gpu_block_ids_a)
+    cpu_block_ids_a = [
+        dict(demotions)[gpu_block_id] for gpu_block_id in gpu_block_ids_a
+    ]
+    _ = [allocator.free(block) for block in blocks_b]
+
+    # Prompt a is swapped in from the CPU copies and is computed.
+    blocks_a = allocator.allocate_immutable_blocks(None, prompt_a, Device.GPU)
+    promotions, demotions = allocator.get_and_reset_host_swaps()
+    assert promotions == [(cpu_block_id, block.block_id)
+                          for cpu_block_id, block in zip(
+                              cpu_block_ids_a, blocks_a)]
+    assert len(demotions) == num_blocks
+    assert all(block.computed for block in blocks_a)
+    assert allocator.get_prefix_cache_hit_rate(Device.GPU) == 0
+    assert allocator.get_prefix_cache_hit_rate(Device.CPU) > 0
+
+    # Both prompts are cached on the CPU, with no block in use.
+    _ = [allocator.free(block) for block in blocks_a]
+    assert allocator.get_num_free_blocks(Device.CPU) == 2 * num_blocks
+    assert allocator.get_num_free_blocks(Device.GPU) == num_blocks
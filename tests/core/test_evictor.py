@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from aphrodite.common.block import PhysicalTokenBlock
+from aphrodite.common.utils import Device
+from aphrodite.processing import evictor_v1, evictor_v2
+
+
+def _expected_victim_key(free_table):
+    return min((block.last_accessed, -block.num_hashed_tokens)
+               for block in free_table.values())
+
+
+@pytest.mark.parametrize("seed", list(range(5)))
+def test_heap_evictor_v2_eviction_order(seed: int):
+    """Randomly interleave add/update/remove/evict and check every eviction
+    picks a block with the oldest access time and the most hashed tokens.
+
+    Only the heap evictor is checked here: LRUEvictor assumes the free table
+    stays sorted by access time, which arbitrary updates do not preserve.
+    """
+    random.seed(seed)
+    evictor = evictor_v2.make_evictor(evictor_v2.EvictionPolicy.HEAP_LRU)
+    shadow = {}
+    next_block_id = 0
+
+    for _ in range(2000):
+        op = random.random()
+        if op < 0.4 or not shadow:
+            block_id = next_block_id
+            next_block_id += 1
+            num_hashed_tokens = random.randint(1, 8) * 16
+            last_accessed = float(random.randint(0, 50))
+            evictor.add(block_id, block_id * 7, num_hashed_tokens,
+                        last_accessed)
+            shadow[block_id] = evictor_v2.BlockMetaData(
+                block_id * 7, num_hashed_tokens, last_accessed)
+        elif op < 0.6:
+            block_id = random.choice(list(shadow))
+            last_accessed = float(random.randint(0, 100))
+            evictor.update(block_id, last_accessed)
+            shadow[block_id].last_accessed = last_accessed
+        elif op < 0.75:
+            block_id = random.choice(list(shadow))
+            evictor.remove(block_id)
+            del shadow[block_id]
+        else:
+            expected_key = _expected_victim_key(shadow)
+            block_id, content_hash = evictor.evict()
+            block = shadow.pop(block_id)
+            assert content_hash == block.content_hash
+            assert (block.last_accessed,
+                    -block.num_hashed_tokens) == expected_key
+
+        assert evictor.num_blocks == len(shadow)
+        assert all(block_id in evictor for block_id in shadow)
+
+    while shadow:
+        expected_key = _expected_victim_key(shadow)
+        block_id, _ = evictor.evict()
+        block = shadow.pop(block_id)
+        assert (block.last_accessed, -block.num_hashed_tokens) == expected_key
+
+    with pytest.raises(ValueError):
+        evictor.evict()
+
+
+@pytest.mark.parametrize("policy", [
+    evictor_v1.EvictionPolicy.LRU,
+    evictor_v1.EvictionPolicy.HEAP_LRU,
+])
+@pytest.mark.parametrize("seed", list(range(5)))
+def test_evictor_v1_eviction_order(policy: evictor_v1.EvictionPolicy,
+                                   seed: int):
+    random.seed(seed)
+    evictor = evictor_v1.make_evictor(policy)
+    shadow = {}
+    next_block_hash = 0
+    # The v1 free table relies on blocks being freed in access-time order.
+    clock = 0.0
+
+    for _ in range(2000):
+        op = random.random()
+        if op < 0.5 or not shadow:
+            num_hashed_tokens = random.randint(1, 8) * 16
+            block = PhysicalTokenBlock(device=Device.GPU,
+                                       block_number=next_block_hash,
+                                       block_size=16,
+                                       block_hash=next_block_hash,
+                                       num_hashed_tokens=num_hashed_tokens)
+            clock += random.choice([0.0, 1.0])
+            block.last_accessed = clock
+            next_block_hash += 1
+            evictor.add(block)
+            shadow[block.block_hash] = block
+        elif op < 0.7:
+            block_hash = random.choice(list(shadow))
+            assert evictor.remove(block_hash) is shadow.pop(block_hash)
+        else:
+            expected_key = _expected_victim_key(shadow)
+            block = evictor.evict()
+            assert shadow.pop(block.block_hash) is block
+            assert not block.computed
+            assert (block.last_accessed,
+                    -block.num_hashed_tokens) == expected_key
+
+        assert evictor.num_blocks == len(shadow)
+
+
+def test_heap_evictor_compacts_stale_entries():
+    evictor = evictor_v2.make_evictor(evictor_v2.EvictionPolicy.HEAP_LRU)
+    for block_id in range(100):
+        evictor.add(block_id, block_id, 16, 0.0)
+    for step in range(10000):
+        evictor.update(step % 100, float(step))
+    assert len(evictor._heap) <= 2 * evictor.num_blocks + 1
+
+    for block_id in range(99):
+        evictor.remove(block_id)
+    assert evictor.evict() == (99, 99)
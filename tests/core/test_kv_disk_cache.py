@@ -0,0 +1,195 @@
+import os
+from types import SimpleNamespace
+
+from aphrodite.lora.request import LoRARequest
+from aphrodite.processing import kv_disk_cache
+from aphrodite.processing.kv_disk_cache import (KVDiskCacheIndex,
+                                                KVDiskCacheStore,
+                                                get_kv_disk_cache_dir,
+                                                iter_block_keys)
+
+LAYOUT = {"attn_backend": "FLASH_ATTN", "block_shape": [2, 2, 4]}
+
+
+def _lookup(index: KVDiskCacheIndex, key: str) -> bool:
+    """Look up the key, waiting for the verification of its files."""
+    if index.lookup(key):
+        return True
+    future = index._verifications.get(key)
+    if future is not None:
+        future.result()
+    return index.lookup(key)
+
+
+def test_block_keys_chain_prefix():
+    """Verify the key of a block depends on the whole prefix and the LoRA.
+    """
+    block_size = 4
+    token_ids = list(range(12))
+    keys = list(iter_block_keys(None, token_ids, block_size, 3))
+    assert len(set(keys)) == 3
+    # The same prefix gives the same keys.
+    assert list(iter_block_keys(None, token_ids[:8] + [0] * 4, block_size,
+                                3))[:2] == keys[:2]
+    # A different first block changes all keys.
+    other_keys = list(iter_block_keys(None, [1] + token_ids[1:], block_size,
+                                      3))
+    assert not set(other_keys) & set(keys)
+
+    lora_request = LoRARequest("lora", 1, lora_path="/path/to/lora")
+    assert not set(iter_block_keys(lora_request, token_ids, block_size,
+                                   3)) & set(keys)
+
+
+def test_keys_and_cache_dir_follow_the_weight_files(tmp_path):
+    """Verify the blocks of replaced weights or adapters are not reused."""
+    model_dir = tmp_path / "model"
+    lora_dir = tmp_path / "lora"
+    for directory in (model_dir, lora_dir):
+        directory.mkdir()
+        (directory / "model.safetensors").write_bytes(bytes(8))
+
+    def get_dir():
+        cache_config = SimpleNamespace(kv_disk_cache_path=str(tmp_path),
+                                       kv_disk_cache_dir=None,
+                                       cache_dtype="auto",
+                                       block_size=16)
+        model_config = SimpleNamespace(
+            model=str(model_dir),
+            revision=None,
+            quantization=None,
+            dtype="float16",
+            hf_config=SimpleNamespace(to_json_string=lambda: "{}"))
+        parallel_config = SimpleNamespace(tensor_parallel_size=1)
+        return get_kv_disk_cache_dir(cache_config, model_config,
+                                     parallel_config)
+
+    def get_key(lora_int_id):
+        lora_request = LoRARequest("lora",
+                                   lora_int_id,
+                                   lora_path=str(lora_dir))
+        return next(iter_block_keys(lora_request, list(range(4)), 4, 1))
+
+    cache_dir = get_dir()
+    key = get_key(1)
+    assert get_dir() == cache_dir
+    assert get_key(2) == key
+
+    (model_dir / "model.safetensors").write_bytes(bytes(16))
+    (lora_dir / "model.safetensors").write_bytes(bytes(16))
+    assert get_dir() != cache_dir
+    # The files of a LoRA id are only checked once.
+    assert get_key(1) == key
+    assert get_key(3) != key
+
+
+def test_index_lru_eviction(tmp_path):
+    """Verify the least recently used blocks are removed when the cache is
+    full, and that the operations are returned once.
+    """
+    index = KVDiskCacheIndex(str(tmp_path), num_blocks=2, num_ranks=1)
+    index.save("a", 0)
+    index.save("b", 1)
+    index.load("a", 2)
+    index.save("c", 3)
+    assert "a" in index and "c" in index and "b" not in index
+
+    saves, loads, removals = index.get_and_reset_ops()
+    assert saves == [("a", 0), ("b", 1), ("c", 3)]
+    assert loads == [("a", 2)]
+    assert removals == ["b"]
+    assert index.get_and_reset_ops() == ([], [], [])
+
+    # A removed key that is saved again is not removed.
+    index.save("b", 4)
+    index.save("a", 5)
+    saves, _, removals = index.get_and_reset_ops()
+    assert saves == [("b", 4), ("a", 5)]
+    assert removals == ["c"]
+
+
+def test_store_round_trip_and_rescan(tmp_path):
+    """Verify stored blocks are read back, found by a new index if all ranks
+    have them, and rejected if they are corrupted.
+    """
+    cache_dir = str(tmp_path)
+    stores = [KVDiskCacheStore(cache_dir, rank, LAYOUT) for rank in range(2)]
+    keys = list(iter_block_keys(None, list(range(8)), 4, 2))
+    payload = bytes(range(64))
+    for store in stores:
+        store.write(keys[0], memoryview(payload))
+    # Only rank 0 has the second block.
+    stores[0].write(keys[1], memoryview(payload))
+    for store in stores:
+        assert bytes(store.read(keys[0], len(payload))) == payload
+    assert stores[0].read(keys[1], len(payload)) is not None
+
+    index = KVDiskCacheIndex(cache_dir, num_blocks=8, num_ranks=2)
+    assert keys[0] in index and keys[1] not in index
+    assert not os.path.exists(os.path.join(cache_dir, f"{keys[1]}.0.kv"))
+
+    path = os.path.join(cache_dir, f"{keys[0]}.1.kv")
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\xff")
+    assert stores[1].read(keys[0], len(payload)) is None
+    # A block of another size is rejected.
+    assert stores[0].read(keys[0], len(payload) - 1) is None
+
+
+def test_store_layout_change_removes_blocks(tmp_path):
+    """Verify the blocks of a rank are removed when its cache layout
+    changes.
+    """
+    cache_dir = str(tmp_path)
+    store = KVDiskCacheStore(cache_dir, 0, LAYOUT)
+    key = next(iter_block_keys(None, list(range(4)), 4, 1))
+    store.write(key, memoryview(bytes(16)))
+    assert store.read(key, 16) is not None
+
+    KVDiskCacheStore(cache_dir, 0, LAYOUT)
+    assert os.path.exists(os.path.join(cache_dir, f"{key}.0.kv"))
+
+    KVDiskCacheStore(cache_dir, 0, {**LAYOUT, "block_shape": [2, 4, 4]})
+    assert not os.path.exists(os.path.join(cache_dir, f"{key}.0.kv"))
+
+
+def test_index_drops_missing_and_invalid_blocks(tmp_path, monkeypatch):
+    """Verify a block is only found once the files of all ranks are
+    verified, and is dropped if its write failed, its files were removed or
+    they are corrupted.
+    """
+    cache_dir = str(tmp_path)
+    stores = [KVDiskCacheStore(cache_dir, rank, LAYOUT) for rank in range(2)]
+    keys = list(iter_block_keys(None, list(range(12)), 4, 3))
+    payload = bytes(range(64))
+    for key in keys[:2]:
+        for store in stores:
+            store.write(key, memoryview(payload))
+            assert store.read(key, len(payload)) is not None
+    with open(os.path.join(cache_dir, f"{keys[1]}.1.kv"), "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\xff")
+
+    index = KVDiskCacheIndex(cache_dir, num_blocks=8, num_ranks=2)
+    # The first lookup starts the verification.
+    assert not index.lookup(keys[0])
+    assert _lookup(index, keys[0])
+    # The corrupted block is dropped.
+    assert not _lookup(index, keys[1])
+    assert keys[1] not in index
+
+    # A saved block whose write failed is dropped after the write timeout.
+    index.save(keys[2], 0)
+    assert not _lookup(index, keys[2])
+    assert keys[2] in index
+    monkeypatch.setattr(kv_disk_cache, "_WRITE_TIMEOUT_S", 0.0)
+    assert not _lookup(index, keys[2])
+    assert keys[2] not in index
+
+    # A block removed by another engine is dropped.
+    os.remove(os.path.join(cache_dir, f"{keys[0]}.1.kv"))
+    assert not index.lookup(keys[0])
+    assert keys[0] not in index
+    _, _, removals = index.get_and_reset_ops()
+    assert removals == [keys[1], keys[2], keys[0]]
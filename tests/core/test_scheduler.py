@@ -1,5 +1,5 @@
 import time
-from collections import deque
+from collections import OrderedDict, deque
 from typing import List, Set, Tuple
 from unittest.mock import MagicMock
 
@@ -9,6 +9,7 @@ from aphrodite.common.config import CacheConfig, LoRAConfig, SchedulerConfig
 from aphrodite.common.sequence import SequenceGroup, SequenceStatus
 from aphrodite.lora.request import LoRARequest
 from aphrodite.processing.interfaces import AllocStatus
+from aphrodite.processing.policy import PolicyFactory
 from aphrodite.processing.scheduler import Scheduler, SchedulingBudget
 
 from .utils import (append_new_token, append_new_token_seq_group,
@@ -467,6 +468,197 @@ def test_prefill_schedule_max_lora():
     assert budget.num_batched_tokens == 60
 
 
+def test_prefill_schedule_lora_prefetch():
+    """
+    Test requests whose lora is being prefetched are held back while there
+    are other requests to run, and their loras are requested to be
+    prefetched.
+    """
+    lora_config = LoRAConfig(max_lora_rank=8,
+                             max_loras=3,
+                             max_prefetch_loras=1)
+    scheduler = initialize_scheduler(lora_config=lora_config)
+    prefetching_loras = {2}
+    scheduler.get_prefetching_loras = lambda: prefetching_loras
+    for i in range(2):
+        _, seq_group = create_dummy_prompt(str(i),
+                                           prompt_length=10,
+                                           lora_request=LoRARequest(
+                                               lora_name=str(i),
+                                               lora_int_id=i + 1,
+                                               lora_path="abc"))
+        scheduler.add_seq_group(seq_group)
+
+    # A running request is in the budget, so only the request whose lora is
+    # not being prefetched is scheduled.
+    budget = create_token_budget()
+    add_token_budget(budget, 0, 1)
+    curr_loras: Set[int] = set()
+    output = scheduler._schedule_prefills(budget, curr_loras)
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["0"]
+    assert len(scheduler.waiting) == 1
+    prefetch_requests = scheduler._get_lora_prefetch_requests(
+        {output.seq_groups[0].seq_group.lora_request})
+    assert [r.lora_int_id for r in prefetch_requests] == [2]
+
+    # A request whose lora is not being prefetched is not held back, and
+    # the timers of all the waiting loras are kept.
+    _, seq_group = create_dummy_prompt("2",
+                                       prompt_length=10,
+                                       lora_request=LoRARequest(
+                                           lora_name="2",
+                                           lora_int_id=3,
+                                           lora_path="abc"))
+    scheduler.add_seq_group(seq_group)
+    prefetch_requests = scheduler._get_lora_prefetch_requests(set())
+    assert [r.lora_int_id for r in prefetch_requests] == [2]
+    assert set(scheduler._lora_prefetch_times) == {2, 3}
+    budget = create_token_budget()
+    add_token_budget(budget, 0, 1)
+    output = scheduler._schedule_prefills(budget, curr_loras)
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["2"]
+    assert len(scheduler.waiting) == 1
+
+    # Without other requests to run, the request is scheduled anyway.
+    budget = create_token_budget()
+    output = scheduler._schedule_prefills(budget, curr_loras)
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["1"]
+    assert len(scheduler.waiting) == 0
+
+
+def test_prefill_schedule_lora_affinity():
+    """
+    Test requests whose lora is active are preferred over requests whose
+    lora would evict an active lora, until the affinity timeout.
+    """
+    lora_config = LoRAConfig(max_lora_rank=8,
+                             max_loras=1,
+                             lora_affinity_timeout=60.0)
+    scheduler = initialize_scheduler(lora_config=lora_config)
+    lora_requests = [
+        LoRARequest(lora_name=str(i), lora_int_id=i + 1, lora_path="abc")
+        for i in range(2)
+    ]
+    assert scheduler._update_active_loras({lora_requests[0]}) == 0
+    for i, lora_request in enumerate(reversed(lora_requests)):
+        _, seq_group = create_dummy_prompt(str(i),
+                                           prompt_length=10,
+                                           lora_request=lora_request)
+        scheduler.add_seq_group(seq_group)
+    assert scheduler.get_num_waiting_per_lora() == {"0": 1, "1": 1}
+
+    # Request 0 would evict the active lora, so request 1 is scheduled.
+    budget = create_token_budget()
+    add_token_budget(budget, 0, 1)
+    output = scheduler._schedule_prefills(budget, set())
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["1"]
+    assert [s.request_id for s in scheduler.waiting] == ["0"]
+
+    # Request 0 is scheduled once it has waited for the timeout.
+    scheduler.waiting[0].metrics.arrival_time -= 60.0
+    budget = create_token_budget()
+    add_token_budget(budget, 0, 1)
+    output = scheduler._schedule_prefills(budget, set())
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["0"]
+    assert scheduler._update_active_loras({lora_requests[1]}) == 1
+
+
+def test_lora_affinity_shared_between_virtual_engines():
+    """
+    Test the schedulers of the virtual engines, which share the lora slots
+    of the workers, see the loras activated by each other.
+    """
+    lora_config = LoRAConfig(max_lora_rank=8,
+                             max_loras=1,
+                             lora_affinity_timeout=60.0)
+    scheduler_config = SchedulerConfig(1000, 1000, 1000)
+    cache_config = CacheConfig(4, 1.0, 1, "auto")
+    cache_config.num_cpu_blocks = 8
+    cache_config.num_gpu_blocks = 8
+    active_loras: "OrderedDict[int, None]" = OrderedDict()
+    schedulers = [
+        Scheduler(scheduler_config,
+                  cache_config,
+                  lora_config,
+                  pipeline_parallel_size=2,
+                  active_loras=active_loras) for _ in range(2)
+    ]
+    lora_requests = [
+        LoRARequest(lora_name=str(i), lora_int_id=i + 1, lora_path="abc")
+        for i in range(2)
+    ]
+    assert schedulers[0]._update_active_loras({lora_requests[0]}) == 0
+
+    _, seq_group = create_dummy_prompt("0",
+                                       prompt_length=10,
+                                       lora_request=lora_requests[1])
+    assert schedulers[1]._would_swap_lora(lora_requests[1].lora_int_id,
+                                          seq_group)
+    assert schedulers[1]._update_active_loras({lora_requests[1]}) == 1
+    assert list(schedulers[0]._active_loras) == [lora_requests[1].lora_int_id]
+
+
+def test_prefill_schedule_cache_aware_admission():
+    """
+    Test requests with cached prefixes are admitted first, requests that
+    share an uncached prefix wait for it to be prefilled once, and a request
+    is not passed over more times than the size of the window.
+    """
+    block_size = 4
+    scheduler_config = SchedulerConfig(1000,
+                                       1000,
+                                       1000,
+                                       use_v2_block_manager=True,
+                                       cache_aware_admission_window=4)
+    cache_config = CacheConfig(block_size,
+                               1.0,
+                               1,
+                               "auto",
+                               enable_prefix_caching=True)
+    cache_config.num_cpu_blocks = 16
+    cache_config.num_gpu_blocks = 16
+    scheduler = Scheduler(scheduler_config, cache_config, None)
+
+    _, seq_group = create_dummy_prompt("0",
+                                       prompt_length=8,
+                                       block_size=block_size)
+    scheduler.add_seq_group(seq_group)
+    output = scheduler._schedule_prefills(create_token_budget(), None)
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["0"]
+    scheduler.block_manager.mark_blocks_as_computed(seq_group, 8)
+
+    prompts = [
+        list(range(50, 58)),
+        list(range(8)) + list(range(100, 104)),
+        list(range(200, 208)),
+        list(range(200, 212)),
+    ]
+    for i, prompt_tokens in enumerate(prompts):
+        _, seq_group = create_dummy_prompt(str(i + 1),
+                                           prompt_length=len(prompt_tokens),
+                                           block_size=block_size,
+                                           prompt_tokens=prompt_tokens)
+        scheduler.add_seq_group(seq_group)
+
+    # Request 2 reuses the prefix of request 0, and request 4 waits for the
+    # prefix it shares with request 3.
+    budget = create_token_budget()
+    add_token_budget(budget, 0, 1)
+    output = scheduler._schedule_prefills(budget, None)
+    assert [s.seq_group.request_id
+            for s in output.seq_groups] == ["2", "1", "3"]
+    assert [s.request_id for s in scheduler.waiting] == ["4"]
+
+    # Request 4 is admitted once it has been passed over 4 times.
+    for num_steps in range(4):
+        budget = create_token_budget()
+        add_token_budget(budget, 0, 1)
+        output = scheduler._schedule_prefills(budget, None)
+        if num_steps < 3:
+            assert len(output.seq_groups) == 0
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["4"]
+
+
 def test_prefill_schedule_no_block_manager_capacity():
     """
     Test sequence cannot be scheduled due to block manager has no capacity.
@@ -850,3 +1042,156 @@ def test_scheduling_budget():
     assert budget.num_curr_seqs == 0
     budget.subtract_num_seqs(seq_group.request_id, 2)
     assert budget.num_curr_seqs == 0
+
+
+def test_scheduler_priority_policy_ordering():
+    block_size = 4
+    scheduler_config = SchedulerConfig(64,
+                                       1,
+                                       16,
+                                       scheduling_policy="priority")
+    cache_config = CacheConfig(block_size, 1.0, 1, "auto")
+    cache_config.num_cpu_blocks = 8
+    cache_config.num_gpu_blocks = 8
+    scheduler = Scheduler(scheduler_config, cache_config, None)
+
+    seq_groups = []
+    for i, priority in enumerate([3, 1, 2]):
+        _, seq_group = create_dummy_prompt(str(i),
+                                           prompt_length=block_size,
+                                           priority=priority)
+        scheduler.add_seq_group(seq_group)
+        seq_groups.append(seq_group)
+
+    # max_num_seqs is 1, so the most important request is admitted alone.
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert get_sequence_groups(out) == [seq_groups[1]]
+    assert [s.request_id for s in scheduler.waiting] == ["2", "0"]
+
+
+def test_scheduler_priority_policy_sorts_only_changed_queues():
+    """The queues are only sorted again when sequence groups are added to
+    them."""
+    block_size = 4
+    scheduler_config = SchedulerConfig(64,
+                                       4,
+                                       16,
+                                       scheduling_policy="priority")
+    cache_config = CacheConfig(block_size, 1.0, 1, "auto")
+    cache_config.num_cpu_blocks = 8
+    cache_config.num_gpu_blocks = 8
+    scheduler = Scheduler(scheduler_config, cache_config, None)
+    sort_by_priority = scheduler.policy.sort_by_priority
+    sorted_queues = []
+
+    def record_sort(now, seq_groups):
+        sorted_queues.append(seq_groups)
+        return sort_by_priority(now, seq_groups)
+
+    scheduler.policy.sort_by_priority = record_sort
+
+    seq_groups = []
+    for i, priority in enumerate([2, 1]):
+        _, seq_group = create_dummy_prompt(str(i),
+                                           prompt_length=block_size,
+                                           priority=priority)
+        scheduler.add_seq_group(seq_group)
+        seq_groups.append(seq_group)
+
+    # Only the waiting queue changed.
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert get_sequence_groups(out) == [seq_groups[1], seq_groups[0]]
+    assert len(sorted_queues) == 1
+    append_new_token(out, 1)
+
+    # The prefills were added to the running queue.
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert len(sorted_queues) == 2
+    assert list(scheduler.running) == [seq_groups[1], seq_groups[0]]
+    append_new_token(out, 1)
+
+    # Nothing changed.
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert len(sorted_queues) == 2
+    assert list(scheduler.running) == [seq_groups[1], seq_groups[0]]
+
+
+def test_scheduler_priority_preemption():
+    """A higher-priority request preempts lower-priority running requests
+    when there is not enough KV cache to admit it."""
+    block_size = 4
+    scheduler_config = SchedulerConfig(64,
+                                       4,
+                                       16,
+                                       scheduling_policy="priority")
+    cache_config = CacheConfig(block_size, 1.0, 1, "auto")
+    cache_config.num_cpu_blocks = 2
+    cache_config.num_gpu_blocks = 2
+    scheduler = Scheduler(scheduler_config, cache_config, None)
+
+    # Fills both blocks once the first token is appended.
+    _, batch_group = create_dummy_prompt("1",
+                                         prompt_length=2 * block_size - 1,
+                                         block_size=block_size,
+                                         priority=1)
+    scheduler.add_seq_group(batch_group)
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert get_sequence_groups(out) == [batch_group]
+    append_new_token(out, 1)
+
+    _, chat_group = create_dummy_prompt("2",
+                                        prompt_length=block_size,
+                                        block_size=block_size,
+                                        priority=0)
+    scheduler.add_seq_group(chat_group)
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert get_sequence_groups(out) == [chat_group]
+    assert out.preempted == 1
+    assert list(scheduler.waiting) == [batch_group]
+    assert batch_group.get_seqs()[0].status == SequenceStatus.WAITING
+
+
+def test_scheduler_fcfs_policy_ignores_priority():
+    block_size = 4
+    scheduler_config = SchedulerConfig(64, 1, 16)
+    cache_config = CacheConfig(block_size, 1.0, 1, "auto")
+    cache_config.num_cpu_blocks = 8
+    cache_config.num_gpu_blocks = 8
+    scheduler = Scheduler(scheduler_config, cache_config, None)
+    assert scheduler.policy is None
+
+    seq_groups = []
+    for i, priority in enumerate([3, 1, 2]):
+        _, seq_group = create_dummy_prompt(str(i),
+                                           prompt_length=block_size,
+                                           priority=priority)
+        scheduler.add_seq_group(seq_group)
+        seq_groups.append(seq_group)
+
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert get_sequence_groups(out) == [seq_groups[0]]
+
+
+def test_fair_share_policy():
+    policy = PolicyFactory.get_policy("fair")
+    lora_requests = [
+        LoRARequest(f"lora_{i}", i, f"/fake/lora_{i}") for i in range(1, 3)
+    ]
+    _, busy_group = create_dummy_prompt("1", 4, lora_request=lora_requests[0])
+    _, idle_group = create_dummy_prompt("2", 4, lora_request=lora_requests[1])
+    _, urgent_group = create_dummy_prompt("3",
+                                          4,
+                                          lora_request=lora_requests[0],
+                                          priority=-1)
+    now = time.time()
+    queue = deque([busy_group, idle_group])
+    assert list(policy.sort_by_priority(now, queue)) == [busy_group, idle_group]
+
+    # The adapter that got more tokens goes after the other one ...
+    policy.record_scheduled(busy_group, 100)
+    assert list(policy.sort_by_priority(now,
+                                        queue)) == [idle_group, busy_group]
+
+    # ... but request priority still comes first.
+    queue.append(urgent_group)
+    assert list(policy.sort_by_priority(now, queue))[0] is urgent_group
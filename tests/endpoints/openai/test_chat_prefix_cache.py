@@ -0,0 +1,53 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from aphrodite.endpoints.chat_prefix_cache import ChatPrefixCache
+from aphrodite.endpoints.chat_utils import apply_chat_template
+from aphrodite.transformers_utils.tokenizer import get_tokenizer
+from aphrodite.transformers_utils.tokenizer_group.tokenization_executor import (  # noqa: E501
+    TokenizationExecutor)
+
+MODEL_NAME = "openai-community/gpt2"
+CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "{{ '<|endoftext|>' + message['role'] + '\n' + message['content'] }}"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}{{ '<|endoftext|>assistant\n' }}{% endif %}"
+)
+
+
+def test_chat_prefix_cache():
+    tokenizer = get_tokenizer(MODEL_NAME)
+    executor = TokenizationExecutor()
+    cache = ChatPrefixCache(capacity=4)
+    hits = REGISTRY.get_sample_value("aphrodite:chat_prefix_cache_hits_total")
+
+    async def tokenize(conversation):
+        prompt = apply_chat_template(tokenizer,
+                                     conversation,
+                                     CHAT_TEMPLATE,
+                                     add_generation_prompt=True)
+        token_ids = await cache.tokenize(executor, tokenizer, conversation,
+                                         prompt, CHAT_TEMPLATE)
+        # Spliced tokens must match tokenizing the whole prompt.
+        assert token_ids == tokenizer(prompt,
+                                      add_special_tokens=False).input_ids
+
+    conversation = [{
+        "role": "user",
+        "content": "What is the capital of France? Answer in one word."
+    }]
+    for i in range(3):
+        asyncio.run(tokenize(conversation))
+        conversation = conversation + [{
+            "role": "assistant",
+            "content": f"Paris. It has been the capital since year {i}."
+        }, {
+            "role": "user",
+            "content": f"And what about Germany{'?' * i}"
+        }]
+
+    # Only the first turn is tokenized from scratch.
+    assert REGISTRY.get_sample_value(
+        "aphrodite:chat_prefix_cache_hits_total") == hits + 2
@@ -1,5 +1,7 @@
 # This unit test should be moved to a new
 # tests/test_guided_decoding directory.
+from typing import List
+
 import pytest
 import torch
 from transformers import AutoTokenizer
@@ -8,7 +10,7 @@ from aphrodite.endpoints.openai.protocol import CompletionRequest
 from aphrodite.modeling.guided_decoding import (
     get_guided_decoding_logits_processor)
 from aphrodite.modeling.guided_decoding.outlines_logits_processors import (
-    JSONLogitsProcessor, RegexLogitsProcessor)
+    JSONLogitsProcessor, RegexLogitsProcessor, _MaskCache)
 
 
 def test_guided_logits_processors(sample_regex, sample_json_schema):
@@ -70,3 +72,75 @@ async def test_guided_logits_processor_black_box(backend: str, sample_regex,
     tensor = json_lp(token_ids, tensor)
     assert tensor.shape == original_tensor.shape
     assert not torch.allclose(tensor, original_tensor)
+
+
+def test_guided_logits_processor_incremental_state(sample_regex):
+    """The batched path tracks the FSM state of each sequence incrementally
+    and must mask the same tokens as replaying the whole output."""
+    from array import array
+
+    from aphrodite.common.sequence import SequenceData
+    from aphrodite.constants import APHRODITE_TOKEN_ID_ARRAY_TYPE
+
+    tokenizer = AutoTokenizer.from_pretrained('HuggingFaceH4/zephyr-7b-beta')
+    batched_LP = RegexLogitsProcessor(sample_regex, tokenizer)
+    seq_data = SequenceData(array(APHRODITE_TOKEN_ID_ARRAY_TYPE, [1]))
+
+    for _ in range(8):
+        logits = torch.rand((2, 32000))
+        batched_LP.process_batch(logits, [1], [0], [seq_data])
+
+        expected = RegexLogitsProcessor(sample_regex, tokenizer)(
+            list(seq_data.output_token_ids), torch.rand(32000))
+        assert torch.equal(torch.isinf(logits[1]), torch.isinf(expected))
+        assert not torch.isinf(logits[0]).any()
+
+        # Generate the first allowed token.
+        next_token = int(torch.nonzero(~torch.isinf(logits[1]))[0])
+        seq_data.append_token_id(next_token, 0.0)
+
+
+def test_guided_logits_processor_reused_seq_id(sample_regex):
+    """A sequence id that is reused for other tokens, like the expanded
+    sequences of speculative decoding, must not keep the FSM state of the
+    previous tokens."""
+    from array import array
+
+    from aphrodite.common.sequence import SequenceData
+    from aphrodite.constants import APHRODITE_TOKEN_ID_ARRAY_TYPE
+
+    tokenizer = AutoTokenizer.from_pretrained('HuggingFaceH4/zephyr-7b-beta')
+
+    def generate(pick: int, num_tokens: int) -> List[int]:
+        token_ids: List[int] = []
+        for _ in range(num_tokens):
+            logits = RegexLogitsProcessor(sample_regex, tokenizer)(
+                token_ids, torch.rand(32000))
+            token_ids.append(int(torch.nonzero(~torch.isinf(logits))[pick]))
+        return token_ids
+
+    batched_LP = RegexLogitsProcessor(sample_regex, tokenizer)
+    for token_ids in [generate(0, 4), generate(-1, 5), generate(0, 6)]:
+        seq_data = SequenceData(array(APHRODITE_TOKEN_ID_ARRAY_TYPE, [1]),
+                                _output_token_ids=array(
+                                    APHRODITE_TOKEN_ID_ARRAY_TYPE, token_ids))
+        logits = torch.rand((1, 32000))
+        batched_LP.process_batch(logits, [0], [0], [seq_data])
+        expected = RegexLogitsProcessor(sample_regex, tokenizer)(
+            token_ids, torch.rand(32000))
+        assert torch.equal(torch.isinf(logits[0]), torch.isinf(expected))
+
+
+def test_guided_logits_processor_mask_cache():
+    """The masks are shared by key and evicted by size."""
+    cache = _MaskCache(max_bytes=2000)
+    masks = [torch.zeros(1000, dtype=torch.bool) for _ in range(3)]
+    cache.put("a", masks[0])
+    cache.put("b", masks[1])
+    assert cache.get("a") is masks[0]
+    cache.put("c", masks[2])
+    assert cache.get("b") is None
+    assert cache.get("a") is masks[0]
+    assert cache.get("c") is masks[2]
+    cache.put("d", torch.zeros(4000, dtype=torch.bool))
+    assert cache.get("d") is None
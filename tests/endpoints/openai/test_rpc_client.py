@@ -0,0 +1,34 @@
+import pytest
+import zmq
+
+from aphrodite.common.sampling_params import SamplingParams
+from aphrodite.endpoints.openai.rpc.client import AsyncEngineRPCClient
+
+
+class _BrokenSocket:
+
+    async def recv_multipart(self):
+        raise zmq.ZMQError(msg="broken socket")
+
+
+@pytest.mark.asyncio
+async def test_generate_fails_after_output_handler_error():
+    """Once the output handler loop failed, nothing receives outputs, so new
+    requests must fail instead of waiting forever."""
+    client = AsyncEngineRPCClient("inproc://test_rpc_client")
+    client._errored = False
+    client.generate_socket = _BrokenSocket()
+    try:
+        with pytest.raises(zmq.ZMQError):
+            await client.run_output_handler_loop()
+        assert client.errored
+        assert not client.is_running
+
+        generator = client.generate("prompt", SamplingParams(), "request-0")
+        with pytest.raises(RuntimeError) as exc_info:
+            await generator.__anext__()
+        assert isinstance(exc_info.value.__cause__, zmq.ZMQError)
+        assert not client.output_queues
+    finally:
+        client.generate_socket = None
+        client.close()
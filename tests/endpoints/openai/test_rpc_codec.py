@@ -0,0 +1,46 @@
+from aphrodite.common.outputs import CompletionOutput, RequestOutput
+from aphrodite.common.sequence import Logprob, RequestMetrics
+from aphrodite.endpoints.openai.rpc import (decode_request_outputs,
+                                            encode_request_outputs)
+from aphrodite.lora.request import LoRARequest
+
+
+def test_request_outputs_round_trip():
+    logprobs = {5: Logprob(-0.5, rank=1, decoded_token="a"), 7: Logprob(-2.0)}
+    request_outputs = [
+        RequestOutput("0",
+                      "prompt", [1, 2, 3], [None, logprobs], [
+                          CompletionOutput(0, "ab", [5, 6], -1.5,
+                                           [logprobs, logprobs], "stop", 6)
+                      ],
+                      finished=True,
+                      metrics=RequestMetrics(1.0, 2.0, 1.5, 1.8, 0.5, 2.0)),
+        # A delta output, without the prompt.
+        RequestOutput("1", None, None, None,
+                      [CompletionOutput(0, "c", [8], None, None)],
+                      finished=False),
+    ]
+
+    lora_request = LoRARequest("lora", 1, "/path")
+    decoded = [
+        output.to_request_output(lora_request)
+        for output in decode_request_outputs(
+            encode_request_outputs(request_outputs))
+    ]
+
+    assert len(decoded) == 2
+    for expected, actual in zip(request_outputs, decoded):
+        assert actual.request_id == expected.request_id
+        assert actual.prompt == expected.prompt
+        assert actual.prompt_token_ids == expected.prompt_token_ids
+        assert actual.prompt_logprobs == expected.prompt_logprobs
+        assert actual.finished == expected.finished
+        assert actual.metrics == expected.metrics
+        assert actual.lora_request == lora_request
+        for expected_output, actual_output in zip(expected.outputs,
+                                                  actual.outputs):
+            assert actual_output.text == expected_output.text
+            assert actual_output.token_ids == expected_output.token_ids
+            assert actual_output.logprobs == expected_output.logprobs
+            assert actual_output.finish_reason == expected_output.finish_reason
+            assert actual_output.stop_reason == expected_output.stop_reason
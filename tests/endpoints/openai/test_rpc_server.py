@@ -0,0 +1,88 @@
+import asyncio
+
+import cloudpickle
+import pytest
+
+from aphrodite.common.outputs import CompletionOutput, RequestOutput
+from aphrodite.common.sampling_params import SamplingParams
+from aphrodite.endpoints.openai.rpc import RPC_ERROR_FRAME, RPCGenerateRequest
+from aphrodite.endpoints.openai.rpc import server as rpc_server
+from aphrodite.endpoints.openai.rpc.server import AsyncEngineRPCServer
+from aphrodite.engine.async_aphrodite import AsyncStream
+
+
+class _RecordingSocket:
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_multipart(self, frames, copy=True):
+        self.sent.append(frames)
+
+
+class _Engine:
+
+    def __init__(self):
+        self.streams = {}
+
+    def generate(self, inputs, sampling_params, request_id, **kwargs):
+        stream = AsyncStream(request_id, lambda request_id: None)
+        stream.put(
+            RequestOutput(request_id, inputs, [1], None,
+                          [CompletionOutput(0, "a", [2], None, None)],
+                          finished=False))
+        self.streams[request_id] = stream
+        return stream.generator()
+
+    async def abort(self, request_id):
+        self.streams[request_id].finish(asyncio.CancelledError)
+
+    async def check_health(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_running_requests_fail_when_output_loop_fails(monkeypatch):
+    """If sending the outputs fails, the running requests and the new ones
+    must fail instead of waiting forever for outputs."""
+
+    def encode_request_outputs(outputs):
+        raise ValueError("cannot encode")
+
+    monkeypatch.setattr(rpc_server, "encode_request_outputs",
+                        encode_request_outputs)
+    server = AsyncEngineRPCServer.__new__(AsyncEngineRPCServer)
+    server._init_socket("inproc://test_rpc_server")
+    zmq_socket, server.socket = server.socket, _RecordingSocket()
+    server.engine = _Engine()
+    server.outputs_ready = asyncio.Event()
+    try:
+        generate_task = asyncio.create_task(
+            server.generate(
+                b"client",
+                RPCGenerateRequest("prompt", SamplingParams(), "request-0")))
+        output_loop = asyncio.create_task(server.run_output_loop())
+        output_loop.add_done_callback(server._on_output_loop_done)
+        with pytest.raises(ValueError):
+            await output_loop
+        await server._fail_requests_task
+        with pytest.raises(asyncio.CancelledError):
+            await generate_task
+        assert not server.running_requests
+
+        await server.generate(
+            b"client",
+            RPCGenerateRequest("prompt", SamplingParams(), "request-1"))
+        await server.check_health(b"client")
+
+        errors = server.socket.sent
+        assert [frames[:3] for frames in errors[:2]] == [
+            [b"client", RPC_ERROR_FRAME, b"request-0"],
+            [b"client", RPC_ERROR_FRAME, b"request-1"],
+        ]
+        for frames in errors[:2]:
+            assert isinstance(cloudpickle.loads(frames[3]), RuntimeError)
+        assert isinstance(cloudpickle.loads(errors[2][1]), RuntimeError)
+    finally:
+        zmq_socket.close()
+        server.context.destroy()
@@ -1,3 +1,4 @@
+from typing import List
 from unittest.mock import MagicMock
 
 import pytest
@@ -83,3 +84,95 @@ def test_stop_on_eos_token(text_wo_eos: str, eos_token: str, eos_token_id: int,
     else:
         assert seq.status == SequenceStatus.FINISHED_STOPPED
         assert seq.output_text == text_wo_eos
+
+
+def _stream_text(stop_checker: StopChecker, seq: Sequence,
+                 sampling_params: SamplingParams, chunks: List[str]):
+    for i, chunk in enumerate(chunks):
+        seq.append_token_id(token_id=i, logprobs={i: Logprob(0.0)})
+        seq.output_text += chunk
+        stop_checker.maybe_stop_sequence(seq=seq,
+                                         new_char_count=len(chunk),
+                                         sampling_params=sampling_params)
+        if seq.is_finished():
+            break
+
+
+@pytest.mark.parametrize("include_stop_str_in_output", [True, False])
+@pytest.mark.skip_global_cleanup
+def test_stop_strings_across_steps(include_stop_str_in_output: bool):
+    """
+    Test that stop strings are found when they are generated over several
+    steps, and that the first stop string in the output wins.
+    """
+    get_tokenizer_for_seq = MagicMock(
+        return_value=MagicMock(spec=PreTrainedTokenizer))
+    stop_checker = StopChecker(max_model_len=1024,
+                               get_tokenizer_for_seq=get_tokenizer_for_seq)
+    sampling_params = SamplingParams(
+        stop=["<|im_end|>", "User:", "end"],
+        include_stop_str_in_output=include_stop_str_in_output)
+
+    seq = Sequence(seq_id=0, inputs={"prompt_token_ids": [0]}, block_size=16)
+    _stream_text(stop_checker, seq, sampling_params,
+                 ["Hello", " Us", "er", ":<|im_", "end|>"])
+
+    assert seq.status == SequenceStatus.FINISHED_STOPPED
+    assert seq.stop_reason == "User:"
+    if include_stop_str_in_output:
+        assert seq.output_text == "Hello User:"
+    else:
+        assert seq.output_text == "Hello "
+
+
+@pytest.mark.skip_global_cleanup
+@pytest.mark.parametrize("chunks", [["Hello world"], ["Hel", "lo wor", "ld"]])
+def test_stop_string_that_ends_first_wins(chunks: List[str]):
+    """
+    Test that the stop string that ends first in the output wins over stop
+    strings listed before it, and that the list order only decides between
+    stop strings that end at the same character.
+    """
+    get_tokenizer_for_seq = MagicMock(
+        return_value=MagicMock(spec=PreTrainedTokenizer))
+    stop_checker = StopChecker(max_model_len=1024,
+                               get_tokenizer_for_seq=get_tokenizer_for_seq)
+    sampling_params = SamplingParams(stop=["world", "lo", "llo"])
+    matcher = sampling_params.stop_string_matcher
+
+    seq = Sequence(seq_id=0, inputs={"prompt_token_ids": [0]}, block_size=16)
+    _stream_text(stop_checker, seq, sampling_params, chunks)
+
+    assert seq.status == SequenceStatus.FINISHED_STOPPED
+    assert seq.stop_reason == "lo"
+    assert seq.output_text == "Hel"
+    # The matcher is built once for the sampling params.
+    assert sampling_params.stop_string_matcher is matcher
+
+
+@pytest.mark.skip_global_cleanup
+def test_stop_token_sequences():
+    """
+    Test that a stop token sequence stops the sequence only when all of its
+    tokens are generated in a row, and not before min_tokens.
+    """
+    get_tokenizer_for_seq = MagicMock(
+        return_value=MagicMock(spec=PreTrainedTokenizer))
+    stop_checker = StopChecker(max_model_len=1024,
+                               get_tokenizer_for_seq=get_tokenizer_for_seq)
+    sampling_params = SamplingParams(stop_token_sequences=[[5, 6, 7]],
+                                     min_tokens=5)
+
+    seq = Sequence(seq_id=0, inputs={"prompt_token_ids": [0]}, block_size=16)
+    for i, token_id in enumerate([5, 6, 7, 5, 6, 8, 5, 6, 7, 9]):
+        seq.append_token_id(token_id=token_id,
+                            logprobs={token_id: Logprob(0.0)})
+        stop_checker.maybe_stop_sequence(seq=seq,
+                                         new_char_count=0,
+                                         sampling_params=sampling_params)
+        if seq.is_finished():
+            break
+
+    assert seq.status == SequenceStatus.FINISHED_STOPPED
+    assert seq.stop_reason == 7
+    assert seq.get_output_len() == 9
@@ -0,0 +1,35 @@
+"""Compare the outputs of the engine with and without asynchronous output
+processing.
+
+Run `pytest tests/engine/test_async_output_proc.py`.
+"""
+import pytest
+
+from aphrodite import SamplingParams
+
+MODEL = "facebook/opt-125m"
+
+
+@pytest.mark.parametrize("max_tokens", [5, 32])
+def test_async_output_proc(aphrodite_runner, example_prompts,
+                           max_tokens: int):
+    with aphrodite_runner(MODEL, enforce_eager=True) as aphrodite_model:
+        expected = aphrodite_model.generate_greedy(example_prompts,
+                                                   max_tokens)
+
+    with aphrodite_runner(MODEL, enforce_eager=True,
+                          async_output_proc=True) as aphrodite_model:
+        assert aphrodite_model.model.llm_engine.async_output_proc
+        outputs = aphrodite_model.generate_greedy(example_prompts,
+                                                  max_tokens)
+
+        # Stop strings are checked in the output processing thread.
+        stop_params = SamplingParams(temperature=0.0,
+                                     max_tokens=max_tokens,
+                                     stop=["."])
+        for output in aphrodite_model.model.generate(example_prompts,
+                                                     stop_params):
+            assert output.finished
+            assert "." not in output.outputs[0].text
+
+    assert outputs == expected
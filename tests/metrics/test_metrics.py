@@ -9,7 +9,8 @@ from aphrodite import AphroditeEngine, EngineArgs
 from aphrodite.common.sampling_params import SamplingParams
 from aphrodite.engine.args_tools import AsyncEngineArgs
 from aphrodite.engine.async_aphrodite import AsyncAphrodite
-from aphrodite.engine.metrics import RayPrometheusStatLogger
+from aphrodite.engine.metrics import (Metrics, PrometheusStatLogger,
+                                      RayPrometheusStatLogger)
 
 from ..conftest import cleanup
 
@@ -392,3 +393,32 @@ def test_engine_log_metrics_ray(
         assert logger._i > 0, ".log must be called at least once"
 
     ray.get(_inner.remote())
+
+
+def test_metric_waiting_per_lora_removes_stale_labels():
+    stat_logger = PrometheusStatLogger(local_interval=0.5,
+                                       labels=dict(model_name="model"),
+                                       max_model_len=16)
+    gauge = stat_logger.metrics.gauge_scheduler_waiting_per_lora
+
+    def num_waiting(lora_name: str):
+        return REGISTRY.get_sample_value(
+            "aphrodite:num_requests_waiting_per_lora", {
+                "model_name": "model",
+                Metrics.labelname_lora_name: lora_name
+            })
+
+    logged = stat_logger._log_gauge_labels(gauge, {
+        "a": 2,
+        "b": 1
+    }, Metrics.labelname_lora_name, set())
+    assert logged == {"a", "b"}
+    assert num_waiting("a") == 2
+    assert num_waiting("b") == 1
+
+    logged = stat_logger._log_gauge_labels(gauge, {"b": 3},
+                                           Metrics.labelname_lora_name,
+                                           logged)
+    assert logged == {"b"}
+    assert num_waiting("a") is None
+    assert num_waiting("b") == 3
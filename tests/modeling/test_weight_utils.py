@@ -0,0 +1,201 @@
+import json
+import os
+import struct
+import tempfile
+
+import huggingface_hub.constants
+import pytest
+import torch
+from huggingface_hub.utils import LocalEntryNotFoundError
+from safetensors.torch import save_file
+
+from aphrodite.modeling.model_loader.weight_utils import (
+    _read_safetensors_file, _read_safetensors_header,
+    _staged_safetensors_weights_iterator, _StagingBuffers,
+    default_weight_loader, download_weights_from_hf, enable_hf_transfer,
+    multi_thread_safetensors_weights_iterator, safetensors_weights_iterator,
+    sliced_safetensors_weights_iterator)
+
+
+def test_hf_transfer_auto_activation():
+    if "HF_HUB_ENABLE_HF_TRANSFER" in os.environ:
+        # in case it is already set, we can't test the auto activation
+        pytest.skip(
+            "HF_HUB_ENABLE_HF_TRANSFER is set, can't test auto activation")
+    enable_hf_transfer()
+    try:
+        # enable hf hub transfer if available
+        import hf_transfer  # type: ignore # noqa
+        HF_TRANFER_ACTIVE = True
+    except ImportError:
+        HF_TRANFER_ACTIVE = False
+    assert (huggingface_hub.constants.HF_HUB_ENABLE_HF_TRANSFER ==
+            HF_TRANFER_ACTIVE)
+
+
+def test_download_weights_from_hf():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # assert LocalEntryNotFoundError error is thrown
+        # if offline is set and model is not cached
+        huggingface_hub.constants.HF_HUB_OFFLINE = True
+        with pytest.raises(LocalEntryNotFoundError):
+            download_weights_from_hf("facebook/opt-125m",
+                                     allow_patterns=["*.safetensors", "*.bin"],
+                                     cache_dir=tmpdir)
+
+        # download the model
+        huggingface_hub.constants.HF_HUB_OFFLINE = False
+        download_weights_from_hf("facebook/opt-125m",
+                                 allow_patterns=["*.safetensors", "*.bin"],
+                                 cache_dir=tmpdir)
+
+        # now it should work offline
+        huggingface_hub.constants.HF_HUB_OFFLINE = True
+        assert download_weights_from_hf(
+            "facebook/opt-125m",
+            allow_patterns=["*.safetensors", "*.bin"],
+            cache_dir=tmpdir) is not None
+
+
+def _save_shards(tmpdir: str):
+    st_files = []
+    for i in range(3):
+        tensors = {
+            f"{i}.bf16": torch.randn(5, 7).to(torch.bfloat16),
+            f"{i}.f32": torch.randn(3, 2, 4),
+            f"{i}.i64": torch.arange(i + 1),
+            f"{i}.scalar": torch.tensor(float(i)),
+            f"{i}.bool": torch.rand(3) > 0.5,
+            f"{i}.empty": torch.empty(0, 4),
+        }
+        st_file = os.path.join(tmpdir, f"model-{i}.safetensors")
+        save_file(tensors, st_file)
+        st_files.append(st_file)
+    return st_files
+
+
+@pytest.mark.parametrize("num_threads", [1, 4])
+def test_multi_thread_safetensors_weights_iterator(num_threads: int):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        st_files = _save_shards(tmpdir)
+        expected = dict(safetensors_weights_iterator(st_files))
+        weights = dict(
+            multi_thread_safetensors_weights_iterator(st_files, num_threads))
+        assert weights.keys() == expected.keys()
+        for name, weight in weights.items():
+            assert weight.dtype == expected[name].dtype
+            assert torch.equal(weight, expected[name])
+
+
+@pytest.mark.parametrize("num_threads", [1, 4])
+@pytest.mark.parametrize("buffer_bytes", [64, 2**20])
+@pytest.mark.parametrize("keep_weights", [False, True])
+def test_staged_safetensors_weights_iterator(num_threads: int,
+                                             buffer_bytes: int,
+                                             keep_weights: bool):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        st_files = _save_shards(tmpdir)
+        expected = dict(safetensors_weights_iterator(st_files))
+        # The weights are views into reused buffers. A weight that is kept
+        # must not be overwritten by the next reads.
+        weights = {}
+        for name, weight in _staged_safetensors_weights_iterator(
+                st_files, num_threads, False, buffer_bytes):
+            weights[name] = weight if keep_weights else weight.clone()
+        assert weights.keys() == expected.keys()
+        for name, weight in weights.items():
+            assert weight.dtype == expected[name].dtype
+            assert torch.equal(weight, expected[name])
+
+
+def test_staging_buffers_kept_by_weights_are_replaced_unpinned():
+    buffers = _StagingBuffers(2, 16, pin_memory=True)
+    # Stand in for pinned buffers, which need a GPU.
+    buffers.pin_memory = False
+    first = buffers.get()
+    second = buffers.get()
+    buffers.pin_memory = True
+
+    buffers.put(first)
+    assert buffers.pin_memory
+    kept_weight = second[0][:4]
+    buffers.put(second)
+    # A caller that keeps the weights of one buffer may keep all of them,
+    # the buffers that replace them are not pinned.
+    assert not buffers.pin_memory
+    replacement, _ = buffers.get()
+    assert not replacement.is_pinned()
+    assert buffers.get() is first
+    del kept_weight
+
+
+def test_read_safetensors_file_unaligned():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # The format does not align the tensors, write a float tensor at an
+        # odd offset by hand.
+        header = json.dumps({
+            "__metadata__": {
+                "format": "pt"
+            },
+            "f32": {
+                "dtype": "F32",
+                "shape": [2, 2],
+                "data_offsets": [3, 19]
+            },
+            "u8": {
+                "dtype": "U8",
+                "shape": [3],
+                "data_offsets": [0, 3]
+            },
+        }).encode()
+        data = bytes([1, 2, 3]) + torch.arange(4.0).numpy().tobytes()
+        st_file = os.path.join(tmpdir, "model.safetensors")
+        with open(st_file, "wb") as f:
+            f.write(struct.pack("<Q", len(header)) + header + data)
+
+        data_offset, entries = _read_safetensors_header(st_file)
+        assert data_offset == 8 + len(header)
+        assert [entry[0] for entry in entries] == ["u8", "f32"]
+        weights = dict(_read_safetensors_file(st_file, data_offset, entries))
+        assert torch.equal(weights["u8"],
+                           torch.tensor([1, 2, 3], dtype=torch.uint8))
+        assert torch.equal(weights["f32"], torch.arange(4.0).reshape(2, 2))
+        # Reading from the unaligned offset only, into a given buffer.
+        buffer = torch.empty(64, dtype=torch.uint8)
+        weights = dict(
+            _read_safetensors_file(st_file, data_offset, entries[1:], buffer))
+        assert weights["f32"].data_ptr() == buffer.data_ptr()
+        assert torch.equal(weights["f32"], torch.arange(4.0).reshape(2, 2))
+
+
+def test_sliced_safetensors_weights_iterator():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        st_file = os.path.join(tmpdir, "model.safetensors")
+        tensors = {
+            "weight": torch.randn(8, 6, 4),
+            "scale": torch.tensor(0.5),
+        }
+        save_file(tensors, st_file)
+        weights = dict(sliced_safetensors_weights_iterator([st_file]))
+
+        weight = weights["weight"]
+        assert weight.shape == tensors["weight"].shape
+        assert weight.dtype == torch.float32
+        assert weight.numel() * weight.element_size() == 8 * 6 * 4 * 4
+        # Narrowing twice reads only the narrowed range.
+        shard = weight.narrow(0, 4, 4).narrow(1, 2, 2)
+        expected = tensors["weight"][4:8, 2:4]
+        assert shard.shape == expected.shape
+        param = torch.empty(expected.shape)
+        param.data.copy_(shard)
+        assert torch.equal(param, expected)
+        assert weight.num_bytes_read() == 4 * 2 * 4 * 4
+        with pytest.raises(RuntimeError):
+            weight.narrow(1, 4, 4)
+
+        # Any other use reads the whole weight.
+        assert torch.equal(weight.view(-1), tensors["weight"].view(-1))
+        assert weight.num_bytes_read() == (4 * 2 * 4 + 8 * 6 * 4) * 4
+        param = torch.empty(())
+        default_weight_loader(param, weights["scale"])
+        assert param.item() == 0.5
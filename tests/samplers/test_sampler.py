@@ -1057,3 +1057,168 @@ def test_sampler_include_gpu_probs_tensor(device: str):
     assert sampler_output.sampled_token_probs is not None
     assert sampler_output.logprobs is not None
     assert sampler_output.sampled_token_ids is not None
+
+
+@pytest.mark.parametrize("seed", list(range(20)))
+def test_sampler_dry_batched_matches_per_row(seed: int):
+    """The batched DRY implementation must apply exactly the same penalties
+    as the per-row reference implementation."""
+    from aphrodite.modeling.layers.sampler import (_apply_dry,
+                                                   _apply_dry_per_row)
+
+    set_random_seed(seed)
+    vocab_size = 16
+    batch_size = 12
+    # A small alphabet makes long repeats likely.
+    alphabet = random.randint(2, 6)
+
+    def random_tokens(max_len: int, min_len: int) -> torch.Tensor:
+        rows = [[random.randrange(alphabet)
+                 for _ in range(random.randint(min_len, max_len))]
+                for _ in range(batch_size)]
+        width = max(len(row) for row in rows)
+        return torch.tensor(
+            [row + [vocab_size] * (width - len(row)) for row in rows],
+            dtype=torch.long)
+
+    prompt_tokens = random_tokens(120, 1)
+    output_tokens = random_tokens(60, 0)
+    multipliers = torch.tensor(
+        [random.choice([0.0, 0.8, 1.5]) for _ in range(batch_size)])
+    bases = torch.tensor(
+        [random.choice([1.1, 1.75, 2.0]) for _ in range(batch_size)])
+    allowed_lengths = torch.tensor(
+        [random.randint(0, 4) for _ in range(batch_size)], dtype=torch.int)
+    breakers = torch.tensor(
+        [random.sample(range(vocab_size), 2) for _ in range(batch_size)],
+        dtype=torch.long)
+    ranges = torch.tensor(
+        [random.choice([0, 0, 5, 40]) for _ in range(batch_size)],
+        dtype=torch.int)
+    logits = torch.randn(batch_size, vocab_size)
+
+    args = (prompt_tokens, output_tokens, multipliers, bases,
+            allowed_lengths, breakers, ranges)
+    expected = _apply_dry_per_row(logits.clone(), *args)
+    actual = _apply_dry(logits.clone(), *args)
+    assert torch.equal(actual, expected)
+
+
+@pytest.mark.parametrize("max_idle_updates", [0, 2])
+def test_persistent_sampling_state_matches_recount(max_idle_updates: int):
+    """The incrementally updated token histogram must match counting the full
+    token history of each sequence from scratch, also when sequences miss
+    batches and when sequence ids are reused for other tokens, like the
+    expanded sequences of speculative decoding."""
+    from aphrodite.modeling.sampling_metadata import (PersistentSamplingState,
+                                                      SequenceGroupToSample)
+
+    set_random_seed(0)
+    vocab_size = 32
+    state = PersistentSamplingState(vocab_size, torch.device("cpu"),
+                                    max_idle_updates)
+    sampling_params = SamplingParams(presence_penalty=0.5)
+    seqs: Dict[int, SequenceData] = {}
+    next_seq_id = 0
+
+    for _ in range(20):
+        # Finish some sequences, start new ones and extend the rest.
+        for seq_id in random.sample(list(seqs), k=len(seqs) // 4):
+            del seqs[seq_id]
+        for _ in range(random.randint(0, 3)):
+            seqs[next_seq_id] = SequenceData(
+                array(APHRODITE_TOKEN_ID_ARRAY_TYPE, [
+                    random.randrange(vocab_size)
+                    for _ in range(random.randint(1, 10))
+                ]))
+            next_seq_id += 1
+        # Reuse some sequence ids for a sequence whose last output token
+        # differs.
+        decoded = [s for s in seqs if seqs[s].get_output_len() > 0]
+        for seq_id in random.sample(decoded, k=len(decoded) // 4):
+            output = list(seqs[seq_id].output_token_ids)
+            output[-1] = (output[-1] + 1) % vocab_size
+            seqs[seq_id] = SequenceData(
+                seqs[seq_id].prompt_token_ids_array,
+                _output_token_ids=array(APHRODITE_TOKEN_ID_ARRAY_TYPE,
+                                        output))
+        for seq_data in seqs.values():
+            for _ in range(random.randint(1, 2)):
+                seq_data.append_token_id(random.randrange(vocab_size), 0.0)
+        batch = {
+            seq_id: seq_data
+            for seq_id, seq_data in seqs.items() if random.random() < 0.75
+        }
+
+        seq_groups = [
+            SequenceGroupToSample(seq_ids=[seq_id],
+                                  sampling_params=sampling_params,
+                                  seq_data={seq_id: seq_data},
+                                  seq_len=None,
+                                  query_len=None,
+                                  generator=None,
+                                  is_prompt=False,
+                                  prompt_logprob_indices=[],
+                                  sample_indices=[i])
+            for i, (seq_id, seq_data) in enumerate(batch.items())
+        ]
+        sampling_metadata = SamplingMetadata(seq_groups=seq_groups,
+                                             selected_token_indices=None,
+                                             categorized_sample_indices={},
+                                             num_prompts=0)
+        row_slots = state.update(sampling_metadata)
+
+        assert len(set(row_slots.tolist())) == len(batch)
+        for slot, seq_data in zip(row_slots.tolist(), batch.values()):
+            expected_counts = torch.bincount(
+                torch.tensor(seq_data.output_token_ids, dtype=torch.long),
+                minlength=vocab_size)
+            expected_prompt = torch.zeros(vocab_size, dtype=torch.bool)
+            expected_prompt[list(seq_data.prompt_token_ids)] = True
+            assert torch.equal(state.output_counts[slot].long(),
+                               expected_counts)
+            assert torch.equal(state.prompt_mask[slot], expected_prompt)
+
+
+def test_persistent_sampling_state_sequence_id_reused_by_other_request():
+    """A sequence id reused by another request must be recounted and must not
+    reuse the sampling tensors of the previous batch, even if the tokens that
+    are compared to detect replaced sequences are the same."""
+    from aphrodite.modeling.sampling_metadata import (PersistentSamplingState,
+                                                      SequenceGroupToSample)
+
+    vocab_size = 32
+    state = PersistentSamplingState(vocab_size, torch.device("cpu"))
+
+    def make_metadata(request_id, sampling_params, prompt, output):
+        seq_data = SequenceData(
+            array(APHRODITE_TOKEN_ID_ARRAY_TYPE, prompt),
+            _output_token_ids=array(APHRODITE_TOKEN_ID_ARRAY_TYPE, output))
+        seq_group = SequenceGroupToSample(seq_ids=[0],
+                                          sampling_params=sampling_params,
+                                          seq_data={0: seq_data},
+                                          seq_len=None,
+                                          query_len=None,
+                                          generator=None,
+                                          is_prompt=False,
+                                          prompt_logprob_indices=[],
+                                          sample_indices=[0],
+                                          request_id=request_id)
+        return SamplingMetadata(seq_groups=[seq_group],
+                                selected_token_indices=None,
+                                categorized_sample_indices={},
+                                num_prompts=0)
+
+    first = make_metadata("0", SamplingParams(presence_penalty=0.5),
+                          [1, 2, 3], [4, 5, 6, 7, 8])
+    second = make_metadata("1", SamplingParams(presence_penalty=1.0),
+                           [9, 2, 3], [9, 5, 6, 7, 8, 10])
+    assert (PersistentSamplingState.get_batch_key(first) !=
+            PersistentSamplingState.get_batch_key(second))
+
+    state.update(first)
+    slot = state.update(second).item()
+    expected_counts = torch.bincount(torch.tensor([9, 5, 6, 7, 8, 10]),
+                                     minlength=vocab_size)
+    assert torch.equal(state.output_counts[slot].long(), expected_counts)
+    assert state.prompt_mask[slot].nonzero().flatten().tolist() == [2, 3, 9]
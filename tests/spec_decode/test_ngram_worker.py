@@ -1,6 +1,7 @@
 import torch
 
 from aphrodite.common.sequence import ExecuteModelRequest
+from aphrodite.spec_decode.ngram_index import NGramIndex
 from aphrodite.spec_decode.ngram_worker import NGramWorker
 from aphrodite.spec_decode.top1_proposer import Top1Proposer
 
@@ -211,3 +212,150 @@ def test_ngram_algo_correctness_for_batches_match_all():
         assert proposals.proposal_token_ids[0][i] == prompts[0][i + 1]
         assert proposals.proposal_token_ids[1][i] == prompts[1][i + 3]
         assert proposals.proposal_token_ids[2][i] == prompts[2][i + 5]
+
+
+def test_ngram_algo_correctness_for_growing_sequences():
+    """Verify the ngram index is updated with the tokens appended since the
+    previous step, and matches the proposals of a new worker.
+    """
+    block_size = 32
+    num_gpu_blocks = 2048 // block_size
+    seed = 100
+    model_name = 'JackFram/llama-68m'
+    vocab_size = 32_000
+    device = 'cuda:0'
+
+    ngram_worker = create_worker(
+        NGramWorker,
+        model_name,
+        block_size,
+        num_gpu_blocks,
+        seed,
+    )
+
+    proposer = Top1Proposer(
+        worker=ngram_worker,
+        device=device,
+        vocab_size=vocab_size,
+        max_proposal_len=20,
+    )
+
+    # set ngram window [1, 3], which is window=1/2/3
+    ngram_worker.set_ngram_window_size(1, 3)
+
+    prompts = [[1, 2, 3, 4, 5, 6, 7]]
+    continuations = [
+        # shall find no candidate
+        [],
+        # shall find candidate 3,4,5,6,7
+        [1, 2],
+        # shall find candidate 2,5,6,7,1
+        [1, 2, 5, 6, 7, 1],
+    ]
+
+    proposal_len = 5
+    for continuation, expected in zip(continuations, [
+        [],
+        [3, 4, 5, 6, 7],
+        [2, 5, 6, 7, 1],
+    ]):
+        final_prompt_lens = [
+            len(prompt) + len(continuation) + proposal_len
+            for prompt in prompts
+        ]
+        seq_group_metadata_list = create_seq_group_metadata_from_prompts(
+            prompts,
+            num_gpu_blocks,
+            block_size,
+            final_prompt_lens=final_prompt_lens,
+            continuations=[continuation])
+
+        proposals = proposer.get_spec_proposals(
+            execute_model_req=ExecuteModelRequest(
+                seq_group_metadata_list=seq_group_metadata_list,
+                num_lookahead_slots=proposal_len),
+            seq_ids_with_bonus_token_in_last_step=None)
+
+        assert proposals.proposal_lens.tolist() == [len(expected)]
+        if expected:
+            assert proposals.proposal_token_ids[0].tolist() == expected
+
+
+def test_ngram_algo_correctness_for_corpus_lookup():
+    """Verify the prompts of the other requests are looked up when corpus
+    lookup is enabled and a sequence has no match in its own tokens.
+    """
+    block_size = 32
+    num_gpu_blocks = 2048 // block_size
+    seed = 100
+    model_name = 'JackFram/llama-68m'
+    vocab_size = 32_000
+    device = 'cuda:0'
+
+    ngram_worker = create_worker(
+        NGramWorker,
+        model_name,
+        block_size,
+        num_gpu_blocks,
+        seed,
+    )
+
+    proposer = Top1Proposer(
+        worker=ngram_worker,
+        device=device,
+        vocab_size=vocab_size,
+        max_proposal_len=20,
+    )
+
+    # set ngram window [1, 3], which is window=1/2/3
+    ngram_worker.set_ngram_window_size(1, 3)
+    ngram_worker.set_ngram_corpus_lookup(True)
+
+    prompts = [
+        # shall find no candidate
+        [1, 2, 3, 4, 5, 6, 7, 8],
+        # shall find candidate 5,6,7,8,8 in the first prompt
+        [9, 9, 3, 4],
+    ]
+
+    proposal_len = 5
+    final_prompt_lens = [len(prompt) + proposal_len for prompt in prompts]
+    seq_group_metadata_list = create_seq_group_metadata_from_prompts(
+        prompts,
+        num_gpu_blocks,
+        block_size,
+        final_prompt_lens=final_prompt_lens)
+
+    proposals = proposer.get_spec_proposals(
+        execute_model_req=ExecuteModelRequest(
+            seq_group_metadata_list=seq_group_metadata_list,
+            num_lookahead_slots=proposal_len),
+        seq_ids_with_bonus_token_in_last_step=None)
+
+    assert proposals.proposal_lens.tolist() == [0, proposal_len]
+    assert proposals.proposal_token_ids[1].tolist() == [5, 6, 7, 8, 8]
+
+
+def test_ngram_index_remove_keeps_other_documents():
+    """Verify removing a document from the corpus index keeps the n-grams
+    that also occur in the other documents.
+    """
+    index = NGramIndex(1, 3)
+    index.extend("a", [1, 2, 3, 4, 5])
+    index.extend("b", [1, 2, 3, 6, 7])
+    index.extend("c", [8, 2, 3, 9])
+
+    assert index.lookup([2, 3], 2) == [[4, 5]]
+    assert index.lookup([2, 3], 2, num_candidates=3) == [[4, 5], [6, 7],
+                                                         [9, 9]]
+    assert index.lookup([2, 3], 2, exclude_doc_id="a") == [[6, 7]]
+
+    index.remove("a")
+    assert "a" not in index
+    assert index.lookup([1, 2, 3], 2) == [[6, 7]]
+    assert index.lookup([2, 3], 2, num_candidates=3) == [[6, 7], [9, 9]]
+    assert index.lookup([4], 1) == []
+
+    index.remove_oldest()
+    assert index.lookup([1, 2, 3], 2) == []
+    assert index.lookup([2, 3], 2) == [[9, 9]]
@@ -0,0 +1,77 @@
+import pytest
+
+from aphrodite.spec_decode.spec_length_controller import SpecLengthController
+
+
+def _run_steps(controller: SpecLengthController, batch_size: int,
+               max_k: int, acceptance_rate: float,
+               scoring_time_per_token_ms: float, num_steps: int) -> int:
+    """Run steps where each sequence accepts the first
+    round(acceptance_rate * k) draft tokens, and return the number of
+    speculative tokens of the last step."""
+    seq_ids = list(range(batch_size))
+    k = max_k
+    for _ in range(num_steps):
+        k = controller.get_num_spec_tokens(seq_ids, max_k)
+        if k == 0:
+            continue
+        num_accepted = round(acceptance_rate * k)
+        controller.observe(seq_ids, [k] * batch_size,
+                           [num_accepted + 1] * batch_size,
+                           proposal_time_per_token_ms=0.1,
+                           scoring_time_ms=10.0 + scoring_time_per_token_ms *
+                           batch_size * (k + 1))
+    return k
+
+
+def test_warmup_uses_max_num_spec_tokens():
+    """Verify all lookahead slots are used before any step is observed.
+    """
+    controller = SpecLengthController()
+    assert controller.get_num_spec_tokens([0, 1], max_k=5) == 5
+
+
+@pytest.mark.parametrize("max_k", [3, 5])
+def test_small_batch_speculates_max_num_tokens(max_k: int):
+    """Verify a small batch with a high acceptance rate keeps speculating
+    the max number of tokens.
+    """
+    controller = SpecLengthController()
+    k = _run_steps(controller,
+                   batch_size=2,
+                   max_k=max_k,
+                   acceptance_rate=1.0,
+                   scoring_time_per_token_ms=0.01,
+                   num_steps=100)
+    assert k >= max_k - 1
+
+
+def test_large_batch_ramps_down():
+    """Verify speculation ramps down when scoring cost grows with the
+    number of scored tokens.
+    """
+    controller = SpecLengthController()
+    k = _run_steps(controller,
+                   batch_size=256,
+                   max_k=5,
+                   acceptance_rate=0.4,
+                   scoring_time_per_token_ms=0.5,
+                   num_steps=200)
+    assert k <= 2
+
+
+def test_acceptance_rate_per_sequence():
+    """Verify the acceptance rate is tracked per sequence and freed.
+    """
+    controller = SpecLengthController()
+    for _ in range(20):
+        controller.observe([0, 1], [4, 4], [5, 1],
+                           proposal_time_per_token_ms=0.1,
+                           scoring_time_ms=10.0)
+    assert controller.get_acceptance_rate(0) > 0.8
+    assert controller.get_acceptance_rate(1) < 0.2
+
+    controller.free_seqs([0, 1])
+    # Unseen sequences get the acceptance rate of all sequences.
+    assert controller.get_acceptance_rate(
+        0) == pytest.approx(controller.get_acceptance_rate(2))
@@ -6,7 +6,7 @@ from typing import List, Optional
 
 import pytest
 
-from aphrodite.common.sequence import Sequence
+from aphrodite.common.sequence import Logprob, Sequence
 from aphrodite.lora.request import LoRARequest
 from aphrodite.transformers_utils.tokenizer_group import TokenizerGroup
 
@@ -97,3 +97,39 @@ def test_auto_prefix_caching(model: str, block_size: int, max_num_seqs: int,
         different_hashes = [h[-1] for h in hash_pref]
         assert (len(set(same_hashes)) == 1)
         assert (len(set(different_hashes)) == len(different_hashes))
+
+
+@pytest.mark.parametrize("block_size", [1, 16])
+@pytest.mark.parametrize("prompt_len", [5, 16, 100])
+def test_block_hashes_are_chained(block_size: int, prompt_len: int):
+    """Block hashes computed incrementally while tokens are appended must
+    match the hashes of a fresh sequence holding the same tokens."""
+
+    def make_seq(seq_id: int, token_ids: List[int]) -> Sequence:
+        return Sequence(seq_id,
+                        inputs={"prompt_token_ids": token_ids},
+                        block_size=block_size)
+
+    prompt_token_ids = list(range(prompt_len))
+    seq = make_seq(0, prompt_token_ids)
+    hashes = [seq.hash_of_block(idx) for idx in range(seq.n_blocks)]
+
+    for token_id in range(1000, 1000 + 2 * block_size + 3):
+        seq.append_token_id(token_id, {token_id: Logprob(0.0)})
+        hashes = [seq.hash_of_block(idx) for idx in range(seq.n_blocks)]
+
+    fresh_seq = make_seq(1, seq.get_token_ids())
+    assert hashes == [
+        fresh_seq.hash_of_block(idx) for idx in range(fresh_seq.n_blocks)
+    ]
+
+    # Blocks sharing a prefix share hashes, and a differing block changes
+    # the hash of every following block.
+    other_token_ids = list(seq.get_token_ids())
+    other_token_ids[block_size] += 1
+    other_seq = make_seq(2, other_token_ids)
+    other_hashes = [
+        other_seq.hash_of_block(idx) for idx in range(other_seq.n_blocks)
+    ]
+    assert other_hashes[0] == hashes[0]
+    assert all(h0 != h1 for h0, h1 in zip(hashes[1:], other_hashes[1:]))
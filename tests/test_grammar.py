@@ -0,0 +1,138 @@
+import pytest
+import torch
+from lark import Lark
+from lark.exceptions import LarkError
+
+from aphrodite.common import grammar
+from aphrodite.common.grammar import (GrammarLogitsProcessor,
+                                      IncrementalParserState,
+                                      NextTokenValidator)
+
+JSON_GRAMMAR = r"""
+?start: value
+?value: object | array | ESCAPED_STRING | SIGNED_NUMBER
+      | "true" | "false" | "null"
+array: "[" [value ("," value)*] "]"
+object: "{" [pair ("," pair)*] "}"
+pair: ESCAPED_STRING ":" value
+%import common.ESCAPED_STRING
+%import common.SIGNED_NUMBER
+%import common.WS
+%ignore WS
+"""
+
+DOCUMENTS = [
+    '{"a": [12, -3.5, true, "x y"], "b": null}',
+    '[ 1,2 ,  {"k" : "v"}, [], false ]',
+    '{"a": 1 2}',
+    '[1, tru]',
+]
+
+
+def _summary(result):
+    if result is None:
+        return None
+    partial_term, parser = result
+    return (partial_term,
+            tuple(parser.interactive_parser.parser_state.state_stack),
+            parser.allowed_terminals())
+
+
+def _full_reparse(seq):
+    return IncrementalParserState.from_grammar(JSON_GRAMMAR, "start")[seq]
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_incremental_parse_matches_full_reparse(document):
+    parser = IncrementalParserState.from_grammar(JSON_GRAMMAR, "start")
+    for i in range(len(document) + 1):
+        seq = document[:i]
+        assert _summary(parser[seq]) == _summary(_full_reparse(seq)), seq
+
+
+def test_parser_caches_are_per_request_and_bounded(monkeypatch):
+    monkeypatch.setattr(grammar, "_MAX_FULL_SEQS", 8)
+    parser = IncrementalParserState.from_grammar(JSON_GRAMMAR, "start")
+    other = IncrementalParserState.from_grammar(JSON_GRAMMAR, "start")
+    assert parser._memo is not other._memo
+    assert parser._full_seq_trie is not other._full_seq_trie
+
+    document = "[" + ", ".join(str(i) for i in range(100)) + "]"
+    for i in range(len(document) + 1):
+        seq = document[:i]
+        assert _summary(parser[seq]) == _summary(_full_reparse(seq)), seq
+        assert len(parser._full_seq_trie) <= 8
+    assert len(other._full_seq_trie) == 1
+
+
+class _CharTokenizer:
+    bos_token = "<s>"
+    bos_token_id = 0
+    eos_token_id = 1
+
+    def __init__(self, tokens):
+        self.vocab = {
+            token: token_id
+            for token_id, token in enumerate(["<s>", "</s>"] + tokens)
+        }
+        self._tokens = {
+            token_id: token
+            for token, token_id in self.vocab.items()
+        }
+
+    def decode(self, token_ids):
+        return "".join(self._tokens[token_id] for token_id in token_ids)
+
+
+def test_valid_next_token_strs_match_full_reparse():
+    tokens = list('{}[],:" -.0123456789abtrue') + [
+        "true", "false", "null", '"a"', "12", ", ", '": ', "]}"
+    ]
+    validator = NextTokenValidator(_CharTokenizer(tokens), JSON_GRAMMAR)
+    lark_parser = Lark(JSON_GRAMMAR, parser="lalr")
+    document = '{"a": [12, -3.5, true, "b a"], "b": null}'
+    for i in range(len(document) + 1):
+        seq = document[:i]
+        expected = {
+            token
+            for token in validator.vocab
+            if token is not None and _full_reparse(seq + token) is not None
+        }
+        try:
+            lark_parser.parse(seq)
+            expected.add(None)
+        except LarkError:
+            pass
+        assert set(validator.get_valid_next_token_strs(seq)) == expected, seq
+
+
+def test_grammar_logits_processor_caches_masks_per_parser_state():
+    tokens = list('[],0123456789 ') + ["12", ", "]
+    tokenizer = _CharTokenizer(tokens)
+    processor = GrammarLogitsProcessor(tokenizer,
+                                       JSON_GRAMMAR,
+                                       mask_cache_size=2)
+    vocab_size = len(tokenizer.vocab)
+
+    def allowed(text):
+        token_ids = [tokenizer.vocab[char] for char in text]
+        logits = torch.zeros(1, vocab_size)
+        processor(logits, [token_ids])
+        return {
+            tokenizer.decode([token_id])
+            for token_id in torch.nonzero(logits[0] == 0).flatten().tolist()
+        }
+
+    validator = NextTokenValidator(tokenizer, JSON_GRAMMAR)
+    for text in ["[", "[1", "[1,", "[1,2"]:
+        assert allowed(text) == set(
+            validator.get_valid_next_token_strs(text)) - {None}, text
+    info = processor.mask_cache_info()
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (0, 4,
+                                                                       2, 2)
+    # The same parser state and incomplete terminal reuse the cached mask.
+    assert allowed("[1,2") == allowed("[1,2")
+    assert processor.mask_cache_info().hits == 2
+
+    # An invalid sequence excludes every token.
+    assert allowed("]") == set()
@@ -1,4 +1,5 @@
 import random
+from array import array
 from typing import Tuple
 from unittest.mock import patch
 
@@ -8,6 +9,7 @@ import torch
 from aphrodite.common.sequence import (SamplingParams, SequenceData,
                                        SequenceGroupMetadata)
 from aphrodite.common.utils import is_pin_memory_available
+from aphrodite.constants import APHRODITE_TOKEN_ID_ARRAY_TYPE
 from aphrodite.modeling.layers.logits_processor import LogitsProcessor
 from aphrodite.modeling.sampling_metadata import SamplingMetadata
 from aphrodite.modeling.utils import set_random_seed
@@ -95,3 +97,30 @@ def test_logits_processors(seed: int, device: str):
                                fake_logits[:, 1],
                                rtol=1e-4,
                                atol=0.0)
+
+
+def test_batched_logits_processors_match_per_row():
+    from aphrodite.endpoints.openai.logits_processors import (
+        AllowedTokenIdsLogitsProcessor, LogitBiasLogitsProcessor)
+
+    set_random_seed(0)
+    vocab_size = 64
+    logits = torch.randn((8, vocab_size))
+    row_indices = [1, 4, 6]
+    seq_data = [
+        SequenceData(array(APHRODITE_TOKEN_ID_ARRAY_TYPE, [1, 2, 3]))
+        for _ in row_indices
+    ]
+
+    for processor_cls, arg in ((LogitBiasLogitsProcessor, {
+            3: 5.0,
+            10: -100.0
+    }), (AllowedTokenIdsLogitsProcessor, [2, 7, 63])):
+        expected = logits.clone()
+        for row in row_indices:
+            expected[row] = processor_cls(arg)([], expected[row])
+
+        actual = logits.clone()
+        processor_cls(arg).process_batch(actual, row_indices, [0, 1, 2],
+                                         seq_data)
+        torch.testing.assert_close(actual, expected)
@@ -1,8 +1,13 @@
+from array import array
+
 import pytest
 
-from aphrodite.common.sequence import (CompletionSequenceGroupOutput,
+from aphrodite.common.outputs import RequestOutput
+from aphrodite.common.sampling_params import RequestOutputKind
+from aphrodite.common.sequence import (CompletionSequenceGroupOutput, Logprob,
                                        SamplerOutput, SequenceData,
-                                       SequenceOutput)
+                                       SequenceOutput, SequenceStatus)
+from aphrodite.constants import APHRODITE_TOKEN_ID_ARRAY_TYPE
 
 from .core.utils import create_dummy_prompt
 
@@ -75,6 +80,27 @@ def test_sequence_data_prefill():
     assert seq_data.get_num_computed_tokens() == 0
 
 
+def test_sequence_data_banned_ngram_tokens():
+    seq_data = SequenceData(array(APHRODITE_TOKEN_ID_ARRAY_TYPE, [1, 2, 3]))
+    assert seq_data.get_banned_ngram_tokens(4) == []
+    assert seq_data.get_banned_ngram_tokens(2) == []
+
+    # the index is extended with appended tokens
+    seq_data.append_token_id(1, logprob=0.0)
+    seq_data.append_token_id(2, logprob=0.0)
+    assert seq_data.get_banned_ngram_tokens(2) == [3]
+    assert seq_data.get_banned_ngram_tokens(3) == [3]
+    seq_data.append_token_id(4, logprob=0.0)
+    seq_data.append_token_id(1, logprob=0.0)
+    assert sorted(seq_data.get_banned_ngram_tokens(2)) == [2]
+    seq_data.append_token_id(2, logprob=0.0)
+    assert sorted(seq_data.get_banned_ngram_tokens(2)) == [3, 4]
+
+    # replacing the output tokens rebuilds the index
+    seq_data.output_token_ids = [9]
+    assert seq_data.get_banned_ngram_tokens(2) == []
+
+
 def test_sequence_group_stage():
     _, seq_group = create_dummy_prompt("1", 12)
     assert seq_group.is_prefill() is True
@@ -96,3 +122,34 @@ def test_sequence_group_stage():
     assert seq_group.is_prefill() is True
     seq_group.update_num_computed_tokens(1)
     assert seq_group.is_prefill() is False
+
+
+@pytest.mark.parametrize("output_kind", list(RequestOutputKind))
+def test_request_output_kind(output_kind: RequestOutputKind):
+    seq, seq_group = create_dummy_prompt("1", 4)
+    seq_group.sampling_params.output_kind = output_kind
+
+    outputs = []
+    for token_id, text in [(5, "a"), (6, "bc"), (7, "d")]:
+        seq.append_token_id(token_id, {token_id: Logprob(0.0)})
+        seq.output_text += text
+        if token_id == 7:
+            seq.status = SequenceStatus.FINISHED_STOPPED
+        outputs.append(RequestOutput.from_seq_group(seq_group))
+
+    if output_kind == RequestOutputKind.FINAL_ONLY:
+        assert outputs[:2] == [None, None]
+        outputs = outputs[2:]
+    assert outputs[-1].finished
+    texts = [output.outputs[0].text for output in outputs]
+    token_ids = [list(output.outputs[0].token_ids) for output in outputs]
+    if output_kind == RequestOutputKind.DELTA:
+        assert texts == ["a", "bc", "d"]
+        assert token_ids == [[5], [6], [7]]
+        # Only the first delta carries the prompt.
+        assert outputs[0].prompt_token_ids == [0, 1, 2, 3]
+        assert outputs[1].prompt_token_ids is None
+    else:
+        assert texts[-1] == "abcd"
+        assert token_ids[-1] == [5, 6, 7]
+        assert outputs[-1].prompt_token_ids == [0, 1, 2, 3]
@@ -185,6 +185,31 @@ def test_decode_sequence_logprobs(complete_sequence: str,
         assert sequential_result == complete_sequence
 
 
+@pytest.mark.parametrize("complete_sequence", TRUTH)
+@pytest.mark.parametrize("tokenizer_name", TOKENIZERS)
+def test_decode_sequences_batched(complete_sequence_token_ids: List[int],
+                                  detokenizer: Detokenizer):
+    """Verify the batched decode matches decoding each sequence."""
+    skip_params = SamplingParams(skip_special_tokens=True)
+    keep_params = SamplingParams(skip_special_tokens=False)
+
+    expected = []
+    for sampling_params in (skip_params, keep_params):
+        seq = create_sequence()
+        for new_token in complete_sequence_token_ids:
+            seq.append_token_id(new_token, {new_token: Logprob(0.0)})
+            detokenizer.decode_sequence_inplace(seq, sampling_params)
+        expected.append(seq.output_text)
+
+    seqs = [(create_sequence(), skip_params), (create_sequence(), keep_params)]
+    for new_token in complete_sequence_token_ids:
+        for seq, _ in seqs:
+            seq.append_token_id(new_token, {new_token: Logprob(0.0)})
+        detokenizer.decode_sequences_inplace(seqs)
+
+    assert [seq.output_text for seq, _ in seqs] == expected
+
+
 @pytest.mark.parametrize("complete_sequence", TRUTH)
 @pytest.mark.parametrize("tokenizer_name", TOKENIZERS)
 def test_decode_prompt_logprobs(complete_sequence_token_ids: List[int],
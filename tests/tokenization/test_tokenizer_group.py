@@ -11,6 +11,8 @@ from aphrodite.transformers_utils.tokenizer_group import (TokenizerGroup,
                                                           get_tokenizer_group)
 from aphrodite.transformers_utils.tokenizer_group.ray_tokenizer_group import (
     RayTokenizerGroupPool)
+from aphrodite.transformers_utils.tokenizer_group.tokenization_executor import (  # noqa: E501
+    TokenizationExecutor)
 
 from ..conftest import get_tokenizer_pool_config
 
@@ -51,6 +53,56 @@ async def test_tokenizer_group(tokenizer_group_type):
         assert tokenizer_group._i > 0
 
 
+@pytest.mark.asyncio
+async def test_tokenization_executor():
+    reference_tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    executor = TokenizationExecutor(max_queue_size=4, max_batch_size=3)
+    prompts = [f"prompt {i} " * (i + 1) for i in range(10)]
+
+    # Concurrent calls are encoded in batches, and still get their own ids.
+    results = await asyncio.gather(
+        *(executor.encode(reference_tokenizer, prompt) for prompt in prompts))
+    assert results == [reference_tokenizer.encode(p) for p in prompts]
+
+    results = await asyncio.gather(*(executor.encode(
+        reference_tokenizer, prompt, add_special_tokens=False, max_length=2)
+                                     for prompt in prompts))
+    assert results == [
+        reference_tokenizer.encode(p, add_special_tokens=False)[:2]
+        for p in prompts
+    ]
+
+    assert await executor.run(reference_tokenizer.decode,
+                              [31373]) == reference_tokenizer.decode([31373])
+
+
+@pytest.mark.asyncio
+async def test_tokenization_executor_failures():
+    """A failed batch fails its calls, and the later calls are still
+    encoded."""
+    reference_tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    executor = TokenizationExecutor()
+
+    def broken_tokenizer(prompts, **kwargs):
+        raise ValueError("broken tokenizer")
+
+    def short_tokenizer(prompts, **kwargs):
+        return reference_tokenizer(prompts[1:], **kwargs)
+
+    with pytest.raises(ValueError):
+        await executor.encode(broken_tokenizer, "prompt")
+    with pytest.raises(RuntimeError):
+        await executor.encode(short_tokenizer, "prompt")
+    assert await executor.encode(
+        reference_tokenizer, "prompt") == reference_tokenizer.encode("prompt")
+
+    # The batch loop is started again if it was cancelled.
+    executor._batch_loop.cancel()
+    await asyncio.sleep(0)
+    assert await executor.encode(
+        reference_tokenizer, "prompt") == reference_tokenizer.encode("prompt")
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize("tokenizer_group_type", ["ray"])
 async def test_tokenizer_group_pool(tokenizer_group_type):
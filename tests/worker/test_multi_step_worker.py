@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import torch
+
+from aphrodite.task_handler.multi_step_worker import (MultiStepState,
+                                                      MultiStepWorker)
+from aphrodite.task_handler.worker_base import WorkerInput
+
+
+def test_cache_operations_only_run_on_first_step():
+    # A block demoted to the host prefix cache on the first step may be
+    # reused by then, replaying the swap out would overwrite the host block
+    # with the KV of another sequence.
+    first_step_input = WorkerInput(
+        num_seq_groups=1,
+        blocks_to_swap_in=torch.tensor([[3, 4]]),
+        blocks_to_swap_out=torch.tensor([[1, 2]]),
+        blocks_to_copy=torch.tensor([[5, 6]]),
+        disk_blocks_to_save=[("key", 7)],
+        disk_blocks_to_load=[("key", 8)],
+        disk_blocks_to_remove=["key"],
+    )
+    model_input = SimpleNamespace(frozen_model_input=SimpleNamespace(
+        attn_metadata=SimpleNamespace(_cached_decode_metadata=None)))
+    worker = SimpleNamespace(
+        is_driver_worker=True,
+        do_metadata_broadcast=False,
+        multi_step_states=[MultiStepState(first_step_input, model_input)],
+        _prepare_last_sampled_token_ids_for_tp_workers=lambda **kwargs: None,
+    )
+    execute_model_req = SimpleNamespace(virtual_engine=0,
+                                        is_first_multi_step=False,
+                                        is_last_step=False)
+
+    _, worker_input = MultiStepWorker._get_driver_input_and_broadcast(
+        worker, execute_model_req)
+
+    assert worker_input.num_seq_groups == 1
+    assert worker_input.blocks_to_swap_in.numel() == 0
+    assert worker_input.blocks_to_swap_out.numel() == 0
+    assert worker_input.blocks_to_copy.numel() == 0
+    assert worker_input.disk_blocks_to_save is None
+    assert worker_input.disk_blocks_to_load is None
+    assert worker_input.disk_blocks_to_remove is None
+    # The input of the first step is kept as is.
+    assert first_step_input.blocks_to_swap_out.tolist() == [[1, 2]]
@@ -0,0 +1,39 @@
+from array import array
+from types import SimpleNamespace
+
+from aphrodite.common.sequence import SequenceData
+from aphrodite.constants import APHRODITE_TOKEN_ID_ARRAY_TYPE
+from aphrodite.task_handler.worker import Worker
+
+
+def _prefill_metadata(num_computed_tokens, token_chunk_size):
+    seq_data = SequenceData(array(APHRODITE_TOKEN_ID_ARRAY_TYPE, range(40)))
+    seq_data.update_num_computed_tokens(num_computed_tokens)
+    return SimpleNamespace(is_prompt=True,
+                           seq_data={0: seq_data},
+                           block_tables={0: [10, 11, 12, 13, 14]},
+                           computed_block_nums=[10, 11, 12, 13],
+                           token_chunk_size=token_chunk_size)
+
+
+def test_blocks_that_failed_to_load_are_recomputed():
+    # Block 12 failed to load from the disk cache.
+    worker = SimpleNamespace(cache_config=SimpleNamespace(block_size=8),
+                             _blocks_to_recompute={12})
+
+    # The first chunk does not reach the block.
+    metadata = _prefill_metadata(0, 16)
+    Worker._exclude_blocks_to_recompute(worker, [metadata])
+    assert metadata.computed_block_nums == [10, 11]
+    assert worker._blocks_to_recompute == {12}
+
+    # The next chunk computes it.
+    metadata = _prefill_metadata(16, 24)
+    Worker._exclude_blocks_to_recompute(worker, [metadata])
+    assert metadata.computed_block_nums == [10, 11]
+    assert worker._blocks_to_recompute == set()
+
+    # Afterwards the block is used as computed again.
+    metadata = _prefill_metadata(0, 40)
+    Worker._exclude_blocks_to_recompute(worker, [metadata])
+    assert metadata.computed_block_nums == [10, 11, 12, 13]